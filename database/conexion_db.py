@@ -1,8 +1,12 @@
 import mysql.connector
+import mysql.connector.pooling
 from dotenv import load_dotenv
 import os
 import logging
 import sys
+import threading
+import time
+import weakref
 
 # --- FIX CRÍTICO PARA PYINSTALLER ---
 # Esto evita el error "No localization support for language 'eng'" cuando falla la conexión.
@@ -14,6 +18,14 @@ except ImportError:
 
 load_dotenv()
 
+# La extensión en C del conector decodifica las filas mucho más rápido que la implementación
+# en Python puro. PyInstaller no siempre la empaqueta: entonces se usa la pura (o con DB_USE_PURE=1).
+try:
+    from mysql.connector import HAVE_CEXT
+except ImportError:
+    HAVE_CEXT = False
+USAR_PURE = not HAVE_CEXT or os.getenv("DB_USE_PURE") == "1"
+
 def resource_path(relative_path):
     """ Obtiene la ruta absoluta al recurso, funciona para dev y para PyInstaller """
     try:
@@ -23,36 +35,158 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def parametros_conexion():
+    """Parámetros de conexión leídos del .env (None si faltan los imprescindibles)."""
+    # Leemos la contraseña usando DB_PASS, como está en tu .env
+    password = os.getenv("DB_PASS")
+    user = os.getenv("DB_USER")
+    host = os.getenv("DB_HOST")
+
+    if not all([password, user, host]):
+        logging.error("Faltan variables de entorno críticas (DB_USER, DB_PASS o DB_HOST).")
+        return None
+
+    return dict(
+        host=host,
+        user=user,
+        password=password,
+        database=os.getenv("DB_NAME"),
+        port=int(os.getenv("DB_PORT", "3306")),
+        # --- CONEXIÓN SEGURA PARA LA NUBE ---
+        ssl_ca=resource_path('ca.pem'),
+        ssl_verify_cert=True,
+        use_pure=USAR_PURE,
+        # Compresión del protocolo (DB_COMPRESS=1): menos bytes por enlaces lentos a cambio de CPU
+        compress=os.getenv("DB_COMPRESS") == "1"
+    )
+
+# =================== Pool compartido (servidor de la API) ===================
+_pool = None
+_lock_pool = threading.Lock()
+ESPERA_POOL = 5.0 # segundos que se espera una conexión libre antes de rendirse
+
+class _ConexionDelPool:
+    """Conexión prestada por el pool: al cerrarla (o al salir del 'with') vuelve al pool."""
+    def __init__(self, conn):
+        self._conn = conn
+        self._devuelta = False
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
+        return False
+    def close(self):
+        if self._devuelta:
+            return
+        self._devuelta = True
+        try:
+            # El pool no reinicia la sesión (borraría las sentencias preparadas), así que
+            # deshacemos aquí lo que quede abierto para que el siguiente no herede la transacción.
+            if self._conn.in_transaction:
+                self._conn.rollback()
+        except mysql.connector.Error:
+            pass
+        finally:
+            self._conn.close()
+
+def activar_pool(tamanio=8):
+    """
+    A partir de aquí conectar_db() presta conexiones de un pool compartido por todos
+    los hilos en vez de abrir (y negociar TLS) una nueva en cada llamada.
+    """
+    global _pool
+    parametros = parametros_conexion()
+    if not parametros:
+        raise RuntimeError("No se puede crear el pool: faltan credenciales en .env")
+    with _lock_pool:
+        if _pool is None:
+            _pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name="minicalendar", pool_size=tamanio, pool_reset_session=False, **parametros
+            )
+    return _pool
+
+def _conexion_del_pool():
+    limite = time.monotonic() + ESPERA_POOL
+    while True:
+        try:
+            return _ConexionDelPool(_pool.get_connection())
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() > limite:
+                raise
+            time.sleep(0.02) # Todas prestadas: esperamos a que se libere alguna
+
 def conectar_db():
     """Establece y devuelve una conexión simple y segura a la base de datos."""
     try:
-        # Leemos la contraseña usando DB_PASS, como está en tu .env
-        password = os.getenv("DB_PASS")
-        user = os.getenv("DB_USER")
-        host = os.getenv("DB_HOST")
-        
-        if not all([password, user, host]):
-            logging.error("Faltan variables de entorno críticas (DB_USER, DB_PASS o DB_HOST).")
+        if _pool is not None:
+            return _conexion_del_pool()
+        parametros = parametros_conexion()
+        if not parametros:
             return None
-
-        port_int = int(os.getenv("DB_PORT", "3306"))
-        
-        conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=os.getenv("DB_NAME"),
-            port=port_int,
-            # --- CONEXIÓN SEGURA PARA LA NUBE ---
-            ssl_ca=resource_path('ca.pem'),
-            ssl_verify_cert=True,
-            use_pure=True  # Forzar conector Pure Python para máxima compatibilidad
-        )
+        conn = mysql.connector.connect(**parametros)
         return conn
     except Exception as err:
         logging.error(f"Error fatal al conectar a la base de datos: {err}", exc_info=True)
         return None
 
+# =================== Sentencias preparadas ===================
+# Con conexiones que duran (las del pool), las consultas frecuentes se preparan una vez en
+# el servidor y después solo viajan los parámetros y las filas en protocolo binario.
+_preparadas = weakref.WeakKeyDictionary() # conexión física -> (id de sesión, {sql: cursor})
+_lock_preparadas = threading.Lock()
+
+def _conexion_fisica(conn):
+    while hasattr(conn, "_conn"): # Envoltorios de lote (dao._ConexionDeLote) y de pool
+        conn = conn._conn
+    return getattr(conn, "_cnx", conn) # PooledMySQLConnection -> conexión real
+
+def _cursor_preparado(conn, sql):
+    fisica = _conexion_fisica(conn)
+    with _lock_preparadas:
+        sesion, cursores = _preparadas.get(fisica, (None, None))
+        if sesion != fisica.connection_id:
+            # Conexión nueva o reconectada por el pool: el servidor ya no tiene sus sentencias
+            cursores = {}
+            _preparadas[fisica] = (fisica.connection_id, cursores)
+    cursor = cursores.get(sql)
+    if cursor is None:
+        cursor = cursores[sql] = fisica.cursor(prepared=True)
+    return cursor
+
+def consultar_preparada(conn, sql, parametros=(), dictionary=False):
+    """
+    Filas de una consulta frecuente. Con el pool activo va por un cursor preparado que se
+    reutiliza mientras viva la conexión; sin pool (conexión de un solo uso) preparar
+    costaría un viaje más al servidor, así que se lanza como texto.
+    """
+    if _pool is None:
+        cursor = conn.cursor(dictionary=dictionary)
+        cursor.execute(sql, parametros)
+        filas = cursor.fetchall()
+        cursor.close()
+        return filas
+    cursor = _cursor_preparado(conn, sql)
+    cursor.execute(sql, parametros)
+    filas = cursor.fetchall()
+    if dictionary:
+        columnas = cursor.column_names
+        return [dict(zip(columnas, fila)) for fila in filas]
+    return filas
+
+def ejecutar_preparada(conn, sql, parametros=()):
+    """Como consultar_preparada, para INSERT/UPDATE. Devuelve el lastrowid."""
+    if _pool is None:
+        cursor = conn.cursor()
+        cursor.execute(sql, parametros)
+        id_fila = cursor.lastrowid
+        cursor.close()
+        return id_fila
+    cursor = _cursor_preparado(conn, sql)
+    cursor.execute(sql, parametros)
+    return cursor.lastrowid
+
 def verificar_y_crear_tablas_base():
     """Asegura que las tablas esenciales existan, sin modificar datos."""
     try:
@@ -90,3 +224,42 @@ def verificar_y_crear_tablas_base():
             logging.info("Verificación de tablas base completada.")
     except Exception as e:
         logging.error(f"No se pudieron crear las tablas base: {e}", exc_info=True)
+
+
+def medir_consultas(usuario_id, repeticiones=10):
+    """
+    Benchmark: conector puro vs. extensión C, SQL de texto vs. sentencia preparada, y
+    carga completa (obtener_por_usuario) vs. resumen para las vistas (obtener_resumen_por_usuario).
+    Devuelve {(modo, consulta, preparada): {'segundos', 'filas', 'bytes'}} con el tiempo medio por consulta.
+    """
+    from database.dao import SQL_EVENTOS_DE_USUARIO, SQL_RESUMEN_DE_USUARIO
+
+    parametros = parametros_conexion()
+    resultados = {}
+    for pure in ([True, False] if HAVE_CEXT else [True]):
+        conn = mysql.connector.connect(**dict(parametros, use_pure=pure))
+        for nombre, sql in (("completa", SQL_EVENTOS_DE_USUARIO), ("resumen", SQL_RESUMEN_DE_USUARIO)):
+            for preparada in (False, True):
+                cursor = conn.cursor(prepared=preparada)
+                t0 = time.perf_counter()
+                for _ in range(repeticiones):
+                    cursor.execute(sql, (usuario_id,) * sql.count("%s"))
+                    filas = cursor.fetchall()
+                t = (time.perf_counter() - t0) / repeticiones
+                cursor.close()
+                resultados[("puro" if pure else "C", nombre, preparada)] = {
+                    'segundos': t, 'filas': len(filas),
+                    'bytes': sum(len(str(v)) for fila in filas for v in fila if v is not None), # Aproximación de los datos
+                }
+        conn.close()
+    return resultados
+
+
+if __name__ == '__main__':
+    # Uso: python -m database.conexion_db <usuario_id> [repeticiones]
+    logging.basicConfig(level=logging.INFO)
+    usuario_id = int(sys.argv[1])
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    for (modo, nombre, preparada), r in medir_consultas(usuario_id, repeticiones).items():
+        logging.info(f"{modo:>4} {nombre:>8} {'preparada' if preparada else 'texto':>9}: "
+                     f"{r['filas']} filas, ~{r['bytes'] / 1024:.0f} KB, {r['segundos'] * 1000:.1f} ms/consulta")
@@ -1,16 +1,86 @@
 import mysql.connector
 import logging
+import os
+import re
+import threading
 import bcrypt
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from database.conexion_db import conectar_db
+from database.conexion_db import conectar_db, consultar_preparada, ejecutar_preparada
+from utils.excepciones import desplazar_excepciones
+from utils.config import COLORES_CALENDARIOS
+
+class SinConexionError(Exception):
+    """No se puede contactar con la base de datos (a diferencia de un error en la propia consulta)."""
+
+def es_error_de_conexion(e):
+    return isinstance(e, (SinConexionError, mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError))
+
+# Conexión del lote en curso, por hilo (ver BaseDAO.lote)
+_hilo = threading.local()
+
+class _ConexionDeLote:
+    """
+    Envuelve la conexión de un lote: cada método del DAO sigue haciendo su
+    'with ... as conn', commit() y start_transaction() como siempre, pero no
+    tienen efecto hasta que termina el lote completo.
+    """
+    def __init__(self, conn):
+        self._conn = conn
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def commit(self):
+        pass
+    def rollback(self):
+        pass # Lo deshace el punto de guardado de la operación (ver BaseDAO.punto_guardado)
+    def start_transaction(self, *args, **kwargs):
+        pass
 
 class BaseDAO:
     def get_connection(self):
+        lote = getattr(_hilo, 'lote', None)
+        if lote is not None:
+            return lote
         conn = conectar_db()
         if not conn:
-            raise Exception("No se pudo obtener una conexión a la base de datos.")
+            raise SinConexionError("No se pudo obtener una conexión a la base de datos.")
         return conn
 
+    @contextmanager
+    def lote(self):
+        """Agrupa en una sola transacción todas las llamadas al DAO hechas desde este hilo."""
+        conn = self.get_connection()
+        conn.start_transaction()
+        _hilo.lote = _ConexionDeLote(conn)
+        try:
+            yield
+            conn.commit()
+        except Exception:
+            try: conn.rollback()
+            except Exception: pass
+            raise
+        finally:
+            _hilo.lote = None
+            conn.close()
+
+    @contextmanager
+    def punto_guardado(self, nombre="operacion"):
+        """Dentro de un lote: si la operación falla se deshace solo ella, no el lote entero."""
+        cursor = _hilo.lote.cursor()
+        cursor.execute(f"SAVEPOINT {nombre}")
+        try:
+            yield
+        except Exception as e:
+            if not es_error_de_conexion(e):
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {nombre}")
+            raise
+        finally:
+            cursor.close()
+
 class UsuariosDAO(BaseDAO):
     def autenticar(self, email, password):
         try:
@@ -87,7 +157,7 @@ class UsuariosDAO(BaseDAO):
             raise e
         except Exception as e:
             logging.error(f"Error al registrar usuario: {e}", exc_info=True)
-            return False, f"Ocurrió un error inesperado: {e}"
+            return False, "Ocurrió un error inesperado al registrar el usuario." # El detalle va al log
 
     def _crear_eventos_bienvenida(self, conn, usuario_id):
         """Crea eventos iniciales para que el nuevo usuario no vea el calendario vacío."""
@@ -196,6 +266,57 @@ class UsuariosDAO(BaseDAO):
         except Exception as e:
             logging.error(f"Error cargando demo: {e}", exc_info=True)
 
+    def obtener_region_festivos(self, id_usuario):
+        """Calendario de festivos elegido por el usuario (None si no ha elegido o no hay BD)."""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT region_festivos FROM usuarios WHERE id_usuario = %s", (id_usuario,))
+                fila = cursor.fetchone()
+                cursor.close()
+                return fila[0] if fila else None
+        except Exception as e:
+            logging.error(f"Error obteniendo región de festivos: {e}", exc_info=True)
+            return None
+
+    def guardar_region_festivos(self, id_usuario, region):
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE usuarios SET region_festivos = %s WHERE id_usuario = %s", (region, id_usuario))
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            logging.error(f"Error guardando región de festivos: {e}", exc_info=True)
+            raise e
+
+    def obtener_ubicacion_clima(self, id_usuario):
+        """(nombre, latitud, longitud) elegidos por el usuario para el clima, o None."""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT clima_nombre, clima_latitud, clima_longitud FROM usuarios WHERE id_usuario = %s", (id_usuario,))
+                fila = cursor.fetchone()
+                cursor.close()
+                return fila if fila and fila[1] is not None and fila[2] is not None else None
+        except Exception as e:
+            logging.error(f"Error obteniendo ubicación del clima: {e}", exc_info=True)
+            return None
+
+    def guardar_ubicacion_clima(self, id_usuario, nombre, latitud, longitud):
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE usuarios SET clima_nombre = %s, clima_latitud = %s, clima_longitud = %s WHERE id_usuario = %s",
+                    (nombre, latitud, longitud, id_usuario)
+                )
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            logging.error(f"Error guardando ubicación del clima: {e}", exc_info=True)
+            raise e
+
     def obtener_primer_usuario(self):
         try:
             with self.get_connection() as conn:
@@ -210,7 +331,26 @@ class UsuariosDAO(BaseDAO):
             return None
 
 class ColoresDAO(BaseDAO):
+    # Catálogo HEX -> id_color: no depende del usuario, así que se lee una vez por proceso
+    # y lo comparten todas las sesiones (y todos los hilos) hasta que cambian los colores
+    _catalogo = None
+    _lock_catalogo = threading.Lock()
+
+    def catalogo_compartido(self):
+        with ColoresDAO._lock_catalogo:
+            if ColoresDAO._catalogo is None:
+                ColoresDAO._catalogo = self.obtener_catalogo()
+            return ColoresDAO._catalogo
+
     def obtener_id_por_hex(self, hex_code):
+        try:
+            id_color = self.catalogo_compartido().get(hex_code.upper())
+        except SinConexionError:
+            raise
+        except Exception:
+            id_color = None # Ya registrado en obtener_catalogo: se intenta con la consulta suelta
+        if id_color is not None:
+            return id_color
         try:
             with self.get_connection() as conn:
                 if not conn: return None
@@ -219,9 +359,27 @@ class ColoresDAO(BaseDAO):
                 result = cursor.fetchone()
                 cursor.close()
                 return result[0] if result else None
+        except SinConexionError:
+            raise # Sin conexión no es lo mismo que "color no encontrado"
         except Exception as e:
             logging.error(f"Error obteniendo id de color: {e}", exc_info=True)
             return None
+
+    def obtener_catalogo(self):
+        """Todo el catálogo de una vez (HEX en mayúsculas -> id_color), para resolver colores en bloque."""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id_color, codigo FROM colores ORDER BY id_color")
+                catalogo = {}
+                for id_color, codigo in cursor.fetchall():
+                    if codigo and "#" in codigo:
+                        catalogo.setdefault(("#" + codigo.split("#")[-1]).upper(), id_color)
+                cursor.close()
+                return catalogo
+        except Exception as e:
+            logging.error(f"Error obteniendo catálogo de colores: {e}", exc_info=True)
+            raise e
             
     def sincronizar(self, mapa_colores):
         try:
@@ -234,67 +392,837 @@ class ColoresDAO(BaseDAO):
                         cursor.execute("INSERT INTO colores (nombre, codigo) VALUES (%s, %s)", (nombre, hex_code))
                 conn.commit()
                 cursor.close()
+            with ColoresDAO._lock_catalogo:
+                ColoresDAO._catalogo = None # Puede haber colores nuevos: se vuelve a leer al pedirlo
         except Exception as e:
             logging.error(f"Error sincronizando colores: {e}", exc_info=True)
 
-class EventosDAO(BaseDAO):
-    def obtener_por_usuario(self, usuario_id):
+# Carga completa de un usuario: la consulta más frecuente, va como sentencia preparada
+SQL_EVENTOS_DE_USUARIO = """
+    SELECT e.id_evento, e.titulo, e.descripcion, e.fecha_inicio, c.codigo AS color_db_string, e.archivo_adjunto, e.es_importante, e.minutos_aviso, e.duracion_minutos,
+           e.regla_recurrencia, e.excepciones_recurrencia, e.serie_id, e.fecha_original, e.version
+    FROM eventos e
+    JOIN colores c ON e.color_id = c.id_color
+    WHERE e.usuario_id=%s
+    ORDER BY e.fecha_inicio ASC, e.titulo ASC, e.id_evento ASC
+"""
+
+# Calendarios que ve un usuario: el suyo y los que otros le han compartido. Es una tabla
+# derivada (parámetros: usuario_id, usuario_id) que se une a eventos por usuario_id, así que
+# cada calendario es un rango de idx_eventos_usuario_fecha dentro de una única consulta.
+SQL_CALENDARIOS_VISIBLES = """
+    (SELECT id_usuario AS propietario_id, 'propietario' AS permiso, NULL AS color_calendario
+     FROM usuarios WHERE id_usuario = %s
+     UNION ALL
+     SELECT propietario_id, permiso, color FROM calendarios_compartidos WHERE usuario_id = %s) v
+"""
+
+# Proyección para las vistas de calendario: sin descripcion (TEXT) ni archivo_adjunto,
+# que solo hacen falta en el tooltip y el editor (ver EventosDAO.obtener_detalles).
+# Incluye los calendarios compartidos, con su dueño, el permiso y el color del calendario.
+SQL_RESUMEN_DE_USUARIO = f"""
+    SELECT e.id_evento, e.titulo, e.fecha_inicio, c.codigo AS color_db_string, e.es_importante, e.minutos_aviso, e.duracion_minutos,
+           e.regla_recurrencia, e.excepciones_recurrencia, e.serie_id, e.fecha_original, e.version,
+           (e.descripcion IS NOT NULL AND e.descripcion <> '') AS tiene_notas, (e.archivo_adjunto IS NOT NULL) AS tiene_adjunto,
+           v.propietario_id, u.nombre AS propietario_nombre, v.permiso, v.color_calendario
+    FROM {SQL_CALENDARIOS_VISIBLES}
+    JOIN eventos e ON e.usuario_id = v.propietario_id
+    JOIN colores c ON e.color_id = c.id_color
+    JOIN usuarios u ON u.id_usuario = v.propietario_id
+    ORDER BY e.fecha_inicio ASC, e.titulo ASC, e.id_evento ASC
+"""
+
+# Agenda y próximos eventos: paginación por keyset sobre (fecha_inicio, id_evento) en una
+# sola consulta para todos los calendarios visibles. Cada calendario es un rango de
+# idx_eventos_usuario_fecha (usuario_id, fecha_inicio), que ya lleva id_evento al final
+# (InnoDB añade la clave primaria a cada índice secundario); el LIMIT corta la mezcla, sin
+# OFFSET. Los filtros de importantes y avisos tienen su propio índice con la igualdad delante
+# (idx_eventos_usuario_importante, idx_eventos_usuario_aviso).
+# Las series no entran: se expanden en el cliente como en el resto de vistas.
+SQL_PAGINA_EVENTOS = f"""
+    SELECT e.id_evento, e.titulo, e.fecha_inicio, c.codigo AS color_db_string, e.es_importante, e.minutos_aviso, e.duracion_minutos,
+           e.regla_recurrencia, e.excepciones_recurrencia, e.serie_id, e.fecha_original, e.version,
+           (e.descripcion IS NOT NULL AND e.descripcion <> '') AS tiene_notas, (e.archivo_adjunto IS NOT NULL) AS tiene_adjunto,
+           v.propietario_id, u.nombre AS propietario_nombre, v.permiso, v.color_calendario
+    FROM {SQL_CALENDARIOS_VISIBLES}
+    JOIN eventos e ON e.usuario_id = v.propietario_id
+    JOIN colores c ON e.color_id = c.id_color
+    JOIN usuarios u ON u.id_usuario = v.propietario_id
+    WHERE e.regla_recurrencia IS NULL {{filtro}}
+      AND (e.fecha_inicio {{op}} %s OR (e.fecha_inicio = %s AND e.id_evento {{op}} %s))
+    ORDER BY e.fecha_inicio {{orden}}, e.id_evento {{orden}}
+    LIMIT %s
+"""
+FILTROS_PROXIMOS = {None: "", "importantes": "AND e.es_importante = TRUE", "avisos": "AND e.con_aviso = TRUE"}
+SQL_SIGUIENTES = {f: SQL_PAGINA_EVENTOS.format(filtro=c, op=">", orden="ASC") for f, c in FILTROS_PROXIMOS.items()}
+SQL_ANTERIORES = SQL_PAGINA_EVENTOS.format(filtro="", op="<", orden="DESC")
+
+class CalendariosDAO(BaseDAO):
+    """
+    Calendarios compartidos. Cada usuario tiene uno (sus eventos) y puede compartirlo
+    con otros en modo 'lectura' o 'escritura'; la tabla calendarios_compartidos tiene
+    una fila por (usuario que ve, propietario).
+    """
+    def obtener_visibles(self, usuario_id):
+        """El calendario propio y los compartidos con el usuario: [{propietario_id, nombre, permiso, color, version}]."""
         try:
             with self.get_connection() as conn:
                 if not conn: return None
                 cursor = conn.cursor(dictionary=True)
+                calendarios = self._leer_visibles(cursor, usuario_id)
+                cursor.close()
+                return calendarios
+        except Exception as e:
+            logging.error(f"Error obteniendo calendarios visibles: {e}", exc_info=True)
+            return None
+
+    @staticmethod
+    def _leer_visibles(cursor, usuario_id):
+        cursor.execute(f"""
+            SELECT v.propietario_id, u.nombre, v.permiso, v.color_calendario AS color, u.version_cambios AS version
+            FROM {SQL_CALENDARIOS_VISIBLES}
+            JOIN usuarios u ON u.id_usuario = v.propietario_id
+            ORDER BY v.propietario_id = %s DESC, u.nombre ASC
+        """, (usuario_id, usuario_id, usuario_id))
+        return cursor.fetchall()
+
+    def obtener_compartidos_por(self, propietario_id):
+        """Con quién comparte el usuario su calendario: [{usuario_id, nombre, email, permiso}]."""
+        try:
+            with self.get_connection() as conn:
+                if not conn: return []
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT cc.usuario_id, u.nombre, u.email, cc.permiso
+                    FROM calendarios_compartidos cc
+                    JOIN usuarios u ON u.id_usuario = cc.usuario_id
+                    WHERE cc.propietario_id = %s
+                    ORDER BY u.nombre ASC
+                """, (propietario_id,))
+                compartidos = cursor.fetchall()
+                cursor.close()
+                return compartidos
+        except Exception as e:
+            logging.error(f"Error obteniendo calendarios compartidos: {e}", exc_info=True)
+            raise e
+
+    def compartir(self, propietario_id, email, permiso='lectura'):
+        """Comparte (o cambia el permiso de) el calendario con el usuario de ese email. Devuelve (exito, mensaje)."""
+        if permiso not in ('lectura', 'escritura'):
+            return False, "Permiso no válido."
+        try:
+            with self.get_connection() as conn:
+                if not conn: return False, "Sin conexión con la base de datos."
+                cursor = conn.cursor()
+                cursor.execute("SELECT id_usuario FROM usuarios WHERE email = %s", (email.strip(),))
+                fila = cursor.fetchone()
+                if not fila:
+                    cursor.close()
+                    return False, "No existe ningún usuario con ese email."
+                usuario_id = fila[0]
+                if usuario_id == propietario_id:
+                    cursor.close()
+                    return False, "No puedes compartir el calendario contigo mismo."
+                color = COLORES_CALENDARIOS[propietario_id % len(COLORES_CALENDARIOS)]
                 cursor.execute("""
-                    SELECT e.id_evento, e.titulo, e.descripcion, e.fecha_inicio, c.codigo AS color_db_string, e.archivo_adjunto, e.es_importante, e.minutos_aviso
+                    INSERT INTO calendarios_compartidos (propietario_id, usuario_id, permiso, color)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE permiso = VALUES(permiso)
+                """, (propietario_id, usuario_id, permiso, color))
+                # El sello del que recibe cambia para que su feed de cambios lo note
+                cursor.execute("UPDATE usuarios SET version_cambios = version_cambios + 1 WHERE id_usuario = %s", (usuario_id,))
+                conn.commit()
+                cursor.close()
+                return True, "Calendario compartido."
+        except Exception as e:
+            logging.error(f"Error compartiendo calendario: {e}", exc_info=True)
+            raise e
+
+    def dejar_de_compartir(self, propietario_id, usuario_id):
+        try:
+            with self.get_connection() as conn:
+                if not conn: return False
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM calendarios_compartidos WHERE propietario_id = %s AND usuario_id = %s",
+                               (propietario_id, usuario_id))
+                borrado = cursor.rowcount > 0
+                if borrado:
+                    # El sello visible es la suma de los calendarios que se ven: al quitar uno
+                    # se suma su versión al del usuario para que nunca retroceda
+                    cursor.execute("""
+                        UPDATE usuarios u, (SELECT version_cambios FROM usuarios WHERE id_usuario = %s) p
+                        SET u.version_cambios = u.version_cambios + p.version_cambios + 1
+                        WHERE u.id_usuario = %s
+                    """, (propietario_id, usuario_id))
+                conn.commit()
+                cursor.close()
+                return borrado
+        except Exception as e:
+            logging.error(f"Error dejando de compartir calendario: {e}", exc_info=True)
+            raise e
+
+    def propietarios_visibles(self, usuario_id):
+        """Ids de los calendarios que el usuario puede leer (incluido el suyo)."""
+        return self._propietarios(usuario_id, ('lectura', 'escritura'))
+
+    def propietarios_editables(self, usuario_id):
+        """Ids de los calendarios que el usuario puede modificar (incluido el suyo)."""
+        return self._propietarios(usuario_id, ('escritura',))
+
+    def _propietarios(self, usuario_id, permisos):
+        try:
+            with self.get_connection() as conn:
+                if not conn: return {usuario_id}
+                cursor = conn.cursor()
+                marcadores = ", ".join(["%s"] * len(permisos))
+                cursor.execute(f"SELECT propietario_id FROM calendarios_compartidos WHERE usuario_id = %s AND permiso IN ({marcadores})",
+                               [usuario_id, *permisos])
+                propietarios = {fila[0] for fila in cursor.fetchall()} | {usuario_id}
+                cursor.close()
+                return propietarios
+        except Exception as e:
+            logging.error(f"Error obteniendo permisos de calendarios: {e}", exc_info=True)
+            raise e
+
+class EventosDAO(BaseDAO):
+    def obtener_resumen_por_usuario(self, usuario_id):
+        """
+        Como obtener_por_usuario, pero sin descripción ni ruta del adjunto (solo si los hay)
+        y con los eventos de los calendarios compartidos con el usuario.
+        """
+        try:
+            with self.get_connection() as conn:
+                if not conn: return None
+                return consultar_preparada(conn, SQL_RESUMEN_DE_USUARIO, (usuario_id, usuario_id), dictionary=True)
+        except mysql.connector.Error as e:
+            logging.error(f"Error SQL cargando resumen de eventos: {e}", exc_info=True)
+            raise e
+
+    def obtener_detalles(self, ids_eventos):
+        """Descripción y adjunto de los eventos pedidos: {id_evento: {'descripcion': ..., 'archivo_adjunto': ...}}."""
+        if not ids_eventos:
+            return {}
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                marcadores = ", ".join(["%s"] * len(ids_eventos))
+                cursor.execute(f"SELECT id_evento, descripcion, archivo_adjunto FROM eventos WHERE id_evento IN ({marcadores})",
+                               list(ids_eventos))
+                detalles = {fila.pop('id_evento'): fila for fila in cursor.fetchall()}
+                cursor.close()
+                return detalles
+        except Exception as e:
+            logging.error(f"Error obteniendo detalles de eventos: {e}", exc_info=True)
+            raise e
+
+    def obtener_descripciones(self, usuario_id):
+        """
+        {id_evento: descripcion} de los eventos con notas de los calendarios visibles. Solo
+        para el índice de búsqueda local, que se construye una vez en segundo plano: así
+        las vistas siguen cargando el resumen sin el TEXT de las notas.
+        """
+        try:
+            with self.get_connection() as conn:
+                if not conn: return None
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT e.id_evento, e.descripcion FROM {SQL_CALENDARIOS_VISIBLES}
+                    JOIN eventos e ON e.usuario_id = v.propietario_id
+                    WHERE e.descripcion IS NOT NULL AND e.descripcion <> ''
+                """, (usuario_id, usuario_id))
+                descripciones = dict(cursor.fetchall())
+                cursor.close()
+                return descripciones
+        except Exception as e:
+            logging.error(f"Error obteniendo descripciones de eventos: {e}", exc_info=True)
+            raise e
+
+    def obtener_por_usuario(self, usuario_id):
+        try:
+            with self.get_connection() as conn:
+                if not conn: return None
+                return consultar_preparada(conn, SQL_EVENTOS_DE_USUARIO, (usuario_id,), dictionary=True)
+        except mysql.connector.Error as e:
+            logging.error(f"Error SQL cargando eventos: {e}", exc_info=True)
+            raise e
+
+    def obtener_rango(self, usuario_id, desde, hasta):
+        """Eventos que pueden aparecer en [desde, hasta): los que empiezan dentro y las series que empiezan antes."""
+        try:
+            with self.get_connection() as conn:
+                if not conn: return None
+                return consultar_preparada(conn, """
+                    SELECT e.id_evento, e.titulo, e.descripcion, e.fecha_inicio, c.codigo AS color_db_string, e.archivo_adjunto, e.es_importante, e.minutos_aviso, e.duracion_minutos,
+                           e.regla_recurrencia, e.excepciones_recurrencia, e.serie_id, e.fecha_original, e.version
                     FROM eventos e
                     JOIN colores c ON e.color_id = c.id_color
-                    WHERE e.usuario_id=%s
+                    WHERE e.usuario_id = %s AND e.fecha_inicio < %s
+                      AND (e.fecha_inicio >= %s OR e.regla_recurrencia IS NOT NULL)
                     ORDER BY e.fecha_inicio ASC, e.titulo ASC, e.id_evento ASC
-                """, (usuario_id,))
-                eventos = cursor.fetchall()
-                cursor.close()
-                return eventos
+                """, (usuario_id, hasta, desde), dictionary=True)
         except mysql.connector.Error as e:
-            logging.error(f"Error SQL cargando eventos: {e}", exc_info=True)
+            logging.error(f"Error SQL cargando rango de eventos: {e}", exc_info=True)
+            raise e
+
+    def obtener_pagina_agenda(self, usuario_id, cursor, adelante=True, limite=100, filtro=None):
+        """
+        Hasta 'limite' eventos sueltos (no series) de los calendarios visibles justo después
+        (o antes) del cursor (fecha_inicio, id_evento), en orden ascendente.
+        'filtro' (solo hacia adelante): 'importantes' o 'avisos' (minutos_aviso > 0).
+        """
+        fecha, id_evento = cursor
+        sql = SQL_SIGUIENTES[filtro] if adelante else SQL_ANTERIORES
+        try:
+            with self.get_connection() as conn:
+                if not conn: return None
+                filas = consultar_preparada(conn, sql, (usuario_id, usuario_id, fecha, fecha, id_evento, limite), dictionary=True)
+                return filas if adelante else filas[::-1]
+        except mysql.connector.Error as e:
+            logging.error(f"Error SQL cargando página de eventos: {e}", exc_info=True)
+            raise e
+
+    def obtener_proximos(self, usuario_id, desde, limite=50, filtro=None, cursor=None):
+        """
+        Los 'limite' próximos eventos sueltos que empiezan en 'desde' o después (o tras
+        'cursor' para la página siguiente), solo importantes o con aviso según 'filtro'.
+        """
+        return self.obtener_pagina_agenda(usuario_id, cursor or (desde, 0), True, limite, filtro)
+
+    def propietarios(self, ids_eventos):
+        """Usuarios dueños de esos eventos (los ids que no existen no cuentan)."""
+        if not ids_eventos:
+            return set()
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                marcadores = ", ".join(["%s"] * len(ids_eventos))
+                cursor.execute(f"SELECT DISTINCT usuario_id FROM eventos WHERE id_evento IN ({marcadores})", list(ids_eventos))
+                usuarios = {fila[0] for fila in cursor.fetchall()}
+                cursor.close()
+                return usuarios
+        except Exception as e:
+            logging.error(f"Error comprobando propietarios de eventos: {e}", exc_info=True)
             raise e
 
     def guardar(self, datos, modo='crear', id_evento=None):
         try:
             with self.get_connection() as conn:
                 if not conn: raise Exception("No hay conexión con la base de datos")
-                cursor = conn.cursor()
                 if modo == 'crear':
-                    cursor.execute("""
-                        INSERT INTO eventos (usuario_id, titulo, descripcion, fecha_inicio, color_id, archivo_adjunto, es_importante, minutos_aviso)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (datos['usuario_id'], datos['titulo'], datos['descripcion'], datos['fecha_inicio'], datos['color_id'], datos['archivo_adjunto'], datos['es_importante'], datos['minutos_aviso']))
+                    # serie_id/fecha_original solo vienen cuando se crea la excepción de una ocurrencia
+                    id_evento = ejecutar_preparada(conn, """
+                        INSERT INTO eventos (usuario_id, titulo, descripcion, fecha_inicio, color_id, archivo_adjunto, es_importante, minutos_aviso,
+                                             duracion_minutos, regla_recurrencia, serie_id, fecha_original)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (datos['usuario_id'], datos['titulo'], datos['descripcion'], datos['fecha_inicio'], datos['color_id'], datos['archivo_adjunto'], datos['es_importante'], datos['minutos_aviso'],
+                          datos.get('duracion_minutos', 0), datos.get('regla_recurrencia'), datos.get('serie_id'), datos.get('fecha_original')))
                 else:
-                    cursor.execute("""
+                    ejecutar_preparada(conn, """
                         UPDATE eventos 
-                        SET titulo = %s, descripcion = %s, color_id = %s, archivo_adjunto = %s, fecha_inicio = %s, es_importante = %s, minutos_aviso = %s
+                        SET titulo = %s, descripcion = %s, color_id = %s, archivo_adjunto = %s, fecha_inicio = %s, es_importante = %s, minutos_aviso = %s,
+                            duracion_minutos = %s, regla_recurrencia = %s
                         WHERE id_evento = %s
-                    """, (datos['titulo'], datos['descripcion'], datos['color_id'], datos['archivo_adjunto'], datos['fecha_inicio'], datos['es_importante'], datos['minutos_aviso'], id_evento))
+                    """, (datos['titulo'], datos['descripcion'], datos['color_id'], datos['archivo_adjunto'], datos['fecha_inicio'], datos['es_importante'], datos['minutos_aviso'],
+                          datos.get('duracion_minutos', 0), datos.get('regla_recurrencia'), id_evento))
                 conn.commit()
-                cursor.close()
+                return id_evento
         except Exception as e:
             logging.error(f"Error guardando evento: {e}", exc_info=True)
             raise e
 
+    def importar(self, usuario_id, eventos, tam_lote=500, series=None):
+        """
+        Inserta los eventos (un iterable que puede ser un generador) en transacciones
+        de 'tam_lote' filas. Es un generador: cede el total insertado tras confirmar
+        cada lote, y si se deja de iterar los lotes ya confirmados se quedan.
+
+        Las series (con regla) se insertan una a una para conocer su id; las ocurrencias
+        modificadas que vienen después con el mismo 'uid' se enlazan a ellas, y si la
+        serie no está en el fichero entran como eventos sueltos. 'series' (uid -> id) permite
+        enlazarlas aunque lleguen en otra llamada (la API importa por trozos).
+        """
+        sql = """
+            INSERT INTO eventos (usuario_id, titulo, descripcion, fecha_inicio, color_id, es_importante, minutos_aviso, duracion_minutos,
+                                 regla_recurrencia, excepciones_recurrencia, serie_id, fecha_original)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        series = {} if series is None else series # uid -> id_evento de las series importadas
+        insertados = 0
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                lote = []
+                for evento in eventos:
+                    serie_id = series.get(evento.get('uid')) if evento.get('fecha_original') else None
+                    fila = (usuario_id, evento['titulo'], evento['descripcion'], evento['fecha_inicio'], evento['color_id'],
+                            evento['es_importante'], evento['minutos_aviso'], evento.get('duracion_minutos', 0), evento['regla_recurrencia'],
+                            evento['excepciones_recurrencia'], serie_id, evento['fecha_original'] if serie_id else None)
+                    if evento['regla_recurrencia'] and evento.get('uid'):
+                        cursor.execute(sql, fila)
+                        series[evento['uid']] = cursor.lastrowid
+                        insertados += 1
+                    else:
+                        lote.append(fila)
+                    if len(lote) >= tam_lote:
+                        cursor.executemany(sql, lote) # El conector lo envía como un único INSERT de varias filas
+                        conn.commit()
+                        insertados += len(lote)
+                        lote = []
+                        yield insertados
+                if lote:
+                    cursor.executemany(sql, lote)
+                    insertados += len(lote)
+                conn.commit()
+                cursor.close()
+                yield insertados
+        except mysql.connector.Error as e:
+            logging.error(f"Error SQL importando eventos: {e}", exc_info=True)
+            raise e
+
+    def contar_por_usuario(self, usuario_id):
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT COUNT(*) FROM eventos WHERE usuario_id = %s", (usuario_id,))
+                total = cursor.fetchone()[0]
+                cursor.close()
+                return total
+        except Exception as e:
+            logging.error(f"Error contando eventos: {e}", exc_info=True)
+            return 0
+
+    def iterar_por_usuario(self, usuario_id, tam_lote=1000):
+        """
+        Generador de todos los eventos del usuario leídos con un cursor sin búfer: las
+        filas se van trayendo del servidor de 'tam_lote' en 'tam_lote' en lugar de
+        cargarlas todas en memoria. Las series salen antes que sus excepciones (id menor).
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor(dictionary=True, buffered=False)
+                cursor.execute("""
+                    SELECT e.id_evento, e.titulo, e.descripcion, e.fecha_inicio, c.codigo AS color_db_string, e.es_importante, e.minutos_aviso, e.duracion_minutos,
+                           e.regla_recurrencia, e.excepciones_recurrencia, e.serie_id, e.fecha_original
+                    FROM eventos e
+                    JOIN colores c ON e.color_id = c.id_color
+                    WHERE e.usuario_id = %s
+                    ORDER BY e.id_evento
+                """, (usuario_id,))
+                try:
+                    while True:
+                        filas = cursor.fetchmany(tam_lote)
+                        if not filas:
+                            break
+                        yield from filas
+                finally:
+                    try: cursor.close()
+                    except mysql.connector.Error: pass # Quedaban filas sin leer (se dejó de iterar)
+        except mysql.connector.Error as e:
+            logging.error(f"Error SQL exportando eventos: {e}", exc_info=True)
+            raise e
+
     def eliminar(self, id_evento):
         try:
             with self.get_connection() as conn:
                 if not conn: raise Exception("No hay conexión")
                 cursor = conn.cursor()
-                cursor.execute("DELETE FROM eventos WHERE id_evento = %s", (id_evento,))
+                # Si es una serie recurrente, se van también sus ocurrencias sobrescritas
+                cursor.execute("DELETE FROM eventos WHERE id_evento = %s OR serie_id = %s", (id_evento, id_evento))
                 conn.commit()
                 cursor.close()
         except Exception as e:
             logging.error(f"Error eliminando evento: {e}", exc_info=True)
             raise e
 
-    def actualizar_fecha_evento_con_ripple(self, id_evento, nueva_fecha, lista_eventos_posteriores, indice_inicio):
+    def buscar(self, usuario_id, texto, limite=50):
+        """
+        Búsqueda en el servidor con el índice FULLTEXT (titulo, descripcion), en el
+        calendario propio y en los compartidos con el usuario. Cada palabra es obligatoria y se busca como prefijo (modo BOOLEAN).
+        """
+        palabras = [p for p in re.findall(r"\w+", texto, re.UNICODE)]
+        if not palabras:
+            return []
+        consulta = " ".join(f"+{p}*" for p in palabras)
+        try:
+            with self.get_connection() as conn:
+                if not conn: return None
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute(f"""
+                    SELECT e.id_evento, e.titulo, e.descripcion, e.fecha_inicio, c.codigo AS color_db_string, e.archivo_adjunto, e.es_importante, e.minutos_aviso, e.duracion_minutos,
+                           e.regla_recurrencia, e.excepciones_recurrencia, e.serie_id, e.fecha_original, e.version,
+                           v.propietario_id, u.nombre AS propietario_nombre, v.permiso, v.color_calendario
+                    FROM {SQL_CALENDARIOS_VISIBLES}
+                    JOIN eventos e ON e.usuario_id = v.propietario_id
+                    JOIN colores c ON e.color_id = c.id_color
+                    JOIN usuarios u ON u.id_usuario = v.propietario_id
+                    WHERE MATCH(e.titulo, e.descripcion) AGAINST (%s IN BOOLEAN MODE)
+                    ORDER BY e.fecha_inicio ASC, e.id_evento ASC
+                    LIMIT %s
+                """, (usuario_id, usuario_id, consulta, limite))
+                eventos = cursor.fetchall()
+                cursor.close()
+                return eventos
+        except mysql.connector.Error as e:
+            logging.error(f"Error SQL buscando eventos: {e}", exc_info=True)
+            raise e
+
+    # =================== Feed de cambios ===================
+    def obtener_version(self, usuario_id):
+        """
+        Sello de versión de lo que ve el usuario (sube con cada cambio): la suma de los
+        sellos de su calendario y de los compartidos con él.
+        """
+        try:
+            with self.get_connection() as conn:
+                if not conn: return None
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT CAST(SUM(version_cambios) AS SIGNED) FROM usuarios
+                    WHERE id_usuario = %s OR id_usuario IN (SELECT propietario_id FROM calendarios_compartidos WHERE usuario_id = %s)
+                """, (usuario_id, usuario_id))
+                fila = cursor.fetchone()
+                cursor.close()
+                return fila[0] if fila else None
+        except Exception as e:
+            logging.error(f"Error obteniendo versión de cambios: {e}", exc_info=True)
+            return None
+
+    def obtener_versiones(self, usuarios_ids):
+        """Versiones (como obtener_version) de varios usuarios en una sola consulta (lo usa el servidor de notificaciones)."""
+        if not usuarios_ids:
+            return {}
+        try:
+            with self.get_connection() as conn:
+                if not conn: return {}
+                cursor = conn.cursor()
+                marcadores = ", ".join(["%s"] * len(usuarios_ids))
+                cursor.execute(f"""
+                    SELECT v.usuario_id, CAST(SUM(u.version_cambios) AS SIGNED)
+                    FROM (SELECT id_usuario AS usuario_id, id_usuario AS propietario_id FROM usuarios WHERE id_usuario IN ({marcadores})
+                          UNION ALL
+                          SELECT usuario_id, propietario_id FROM calendarios_compartidos WHERE usuario_id IN ({marcadores})) v
+                    JOIN usuarios u ON u.id_usuario = v.propietario_id
+                    GROUP BY v.usuario_id
+                """, list(usuarios_ids) * 2)
+                versiones = dict(cursor.fetchall())
+                cursor.close()
+                return versiones
+        except Exception as e:
+            logging.error(f"Error obteniendo versiones de cambios: {e}", exc_info=True)
+            return {}
+
+    def obtener_versiones_eventos(self, ids_eventos):
+        """Versión actual de cada evento; los que ya no existen no aparecen en el resultado."""
+        if not ids_eventos:
+            return {}
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                marcadores = ", ".join(["%s"] * len(ids_eventos))
+                cursor.execute(f"SELECT id_evento, version FROM eventos WHERE id_evento IN ({marcadores})", list(ids_eventos))
+                versiones = dict(cursor.fetchall())
+                cursor.close()
+                return versiones
+        except Exception as e:
+            logging.error(f"Error obteniendo versiones de eventos: {e}", exc_info=True)
+            raise e
+
+    def obtener_cambios(self, usuario_id, desde_version):
+        """
+        Filas modificadas y ids borrados desde 'desde_version'.
+        Devuelve (filas, ids_borrados, version): la versión se lee antes que las filas,
+        así que nada que ocurra durante la lectura se pierde (como mucho se lee dos veces).
+        """
+        try:
+            with self.get_connection() as conn:
+                if not conn: raise Exception("No hay conexión")
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT version_cambios FROM usuarios WHERE id_usuario = %s", (usuario_id,))
+                fila = cursor.fetchone()
+                version = fila['version_cambios'] if fila else desde_version
+                cursor.execute("""
+                    SELECT e.id_evento, e.titulo, e.descripcion, e.fecha_inicio, c.codigo AS color_db_string, e.archivo_adjunto, e.es_importante, e.minutos_aviso, e.duracion_minutos,
+                           e.regla_recurrencia, e.excepciones_recurrencia, e.serie_id, e.fecha_original, e.version
+                    FROM eventos e
+                    JOIN colores c ON e.color_id = c.id_color
+                    WHERE e.usuario_id = %s AND e.version > %s
+                """, (usuario_id, desde_version))
+                filas = cursor.fetchall()
+                cursor.execute("SELECT id_evento FROM eventos_borrados WHERE usuario_id = %s AND version > %s", (usuario_id, desde_version))
+                borrados = [f['id_evento'] for f in cursor.fetchall()]
+                cursor.close()
+                version = max([version] + [f['version'] for f in filas])
+                return filas, borrados, version
+        except Exception as e:
+            logging.error(f"Error obteniendo cambios: {e}", exc_info=True)
+            raise e
+
+    def obtener_cambios_visibles(self, usuario_id, desde):
+        """
+        Como obtener_cambios, para el calendario propio y los compartidos. 'desde' es
+        {propietario_id: versión}, porque cada calendario lleva su propio sello; los que
+        no aparecen (recién compartidos) se traen enteros. Devuelve (filas, ids_borrados,
+        calendarios), con los calendarios como CalendariosDAO.obtener_visibles y su
+        versión leída antes que las filas.
+        """
+        desde = {int(k): v for k, v in desde.items()} # Por JSON las claves llegan como texto
+        try:
+            with self.get_connection() as conn:
+                if not conn: raise Exception("No hay conexión")
+                cursor = conn.cursor(dictionary=True)
+                calendarios = CalendariosDAO._leer_visibles(cursor, usuario_id)
+                if not calendarios:
+                    cursor.close()
+                    return [], [], []
+                condiciones = " OR ".join(["(e.usuario_id = %s AND e.version > %s)"] * len(calendarios))
+                parametros = [v for c in calendarios for v in (c['propietario_id'], desde.get(c['propietario_id'], -1))]
+                cursor.execute(f"""
+                    SELECT e.id_evento, e.titulo, e.descripcion, e.fecha_inicio, c.codigo AS color_db_string, e.archivo_adjunto, e.es_importante, e.minutos_aviso, e.duracion_minutos,
+                           e.regla_recurrencia, e.excepciones_recurrencia, e.serie_id, e.fecha_original, e.version,
+                           v.propietario_id, u.nombre AS propietario_nombre, v.permiso, v.color_calendario
+                    FROM {SQL_CALENDARIOS_VISIBLES}
+                    JOIN eventos e ON e.usuario_id = v.propietario_id
+                    JOIN colores c ON e.color_id = c.id_color
+                    JOIN usuarios u ON u.id_usuario = v.propietario_id
+                    WHERE {condiciones}
+                """, [usuario_id, usuario_id] + parametros)
+                filas = cursor.fetchall()
+                cursor.execute(f"SELECT id_evento FROM eventos_borrados e WHERE {condiciones}", parametros)
+                borrados = [f['id_evento'] for f in cursor.fetchall()]
+                cursor.close()
+                por_propietario = {c['propietario_id']: c for c in calendarios}
+                for f in filas:
+                    c = por_propietario[f['propietario_id']]
+                    c['version'] = max(c['version'], f['version'])
+                return filas, borrados, calendarios
+        except Exception as e:
+            logging.error(f"Error obteniendo cambios de calendarios: {e}", exc_info=True)
+            raise e
+
+    # =================== Adjuntos ===================
+    def contar_referencias_adjunto(self, ruta, usuario_id=None):
+        """
+        Número de eventos que apuntan a un archivo adjunto: de cualquier usuario o, con
+        'usuario_id', solo de los calendarios que ese usuario puede ver (lo que expone la API).
+        """
+        try:
+            with self.get_connection() as conn:
+                if not conn: raise Exception("No hay conexión")
+                cursor = conn.cursor()
+                if usuario_id is None:
+                    cursor.execute("SELECT COUNT(*) FROM eventos WHERE archivo_adjunto = %s", (ruta,))
+                else:
+                    cursor.execute(f"""
+                        SELECT COUNT(*) FROM {SQL_CALENDARIOS_VISIBLES}
+                        JOIN eventos e ON e.usuario_id = v.propietario_id
+                        WHERE e.archivo_adjunto = %s
+                    """, (usuario_id, usuario_id, ruta))
+                total = cursor.fetchone()[0]
+                cursor.close()
+                return total
+        except Exception as e:
+            logging.error(f"Error contando referencias de adjunto: {e}", exc_info=True)
+            raise e
+
+    def obtener_rutas_adjuntos(self, usuario_id=None):
+        """
+        Rutas de adjuntos en uso (de todos o, con 'usuario_id', de sus calendarios visibles).
+        Devuelve None si no hay BD (no se debe limpiar nada).
+        """
+        try:
+            with self.get_connection() as conn:
+                if not conn: return None
+                cursor = conn.cursor()
+                if usuario_id is None:
+                    cursor.execute("SELECT DISTINCT archivo_adjunto FROM eventos WHERE archivo_adjunto IS NOT NULL")
+                else:
+                    cursor.execute(f"""
+                        SELECT DISTINCT e.archivo_adjunto FROM {SQL_CALENDARIOS_VISIBLES}
+                        JOIN eventos e ON e.usuario_id = v.propietario_id
+                        WHERE e.archivo_adjunto IS NOT NULL
+                    """, (usuario_id, usuario_id))
+                rutas = [fila[0] for fila in cursor.fetchall()]
+                cursor.close()
+                return rutas
+        except Exception as e:
+            logging.error(f"Error obteniendo rutas de adjuntos: {e}", exc_info=True)
+            return None
+
+    # =================== Series recurrentes ===================
+    def excluir_ocurrencia(self, serie_id, fecha_original):
+        """Añade una fecha a las excepciones de la serie (borrar "solo esta ocurrencia")."""
+        try:
+            with self.get_connection() as conn:
+                if not conn: raise Exception("No hay conexión")
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE eventos
+                    SET excepciones_recurrencia = CONCAT_WS(',', NULLIF(excepciones_recurrencia, ''), %s)
+                    WHERE id_evento = %s
+                """, (fecha_original.strftime("%Y-%m-%d %H:%M"), serie_id))
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            logging.error(f"Error excluyendo ocurrencia: {e}", exc_info=True)
+            raise e
+
+    def desprender_ocurrencia(self, serie_id, fecha_original, nueva_fecha):
+        """
+        Mueve "solo esta ocurrencia": copia la serie en una fila propia enlazada por
+        serie_id/fecha_original, que sustituye a la ocurrencia al expandir. Devuelve el id nuevo.
+        """
+        try:
+            with self.get_connection() as conn:
+                if not conn: raise Exception("No hay conexión")
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO eventos (usuario_id, titulo, descripcion, fecha_inicio, color_id, archivo_adjunto, es_importante, minutos_aviso, duracion_minutos, serie_id, fecha_original)
+                    SELECT usuario_id, titulo, descripcion, %s, color_id, archivo_adjunto, es_importante, minutos_aviso, duracion_minutos, id_evento, %s
+                    FROM eventos WHERE id_evento = %s
+                """, (nueva_fecha, fecha_original, serie_id))
+                nuevo_id = cursor.lastrowid
+                conn.commit()
+                cursor.close()
+                return nuevo_id
+        except Exception as e:
+            logging.error(f"Error desprendiendo ocurrencia: {e}", exc_info=True)
+            raise e
+
+    @staticmethod
+    def _desplazar_ocurrencias(cursor, desplazamientos):
+        """
+        Mueve con cada serie lo que apunta a ocurrencias concretas suyas: las excepciones y
+        la fecha_original de las ocurrencias sobrescritas. 'desplazamientos' es
+        [(serie_id, excepciones_recurrencia, delta), ...]; va en la transacción del llamante.
+        """
+        for serie_id, excepciones, delta in desplazamientos:
+            if not delta:
+                continue
+            if excepciones:
+                cursor.execute("UPDATE eventos SET excepciones_recurrencia = %s WHERE id_evento = %s",
+                               (desplazar_excepciones(excepciones, delta), serie_id))
+            cursor.execute("UPDATE eventos SET fecha_original = fecha_original + INTERVAL %s SECOND WHERE serie_id = %s",
+                           (int(delta.total_seconds()), serie_id))
+
+    def mover_serie(self, serie_id, nuevo_inicio):
+        """
+        Mueve "toda la serie": cambia la fecha de inicio de la regla y desplaza lo mismo sus
+        excepciones y sus ocurrencias sobrescritas, todo en una transacción.
+        """
+        try:
+            with self.get_connection() as conn:
+                if not conn: raise Exception("No hay conexión")
+                cursor = conn.cursor()
+                conn.start_transaction()
+                cursor.execute("SELECT fecha_inicio, excepciones_recurrencia FROM eventos WHERE id_evento = %s FOR UPDATE", (serie_id,))
+                fila = cursor.fetchone()
+                if fila:
+                    cursor.execute("UPDATE eventos SET fecha_inicio = %s WHERE id_evento = %s", (nuevo_inicio, serie_id))
+                    self._desplazar_ocurrencias(cursor, [(serie_id, fila[1], nuevo_inicio - fila[0])])
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            logging.error(f"Error moviendo serie: {e}", exc_info=True)
+            raise e
+
+    def actualizar_en_bloque(self, ids, accion, valor=None, excluir=()):
         """
-        Actualiza la fecha de un evento y aplica un "efecto dominó" a los eventos
-        siguientes para evitar colisiones, todo dentro de una transacción.
+        Aplica la misma acción a varios eventos con una sola sentencia por tabla, en una
+        única transacción. Acciones y su 'valor':
+          'desplazar' (días), 'mover_a' (fecha; cada evento conserva su hora),
+          'color' (id_color), 'importante' (bool), 'aviso' (minutos), 'eliminar'.
+        'excluir' son ocurrencias sueltas [(serie_id, fecha_original), ...] que se quitan de
+        sus series (solo con 'eliminar'). Al mover una serie se desplazan también sus
+        excepciones y ocurrencias sobrescritas. Devuelve el número de filas afectadas.
+        """
+        asignaciones = {
+            'desplazar': "fecha_inicio = fecha_inicio + INTERVAL %s DAY",
+            'mover_a': "fecha_inicio = TIMESTAMP(%s, TIME(fecha_inicio))",
+            'color': "color_id = %s",
+            'importante': "es_importante = %s",
+            'aviso': "minutos_aviso = %s",
+        }
+        if accion != 'eliminar' and accion not in asignaciones:
+            raise ValueError(f"Acción en bloque desconocida: {accion}")
+        if accion == 'mover_a' and isinstance(valor, datetime):
+            valor = valor.date()
+        try:
+            with self.get_connection() as conn:
+                if not conn: raise Exception("No hay conexión")
+                cursor = conn.cursor()
+                conn.start_transaction()
+                afectadas = 0
+                if ids:
+                    marcadores = ", ".join(["%s"] * len(ids))
+                    if accion == 'eliminar':
+                        # Las series se llevan sus ocurrencias sobrescritas, igual que en eliminar()
+                        cursor.execute(f"DELETE FROM eventos WHERE id_evento IN ({marcadores}) OR serie_id IN ({marcadores})",
+                                       list(ids) + list(ids))
+                        afectadas += cursor.rowcount
+                    else:
+                        series = []
+                        if accion in ('desplazar', 'mover_a'):
+                            # Las series movidas arrastran sus excepciones y ocurrencias sobrescritas (como en mover_serie)
+                            cursor.execute(f"""
+                                SELECT id_evento, fecha_inicio, excepciones_recurrencia FROM eventos
+                                WHERE id_evento IN ({marcadores}) AND regla_recurrencia IS NOT NULL FOR UPDATE
+                            """, list(ids))
+                            series = cursor.fetchall()
+                        cursor.execute(f"UPDATE eventos SET {asignaciones[accion]} WHERE id_evento IN ({marcadores})",
+                                       [valor] + list(ids))
+                        afectadas += cursor.rowcount
+                        self._desplazar_ocurrencias(cursor, [
+                            (serie_id, excepciones,
+                             timedelta(days=valor) if accion == 'desplazar' else datetime.combine(valor, inicio.time()) - inicio)
+                            for serie_id, inicio, excepciones in series
+                        ])
+                if excluir and accion == 'eliminar':
+                    # Todas las fechas de cada serie en un solo UPDATE con CASE
+                    por_serie = {}
+                    for serie_id, fecha_original in excluir:
+                        por_serie.setdefault(serie_id, []).append(fecha_original.strftime("%Y-%m-%d %H:%M"))
+                    casos = " ".join(["WHEN %s THEN %s"] * len(por_serie))
+                    marcadores = ", ".join(["%s"] * len(por_serie))
+                    parametros = [v for serie_id, fechas in por_serie.items() for v in (serie_id, ",".join(fechas))]
+                    cursor.execute(f"""
+                        UPDATE eventos
+                        SET excepciones_recurrencia = CONCAT_WS(',', NULLIF(excepciones_recurrencia, ''), CASE id_evento {casos} END)
+                        WHERE id_evento IN ({marcadores})
+                    """, parametros + list(por_serie))
+                    afectadas += cursor.rowcount
+                conn.commit()
+                cursor.close()
+                return afectadas
+        except Exception as e:
+            logging.error(f"Error en actualización en bloque ({accion}): {e}", exc_info=True)
+            raise e
+
+    @staticmethod
+    def calcular_ripple(posteriores, nueva_fecha, duracion=0, separacion=timedelta(minutes=1)):
+        """
+        Calcula en una sola pasada el conjunto completo de desplazamientos del "efecto dominó".
+
+        'posteriores' es la lista ordenada de (id_evento, fecha_inicio, duracion_minutos) con
+        fecha >= nueva_fecha, y 'duracion' la del evento movido. Cada evento que empieza antes
+        de que termine el anterior se empuja a ese final; la cascada termina en el primer hueco.
+        Los eventos puntuales (duración 0) ocupan 'separacion'. Devuelve [(id_evento, fecha_nueva), ...].
+        """
+        cambios = []
+        fin_actual = nueva_fecha + max(timedelta(minutes=duracion or 0), separacion)
+        for id_ev, fecha, duracion_ev in posteriores:
+            if fecha >= fin_actual:
+                break # No hay más colisiones, el efecto dominó termina
+            cambios.append((id_ev, fin_actual))
+            fin_actual += max(timedelta(minutes=duracion_ev or 0), separacion)
+        return cambios
+
+    def actualizar_fecha_evento_con_ripple(self, id_evento, nueva_fecha):
+        """
+        Mueve un evento y aplica un "efecto dominó" a los eventos siguientes para evitar
+        colisiones. Los eventos del día se leen y bloquean (FOR UPDATE) dentro de la misma
+        transacción, así que la cascada se calcula sobre el estado real de la BD y no sobre
+        la copia local: dos dispositivos moviendo a la vez no se pisan. Todos los cambios
+        se aplican con un único UPDATE multi-fila.
         """
         try:
             with self.get_connection() as conn:
@@ -302,22 +1230,38 @@ class EventosDAO(BaseDAO):
                     raise Exception("No hay conexión con la base de datos para la actualización.")
                 
                 cursor = conn.cursor()
-                # 1. Actualizar el evento principal que se movió
-                cursor.execute("UPDATE eventos SET fecha_inicio = %s WHERE id_evento = %s", (nueva_fecha, id_evento))
-                
-                # 2. Efecto Dominó (Ripple): Verificar colisiones y empujar eventos siguientes
-                tiempo_actual = nueva_fecha
-                for i in range(indice_inicio, len(lista_eventos_posteriores)):
-                    ev = lista_eventos_posteriores[i]
-                    
-                    if ev['fecha_inicio'] <= tiempo_actual:
-                        tiempo_actual += timedelta(minutes=1) # Empujar 1 minuto
-                        cursor.execute("UPDATE eventos SET fecha_inicio = %s WHERE id_evento = %s", (tiempo_actual, ev['id_evento']))
-                    else:
-                        break # No hay más colisiones, el efecto dominó termina
+                conn.start_transaction()
+
+                # 1. Revalidar: el evento debe seguir existiendo (otro dispositivo pudo borrarlo)
+                cursor.execute("SELECT usuario_id, duracion_minutos FROM eventos WHERE id_evento = %s FOR UPDATE", (id_evento,))
+                fila = cursor.fetchone()
+                if not fila:
+                    conn.rollback()
+                    raise Exception("El evento ya no existe (puede que se haya borrado desde otro dispositivo).")
+
+                # 2. Índice ordenado de lo que hay a partir de la nueva hora (hasta el final del día siguiente)
+                fin_rango = datetime.combine(nueva_fecha.date() + timedelta(days=2), datetime.min.time())
+                cursor.execute("""
+                    SELECT id_evento, fecha_inicio, duracion_minutos FROM eventos
+                    WHERE usuario_id = %s AND fecha_inicio >= %s AND fecha_inicio < %s
+                      AND id_evento <> %s AND regla_recurrencia IS NULL
+                    ORDER BY fecha_inicio ASC, titulo ASC, id_evento ASC
+                    FOR UPDATE
+                """, (fila[0], nueva_fecha, fin_rango, id_evento))
+                cambios = [(id_evento, nueva_fecha)] + self.calcular_ripple(cursor.fetchall(), nueva_fecha, fila[1])
+
+                # 3. Un solo UPDATE para el evento movido y toda la cascada
+                casos = " ".join(["WHEN %s THEN %s"] * len(cambios))
+                marcadores = ", ".join(["%s"] * len(cambios))
+                parametros = [v for cambio in cambios for v in cambio] + [id_ev for id_ev, _ in cambios]
+                cursor.execute(
+                    f"UPDATE eventos SET fecha_inicio = CASE id_evento {casos} END WHERE id_evento IN ({marcadores})",
+                    parametros
+                )
 
                 conn.commit()
                 cursor.close()
+                return cambios
         except Exception as e:
             logging.error(f"Error en ripple update: {e}", exc_info=True)
             raise e
@@ -331,7 +1275,122 @@ class EventosDAO(BaseDAO):
                     except: pass
                     try: cursor.execute("ALTER TABLE eventos ADD COLUMN minutos_aviso INT DEFAULT 0")
                     except: pass
+                    # Duración (0 = evento puntual, como todos los anteriores a esta columna)
+                    try: cursor.execute("ALTER TABLE eventos ADD COLUMN duracion_minutos INT NOT NULL DEFAULT 0")
+                    except: pass
+                    # Recurrencia: la regla y sus excepciones viven en la fila de la serie;
+                    # las ocurrencias sobrescritas son filas con serie_id + fecha_original.
+                    try: cursor.execute("ALTER TABLE eventos ADD COLUMN regla_recurrencia VARCHAR(255) DEFAULT NULL")
+                    except: pass
+                    try: cursor.execute("ALTER TABLE eventos ADD COLUMN excepciones_recurrencia TEXT DEFAULT NULL")
+                    except: pass
+                    try: cursor.execute("ALTER TABLE eventos ADD COLUMN serie_id INT DEFAULT NULL")
+                    except: pass
+                    try: cursor.execute("ALTER TABLE eventos ADD COLUMN fecha_original DATETIME DEFAULT NULL")
+                    except: pass
+                    try: cursor.execute("CREATE INDEX idx_eventos_serie ON eventos (serie_id)")
+                    except: pass
+                    # Próximos importantes / con aviso: igualdad y después fecha, para leerlos ya ordenados.
+                    # minutos_aviso > 0 es un rango, así que el índice va sobre una columna generada.
+                    try: cursor.execute("ALTER TABLE eventos ADD COLUMN con_aviso BOOLEAN AS (minutos_aviso > 0) STORED")
+                    except: pass
+                    try: cursor.execute("CREATE INDEX idx_eventos_usuario_importante ON eventos (usuario_id, es_importante, fecha_inicio)")
+                    except: pass
+                    try: cursor.execute("CREATE INDEX idx_eventos_usuario_aviso ON eventos (usuario_id, con_aviso, fecha_inicio)")
+                    except: pass
+                    # Rango por usuario y fecha (ripple, cargas por rango)
+                    try: cursor.execute("CREATE INDEX idx_eventos_usuario_fecha ON eventos (usuario_id, fecha_inicio)")
+                    except: pass
+                    # Conteo de referencias de adjuntos
+                    try: cursor.execute("CREATE INDEX idx_eventos_adjunto ON eventos (archivo_adjunto)")
+                    except: pass
+                    # Búsqueda de texto en el servidor
+                    try: cursor.execute("CREATE FULLTEXT INDEX ft_eventos_texto ON eventos (titulo, descripcion)")
+                    except: pass
+                    # Feed de cambios: sello de versión por usuario, versión de cada fila y
+                    # lápidas de borrado. Los triggers lo mantienen para cualquier escritor
+                    # (esta app, la importación de Google u otros dispositivos).
+                    try: cursor.execute("ALTER TABLE usuarios ADD COLUMN version_cambios BIGINT NOT NULL DEFAULT 0")
+                    except: pass
+                    # Calendario de festivos de cada usuario (clave de logic.festivos.REGIONES)
+                    try: cursor.execute("ALTER TABLE usuarios ADD COLUMN region_festivos VARCHAR(20) DEFAULT NULL")
+                    except: pass
+                    # Ubicación del pronóstico del tiempo de cada usuario (NULL = la de por defecto)
+                    for columna in ("clima_nombre VARCHAR(100)", "clima_latitud DOUBLE", "clima_longitud DOUBLE"):
+                        try: cursor.execute(f"ALTER TABLE usuarios ADD COLUMN {columna} DEFAULT NULL")
+                        except: pass
+                    try: cursor.execute("ALTER TABLE eventos ADD COLUMN version BIGINT NOT NULL DEFAULT 0")
+                    except: pass
+                    try: cursor.execute("CREATE INDEX idx_eventos_usuario_version ON eventos (usuario_id, version)")
+                    except: pass
+                    try: cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS eventos_borrados (
+                            id_evento INT PRIMARY KEY,
+                            usuario_id INT NOT NULL,
+                            version BIGINT NOT NULL,
+                            INDEX idx_borrados_usuario_version (usuario_id, version)
+                        ) ENGINE=InnoDB
+                    """)
+                    except: pass
+                    for operacion in ("INSERT", "UPDATE"):
+                        try: cursor.execute(f"""
+                            CREATE TRIGGER trg_eventos_version_{operacion.lower()} BEFORE {operacion} ON eventos FOR EACH ROW
+                            BEGIN
+                                UPDATE usuarios SET version_cambios = version_cambios + 1 WHERE id_usuario = NEW.usuario_id;
+                                SET NEW.version = (SELECT version_cambios FROM usuarios WHERE id_usuario = NEW.usuario_id);
+                            END
+                        """)
+                        except: pass
+                    try: cursor.execute("""
+                        CREATE TRIGGER trg_eventos_version_delete AFTER DELETE ON eventos FOR EACH ROW
+                        BEGIN
+                            UPDATE usuarios SET version_cambios = version_cambios + 1 WHERE id_usuario = OLD.usuario_id;
+                            INSERT INTO eventos_borrados (id_evento, usuario_id, version)
+                            SELECT OLD.id_evento, OLD.usuario_id, version_cambios FROM usuarios WHERE id_usuario = OLD.usuario_id
+                            ON DUPLICATE KEY UPDATE version = VALUES(version);
+                        END
+                    """)
+                    except: pass
+                    # Sin triggers (p. ej. sin privilegio TRIGGER o con binlog sin
+                    # log_bin_trust_function_creators) el feed no ve ningún cambio
+                    try:
+                        cursor.execute("""
+                            SELECT TRIGGER_NAME FROM information_schema.TRIGGERS
+                            WHERE TRIGGER_SCHEMA = DATABASE() AND EVENT_OBJECT_TABLE = 'eventos'
+                        """)
+                        existentes = {fila[0] for fila in cursor.fetchall()}
+                        faltan = sorted({f"trg_eventos_version_{op}" for op in ("insert", "update", "delete")} - existentes)
+                        if faltan:
+                            logging.error(f"Faltan los triggers del feed de cambios ({', '.join(faltan)}): "
+                                          "los cambios no llegarán a las demás sesiones hasta que se creen.")
+                    except Exception as e:
+                        logging.error(f"No se pudieron comprobar los triggers del feed de cambios: {e}")
+                    # Calendarios compartidos: una fila por (quien ve, propietario). La clave
+                    # primaria empieza por usuario_id, que es por donde se resuelve la visibilidad.
+                    try: cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS calendarios_compartidos (
+                            propietario_id INT NOT NULL,
+                            usuario_id INT NOT NULL,
+                            permiso ENUM('lectura', 'escritura') NOT NULL DEFAULT 'lectura',
+                            color VARCHAR(7) NOT NULL DEFAULT '#3498db',
+                            PRIMARY KEY (usuario_id, propietario_id),
+                            INDEX idx_compartidos_propietario (propietario_id),
+                            FOREIGN KEY (propietario_id) REFERENCES usuarios(id_usuario) ON DELETE CASCADE,
+                            FOREIGN KEY (usuario_id) REFERENCES usuarios(id_usuario) ON DELETE CASCADE
+                        ) ENGINE=InnoDB
+                    """)
+                    except: pass
                     conn.commit()
                     cursor.close()
         except Exception as e:
-            logging.warning(f"No se pudieron verificar/añadir columnas: {e}")
\ No newline at end of file
+            logging.warning(f"No se pudieron verificar/añadir columnas: {e}")
+
+
+# Las clases de acceso directo a MySQL (las usa siempre el servidor de la API)
+DAOS_MYSQL = {"usuarios": UsuariosDAO, "colores": ColoresDAO, "eventos": EventosDAO, "calendarios": CalendariosDAO}
+
+# Modo cliente: con API_URL definida, la aplicación habla con logic.servidor_api por HTTP
+# en lugar de conectarse a MySQL. Los DAO remotos tienen los mismos métodos.
+MODO_CLIENTE = bool(os.getenv("API_URL"))
+if MODO_CLIENTE:
+    from database.remoto import UsuariosDAO, ColoresDAO, EventosDAO, CalendariosDAO
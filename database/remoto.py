@@ -0,0 +1,245 @@
+"""
+DAO remotos: los mismos métodos que los de database.dao, pero hablando por HTTP con
+logic.servidor_api en lugar de con MySQL. Se activan al definir API_URL (ver el
+final de database/dao.py), así que el resto de la aplicación no cambia.
+
+Las lecturas grandes (eventos, cambios, colores) van por GET con ETag: si no hay
+cambios el servidor responde 304 y se reutiliza la copia local sin volver a
+descargarla. El resto de métodos se invocan por POST /rpc/<dao>.<método>.
+"""
+import gzip
+import http.client
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlencode, urlparse
+
+from database.dao import DAOS_MYSQL, SinConexionError
+from utils.serializacion import a_json, de_json
+
+TIEMPO_ESPERA = 15 # segundos
+
+
+class ClienteAPI:
+    """Conexión HTTP persistente (una por hilo) con el servidor de la API y el token de la sesión."""
+    _instancia = None
+
+    def __init__(self, url=None):
+        self.url = urlparse((url or os.getenv("API_URL") or "").rstrip("/"))
+        self.token = None
+        self._hilo = threading.local()
+        self._etags = {} # ruta -> (etag, datos)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instancia(cls):
+        if cls._instancia is None:
+            cls._instancia = cls()
+        return cls._instancia
+
+    def _conexion(self):
+        conn = getattr(self._hilo, "conn", None)
+        if conn is None:
+            clase = http.client.HTTPSConnection if self.url.scheme == "https" else http.client.HTTPConnection
+            conn = self._hilo.conn = clase(self.url.hostname, self.url.port, timeout=TIEMPO_ESPERA)
+        return conn
+
+    def _cerrar(self):
+        conn = getattr(self._hilo, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._hilo.conn = None
+
+    def peticion(self, metodo, ruta, cuerpo=None):
+        cabeceras = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+        if self.token:
+            cabeceras["Authorization"] = f"Bearer {self.token}"
+        cacheable = metodo == "GET"
+        if cacheable:
+            with self._lock:
+                guardado = self._etags.get(ruta)
+            if guardado:
+                cabeceras["If-None-Match"] = guardado[0]
+        datos = a_json(cuerpo).encode("utf-8") if cuerpo is not None else None
+
+        # Un reintento: la conexión persistente puede haberla cerrado el servidor mientras estaba ociosa
+        for intento in range(2):
+            try:
+                conn = self._conexion()
+                conn.request(metodo, self.url.path + ruta, body=datos, headers=cabeceras)
+                respuesta = conn.getresponse()
+                contenido = respuesta.read()
+                if respuesta.getheader("Content-Encoding") == "gzip":
+                    contenido = gzip.decompress(contenido)
+                break
+            except (http.client.HTTPException, OSError) as e:
+                self._cerrar()
+                if intento:
+                    raise SinConexionError(f"No se pudo contactar con el servidor de la API: {e}")
+
+        if respuesta.status == 304 and guardado:
+            return guardado[1]
+        resultado = de_json(contenido.decode("utf-8")) if contenido else {}
+        if respuesta.status >= 400:
+            mensaje = resultado.get("error", f"HTTP {respuesta.status}") if isinstance(resultado, dict) else contenido
+            if respuesta.status in (429, 503):
+                raise SinConexionError(mensaje) # Transitorio: el llamador lo trata como falta de conexión
+            raise Exception(mensaje)
+        etag = respuesta.getheader("ETag")
+        if cacheable and etag:
+            with self._lock:
+                self._etags[ruta] = (etag, resultado)
+        return resultado
+
+    def disponible(self):
+        try:
+            return bool(self.peticion("GET", "/salud").get("ok"))
+        except Exception as e:
+            logging.error(f"Servidor de la API no disponible: {e}")
+            return False
+
+
+class _DAORemoto:
+    prefijo = None
+
+    @property
+    def api(self):
+        return ClienteAPI.instancia()
+
+    # Cada llamada ya es una transacción en el servidor: los lotes no agrupan nada en modo cliente
+    @contextmanager
+    def lote(self):
+        yield
+
+    @contextmanager
+    def punto_guardado(self, nombre="operacion"):
+        yield
+
+    def _rpc(self, metodo, *args, **kwargs):
+        try:
+            return self.api.peticion("POST", f"/rpc/{self.prefijo}.{metodo}", {"args": args, "kwargs": kwargs})["resultado"]
+        except Exception as e:
+            logging.error(f"Error en {self.prefijo}.{metodo} (API): {e}")
+            raise e
+
+    def _get(self, ruta, **parametros):
+        if parametros:
+            ruta += "?" + urlencode(parametros)
+        return self.api.peticion("GET", ruta)["resultado"]
+
+    def __getattr__(self, nombre):
+        if nombre.startswith("_"):
+            raise AttributeError(nombre)
+        return lambda *args, **kwargs: self._rpc(nombre, *args, **kwargs)
+
+
+class UsuariosDAO(_DAORemoto):
+    prefijo = "usuarios"
+
+    def _iniciar_sesion(self, ruta, datos):
+        try:
+            respuesta = self.api.peticion("POST", ruta, datos)
+        except SinConexionError:
+            raise
+        except Exception as e:
+            logging.warning(f"Inicio de sesión rechazado: {e}")
+            return None
+        self.api.token = respuesta["token"]
+        return respuesta["usuario"]
+
+    def autenticar(self, email, password):
+        return self._iniciar_sesion("/login", {"email": email, "password": password})
+
+    def login_invitado(self):
+        return self._iniciar_sesion("/login/invitado", {})
+
+    def registrar(self, nombre, email, password):
+        respuesta = self.api.peticion("POST", "/registro", {"nombre": nombre, "email": email, "password": password})
+        return respuesta["exito"], respuesta["mensaje"]
+
+
+class ColoresDAO(_DAORemoto):
+    prefijo = "colores"
+
+    def obtener_catalogo(self):
+        return self._get("/colores")
+
+    def sincronizar(self, mapa_colores):
+        pass # Lo hace el servidor al arrancar
+
+
+class EventosDAO(_DAORemoto):
+    prefijo = "eventos"
+    calcular_ripple = staticmethod(DAOS_MYSQL["eventos"].calcular_ripple)
+
+    def obtener_por_usuario(self, usuario_id):
+        return self._get("/eventos")
+
+    def obtener_resumen_por_usuario(self, usuario_id):
+        return self._get("/eventos", resumen=1)
+
+    def obtener_detalles(self, ids_eventos):
+        if not ids_eventos:
+            return {}
+        return {int(k): v for k, v in self._rpc("obtener_detalles", list(ids_eventos)).items()}
+
+    def obtener_descripciones(self, usuario_id):
+        return {int(k): v for k, v in self._rpc("obtener_descripciones", usuario_id).items()}
+
+    def obtener_rango(self, usuario_id, desde, hasta):
+        return self._get("/eventos", desde=desde.isoformat(), hasta=hasta.isoformat())
+
+    def obtener_version(self, usuario_id):
+        return self.api.peticion("GET", "/version")["version"]
+
+    def obtener_cambios(self, usuario_id, desde_version):
+        filas, borrados, version = self._get("/cambios", desde=desde_version)
+        return filas, borrados, version
+
+    def obtener_versiones_eventos(self, ids_eventos):
+        if not ids_eventos:
+            return {}
+        # JSON convierte las claves en texto
+        return {int(k): v for k, v in self._rpc("obtener_versiones_eventos", list(ids_eventos)).items()}
+
+    def iterar_por_usuario(self, usuario_id, tam_lote=1000):
+        eventos = sorted(self.obtener_por_usuario(usuario_id), key=lambda e: e["id_evento"])
+        yield from eventos
+
+    def importar(self, usuario_id, eventos, tam_lote=500, series=None):
+        """Envía los eventos en trozos de 'tam_lote'; como el DAO de MySQL, va cediendo el total insertado."""
+        series = {} if series is None else series
+        total = 0
+        trozo = []
+        for evento in eventos:
+            trozo.append(evento)
+            if len(trozo) >= tam_lote:
+                total += self._importar_trozo(trozo, series)
+                trozo = []
+                yield total
+        if trozo:
+            total += self._importar_trozo(trozo, series)
+            yield total
+
+    def _importar_trozo(self, trozo, series):
+        respuesta = self.api.peticion("POST", "/importar", {"eventos": trozo, "series": series})
+        series.update(respuesta["series"]) # Para enlazar ocurrencias de series que llegaron en otro trozo
+        return respuesta["insertados"]
+
+    def verificar_columnas(self):
+        pass # Lo hace el servidor al arrancar
+
+
+class CalendariosDAO(_DAORemoto):
+    prefijo = "calendarios"
+
+    def compartir(self, propietario_id, email, permiso='lectura'):
+        exito, mensaje = self._rpc("compartir", propietario_id, email, permiso)
+        return exito, mensaje
+
+    def propietarios_visibles(self, usuario_id):
+        return set(self._rpc("propietarios_visibles", usuario_id))
+
+    def propietarios_editables(self, usuario_id):
+        return set(self._rpc("propietarios_editables", usuario_id))
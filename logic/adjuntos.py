@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import time
+import uuid
+
+from database.dao import EventosDAO
+from logic.diario import textos_pendientes
+
+CARPETA_ADJUNTOS = "adjuntos"
+TAM_BLOQUE = 1024 * 1024  # 1 MiB por lectura: el progreso se actualiza con fluidez sin penalizar la copia
+PREFIJO_TEMPORAL = ".tmp_"
+EDAD_MINIMA_HUERFANO = 3600  # No se recogen archivos recientes: copia en curso o editor aún sin guardar
+
+# ioctl FICLONE de Linux (reflink en Btrfs/XFS): copia instantánea copy-on-write
+FICLONE = 0x40049409
+
+
+class CopiaCancelada(Exception):
+    """El usuario canceló la importación del adjunto."""
+
+
+def nombre_fichero(ruta):
+    """Nombre del fichero de una ruta guardada en la BD, venga de Windows o de Unix."""
+    return ruta.replace("\\", "/").rsplit("/", 1)[-1]
+
+
+class AlmacenAdjuntos:
+    """
+    Almacén de adjuntos direccionado por contenido.
+
+    Cada archivo se guarda como adjuntos/<sha256><extensión>, así que adjuntar el
+    mismo archivo a diez eventos lo guarda una sola vez. Las referencias son las
+    filas de 'eventos' que apuntan a la ruta: un archivo solo se borra cuando ya
+    no lo usa ningún evento, y recolectar_huerfanos() limpia los que quedaron
+    sueltos (p.ej. si falló el borrado tras eliminar un evento).
+    """
+
+    def __init__(self, carpeta=CARPETA_ADJUNTOS, dao=None):
+        self.carpeta = carpeta
+        self.dao = dao or EventosDAO()
+
+    # =================== Importar ===================
+    def importar(self, origen, progreso=None, cancelado=None):
+        """
+        Calcula el hash de 'origen' y lo incorpora al almacén. Devuelve la ruta a guardar en la BD.
+
+        progreso(fraccion) se llama con valores entre 0 y 1; si cancelado() devuelve True
+        se interrumpe la operación con CopiaCancelada y no queda nada a medias en disco.
+        Está pensado para ejecutarse en un hilo de trabajo, nunca en el de la interfaz.
+        """
+        os.makedirs(self.carpeta, exist_ok=True)
+        total = max(1, os.path.getsize(origen))
+
+        # 1. Hash por bloques (primera mitad de la barra de progreso)
+        sha = hashlib.sha256()
+        leidos = 0
+        with open(origen, "rb") as f:
+            for bloque in iter(lambda: f.read(TAM_BLOQUE), b""):
+                if cancelado and cancelado():
+                    raise CopiaCancelada()
+                sha.update(bloque)
+                leidos += len(bloque)
+                if progreso:
+                    progreso(0.5 * leidos / total)
+
+        extension = os.path.splitext(origen)[1].lower()
+        destino = os.path.join(self.carpeta, sha.hexdigest() + extension)
+        if os.path.exists(destino):
+            # Deduplicación: el contenido ya está en el almacén. Se renueva su fecha para que
+            # recolectar_huerfanos() no lo borre mientras el editor aún no ha guardado
+            try: os.utime(destino)
+            except OSError: pass
+            if progreso:
+                progreso(1.0)
+            return destino
+
+        # 2. Reflink -> copia por bloques (segunda mitad). Nunca un hardlink: compartiría
+        # inodo con el original y editarlo cambiaría el adjunto sin cambiar su hash
+        temporal = os.path.join(self.carpeta, f"{PREFIJO_TEMPORAL}{uuid.uuid4().hex}")
+        try:
+            if not self._reflink(origen, temporal):
+                self._copiar_por_bloques(origen, temporal, total, progreso, cancelado)
+            os.replace(temporal, destino) # Renombrado atómico: nunca queda un destino a medias
+        except BaseException:
+            if os.path.exists(temporal):
+                try: os.remove(temporal)
+                except OSError: pass
+            raise
+
+        if progreso:
+            progreso(1.0)
+        return destino
+
+    def _reflink(self, origen, destino):
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            import fcntl
+            with open(origen, "rb") as fo, open(destino, "wb") as fd:
+                fcntl.ioctl(fd.fileno(), FICLONE, fo.fileno())
+            return True
+        except (OSError, ImportError):
+            if os.path.exists(destino):
+                os.remove(destino)
+            return False
+
+    def _copiar_por_bloques(self, origen, destino, total, progreso, cancelado):
+        copiados = 0
+        with open(origen, "rb") as fo, open(destino, "wb") as fd:
+            for bloque in iter(lambda: fo.read(TAM_BLOQUE), b""):
+                if cancelado and cancelado():
+                    raise CopiaCancelada()
+                fd.write(bloque)
+                copiados += len(bloque)
+                if progreso:
+                    progreso(0.5 + 0.5 * copiados / total)
+        shutil.copymode(origen, destino) # Sin copystat: la fecha del adjunto es la de su llegada al almacén
+
+    # =================== Referencias y limpieza ===================
+    def liberar(self, ruta):
+        """Borra el archivo si ningún evento lo referencia ya. Llamar DESPUÉS de actualizar la BD."""
+        if not ruta or not os.path.exists(ruta):
+            return False
+        try:
+            if self.dao.contar_referencias_adjunto(ruta) > 0:
+                return False
+            os.remove(ruta)
+            return True
+        except Exception as e:
+            # Si no se puede borrar ahora, lo recogerá recolectar_huerfanos() más adelante
+            logging.warning(f"No se pudo liberar el adjunto {ruta}: {e}")
+            return False
+
+    def recolectar_huerfanos(self):
+        """
+        Elimina los archivos de la carpeta de adjuntos que no referencia ningún evento ni
+        ninguna escritura pendiente en los diarios sin conexión, y que llevan más de
+        EDAD_MINIMA_HUERFANO segundos en el almacén (un editor abierto puede haber
+        importado uno que aún no ha guardado).
+        """
+        if not os.path.isdir(self.carpeta):
+            return 0
+        rutas = self.dao.obtener_rutas_adjuntos()
+        if rutas is None:
+            return 0 # Sin BD no sabemos qué está en uso: no se toca nada
+        try:
+            pendientes = textos_pendientes()
+        except Exception as e:
+            logging.warning(f"No se pudieron leer los diarios sin conexión, no se recogen adjuntos: {e}")
+            return 0
+        en_uso = {nombre_fichero(r) for r in list(rutas) + list(pendientes) if r}
+
+        borrados = 0
+        ahora = time.time()
+        for nombre in os.listdir(self.carpeta):
+            ruta = os.path.join(self.carpeta, nombre)
+            if nombre in en_uso or not os.path.isfile(ruta):
+                continue
+            estado = os.stat(ruta)
+            # ctime: en Linux cambia al crearlo o renombrarlo en el almacén; en Windows es su creación
+            if ahora - max(estado.st_mtime, estado.st_ctime) < EDAD_MINIMA_HUERFANO:
+                continue
+            try:
+                os.remove(ruta)
+                borrados += 1
+            except OSError as e:
+                logging.warning(f"No se pudo borrar el adjunto huérfano {ruta}: {e}")
+        if borrados:
+            logging.info(f"Adjuntos: {borrados} archivos huérfanos eliminados.")
+        return borrados
@@ -0,0 +1,107 @@
+"""
+Datos de la vista Agenda: una lista continua de eventos que se lee por páginas en
+las dos direcciones con paginación por keyset sobre (fecha_inicio, id_evento).
+Con un filtro ('importantes' o 'avisos') da los próximos eventos de la lista de
+importantes y de los recordatorios.
+
+Los eventos sueltos vienen de EventosDAO.obtener_pagina_agenda; las ocurrencias de
+las series se generan aquí, solo para el tramo de fechas que cubre cada página.
+Ninguna página depende del número total de eventos: ni memoria ni tiempo crecen
+con los años de historial.
+"""
+from datetime import datetime, timedelta
+
+from logic.recurrencia import ExpansorRecurrencias
+
+TAM_PAGINA_AGENDA = 100
+TRAMO_MAXIMO = timedelta(days=90)      # las series se expanden de 90 en 90 días (no años de una serie diaria de golpe)
+HORIZONTE_SERIES = timedelta(days=730)  # sin más eventos sueltos, hasta dónde se siguen mostrando series
+
+
+def clave_agenda(evento):
+    return (evento['fecha_inicio'], evento['id_evento'])
+
+
+def cumple_filtro(evento, filtro):
+    """Mismo criterio que EventosDAO.obtener_proximos, para las series que se expanden aquí."""
+    if filtro == "importantes":
+        return bool(evento.get('es_importante'))
+    if filtro == "avisos":
+        return int(evento.get('minutos_aviso') or 0) > 0
+    return True
+
+
+class FuenteAgenda:
+    """
+    Páginas de la agenda de un usuario. 'series' devuelve las filas de series y las que
+    sobrescriben ocurrencias (ya están en memoria con la carga de las vistas).
+    Cada página es (eventos en orden ascendente, ¿hay más en esa dirección?). Con
+    'filtro' solo se leen hacia adelante (siguientes).
+    """
+
+    def __init__(self, dao, usuario_id, series, tam_pagina=TAM_PAGINA_AGENDA, filtro=None):
+        self.dao = dao
+        self.usuario_id = usuario_id
+        self._series = series
+        self.tam_pagina = tam_pagina
+        self.filtro = filtro
+        # Expansor propio: los tramos de la agenda no deben desplazar de la LRU los de las vistas
+        self.expansor = ExpansorRecurrencias(max_entradas=32)
+
+    def siguientes(self, cursor):
+        """Eventos posteriores al cursor (fecha_inicio, id_evento)."""
+        filas = self.dao.obtener_proximos(self.usuario_id, cursor[0], self.tam_pagina, self.filtro, cursor) or []
+        llena = len(filas) == self.tam_pagina
+        series = self.series()
+        # Hasta dónde se conocen todos los eventos sueltos: la última fila si la página vino llena
+        if llena:
+            tope = filas[-1]['fecha_inicio'] + timedelta(seconds=1)
+        else:
+            # Sin más sueltos, las series se siguen mostrando hasta HORIZONTE_SERIES tras el último (u hoy)
+            tope = max([datetime.now()] + [e['fecha_inicio'] for e in filas[-1:]]) + HORIZONTE_SERIES
+        # Las series se expanden por tramos hasta que haya algo que mostrar
+        ocurrencias, desde, hasta = [], cursor[0], cursor[0] if series else tope
+        while hasta < tope:
+            hasta = min(desde + TRAMO_MAXIMO, tope)
+            ocurrencias += [o for o in self._ocurrencias(series, desde, hasta) if clave_agenda(o) > cursor]
+            if ocurrencias or (filas and filas[0]['fecha_inicio'] < hasta):
+                break
+            desde = hasta
+        eventos = sorted([e for e in filas if e['fecha_inicio'] < hasta] + ocurrencias, key=clave_agenda)
+        if llena:
+            # Más allá de la última fila puede haber sueltos que aún no se han leído
+            eventos = [e for e in eventos if clave_agenda(e) <= clave_agenda(filas[-1])]
+        hay_mas = len(eventos) > self.tam_pagina or llena or hasta < tope
+        return eventos[:self.tam_pagina], hay_mas
+
+    def anteriores(self, cursor):
+        """Eventos anteriores al cursor (fecha_inicio, id_evento)."""
+        filas = self.dao.obtener_pagina_agenda(self.usuario_id, cursor, False, self.tam_pagina) or []
+        llena = len(filas) == self.tam_pagina
+        series = self.series()
+        if llena:
+            tope = filas[0]['fecha_inicio']
+        else:
+            # Hacia atrás no hay nada antes de la primera fila ni del inicio de la primera serie
+            inicios = [s['fecha_inicio'] for s in series if s.get('regla_recurrencia')]
+            tope = min(inicios + [filas[0]['fecha_inicio'] if filas else cursor[0]])
+        hasta = cursor[0] + timedelta(seconds=1)
+        ocurrencias, desde = [], hasta if series else tope
+        while desde > tope:
+            desde = max(hasta - TRAMO_MAXIMO, tope)
+            ocurrencias += [o for o in self._ocurrencias(series, desde, hasta) if clave_agenda(o) < cursor]
+            if ocurrencias or (filas and filas[-1]['fecha_inicio'] >= desde):
+                break
+            hasta = desde
+        eventos = sorted([e for e in filas if e['fecha_inicio'] >= desde] + ocurrencias, key=clave_agenda)
+        if llena:
+            eventos = [e for e in eventos if clave_agenda(e) >= clave_agenda(filas[0])]
+        hay_mas = len(eventos) > self.tam_pagina or llena or desde > tope
+        return eventos[-self.tam_pagina:], hay_mas
+
+    def series(self):
+        # Las filas que sobrescriben ocurrencias se quedan siempre: ocultan su ocurrencia
+        return [s for s in self._series() if not s.get('regla_recurrencia') or cumple_filtro(s, self.filtro)]
+
+    def _ocurrencias(self, series, desde, hasta):
+        return [e for e in self.expansor.expandir(series, desde, hasta) if e.get('es_ocurrencia')]
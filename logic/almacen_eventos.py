@@ -0,0 +1,186 @@
+import bisect
+import logging
+from datetime import datetime, timedelta
+
+# NumPy es opcional: si no está disponible (p.ej. build mínimo de PyInstaller)
+# el almacén funciona igual con listas y bisect, solo que sin vectorizar.
+try:
+    import numpy as np
+    NUMPY_OK = True
+except ImportError:
+    NUMPY_OK = False
+
+MINUTOS_DIA = 1440
+
+
+def a_minutos(fecha):
+    """Convierte un datetime en un ordinal de minutos (días desde 0001-01-01 * 1440 + minuto del día)."""
+    return fecha.toordinal() * MINUTOS_DIA + fecha.hour * 60 + fecha.minute
+
+
+class AlmacenColumnar:
+    """
+    Almacén columnar de los eventos cargados, ordenado por fecha de inicio.
+
+    Guarda en arrays paralelos el ordinal de minutos de inicio, el id de color,
+    la marca de importante y los minutos de aviso. Los rangos se resuelven con
+    búsqueda binaria (searchsorted) y los conteos por día/mes con bincount,
+    así que las vistas no recorren la lista completa de eventos en cada celda.
+    """
+
+    def __init__(self, eventos=None):
+        self.cargar(eventos or [])
+
+    def cargar(self, eventos):
+        # Mismo orden que devuelve el DAO: Hora -> Título -> ID
+        self.eventos = sorted(eventos, key=lambda e: (e['fecha_inicio'], e['titulo'], e['id_evento']))
+
+        # Catálogo de colores: cada color_db_string distinto recibe un id compacto
+        self.catalogo_colores = []
+        ids_color = {}
+        columna_colores = []
+        for e in self.eventos:
+            color = e.get('color_db_string', '')
+            if color not in ids_color:
+                ids_color[color] = len(self.catalogo_colores)
+                self.catalogo_colores.append(color)
+            columna_colores.append(ids_color[color])
+
+        minutos = [a_minutos(e['fecha_inicio']) for e in self.eventos]
+        meses = [e['fecha_inicio'].year * 12 + e['fecha_inicio'].month - 1 for e in self.eventos]
+        importantes = [bool(e.get('es_importante')) for e in self.eventos]
+        avisos = [int(e.get('minutos_aviso') or 0) for e in self.eventos]
+
+        if NUMPY_OK:
+            self.minutos = np.asarray(minutos, dtype=np.int64)
+            self.dias = self.minutos // MINUTOS_DIA
+            self.meses = np.asarray(meses, dtype=np.int64)
+            self.colores = np.asarray(columna_colores, dtype=np.int32)
+            self.importantes = np.asarray(importantes, dtype=bool)
+            self.avisos = np.asarray(avisos, dtype=np.int32)
+        else:
+            self.minutos = minutos
+            self.dias = [m // MINUTOS_DIA for m in minutos]
+            self.meses = meses
+            self.colores = columna_colores
+            self.importantes = importantes
+            self.avisos = avisos
+
+    def __len__(self):
+        return len(self.eventos)
+
+    # =================== Rangos ===================
+    def indices_rango(self, inicio, fin):
+        """Devuelve (i, j) tal que self.eventos[i:j] son los eventos con inicio <= fecha < fin."""
+        m_ini, m_fin = a_minutos(inicio), a_minutos(fin)
+        if NUMPY_OK:
+            i = int(np.searchsorted(self.minutos, m_ini, side='left'))
+            j = int(np.searchsorted(self.minutos, m_fin, side='left'))
+        else:
+            i = bisect.bisect_left(self.minutos, m_ini)
+            j = bisect.bisect_left(self.minutos, m_fin)
+        return i, j
+
+    def eventos_en_rango(self, inicio, fin):
+        i, j = self.indices_rango(inicio, fin)
+        return self.eventos[i:j]
+
+    def eventos_dia(self, fecha):
+        inicio = datetime.combine(fecha.date() if isinstance(fecha, datetime) else fecha, datetime.min.time())
+        return self.eventos_en_rango(inicio, inicio + timedelta(days=1))
+
+    # =================== Conteos ===================
+    def conteo_por_dia(self, anio, mes):
+        """Lista con el número de eventos de cada día del mes (índice 0 = día 1)."""
+        primero = datetime(anio, mes, 1)
+        siguiente = datetime(anio + 1, 1, 1) if mes == 12 else datetime(anio, mes + 1, 1)
+        num_dias = (siguiente - primero).days
+        i, j = self.indices_rango(primero, siguiente)
+        base = primero.toordinal()
+        if NUMPY_OK:
+            return np.bincount(self.dias[i:j] - base, minlength=num_dias).tolist()
+        conteos = [0] * num_dias
+        for d in self.dias[i:j]:
+            conteos[d - base] += 1
+        return conteos
+
+    def conteo_por_mes(self, anio):
+        """Lista con el número de eventos de cada mes del año (índice 0 = Enero)."""
+        i, j = self.indices_rango(datetime(anio, 1, 1), datetime(anio + 1, 1, 1))
+        base = anio * 12
+        if NUMPY_OK:
+            return np.bincount(self.meses[i:j] - base, minlength=12).tolist()
+        conteos = [0] * 12
+        for m in self.meses[i:j]:
+            conteos[m - base] += 1
+        return conteos
+
+    def conteo_por_color(self, inicio, fin):
+        """Diccionario color_db_string -> número de eventos en el rango."""
+        i, j = self.indices_rango(inicio, fin)
+        if NUMPY_OK:
+            conteos = np.bincount(self.colores[i:j], minlength=len(self.catalogo_colores)).tolist()
+        else:
+            conteos = [0] * len(self.catalogo_colores)
+            for c in self.colores[i:j]:
+                conteos[c] += 1
+        return {self.catalogo_colores[k]: n for k, n in enumerate(conteos) if n}
+
+    # =================== Filtros ===================
+    def importantes_lista(self, desde=None):
+        """Eventos marcados como importantes (ya ordenados por fecha), opcionalmente desde una fecha."""
+        i = 0
+        if desde is not None:
+            i, _ = self.indices_rango(desde, desde)
+        if NUMPY_OK:
+            return [self.eventos[k] for k in (np.flatnonzero(self.importantes[i:]) + i)]
+        return [self.eventos[k] for k in range(i, len(self.eventos)) if self.importantes[k]]
+
+    def pendientes_aviso(self, ahora):
+        """Eventos cuyo aviso ya ha saltado pero que aún no han empezado (aviso <= ahora <= inicio)."""
+        if not len(self.eventos):
+            return []
+        m_ahora = a_minutos(ahora)
+        # Solo pueden estar pendientes los eventos que empiezan entre ahora y ahora + aviso máximo
+        max_aviso = int(self.avisos.max()) if NUMPY_OK else max(self.avisos)
+        i, j = self.indices_rango(ahora, ahora + timedelta(minutes=max_aviso + 1))
+        if NUMPY_OK:
+            minutos = self.minutos[i:j]
+            avisos = self.avisos[i:j]
+            mascara = (avisos > 0) & (minutos - avisos <= m_ahora) & (m_ahora <= minutos)
+            return [self.eventos[k] for k in (np.flatnonzero(mascara) + i)]
+        return [
+            self.eventos[k] for k in range(i, j)
+            if self.avisos[k] > 0 and self.minutos[k] - self.avisos[k] <= m_ahora <= self.minutos[k]
+        ]
+
+
+if __name__ == '__main__':
+    # Benchmark rápido: los conteos deben mantenerse planos al crecer el número de eventos.
+    import random
+    import time
+
+    logging.basicConfig(level=logging.INFO)
+    for n in (1_000, 10_000, 100_000, 300_000):
+        base = datetime(2020, 1, 1)
+        eventos = [{
+            'id_evento': k,
+            'titulo': f"Evento {k}",
+            'fecha_inicio': base + timedelta(minutes=random.randrange(0, 60 * 24 * 365 * 8)),
+            'color_db_string': random.choice(["#FF0000", "#00FF00", "#FFA500"]),
+            'es_importante': random.random() < 0.05,
+            'minutos_aviso': random.choice([0, 0, 15, 60]),
+        } for k in range(n)]
+
+        t0 = time.perf_counter()
+        almacen = AlmacenColumnar(eventos)
+        t_carga = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for _ in range(100):
+            almacen.conteo_por_mes(2024)
+            almacen.conteo_por_dia(2024, 6)
+            almacen.eventos_dia(datetime(2024, 6, 15))
+        t_consulta = (time.perf_counter() - t0) / 100
+
+        logging.info(f"n={n:>7} numpy={NUMPY_OK} carga={t_carga * 1000:.1f} ms consulta={t_consulta * 1e6:.0f} µs")
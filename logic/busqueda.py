@@ -0,0 +1,196 @@
+import bisect
+import heapq
+import re
+import unicodedata
+
+from logic.recurrencia import clave_evento
+
+PATRON_PALABRA = re.compile(r"\w+", re.UNICODE)
+MAX_RESULTADOS = 50
+# Por encima de este número de apariciones un prefijo se considera "denso": en lugar de
+# unir sus postings se recorren los eventos en orden cronológico hasta llenar el límite.
+UMBRAL_PREFIJO_DENSO = 5000
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para que 'reunion' encuentre 'Reunión'."""
+    descompuesto = unicodedata.normalize("NFD", texto.lower())
+    return "".join(c for c in descompuesto if unicodedata.category(c) != "Mn")
+
+
+def tokenizar(texto):
+    if not texto:
+        return set()
+    return set(PATRON_PALABRA.findall(normalizar(texto)))
+
+
+class IndiceBusqueda:
+    """
+    Índice invertido en memoria sobre titulo + descripcion.
+
+    Cada palabra apunta al conjunto de claves de evento que la contienen, y las
+    palabras se mantienen en una lista ordenada para resolver prefijos con bisect.
+    Se actualiza de forma incremental: actualizar() recibe solo las filas que han
+    cambiado, y sincronizar() (carga completa) solo re-tokeniza los eventos cuyo texto
+    ha cambiado desde la última vez.
+
+    Las filas del resumen no traen la descripción (solo 'tiene_notas'): para esas se
+    usa la de 'descripciones' (clave -> texto), que se carga aparte y se mantiene con
+    las filas que sí la traen (las del editor o las completadas con su detalle).
+    """
+
+    def __init__(self):
+        self.postings = {}      # palabra -> set(claves)
+        self.palabras = []      # lista ordenada de palabras (para prefijos)
+        self.eventos = {}       # clave -> evento
+        self.claves_fila = {}   # id(evento) -> clave con la que se indexó (un id temporal pasa a real)
+        self.textos = {}        # clave -> (titulo, descripcion) indexados
+        self.descripciones = {} # clave -> descripcion, para las filas que no la traen
+        self.tokens = {}        # clave -> frozenset(palabras)
+        self.orden = {}         # clave -> (fecha_inicio, titulo, clave)
+        self.cronologico = []   # lista ordenada de self.orden.values()
+
+    def __len__(self):
+        return len(self.eventos)
+
+    # =================== Mantenimiento incremental ===================
+    def agregar(self, evento):
+        clave = clave_evento(evento)
+        anterior = self.claves_fila.get(id(evento))
+        if anterior is not None and anterior != clave:
+            self.quitar(anterior)
+        texto = (evento.get('titulo') or "", self._descripcion(clave, evento))
+        orden = (evento['fecha_inicio'], texto[0], clave)
+        if self.textos.get(clave) == texto and self.orden.get(clave) == orden:
+            # Sin cambios: solo refrescamos la referencia (tras una recarga es otro objeto)
+            anterior = self.eventos[clave]
+            if anterior is not evento:
+                self.claves_fila.pop(id(anterior), None)
+                self.claves_fila[id(evento)] = clave
+                self.eventos[clave] = evento
+            return
+        if clave in self.textos:
+            self.quitar(clave)
+
+        self.eventos[clave] = evento
+        self.claves_fila[id(evento)] = clave
+        self.textos[clave] = texto
+        self.orden[clave] = orden
+        bisect.insort(self.cronologico, orden)
+        palabras = tokenizar(texto[0]) | tokenizar(texto[1])
+        self.tokens[clave] = frozenset(palabras)
+        for palabra in palabras:
+            claves = self.postings.get(palabra)
+            if claves is None:
+                claves = self.postings[palabra] = set()
+                bisect.insort(self.palabras, palabra)
+            claves.add(clave)
+
+    def _descripcion(self, clave, evento):
+        if 'descripcion' in evento:
+            descripcion = evento['descripcion'] or ""
+        elif evento.get('tiene_notas'):
+            return self.descripciones.get(clave, "")
+        else:
+            descripcion = ""
+        if descripcion:
+            self.descripciones[clave] = descripcion
+        else:
+            self.descripciones.pop(clave, None)
+        return descripcion
+
+    def quitar(self, clave):
+        texto = self.textos.pop(clave, None)
+        evento = self.eventos.pop(clave, None)
+        if evento is not None and self.claves_fila.get(id(evento)) == clave:
+            del self.claves_fila[id(evento)]
+        if texto is None:
+            return
+        orden = self.orden.pop(clave)
+        i = bisect.bisect_left(self.cronologico, orden)
+        if i < len(self.cronologico) and self.cronologico[i] == orden:
+            del self.cronologico[i]
+        for palabra in self.tokens.pop(clave):
+            claves = self.postings.get(palabra)
+            if claves is None:
+                continue
+            claves.discard(clave)
+            if not claves:
+                del self.postings[palabra]
+                i = bisect.bisect_left(self.palabras, palabra)
+                if i < len(self.palabras) and self.palabras[i] == palabra:
+                    del self.palabras[i]
+
+    def olvidar(self, clave):
+        """Quita un evento borrado, también su descripción guardada."""
+        self.quitar(clave)
+        self.descripciones.pop(clave, None)
+
+    def actualizar(self, cambios):
+        """Aplica en orden [(fila, presente)]: las filas nuevas o cambiadas se re-indexan y las quitadas se olvidan."""
+        for evento, presente in cambios:
+            if presente:
+                self.agregar(evento)
+            else:
+                clave = self.claves_fila.get(id(evento))
+                if clave is not None:
+                    self.olvidar(clave)
+
+    def sincronizar(self, eventos):
+        """Aplica al índice solo las diferencias con la nueva lista de eventos."""
+        nuevas = {}
+        for ev in eventos:
+            nuevas[clave_evento(ev)] = ev
+        for clave in [c for c in self.eventos if c not in nuevas]:
+            self.olvidar(clave)
+        for ev in nuevas.values():
+            self.agregar(ev)
+
+    # =================== Consultas ===================
+    def _rango_prefijo(self, prefijo):
+        i = bisect.bisect_left(self.palabras, prefijo)
+        # El final del rango de palabras con ese prefijo también se localiza por bisect
+        j = bisect.bisect_left(self.palabras, prefijo + "\U0010ffff", i)
+        return self.palabras[i:j]
+
+    def _tiene_prefijo(self, clave, prefijo):
+        return any(p.startswith(prefijo) for p in self.tokens[clave])
+
+    def buscar(self, texto, limite=MAX_RESULTADOS):
+        """
+        Devuelve los eventos que contienen todas las palabras de la consulta.
+        La última palabra se trata como prefijo (búsqueda mientras se escribe).
+        """
+        terminos = PATRON_PALABRA.findall(normalizar(texto))
+        if not terminos:
+            return []
+        *exactos, prefijo = terminos
+
+        # 1. Palabras completas: intersección empezando por el posting más corto
+        candidatos = None
+        for conjunto in sorted((self.postings.get(t, set()) for t in exactos), key=len):
+            candidatos = set(conjunto) if candidatos is None else candidatos & conjunto
+            if not candidatos:
+                return []
+
+        # 2. Última palabra como prefijo
+        palabras_prefijo = self._rango_prefijo(prefijo)
+        volumen = sum(len(self.postings[p]) for p in palabras_prefijo)
+        if candidatos is not None and len(candidatos) <= volumen:
+            claves = [c for c in candidatos if self._tiene_prefijo(c, prefijo)]
+        elif volumen <= UMBRAL_PREFIJO_DENSO:
+            claves = set().union(*(self.postings[p] for p in palabras_prefijo))
+            if candidatos is not None:
+                claves &= candidatos
+        else:
+            # Prefijo denso (p.ej. una sola letra): recorremos en orden cronológico y paramos al llenar
+            resultado = []
+            for orden in self.cronologico:
+                clave = orden[2]
+                if self._tiene_prefijo(clave, prefijo):
+                    resultado.append(self.eventos[clave])
+                    if len(resultado) >= limite:
+                        break
+            return resultado
+
+        return [self.eventos[o[2]] for o in heapq.nsmallest(limite, (self.orden[c] for c in claves))]
@@ -0,0 +1,39 @@
+"""
+Eventos de calendarios compartidos (ver database.dao.CalendariosDAO).
+
+Las filas de la carga de las vistas traen de qué calendario son: propietario_id,
+propietario_nombre, permiso ('propietario', 'lectura' o 'escritura') y
+color_calendario. Las filas nuevas creadas en local no los llevan: son del usuario.
+"""
+
+CAMPOS_CALENDARIO = ('propietario_id', 'propietario_nombre', 'permiso', 'color_calendario')
+
+
+def es_compartido(evento):
+    """Evento del calendario de otro usuario."""
+    return evento.get('permiso', 'propietario') != 'propietario'
+
+
+def es_solo_lectura(evento):
+    """Evento de un calendario compartido en modo lectura: no se edita, mueve ni borra."""
+    return evento.get('permiso') == 'lectura'
+
+
+def calendario_de(evento):
+    """Id del dueño si el evento es de un calendario compartido; None si es del propio usuario."""
+    return evento.get('propietario_id') if es_compartido(evento) else None
+
+
+def marca_calendario(evento):
+    """Prefijo para el título en las vistas: 👁 solo lectura, 👥 compartido con permiso de escritura."""
+    if not es_compartido(evento):
+        return ""
+    return "👁 " if es_solo_lectura(evento) else "👥 "
+
+
+def texto_calendario(evento):
+    """Línea para el tooltip: de quién es el calendario y con qué permiso ("" si es propio)."""
+    if not es_compartido(evento):
+        return ""
+    permiso = "solo lectura" if es_solo_lectura(evento) else "puedes editarlo"
+    return f"Calendario de {evento.get('propietario_nombre', '?')} ({permiso})"
@@ -0,0 +1,131 @@
+import logging
+import queue
+import threading
+from collections import OrderedDict
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database.dao import EventosDAO
+
+MAX_DETALLES = 2000       # eventos con detalle en memoria como máximo
+ESPERA_AGRUPAR = 0.05     # segundos que se espera a juntar peticiones en una sola consulta
+
+
+def tiene_adjunto(evento):
+    """Vale para filas completas y para las del resumen (que solo traen 'tiene_adjunto')."""
+    return bool(evento.get('archivo_adjunto') or evento.get('tiene_adjunto'))
+
+
+def tiene_notas(evento):
+    return bool(evento.get('descripcion') or evento.get('tiene_notas'))
+
+
+class CargadorDetalles(QThread):
+    """
+    Descripción y adjunto de los eventos, que las vistas no cargan (ver
+    EventosDAO.obtener_resumen_por_usuario). Se piden al pasar el ratón por un
+    evento o al abrir el editor, y quedan en una caché LRU indexada por
+    (id, versión): un evento que ha cambiado tiene otra versión, así que nunca
+    se sirve un detalle antiguo.
+
+    La interfaz solo llama a completar() (mira la caché) y a solicitar(); la
+    consulta se hace aquí, agrupando lo pedido casi a la vez.
+    """
+    detalles_listos = pyqtSignal(list)  # ids de los eventos cuyo detalle ya está en caché
+
+    _instancia = None
+
+    @classmethod
+    def instancia(cls):
+        if cls._instancia is None:
+            cls._instancia = cls()
+            cls._instancia.start()
+        return cls._instancia
+
+    def __init__(self, dao=None, maximo=MAX_DETALLES):
+        super().__init__()
+        self.dao = dao or EventosDAO()
+        self.maximo = maximo
+        self._cache = OrderedDict()  # (id_evento, version) -> {'descripcion', 'archivo_adjunto'}
+        self._cola = queue.Queue()
+        self._pendientes = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clave(evento):
+        return (evento['id_evento'], evento.get('version'))
+
+    def completar(self, evento):
+        """Copia en el evento su detalle si está en caché (barato: apto para la interfaz). True si ya lo tiene."""
+        if 'descripcion' in evento:
+            return True
+        clave = self._clave(evento)
+        with self._lock:
+            detalle = self._cache.get(clave)
+            if detalle is None:
+                return False
+            self._cache.move_to_end(clave)
+        evento.update(detalle)
+        return True
+
+    def solicitar(self, evento):
+        """Pide el detalle en segundo plano; al llegar se emite detalles_listos."""
+        clave = self._clave(evento)
+        with self._lock:
+            if clave in self._pendientes:
+                return
+            self._pendientes.add(clave)
+        self._cola.put(clave)
+
+    def cargar(self, eventos):
+        """Síncrono (editor, borrado en bloque): trae en una consulta lo que falte. Si no hay conexión, lanza la excepción del DAO."""
+        faltan = [e for e in eventos if not self.completar(e)]
+        if faltan:
+            self._traer({self._clave(e) for e in faltan})
+            for e in faltan:
+                self.completar(e)
+
+    def _traer(self, claves):
+        detalles = self.dao.obtener_detalles(sorted({id_evento for id_evento, _ in claves}))
+        with self._lock:
+            for clave in claves:
+                if clave[0] in detalles:
+                    self._cache[clave] = detalles[clave[0]]
+                    self._cache.move_to_end(clave)
+            while len(self._cache) > self.maximo:
+                self._cache.popitem(last=False)
+        return [id_evento for id_evento, _ in claves if id_evento in detalles]
+
+    def olvidar(self):
+        """Al cerrar sesión: las notas y adjuntos en caché son del usuario que se va."""
+        with self._lock:
+            self._cache.clear()
+
+    def detener(self):
+        self._cola.put(None)
+        self.wait(2000)
+
+    def run(self):
+        while True:
+            clave = self._cola.get()
+            if clave is None:
+                return
+            claves = {clave}
+            # Un barrido del ratón por el mes pide varios a la vez: van en la misma consulta
+            try:
+                while True:
+                    siguiente = self._cola.get(timeout=ESPERA_AGRUPAR)
+                    if siguiente is None:
+                        return
+                    claves.add(siguiente)
+            except queue.Empty:
+                pass
+            try:
+                ids = self._traer(claves)
+                if ids:
+                    self.detalles_listos.emit(ids)
+            except Exception as e:
+                logging.warning(f"No se pudo cargar el detalle de {len(claves)} eventos: {e}")
+            finally:
+                with self._lock:
+                    self._pendientes -= claves
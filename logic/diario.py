@@ -0,0 +1,159 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+
+from utils.serializacion import a_json, de_json
+
+# Un diario por usuario: lo que uno dejó pendiente solo se reproduce en SU siguiente sesión
+PATRON_DIARIO = "diario_offline_{usuario_id}.sqlite3"
+RUTA_DIARIO_ANTIGUA = "diario_offline.sqlite3"  # versiones anteriores: uno por carpeta, sin dueño
+# En la carpeta de datos del usuario del sistema, no en la carpeta desde la que se lanza
+# la aplicación: arrancarla desde otro sitio no debe perder lo pendiente (DIARIO_DIR la cambia)
+CARPETA_DIARIOS = os.getenv("DIARIO_DIR") or os.path.join(os.path.expanduser("~"), ".minicalendar")
+
+
+def ruta_diario(usuario_id):
+    os.makedirs(CARPETA_DIARIOS, exist_ok=True)
+    nombre = PATRON_DIARIO.format(usuario_id=usuario_id)
+    ruta = os.path.join(CARPETA_DIARIOS, nombre)
+    # Versiones anteriores lo dejaban en la carpeta actual: se trae con su WAL
+    if not os.path.exists(ruta) and os.path.isfile(nombre) and os.path.abspath(nombre) != os.path.abspath(ruta):
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(nombre + sufijo):
+                shutil.move(nombre + sufijo, ruta + sufijo)
+        logging.info(f"Diario sin conexión '{nombre}' trasladado a {CARPETA_DIARIOS}")
+    return ruta
+
+
+def _textos(valor):
+    if isinstance(valor, str):
+        yield valor
+    elif isinstance(valor, dict):
+        for v in valor.values():
+            yield from _textos(v)
+    elif isinstance(valor, (list, tuple)):
+        for v in valor:
+            yield from _textos(v)
+
+
+def textos_pendientes(carpetas=(CARPETA_DIARIOS, ".")):
+    """
+    Todos los textos de los argumentos de las operaciones pendientes en los diarios de
+    cualquier usuario (entre ellos las rutas de los adjuntos que aún se van a guardar),
+    también los que siguen en la carpeta actual de versiones anteriores.
+    """
+    textos = set()
+    rutas = set()
+    for carpeta in carpetas:
+        rutas.update(glob.glob(os.path.join(carpeta, PATRON_DIARIO.format(usuario_id="*"))))
+        rutas.add(os.path.join(carpeta, RUTA_DIARIO_ANTIGUA))
+    for ruta in sorted(rutas):
+        if not os.path.isfile(ruta):
+            continue
+        conn = sqlite3.connect(ruta)
+        try:
+            for (args,) in conn.execute("SELECT argumentos FROM operaciones"):
+                textos.update(_textos(json.loads(args)))
+        finally:
+            conn.close()
+    return textos
+
+
+class DiarioOffline:
+    """
+    Diario local (SQLite) de las escrituras que no se pudieron enviar a la BD.
+
+    Solo se añaden operaciones al final y se borran por el principio cuando el
+    servidor las confirma, así que sobrevive a cierres de la aplicación sin
+    perder el orden. Guarda también la correspondencia id temporal -> id real
+    de los eventos creados sin conexión, y qué eventos ya pasaron la comprobación
+    de conflictos en la reproducción en curso.
+    """
+
+    def __init__(self, ruta):
+        if os.path.exists(RUTA_DIARIO_ANTIGUA):
+            # No se sabe de quién es: no se reproduce en la sesión de nadie
+            logging.warning(f"Se ignora el diario sin conexión antiguo '{RUTA_DIARIO_ANTIGUA}' (no indica a qué usuario pertenece)")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS operaciones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                operacion TEXT NOT NULL,
+                argumentos TEXT NOT NULL,
+                version_base INTEGER,
+                creado TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ids_temporales (temporal INTEGER PRIMARY KEY, real INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS verificados (id_evento INTEGER PRIMARY KEY);
+        """)
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COUNT(*) FROM operaciones").fetchone()[0]
+
+    def __len__(self):
+        return self._total
+
+    def anotar(self, operaciones):
+        """operaciones: [(operacion, argumentos, version_base), ...], en una sola transacción."""
+        ahora = datetime.now().isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO operaciones (operacion, argumentos, version_base, creado) VALUES (?, ?, ?, ?)",
+                [(op, a_json(args), version, ahora) for op, args, version in operaciones]
+            )
+            self._total += len(operaciones)
+
+    def pendientes(self, limite):
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT id, operacion, argumentos, version_base FROM operaciones ORDER BY id LIMIT ?", (limite,)
+            ).fetchall()
+        return [(id_op, op, de_json(args), version) for id_op, op, args, version in filas]
+
+    def confirmar(self, hasta_id):
+        """Borra las operaciones ya aplicadas en el servidor. Al vaciarse se reinicia el estado de la reproducción."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM operaciones WHERE id <= ?", (hasta_id,))
+            self._total = self._conn.execute("SELECT COUNT(*) FROM operaciones").fetchone()[0]
+            if not self._total:
+                self._conn.execute("DELETE FROM ids_temporales")
+                self._conn.execute("DELETE FROM verificados")
+
+    # =================== Ids y verificaciones ===================
+    def registrar_id(self, temporal, real):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO ids_temporales (temporal, real) VALUES (?, ?)", (temporal, real))
+
+    def ids_reales(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT temporal, real FROM ids_temporales").fetchall())
+
+    def menor_id_temporal(self):
+        """El id temporal más bajo usado por operaciones pendientes, para no reutilizarlo tras reiniciar."""
+        with self._lock:
+            menor = self._conn.execute("SELECT MIN(temporal) FROM ids_temporales").fetchone()[0] or 0
+            for (args,) in self._conn.execute("SELECT argumentos FROM operaciones"):
+                args = json.loads(args)
+                valores = [args.get(clave) for clave in ("id_temporal", "id_evento", "serie_id")] + args.get("ids", [])
+                for valor in valores:
+                    if isinstance(valor, int):
+                        menor = min(menor, valor)
+        return menor
+
+    def verificados(self):
+        with self._lock:
+            return {fila[0] for fila in self._conn.execute("SELECT id_evento FROM verificados")}
+
+    def marcar_verificados(self, ids_eventos):
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO verificados (id_evento) VALUES (?)", [(i,) for i in ids_eventos])
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,152 @@
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+# Información precalculada de un día: festivo = (nombre, tipo) o None, santo = texto o ""
+InfoDia = namedtuple("InfoDia", ["festivo", "santo"])
+DIA_NORMAL = InfoDia(None, "")
+
+REGION_POR_DEFECTO = "SEVILLA"
+
+
+def domingo_de_pascua(anio):
+    """Domingo de Pascua del calendario gregoriano (algoritmo anónimo de Meeus/Jones/Butcher)."""
+    a = anio % 19
+    b, c = divmod(anio, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return date(anio, mes, dia + 1)
+
+
+# Una regla es (mes, día) para fechas fijas o ("pascua", desplazamiento en días) para las móviles
+JUEVES_SANTO = ("pascua", -3)
+VIERNES_SANTO = ("pascua", -2)
+LUNES_DE_PASCUA = ("pascua", 1)
+LUNES_DE_PENTECOSTES = ("pascua", 50)
+CORPUS_CHRISTI = ("pascua", 60)
+
+# Regiones: nacional -> comunidad autónoma -> localidad. Elegir una incluye las de sus padres.
+# Son los festivos habituales de cada calendario; los traslados que fija cada año el BOE/BOJA
+# (p.ej. cuando un festivo cae en domingo) no se contemplan.
+REGIONES = {
+    "ES": {"nombre": "España", "tipo": "nacional", "padre": None, "festivos": [
+        ((1, 1), "Año Nuevo"), ((1, 6), "Epifanía del Señor"), (VIERNES_SANTO, "Viernes Santo"),
+        ((5, 1), "Fiesta del Trabajo"), ((8, 15), "Asunción de la Virgen"), ((10, 12), "Fiesta Nacional de España"),
+        ((11, 1), "Todos los Santos"), ((12, 6), "Día de la Constitución"), ((12, 8), "Inmaculada Concepción"),
+        ((12, 25), "Natividad del Señor"),
+    ]},
+    # Comunidades autónomas
+    "AN": {"nombre": "Andalucía", "tipo": "autonomico", "padre": "ES", "festivos": [
+        ((2, 28), "Día de Andalucía"), (JUEVES_SANTO, "Jueves Santo"),
+    ]},
+    "MD": {"nombre": "Comunidad de Madrid", "tipo": "autonomico", "padre": "ES", "festivos": [
+        (JUEVES_SANTO, "Jueves Santo"), ((5, 2), "Fiesta de la Comunidad de Madrid"),
+    ]},
+    "CT": {"nombre": "Cataluña", "tipo": "autonomico", "padre": "ES", "festivos": [
+        (LUNES_DE_PASCUA, "Lunes de Pascua"), ((6, 24), "Sant Joan"), ((9, 11), "Diada Nacional de Catalunya"),
+        ((12, 26), "Sant Esteve"),
+    ]},
+    "VC": {"nombre": "Comunitat Valenciana", "tipo": "autonomico", "padre": "ES", "festivos": [
+        ((3, 19), "San José"), (LUNES_DE_PASCUA, "Lunes de Pascua"), ((10, 9), "Día de la Comunitat Valenciana"),
+    ]},
+    "GA": {"nombre": "Galicia", "tipo": "autonomico", "padre": "ES", "festivos": [
+        (JUEVES_SANTO, "Jueves Santo"), ((5, 17), "Día das Letras Galegas"), ((7, 25), "Día Nacional de Galicia"),
+    ]},
+    "PV": {"nombre": "País Vasco", "tipo": "autonomico", "padre": "ES", "festivos": [
+        (JUEVES_SANTO, "Jueves Santo"), (LUNES_DE_PASCUA, "Lunes de Pascua"),
+    ]},
+    # Localidades
+    "SEVILLA": {"nombre": "Sevilla", "tipo": "local", "padre": "AN", "festivos": [
+        ((5, 30), "San Fernando"), (CORPUS_CHRISTI, "Corpus Christi"),
+    ]},
+    "MALAGA": {"nombre": "Málaga", "tipo": "local", "padre": "AN", "festivos": [
+        ((8, 19), "Incorporación de Málaga a la Corona de Castilla"), ((9, 8), "Virgen de la Victoria"),
+    ]},
+    "MADRID": {"nombre": "Madrid (capital)", "tipo": "local", "padre": "MD", "festivos": [
+        ((5, 15), "San Isidro"), ((11, 9), "Virgen de la Almudena"),
+    ]},
+    "BARCELONA": {"nombre": "Barcelona", "tipo": "local", "padre": "CT", "festivos": [
+        (LUNES_DE_PENTECOSTES, "Lunes de Pascua Granada"), ((9, 24), "La Mercè"),
+    ]},
+    "VALENCIA": {"nombre": "Valencia (ciudad)", "tipo": "local", "padre": "VC", "festivos": [
+        ((1, 22), "San Vicente Mártir"), (("pascua", 8), "San Vicente Ferrer"),
+    ]},
+}
+
+# Santoral (Mes, Día): "Nombre"
+SANTORAL = {
+    (1, 1): "Sta. María", (1, 6): "Reyes Magos", (1, 17): "S. Antón", (1, 20): "S. Sebastián",
+    (1, 22): "S. Vicente", (1, 28): "S. Tomás de Aquino",
+    (2, 2): "Candelaria", (2, 3): "S. Blas", (2, 5): "Sta. Águeda", (2, 14): "S. Valentín",
+    (3, 19): "S. José", (3, 25): "Anunciación",
+    (4, 23): "S. Jorge", (4, 29): "Sta. Catalina",
+    (5, 1): "S. José Obrero", (5, 15): "S. Isidro", (5, 30): "S. Fernando",
+    (6, 13): "S. Antonio", (6, 24): "S. Juan", (6, 29): "S. Pedro",
+    (7, 16): "Virgen Carmen", (7, 22): "Sta. M.ª Magdalena", (7, 25): "Santiago", (7, 26): "Sta. Ana",
+    (8, 10): "S. Lorenzo", (8, 15): "Asunción", (8, 24): "S. Bartolomé", (8, 28): "S. Agustín",
+    (9, 8): "Natividad de María", (9, 29): "S. Miguel",
+    (10, 4): "S. Francisco", (10, 12): "Virgen Pilar", (10, 15): "Sta. Teresa",
+    (11, 1): "Todos Santos", (11, 2): "Difuntos", (11, 30): "S. Andrés",
+    (12, 6): "S. Nicolás", (12, 8): "Inmaculada", (12, 13): "Sta. Lucía", (12, 25): "Navidad",
+    (12, 26): "S. Esteban", (12, 28): "Santos Inocentes",
+}
+
+# Fiestas litúrgicas móviles (desplazamiento respecto al Domingo de Pascua)
+SANTORAL_MOVIL = {
+    -46: "Miércoles de Ceniza", -7: "Domingo de Ramos", -3: "Jueves Santo", -2: "Viernes Santo",
+    0: "Pascua de Resurrección", 39: "Ascensión", 49: "Pentecostés", 60: "Corpus Christi",
+}
+
+
+def cadena_regiones(region):
+    """La región y todas las que la contienen, de la más general a la más concreta."""
+    cadena = []
+    while region in REGIONES:
+        cadena.append(region)
+        region = REGIONES[region]["padre"]
+    return list(reversed(cadena))
+
+
+def _fecha_regla(regla, anio, pascua):
+    if regla[0] == "pascua":
+        return pascua + timedelta(days=regla[1])
+    mes, dia = regla
+    return date(anio, mes, dia)
+
+
+@lru_cache(maxsize=16)
+def tabla_anio(anio, region=REGION_POR_DEFECTO):
+    """
+    Tabla date -> InfoDia de un año para una región, calculada una sola vez y
+    compartida por todas las vistas (la caché se indexa por año y región).
+    Los días sin festivo ni santo no aparecen: usar info_dia(), que devuelve DIA_NORMAL.
+    """
+    pascua = domingo_de_pascua(anio)
+    festivos = {}
+    # De lo general a lo concreto: si coinciden, se muestra el festivo más local
+    for clave in cadena_regiones(region):
+        datos = REGIONES[clave]
+        for regla, nombre in datos["festivos"]:
+            festivos[_fecha_regla(regla, anio, pascua)] = (nombre, datos["tipo"])
+
+    santos = {date(anio, mes, dia): nombre for (mes, dia), nombre in SANTORAL.items()}
+    for desplazamiento, nombre in SANTORAL_MOVIL.items():
+        fecha = pascua + timedelta(days=desplazamiento)
+        if fecha.year == anio:
+            santos[fecha] = nombre # La fiesta móvil tiene preferencia sobre el santo del día
+
+    return {fecha: InfoDia(festivos.get(fecha), santos.get(fecha, ""))
+            for fecha in festivos.keys() | santos.keys()}
+
+
+def info_dia(fecha, region=REGION_POR_DEFECTO):
+    """Festivo y santo de un día (date o datetime): una búsqueda O(1) en la tabla del año."""
+    if hasattr(fecha, "date"):
+        fecha = fecha.date()
+    return tabla_anio(fecha.year, region).get(fecha, DIA_NORMAL)
@@ -1,7 +1,7 @@
 import os.path
 import datetime
 import logging
-from database.conexion_db import conectar_db
+from database.conexion_db import conectar_db, consultar_preparada, ejecutar_preparada
 
 # Intentamos importar las librerías de Google
 try:
@@ -70,7 +70,6 @@ def sincronizar_eventos(usuario_id):
         conn = conectar_db()
         if not conn: return (False, "No se pudo conectar a la base de datos local para guardar los eventos.")
         
-        cursor = conn.cursor()
         count = 0
         
         for event in events:
@@ -79,20 +78,28 @@ def sincronizar_eventos(usuario_id):
             
             # Formato fecha: 2023-01-01T10:00:00Z -> 2023-01-01 10:00:00
             fecha_mysql = start.replace('T', ' ').split('+')[0].split('Z')[0]
+            # Duración a partir del fin (los de día completo duran 1440 minutos por día)
+            end = event.get('end', {}).get('dateTime', event.get('end', {}).get('date'))
+            duracion = 0
+            if end:
+                try:
+                    fecha_fin = end.replace('T', ' ').split('+')[0].split('Z')[0]
+                    duracion = max(0, int((datetime.datetime.fromisoformat(fecha_fin) - datetime.datetime.fromisoformat(fecha_mysql)).total_seconds() // 60))
+                except (ValueError, TypeError):
+                    pass
             
-            # Evitar duplicados (mismo título y fecha)
-            cursor.execute("SELECT id_evento FROM eventos WHERE usuario_id=%s AND titulo=%s AND fecha_inicio LIKE %s", 
-                           (usuario_id, summary, fecha_mysql + '%'))
+            # Evitar duplicados (mismo título y fecha). Misma sentencia en cada vuelta: va preparada
+            duplicados = consultar_preparada(conn, "SELECT id_evento FROM eventos WHERE usuario_id=%s AND titulo=%s AND fecha_inicio LIKE %s",
+                                             (usuario_id, summary, fecha_mysql + '%'))
             
-            if not cursor.fetchone():
-                cursor.execute("""
-                    INSERT INTO eventos (usuario_id, titulo, descripcion, fecha_inicio, color_id)
-                    VALUES (%s, %s, %s, %s, 1)
-                """, (usuario_id, summary, "Importado de G-Cal", fecha_mysql))
+            if not duplicados:
+                ejecutar_preparada(conn, """
+                    INSERT INTO eventos (usuario_id, titulo, descripcion, fecha_inicio, color_id, duracion_minutos)
+                    VALUES (%s, %s, %s, %s, 1, %s)
+                """, (usuario_id, summary, "Importado de G-Cal", fecha_mysql, duracion))
                 count += 1
         
         conn.commit()
-        cursor.close()
         
         return (True, f"Sincronización completada: {count} eventos nuevos.")
 
@@ -0,0 +1,389 @@
+"""
+Importación y exportación de calendarios iCalendar (.ics, RFC 5545).
+
+Ambas trabajan en streaming: el lector recorre el fichero línea a línea y entrega
+un VEVENT cada vez, y el escritor vuelca los eventos según salen del cursor de la
+BD, así que la memoria no crece con el tamaño del calendario.
+"""
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from database.dao import ColoresDAO, EventosDAO
+from logic.recurrencia import parsear_regla
+from utils.excepciones import parsear_excepciones, formatear_excepcion
+from utils.serializacion import a_json, de_json
+
+TAM_LOTE_IMPORTACION = 500
+TAM_LOTE_EXPORTACION = 1000
+COLOR_POR_DEFECTO = "#FFFFFF"
+PRODID = "-//MiniCalendar//MiniCalendar//ES"
+
+# Nombres CSS (propiedad COLOR de RFC 7986) de los colores del catálogo
+COLORES_CSS = {
+    "red": "#FF0000", "lime": "#00FF00", "yellow": "#FFFF00", "orange": "#FFA500",
+    "cyan": "#00FFFF", "aqua": "#00FFFF", "pink": "#FFC0CB", "brown": "#A52A2A",
+    "gray": "#808080", "grey": "#808080", "white": "#FFFFFF", "turquoise": "#40E0D0",
+    "springgreen": "#00FF7F", "violet": "#EE82EE", "gold": "#FFD700", "silver": "#C0C0C0",
+}
+HEX_A_CSS = {codigo: nombre for nombre, codigo in reversed(list(COLORES_CSS.items()))} # Gana el primer nombre
+
+
+_ESCAPE = re.compile(r"\\(.)")
+
+
+class OperacionCancelada(Exception):
+    pass
+
+
+# =================== Lectura ===================
+def _desescapar(valor):
+    if "\\" not in valor:
+        return valor
+    # \n -> salto de línea; \, \; \\ -> el propio carácter
+    return _ESCAPE.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), valor)
+
+
+def _partir_propiedad(linea):
+    """'DTSTART;TZID=Europe/Madrid:20250101T100000' -> ('DTSTART', {'TZID': ...}, '20250101T100000')."""
+    cabecera, separador, valor = linea.partition(":")
+    if not separador:
+        return None
+    if '"' in cabecera:
+        # Los dos puntos dentro de un parámetro entrecomillado no separan el valor
+        entre_comillas = False
+        for i, c in enumerate(linea):
+            if c == '"':
+                entre_comillas = not entre_comillas
+            elif c == ":" and not entre_comillas:
+                cabecera, valor = linea[:i], linea[i + 1:]
+                break
+    if ";" not in cabecera:
+        return cabecera.upper(), {}, valor
+    partes = cabecera.split(";")
+    parametros = {}
+    for parte in partes[1:]:
+        if "=" in parte:
+            clave, v = parte.split("=", 1)
+            parametros[clave.upper()] = v.strip('"')
+    return partes[0].upper(), parametros, valor
+
+
+def _lineas_desplegadas(fichero):
+    """
+    Une las líneas plegadas (las que empiezan por espacio o tabulador continúan la
+    anterior). Lee en binario para poder informar de los bytes consumidos.
+    """
+    leidos = 0
+    actual = None
+    for cruda in fichero:
+        leidos += len(cruda)
+        linea = cruda.decode("utf-8", errors="replace").rstrip("\r\n")
+        if linea[:1] in (" ", "\t") and actual is not None:
+            actual += linea[1:]
+            continue
+        if actual is not None:
+            yield actual, leidos - len(cruda)
+        actual = linea
+    if actual is not None:
+        yield actual, leidos
+
+
+def parsear_fecha(valor, hora_por_defecto=None):
+    """
+    DATE, DATE-TIME local o UTC (sufijo Z) a datetime local sin zona (como se guarda en la BD).
+    A un DATE se le pone la hora de 'hora_por_defecto' (p.ej. un EXDATE de una serie con hora).
+    """
+    valor = valor.strip()
+    # Troceo directo en lugar de strptime: se llama una vez por fecha en ficheros de cientos de miles de eventos
+    if len(valor) < 8 or not valor[:8].isdigit():
+        raise ValueError(f"Fecha iCalendar no válida: '{valor}'")
+    if "T" not in valor:
+        fecha = datetime(int(valor[:4]), int(valor[4:6]), int(valor[6:8]))
+        if hora_por_defecto:
+            fecha = fecha.replace(hour=hora_por_defecto.hour, minute=hora_por_defecto.minute)
+        return fecha
+    if len(valor) < 15 or valor[8] != "T" or not valor[9:15].isdigit():
+        raise ValueError(f"Fecha iCalendar no válida: '{valor}'")
+    fecha = datetime(int(valor[:4]), int(valor[4:6]), int(valor[6:8]), int(valor[9:11]), int(valor[11:13]), int(valor[13:15]))
+    if valor.endswith("Z"):
+        fecha = fecha.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    # Con TZID se toma la hora de pared tal cual: la BD no guarda zonas horarias
+    return fecha
+
+
+def leer_vevents(fichero, progreso=None):
+    """
+    Generador de VEVENTs como diccionarios {PROPIEDAD: (parametros, valor)} más
+    la lista de alarmas en "VALARM". Solo guarda en memoria el evento en curso.
+    progreso(bytes_leidos) se llama al terminar cada evento.
+    """
+    evento = None
+    alarma = None
+    for linea, posicion in _lineas_desplegadas(fichero):
+        propiedad = _partir_propiedad(linea)
+        if not propiedad:
+            continue
+        nombre, parametros, valor = propiedad
+        if nombre == "BEGIN" and valor.upper() == "VEVENT":
+            evento = {"VALARM": []}
+        elif nombre == "BEGIN" and valor.upper() == "VALARM" and evento is not None:
+            alarma = {}
+        elif nombre == "END" and valor.upper() == "VALARM" and alarma is not None:
+            evento["VALARM"].append(alarma)
+            alarma = None
+        elif nombre == "END" and valor.upper() == "VEVENT" and evento is not None:
+            if progreso:
+                progreso(posicion)
+            yield evento
+            evento = None
+        elif alarma is not None:
+            alarma[nombre] = (parametros, valor)
+        elif evento is not None:
+            if nombre == "EXDATE" and nombre in evento:
+                # Puede repetirse: se acumulan todas las fechas excluidas
+                valor = evento[nombre][1] + "," + valor
+            evento[nombre] = (parametros, valor)
+
+
+def _minutos_duracion(valor):
+    """Duración iCalendar (PT15M, PT1H30M, P1D, -PT15M...) -> minutos, sin signo."""
+    minutos = 0
+    numero = ""
+    for c in valor.lstrip("+-")[1:]:
+        if c.isdigit():
+            numero += c
+        elif c in "WDHMS" and numero:
+            minutos += int(numero) * {"W": 10080, "D": 1440, "H": 60, "M": 1, "S": 0}[c]
+            numero = ""
+    return minutos
+
+
+def _minutos_alarma(alarmas):
+    """TRIGGER:-PT15M / -PT1H / -P1D -> minutos de antelación (la primera alarma relativa)."""
+    for alarma in alarmas:
+        parametros, valor = alarma.get("TRIGGER", ({}, ""))
+        if parametros.get("VALUE") == "DATE-TIME" or not valor.startswith("-P"):
+            continue
+        return _minutos_duracion(valor)
+    return 0
+
+
+def _minutos_evento(vevent, fecha_inicio):
+    """Duración del evento: DTEND - DTSTART o DURATION (0 si no trae ninguna o es incoherente)."""
+    try:
+        if "DTEND" in vevent:
+            return max(0, int((parsear_fecha(vevent["DTEND"][1]) - fecha_inicio).total_seconds() // 60))
+    except ValueError:
+        return 0
+    if "DURATION" in vevent:
+        return _minutos_duracion(vevent["DURATION"][1])
+    return 0
+
+
+def convertir_vevent(vevent, colores):
+    """
+    VEVENT -> diccionario listo para EventosDAO.importar. 'colores' es el catálogo
+    HEX -> id_color. Devuelve None si no tiene fecha de inicio válida.
+    """
+    def valor(nombre, defecto=""):
+        return vevent.get(nombre, ({}, defecto))[1]
+
+    try:
+        fecha_inicio = parsear_fecha(vevent["DTSTART"][1])
+    except (KeyError, ValueError):
+        return None
+
+    # Color: el nuestro (hex exacto) o el estándar de RFC 7986 (nombre CSS o hex)
+    color = valor("X-MINICALENDAR-COLOR") or valor("COLOR")
+    color = color.upper() if color.startswith("#") else COLORES_CSS.get(color.lower(), COLOR_POR_DEFECTO)
+    color_id = colores.get(color) or colores.get(COLOR_POR_DEFECTO) or 1
+
+    # Solo se guardan las reglas que se saben expandir: con BYDAY, BYMONTHDAY... la serie
+    # saldría en otras fechas, así que entra solo la primera ocurrencia (ver importar_ics)
+    regla = None
+    if "RRULE" in vevent and parsear_regla(valor("RRULE")):
+        regla = valor("RRULE").upper()
+    excepciones = set()
+    for fecha in filter(None, valor("EXDATE").split(",")):
+        try:
+            excepciones.add(parsear_fecha(fecha, fecha_inicio))
+        except ValueError:
+            pass
+
+    fecha_original = None
+    if "RECURRENCE-ID" in vevent:
+        try:
+            fecha_original = parsear_fecha(valor("RECURRENCE-ID"), fecha_inicio)
+        except ValueError:
+            pass
+
+    try:
+        prioridad = int(valor("PRIORITY", "0") or 0)
+    except ValueError:
+        prioridad = 0
+
+    return {
+        'titulo': _desescapar(valor("SUMMARY", "Sin título"))[:255] or "Sin título",
+        'descripcion': _desescapar(valor("DESCRIPTION")),
+        'fecha_inicio': fecha_inicio,
+        'color_id': color_id,
+        'es_importante': 1 <= prioridad <= 4, # 1-4 es prioridad alta en RFC 5545
+        'minutos_aviso': _minutos_alarma(vevent["VALARM"]),
+        'duracion_minutos': _minutos_evento(vevent, fecha_inicio),
+        'regla_recurrencia': regla,
+        'excepciones_recurrencia': ",".join(sorted(formatear_excepcion(f) for f in excepciones)) if regla and excepciones else None,
+        'uid': valor("UID") or None,
+        'fecha_original': fecha_original,
+    }
+
+
+def importar_ics(ruta, usuario_id, dao=None, progreso=None, cancelado=None):
+    """
+    Importa un .ics en transacciones de TAM_LOTE_IMPORTACION eventos.
+    progreso(fraccion) informa del avance y si cancelado() devuelve True se para
+    tras el último lote confirmado (lanza OperacionCancelada con lo importado).
+    Devuelve (importados, descartados).
+    """
+    dao = dao or EventosDAO()
+    colores = ColoresDAO().obtener_catalogo()
+    total = os.path.getsize(ruta) or 1
+    descartados = 0
+    simplificados = 0
+    importados = 0
+
+    def eventos():
+        nonlocal descartados, simplificados
+        series_vistas = set()
+        # Ocurrencias modificadas (RECURRENCE-ID) que llegan antes que su serie: se apartan
+        # en un fichero temporal, no en memoria, hasta que hayan pasado todas las series
+        with open(ruta, "rb") as fichero, tempfile.TemporaryFile("w+", encoding="utf-8") as diferidas:
+            for vevent in leer_vevents(fichero, progreso=lambda b: progreso and progreso(b / total)):
+                evento = convertir_vevent(vevent, colores)
+                if evento is None:
+                    descartados += 1
+                    continue
+                if "RRULE" in vevent and not evento['regla_recurrencia']:
+                    simplificados += 1 # Regla no soportada (BYDAY...): solo la primera ocurrencia
+                if evento['regla_recurrencia'] and evento['uid']:
+                    series_vistas.add(evento['uid'])
+                elif evento['fecha_original'] and evento['uid'] not in series_vistas:
+                    diferidas.write(a_json(evento) + "\n") # Si entrara ya, la serie la duplicaría al expandirse
+                    continue
+                yield evento
+            # Al final del fichero ya han pasado todas las series: se enlazan a la suya (o van sueltas)
+            diferidas.seek(0)
+            for linea in diferidas:
+                yield de_json(linea)
+
+    lotes = dao.importar(usuario_id, eventos(), TAM_LOTE_IMPORTACION)
+    try:
+        for importados in lotes:
+            if cancelado and cancelado():
+                raise OperacionCancelada(importados)
+    finally:
+        lotes.close() # Al cancelar, cierra la conexión sin tocar los lotes ya confirmados
+    if descartados:
+        logging.warning(f"Importación .ics: {descartados} eventos sin fecha de inicio válida descartados.")
+    if simplificados:
+        logging.warning(f"Importación .ics: {simplificados} series con reglas no soportadas (BYDAY, BYMONTHDAY...) "
+                        "importadas solo con su primera ocurrencia.")
+    return importados, descartados
+
+
+# =================== Escritura ===================
+def _escapar(texto):
+    return (texto or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+
+
+def _plegar(linea):
+    """Pliega a 75 octetos como pide la RFC, sin partir caracteres UTF-8."""
+    datos = linea.encode("utf-8")
+    if len(datos) <= 75:
+        return linea + "\r\n"
+    partes = []
+    inicio = 0
+    limite = 75
+    while inicio < len(datos):
+        fin = min(inicio + limite, len(datos))
+        while fin < len(datos) and (datos[fin] & 0xC0) == 0x80: # No cortar en mitad de un carácter
+            fin -= 1
+        partes.append(datos[inicio:fin].decode("utf-8"))
+        inicio = fin
+        limite = 74 # Las continuaciones llevan un espacio delante
+    return "\r\n ".join(partes) + "\r\n"
+
+
+def _fecha_ics(fecha):
+    return fecha.strftime("%Y%m%dT%H%M%S")
+
+
+def vevent_a_lineas(evento, sello):
+    uid_serie = evento['serie_id'] or evento['id_evento']
+    lineas = [
+        "BEGIN:VEVENT",
+        f"UID:{uid_serie}@minicalendar",
+        f"DTSTAMP:{sello}",
+        f"DTSTART:{_fecha_ics(evento['fecha_inicio'])}",
+        f"SUMMARY:{_escapar(evento['titulo'])}",
+    ]
+    if evento.get('duracion_minutos'):
+        lineas.insert(4, f"DTEND:{_fecha_ics(evento['fecha_inicio'] + timedelta(minutes=evento['duracion_minutos']))}")
+    if evento['descripcion']:
+        lineas.append(f"DESCRIPTION:{_escapar(evento['descripcion'])}")
+    codigo = evento['color_db_string'] or ""
+    if "#" in codigo:
+        color_hex = ("#" + codigo.split("#")[-1]).upper()
+        lineas.append(f"X-MINICALENDAR-COLOR:{color_hex}")
+        if color_hex in HEX_A_CSS:
+            lineas.append(f"COLOR:{HEX_A_CSS[color_hex]}")
+    if evento['es_importante']:
+        lineas.append("PRIORITY:1")
+    if evento['serie_id'] and evento['fecha_original']:
+        lineas.append(f"RECURRENCE-ID:{_fecha_ics(evento['fecha_original'])}")
+    elif evento['regla_recurrencia']:
+        lineas.append(f"RRULE:{evento['regla_recurrencia']}")
+        excepciones = sorted(parsear_excepciones(evento['excepciones_recurrencia']))
+        if excepciones:
+            lineas.append("EXDATE:" + ",".join(_fecha_ics(f) for f in excepciones))
+    if evento['minutos_aviso']:
+        lineas += ["BEGIN:VALARM", "ACTION:DISPLAY", f"DESCRIPTION:{_escapar(evento['titulo'])}",
+                   f"TRIGGER:-PT{int(evento['minutos_aviso'])}M", "END:VALARM"]
+    lineas.append("END:VEVENT")
+    return lineas
+
+
+def exportar_ics(ruta, usuario_id, dao=None, progreso=None, cancelado=None):
+    """
+    Escribe todos los eventos del usuario en 'ruta' según salen del cursor de la BD.
+    Se escribe en un temporal que solo sustituye al destino si termina bien.
+    Devuelve el número de eventos exportados.
+    """
+    dao = dao or EventosDAO()
+    total = dao.contar_por_usuario(usuario_id) or 1
+    sello = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    temporal = ruta + ".parcial"
+    exportados = 0
+    filas = dao.iterar_por_usuario(usuario_id, TAM_LOTE_EXPORTACION)
+    try:
+        with open(temporal, "w", encoding="utf-8", newline="") as fichero:
+            fichero.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + _plegar(f"PRODID:{PRODID}") + "CALSCALE:GREGORIAN\r\n")
+            for evento in filas:
+                fichero.write("".join(_plegar(l) for l in vevent_a_lineas(evento, sello)))
+                exportados += 1
+                if exportados % TAM_LOTE_EXPORTACION == 0:
+                    if cancelado and cancelado():
+                        raise OperacionCancelada(exportados)
+                    if progreso:
+                        progreso(min(1.0, exportados / total))
+            fichero.write("END:VCALENDAR\r\n")
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    finally:
+        filas.close()
+    return exportados
@@ -0,0 +1,188 @@
+import bisect
+import logging
+from datetime import datetime, timedelta
+
+from logic.almacen_eventos import MINUTOS_DIA, a_minutos
+
+MINUTOS_INSTANTANEO = 1  # un evento sin duración ocupa su minuto (mismo criterio que el efecto dominó)
+DURACION_POR_DEFECTO = 60  # minutos de un evento nuevo y del hueco que se le busca
+
+
+def duracion_evento(evento):
+    return int(evento.get('duracion_minutos') or 0)
+
+
+def fin_evento(evento):
+    """Fecha de fin del evento (igual al inicio si no tiene duración)."""
+    return evento['fecha_inicio'] + timedelta(minutes=duracion_evento(evento))
+
+
+def de_minutos(minutos):
+    """Inversa de a_minutos."""
+    dias, resto = divmod(minutos, MINUTOS_DIA)
+    return datetime.fromordinal(dias) + timedelta(minutes=resto)
+
+
+class _Nodo:
+    __slots__ = ("centro", "por_inicio", "por_fin", "izquierda", "derecha")
+
+
+class ArbolIntervalos:
+    """
+    Árbol de intervalos centrado de los eventos cargados, en minutos y semiabiertos
+    [inicio, fin). Se construye una vez por ventana de eventos y no se modifica
+    (el árbol en sí, la primera vez que se consulta).
+
+    - solapados(inicio, fin): los eventos que pisan el rango, en O(log n + k): los que
+      contienen 'inicio' salen del árbol y los que empiezan dentro del rango de una
+      búsqueda binaria en los inicios ordenados.
+    - siguiente_hueco(desde, duracion, hasta): primer hueco libre de 'duracion' minutos,
+      recorriendo los bloques ocupados (intervalos ya fusionados) desde una búsqueda binaria.
+    - conflictos(): ids de los eventos con duración que se solapan con otro.
+    """
+
+    def __init__(self, eventos):
+        self.eventos = list(eventos)
+        intervalos = []
+        for k, e in enumerate(self.eventos):
+            inicio = a_minutos(e['fecha_inicio'])
+            intervalos.append((inicio, inicio + max(duracion_evento(e), MINUTOS_INSTANTANEO), k))
+        intervalos.sort()
+        self.intervalos = intervalos
+        self.inicios = [i[0] for i in intervalos]
+        self._raiz = None # El árbol se construye con la primera consulta de solapados()
+
+        # Bloques ocupados: intervalos fusionados, disjuntos y ordenados
+        self.bloques_inicio, self.bloques_fin = [], []
+        for inicio, fin, _ in intervalos:
+            if self.bloques_fin and inicio <= self.bloques_fin[-1]:
+                self.bloques_fin[-1] = max(self.bloques_fin[-1], fin)
+            else:
+                self.bloques_inicio.append(inicio)
+                self.bloques_fin.append(fin)
+        self._conflictos = None
+
+    def __len__(self):
+        return len(self.eventos)
+
+    @property
+    def raiz(self):
+        if self._raiz is None and self.intervalos:
+            self._raiz = self._construir(self.intervalos)
+        return self._raiz
+
+    def _construir(self, intervalos):
+        # 'intervalos' llega ordenado por inicio. El centro es el inicio del mediano: a cada
+        # lado queda como mucho la mitad, así que la profundidad es O(log n)
+        if not intervalos:
+            return None
+        centro = intervalos[len(intervalos) // 2][0]
+        izquierda, propios, derecha = [], [], []
+        for intervalo in intervalos:
+            if intervalo[1] <= centro:
+                izquierda.append(intervalo)
+            elif intervalo[0] > centro:
+                derecha.append(intervalo)
+            else:
+                propios.append(intervalo)
+        nodo = _Nodo()
+        nodo.centro = centro
+        nodo.por_inicio = propios
+        nodo.por_fin = sorted(propios, key=lambda i: i[1], reverse=True)
+        nodo.izquierda = self._construir(izquierda)
+        nodo.derecha = self._construir(derecha)
+        return nodo
+
+    def _que_contienen(self, minuto):
+        """Índices de los intervalos con inicio <= minuto < fin."""
+        encontrados = []
+        nodo = self.raiz
+        while nodo is not None:
+            if minuto < nodo.centro:
+                for inicio, _, k in nodo.por_inicio:
+                    if inicio > minuto:
+                        break
+                    encontrados.append(k)
+                nodo = nodo.izquierda
+            elif minuto > nodo.centro:
+                for _, fin, k in nodo.por_fin:
+                    if fin <= minuto:
+                        break
+                    encontrados.append(k)
+                nodo = nodo.derecha
+            else:
+                encontrados.extend(k for _, _, k in nodo.por_inicio)
+                break
+        return encontrados
+
+    # =================== Consultas ===================
+    def solapados(self, inicio, fin):
+        """Eventos que ocupan algún minuto de [inicio, fin), ordenados por inicio."""
+        m_ini, m_fin = a_minutos(inicio), max(a_minutos(fin), a_minutos(inicio) + MINUTOS_INSTANTANEO)
+        indices = self._que_contienen(m_ini)
+        i = bisect.bisect_right(self.inicios, m_ini)
+        j = bisect.bisect_left(self.inicios, m_fin)
+        indices.extend(self.intervalos[p][2] for p in range(i, j))
+        return sorted((self.eventos[k] for k in indices), key=lambda e: e['fecha_inicio'])
+
+    def siguiente_hueco(self, desde, duracion, hasta=None):
+        """Primera fecha >= desde en la que caben 'duracion' minutos sin pisar ningún evento (None si no cabe antes de 'hasta')."""
+        m = a_minutos(desde)
+        necesario = max(int(duracion), MINUTOS_INSTANTANEO)
+        limite = a_minutos(hasta) if hasta is not None else None
+        b = bisect.bisect_right(self.bloques_inicio, m) - 1
+        if b >= 0 and self.bloques_fin[b] > m:
+            m = self.bloques_fin[b] # 'desde' cae dentro de un bloque ocupado
+        b += 1
+        while b < len(self.bloques_inicio) and self.bloques_inicio[b] < m + necesario:
+            m = self.bloques_fin[b]
+            b += 1
+        if limite is not None and m + necesario > limite:
+            return None
+        # Sin segundos: 'desde' solo se conserva tal cual si ya era libre
+        return desde if m == a_minutos(desde) else de_minutos(m)
+
+    def conflictos(self):
+        """ids (id(evento)) de los eventos con duración que se solapan con otro con duración."""
+        if self._conflictos is None:
+            conflictos = set()
+            fin_maximo, dueno = None, None
+            for inicio, fin, k in self.intervalos:
+                if not duracion_evento(self.eventos[k]):
+                    continue # Los instantáneos (recordatorios, cumpleaños...) no chocan con nada
+                if fin_maximo is not None and inicio < fin_maximo:
+                    conflictos.add(id(self.eventos[k]))
+                    conflictos.add(id(self.eventos[dueno]))
+                if fin_maximo is None or fin > fin_maximo:
+                    fin_maximo, dueno = fin, k
+            self._conflictos = conflictos
+        return self._conflictos
+
+
+if __name__ == '__main__':
+    # Benchmark rápido: las consultas deben mantenerse planas al crecer el número de eventos.
+    import random
+    import time
+
+    logging.basicConfig(level=logging.INFO)
+    for n in (1_000, 10_000, 100_000, 300_000):
+        base = datetime(2020, 1, 1)
+        eventos = [{
+            'id_evento': k,
+            'fecha_inicio': base + timedelta(minutes=random.randrange(0, 60 * 24 * 365 * 8)),
+            'duracion_minutos': random.choice([0, 30, 60, 90]),
+        } for k in range(n)]
+
+        t0 = time.perf_counter()
+        arbol = ArbolIntervalos(eventos)
+        arbol.raiz
+        t_carga = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for _ in range(100):
+            dia = base + timedelta(days=random.randrange(0, 365 * 8))
+            arbol.solapados(dia.replace(hour=10), dia.replace(hour=12))
+            arbol.siguiente_hueco(dia.replace(hour=9), 60, dia.replace(hour=23, minute=59))
+        t_consulta = (time.perf_counter() - t0) / 100
+
+        logging.info(f"n={n:>7} carga={t_carga * 1000:.1f} ms consulta={t_consulta * 1e6:.0f} µs")
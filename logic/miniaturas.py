@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal, QSize, Qt
+from PyQt5.QtGui import QImage, QImageReader
+
+from logic.adjuntos import TAM_BLOQUE
+
+# PyMuPDF es opcional: sin él los PDF simplemente no tienen miniatura
+try:
+    import fitz
+    PDF_OK = True
+except ImportError:
+    PDF_OK = False
+
+CARPETA_MINIATURAS = "cache_miniaturas"
+TAM_MINIATURA = 160
+MAX_BYTES_CACHE = 50 * 1024 * 1024  # 50 MB en disco como máximo
+EXTENSIONES_IMAGEN = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+EXTENSIONES_PDF = {".pdf"}
+
+
+def admite_miniatura(ruta):
+    extension = os.path.splitext(ruta or "")[1].lower()
+    return extension in EXTENSIONES_IMAGEN or (PDF_OK and extension in EXTENSIONES_PDF)
+
+
+def _es_hash(texto):
+    return len(texto) == 64 and all(c in "0123456789abcdef" for c in texto)
+
+
+class CacheMiniaturas:
+    """
+    Caché LRU en disco de miniaturas PNG, indexada por el hash del contenido del adjunto.
+
+    El orden LRU es la fecha de modificación de cada PNG (se "toca" en cada acierto),
+    y al superar MAX_BYTES_CACHE se borran las más antiguas.
+    """
+
+    def __init__(self, carpeta=CARPETA_MINIATURAS, max_bytes=MAX_BYTES_CACHE):
+        self.carpeta = carpeta
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hashes = {}        # ruta de adjunto -> hash (para adjuntos antiguos con nombre no direccionado)
+        self._tamanios = None    # nombre PNG -> bytes (se carga perezosamente en el hilo de trabajo)
+
+    def hash_conocido(self, ruta):
+        """Hash del adjunto sin tocar el disco: el nombre en el almacén ya es el hash, o ya se calculó antes."""
+        base = os.path.splitext(os.path.basename(ruta.replace("\\", "/")))[0]
+        if _es_hash(base):
+            return base
+        with self._lock:
+            return self._hashes.get(ruta)
+
+    def calcular_hash(self, ruta):
+        """Lee el archivo completo: solo desde el hilo de trabajo."""
+        sha = hashlib.sha256()
+        with open(ruta, "rb") as f:
+            for bloque in iter(lambda: f.read(TAM_BLOQUE), b""):
+                sha.update(bloque)
+        with self._lock:
+            self._hashes[ruta] = sha.hexdigest()
+        return sha.hexdigest()
+
+    def ruta_png(self, hash_contenido, tam=TAM_MINIATURA):
+        return os.path.join(self.carpeta, f"{hash_contenido}_{tam}.png")
+
+    def buscar(self, ruta_adjunto, tam=TAM_MINIATURA):
+        """Ruta del PNG si ya existe en caché (barato: apto para el hilo de la interfaz) o None."""
+        hash_contenido = self.hash_conocido(ruta_adjunto)
+        if not hash_contenido:
+            return None
+        png = self.ruta_png(hash_contenido, tam)
+        if not os.path.exists(png):
+            return None
+        try:
+            os.utime(png) # Marca de uso para el LRU
+        except OSError:
+            pass
+        return png
+
+    def guardar(self, hash_contenido, imagen, tam=TAM_MINIATURA):
+        os.makedirs(self.carpeta, exist_ok=True)
+        png = self.ruta_png(hash_contenido, tam)
+        if not imagen.save(png, "PNG"):
+            return None
+        with self._lock:
+            self._cargar_tamanios()
+            self._tamanios[os.path.basename(png)] = os.path.getsize(png)
+            self._recortar()
+        return png
+
+    def _cargar_tamanios(self):
+        if self._tamanios is not None:
+            return
+        self._tamanios = {}
+        if os.path.isdir(self.carpeta):
+            for nombre in os.listdir(self.carpeta):
+                if nombre.endswith(".png"):
+                    self._tamanios[nombre] = os.path.getsize(os.path.join(self.carpeta, nombre))
+
+    def _recortar(self):
+        total = sum(self._tamanios.values())
+        if total <= self.max_bytes:
+            return
+        # Las menos usadas primero (mtime más antiguo)
+        por_uso = sorted(self._tamanios, key=lambda n: os.path.getmtime(os.path.join(self.carpeta, n)))
+        for nombre in por_uso:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.carpeta, nombre))
+            except OSError:
+                pass
+            total -= self._tamanios.pop(nombre)
+
+
+def generar_miniatura(ruta, tam=TAM_MINIATURA):
+    """Decodifica el adjunto ya reducido (QImageReader escala al leer) y devuelve un QImage, o None."""
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in EXTENSIONES_PDF:
+        if not PDF_OK:
+            return None
+        with fitz.open(ruta) as doc:
+            pagina = doc.load_page(0)
+            escala = tam / max(pagina.rect.width, pagina.rect.height)
+            pix = pagina.get_pixmap(matrix=fitz.Matrix(escala, escala))
+            return QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888).copy()
+
+    lector = QImageReader(ruta)
+    lector.setAutoTransform(True)
+    original = lector.size()
+    if original.isValid():
+        lector.setScaledSize(original.scaled(QSize(tam, tam), Qt.KeepAspectRatio))
+    imagen = lector.read()
+    return None if imagen.isNull() else imagen
+
+
+class GeneradorMiniaturas(QThread):
+    """
+    Hilo único y compartido que genera miniaturas bajo demanda.
+
+    La interfaz solo llama a buscar() (comprobación en disco) y a solicitar();
+    el hash de adjuntos antiguos y la decodificación se hacen aquí, nunca en el
+    hilo de la interfaz.
+    """
+    miniatura_lista = pyqtSignal(str, str)  # ruta_adjunto, ruta_png
+
+    _instancia = None
+
+    @classmethod
+    def instancia(cls):
+        if cls._instancia is None:
+            cls._instancia = cls()
+            cls._instancia.start()
+        return cls._instancia
+
+    def __init__(self, cache=None):
+        super().__init__()
+        self.cache = cache or CacheMiniaturas()
+        self._cola = queue.Queue()
+        self._pendientes = set()
+        self._lock = threading.Lock()
+
+    def buscar(self, ruta_adjunto):
+        return self.cache.buscar(ruta_adjunto)
+
+    def solicitar(self, ruta_adjunto):
+        if not admite_miniatura(ruta_adjunto):
+            return
+        with self._lock:
+            if ruta_adjunto in self._pendientes:
+                return
+            self._pendientes.add(ruta_adjunto)
+        self._cola.put(ruta_adjunto)
+
+    def detener(self):
+        self._cola.put(None)
+        self.wait(2000)
+
+    def run(self):
+        while True:
+            ruta = self._cola.get()
+            if ruta is None:
+                return
+            try:
+                png = self._procesar(ruta)
+                if png:
+                    self.miniatura_lista.emit(ruta, png)
+            except Exception as e:
+                logging.warning(f"No se pudo generar la miniatura de {ruta}: {e}")
+            finally:
+                with self._lock:
+                    self._pendientes.discard(ruta)
+
+    def _procesar(self, ruta):
+        if not os.path.exists(ruta):
+            return None
+        hash_contenido = self.cache.hash_conocido(ruta) or self.cache.calcular_hash(ruta)
+        png = self.cache.buscar(ruta)
+        if png:
+            return png
+        imagen = generar_miniatura(ruta)
+        if imagen is None:
+            return None
+        return self.cache.guardar(hash_contenido, imagen)
@@ -0,0 +1,473 @@
+import itertools
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from database.dao import EventosDAO, ColoresDAO, es_error_de_conexion
+from logic.adjuntos import AlmacenAdjuntos
+from logic.calendarios import calendario_de
+from logic.diario import DiarioOffline, ruta_diario
+from logic.sesion import desconectar, soltar_hilo
+from utils.excepciones import desplazar_excepciones, formatear_excepcion
+
+INTERVALO_REINTENTO = 15  # segundos entre intentos de reproducir el diario sin conexión
+TAM_LOTE = 200            # operaciones del diario por transacción al reconectar
+
+# Operación -> clave de sus argumentos con el evento existente al que afecta (para detectar conflictos)
+OBJETIVO_OPERACION = {
+    'guardar': 'id_evento',
+    'eliminar': 'id_evento',
+    'mover': 'id_evento',
+    'mover_serie': 'serie_id',
+    'excluir_ocurrencia': 'serie_id',
+    'desprender_ocurrencia': 'serie_id',
+}
+# Las acciones en bloque afectan a una lista de eventos: no tienen un único objetivo y
+# en la reproducción del diario no se comprueban conflictos (gana el último en escribir)
+
+
+def _objetivos(operacion, args):
+    """Ids de los eventos que toca una operación (para leer sus versiones nuevas)."""
+    if operacion == 'bloque':
+        return list(args['ids']) + [serie_id for serie_id, _ in args.get('excluir', ())]
+    clave = OBJETIVO_OPERACION.get(operacion)
+    return [args[clave]] if clave and args.get(clave) is not None else []
+
+
+def _dias_de(*fechas):
+    return {f.date() for f in fechas if isinstance(f, datetime)}
+
+
+class HiloMutaciones(QThread):
+    """Ejecuta en orden (FIFO) las escrituras en la BD, fuera del hilo de la interfaz."""
+    resultado = pyqtSignal(int, str, object)  # id_trabajo, 'ok' | 'offline' | 'error', resultados o mensaje
+
+    def __init__(self, procesar, en_reposo):
+        super().__init__()
+        self._procesar = procesar
+        self._en_reposo = en_reposo # Se llama cada INTERVALO_REINTENTO segundos sin trabajo
+        self._cola = queue.Queue()
+
+    def encolar(self, id_trabajo, operaciones):
+        self._cola.put((id_trabajo, operaciones))
+
+    def detener(self):
+        self._cola.put(None)
+        self.wait(5000)
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def run(self):
+        while True:
+            try:
+                trabajo = self._cola.get(timeout=INTERVALO_REINTENTO)
+            except queue.Empty:
+                self._en_reposo()
+                continue
+            if trabajo is None:
+                return
+            id_trabajo, operaciones = trabajo
+            try:
+                estado, resultado = self._procesar(operaciones)
+                self.resultado.emit(id_trabajo, estado, resultado)
+            except Exception as e:
+                logging.error(f"Fallo persistiendo mutación {id_trabajo}: {e}", exc_info=True)
+                self.resultado.emit(id_trabajo, 'error', str(e))
+
+
+class PipelineMutaciones(QObject):
+    """
+    Mutaciones optimistas sobre la lista local de eventos.
+
+    Cada cambio se aplica primero en memoria (y la vista repinta solo los días
+    afectados), después se persiste en segundo plano. Las escrituras se describen
+    como operaciones serializables [(operacion, argumentos), ...] para poder
+    guardarlas en el diario sin conexión. Si el servidor confirma, se reconcilian
+    los ids temporales con los reales (lastrowid) y cualquier ajuste del servidor;
+    si falla, se deshace el cambio local; si no hay conexión, el cambio local se
+    queda y las operaciones se reproducen al volver la conexión.
+    """
+    cambio_local = pyqtSignal(object)        # set de fechas (date) afectadas, o None = todo
+    mutacion_confirmada = pyqtSignal(str)    # descripción
+    mutacion_fallida = pyqtSignal(str, str)  # descripción, mensaje de error
+    sin_conexion = pyqtSignal(int)           # operaciones pendientes en el diario
+    diario_reproducido = pyqtSignal(object)  # informe: {'aplicadas', 'conflictos', 'descartadas', 'pendientes'}
+
+    def __init__(self, obtener_eventos, usuario_id, dao=None, diario=None):
+        super().__init__()
+        self.obtener_eventos = obtener_eventos # Devuelve la lista base actual (cambia al recargar)
+        self.dao = dao or EventosDAO()
+        self.dao_colores = ColoresDAO()
+        self.almacen_adjuntos = AlmacenAdjuntos(dao=self.dao)
+        self.diario = diario if diario is not None else DiarioOffline(ruta_diario(usuario_id)) # Un diario vacío es falso (len 0)
+        self._ids_trabajo = itertools.count(1)
+        # Los ids temporales no se reutilizan entre sesiones mientras queden operaciones en el diario
+        self._ids_temporales = itertools.count(min(-1, self.diario.menor_id_temporal() - 1), -1)
+        self._ids_reales = self.diario.ids_reales() # id temporal -> id real (lo escribe el hilo de trabajo)
+        self._lock = threading.Lock()
+        self._trabajos = {}   # id_trabajo -> (descripcion, deshacer, reconciliar, dias, filas)
+        # (fila, ¿sigue en la lista?) de cada fila tocada en local, para los índices que se
+        # actualizan por cambios (ver tomar_filas_tocadas)
+        self._filas_tocadas = []
+
+        self.hilo = HiloMutaciones(self._procesar, self.reproducir_diario)
+        self.hilo.resultado.connect(self._al_terminar)
+        self.hilo.start()
+
+    def detener(self):
+        self.hilo.detener()
+
+    def cerrar(self):
+        """
+        Fin de sesión: lo ya encolado se termina de escribir (sin conexión, queda en el
+        diario en disco) sin avisar a nadie, y el diario se cierra cuando acaba el hilo.
+        """
+        desconectar(self.cambio_local, self.mutacion_confirmada, self.mutacion_fallida,
+                    self.sin_conexion, self.diario_reproducido)
+        self.hilo.finished.connect(self.diario.cerrar)
+        self.hilo.detener()
+        soltar_hilo(self.hilo, self.hilo.resultado)
+        self._trabajos.clear() # Sus deshacer / reconciliar apuntan a la ventana que se cierra
+        if not self.hilo.isRunning():
+            self.diario.cerrar()
+
+    def ocupado(self):
+        return bool(self._trabajos)
+
+    def pendientes_offline(self):
+        return len(self.diario)
+
+    # =================== Ids temporales ===================
+    def nuevo_id_temporal(self):
+        return next(self._ids_temporales)
+
+    def id_real(self, id_evento, ids_nuevos=None):
+        """Traduce un id temporal al real. Se usa en el hilo de trabajo."""
+        if ids_nuevos and id_evento in ids_nuevos:
+            return ids_nuevos[id_evento]
+        with self._lock:
+            return self._ids_reales.get(id_evento, id_evento)
+
+    def registrar_ids_reales(self, ids_nuevos):
+        with self._lock:
+            self._ids_reales.update(ids_nuevos)
+
+    # =================== Operaciones locales ===================
+    def tomar_filas_tocadas(self):
+        """Las filas insertadas, cambiadas o quitadas desde la última llamada, en orden: [(fila, presente)]."""
+        filas, self._filas_tocadas = self._filas_tocadas, []
+        return filas
+
+    def _tocar(self, filas, presente=True):
+        self._filas_tocadas.extend((fila, presente) for fila in filas)
+
+    def _buscar(self, id_evento):
+        return next((e for e in self.obtener_eventos() if e['id_evento'] == id_evento), None)
+
+    def insertar_local(self, evento):
+        eventos = self.obtener_eventos()
+        eventos.append(evento)
+        self._tocar([evento])
+        def deshacer():
+            if evento in eventos:
+                eventos.remove(evento)
+            self._tocar([evento], False)
+            return _dias_de(evento['fecha_inicio'])
+        return deshacer, _dias_de(evento['fecha_inicio'])
+
+    def actualizar_local(self, id_evento, campos):
+        evento = self._buscar(id_evento)
+        if evento is None:
+            return (lambda: set()), set()
+        anteriores = {k: evento.get(k) for k in campos}
+        dias = _dias_de(evento['fecha_inicio'], campos.get('fecha_inicio'))
+        if evento.get('regla_recurrencia') or campos.get('regla_recurrencia'):
+            dias = None # Una serie puede aparecer en cualquier día: repintado completo
+        evento.update(campos)
+        self._tocar([evento])
+        def deshacer():
+            evento.update(anteriores)
+            self._tocar([evento])
+            return dias
+        return deshacer, dias
+
+    def eliminar_local(self, id_evento):
+        eventos = self.obtener_eventos()
+        # La serie se lleva consigo sus ocurrencias sobrescritas (igual que en la BD)
+        quitados = [e for e in eventos if e['id_evento'] == id_evento or e.get('serie_id') == id_evento]
+        dias = set()
+        for e in quitados:
+            eventos.remove(e)
+            dias |= _dias_de(e['fecha_inicio'])
+            if e.get('regla_recurrencia'):
+                dias = None
+                break
+        self._tocar(quitados, False)
+        def deshacer():
+            eventos.extend(q for q in quitados if q not in eventos)
+            self._tocar(quitados)
+            return dias
+        return deshacer, dias
+
+    def excluir_local(self, serie_id, fecha_original):
+        """Equivalente local de EventosDAO.excluir_ocurrencia()."""
+        serie = self._buscar(serie_id)
+        if serie is None:
+            return (lambda: set()), set()
+        excepciones = ",".join(filter(None, [serie.get('excepciones_recurrencia'), formatear_excepcion(fecha_original)]))
+        return self.actualizar_local(serie_id, {'excepciones_recurrencia': excepciones})
+
+    def mover_serie_local(self, serie_id, nuevo_inicio):
+        """Equivalente local de EventosDAO.mover_serie(): las excepciones y las ocurrencias sobrescritas van con la serie."""
+        serie = self._buscar(serie_id)
+        if serie is None:
+            return (lambda: set()), set()
+        delta = nuevo_inicio - serie['fecha_inicio']
+        cambios = [self.actualizar_local(serie_id, {
+            'fecha_inicio': nuevo_inicio,
+            'excepciones_recurrencia': desplazar_excepciones(serie.get('excepciones_recurrencia'), delta),
+        })]
+        if delta:
+            cambios += [self.actualizar_local(e['id_evento'], {'fecha_original': e['fecha_original'] + delta})
+                        for e in self.obtener_eventos() if e.get('serie_id') == serie_id and e.get('fecha_original')]
+        return self.combinar(*cambios)
+
+    def mover_local(self, cambios):
+        """Aplica [(id_evento, nueva_fecha), ...] y devuelve (deshacer, dias)."""
+        return self.combinar(*(self.actualizar_local(id_evento, {'fecha_inicio': fecha})
+                               for id_evento, fecha in cambios))
+
+    def ripple_local(self, id_evento, nueva_fecha):
+        """Previsualiza en local la misma cascada que calculará el servidor."""
+        fin_rango = datetime.combine(nueva_fecha.date() + timedelta(days=2), datetime.min.time())
+        # Como en el servidor, la cascada solo empuja eventos del mismo calendario
+        calendario = calendario_de(self._buscar(id_evento) or {})
+        posteriores = sorted(
+            (e for e in self.obtener_eventos()
+             if e['id_evento'] != id_evento and not e.get('regla_recurrencia') and calendario_de(e) == calendario
+             and nueva_fecha <= e['fecha_inicio'] < fin_rango),
+            key=lambda e: (e['fecha_inicio'], e['titulo'], e['id_evento'])
+        )
+        cascada = EventosDAO.calcular_ripple([(e['id_evento'], e['fecha_inicio'], e.get('duracion_minutos', 0)) for e in posteriores],
+                                             nueva_fecha, (self._buscar(id_evento) or {}).get('duracion_minutos', 0))
+        return self.mover_local([(id_evento, nueva_fecha)] + cascada)
+
+    def bloque_local(self, ids, accion, valor=None, excluir=()):
+        """Equivalente local de EventosDAO.actualizar_en_bloque()."""
+        if accion == 'eliminar':
+            cambios = [self.eliminar_local(i) for i in ids]
+            cambios += [self.excluir_local(serie_id, fecha) for serie_id, fecha in excluir]
+            return self.combinar(*cambios)
+        cambios = []
+        for id_evento in ids:
+            evento = self._buscar(id_evento)
+            if evento is None:
+                continue
+            if accion in ('desplazar', 'mover_a'):
+                if accion == 'desplazar':
+                    nueva_fecha = evento['fecha_inicio'] + timedelta(days=valor)
+                else:
+                    nueva_fecha = datetime.combine(valor.date(), evento['fecha_inicio'].time())
+                if evento.get('regla_recurrencia'):
+                    cambios.append(self.mover_serie_local(id_evento, nueva_fecha))
+                    continue
+                campos = {'fecha_inicio': nueva_fecha}
+            elif accion == 'color':
+                campos = {'color_db_string': valor}
+            elif accion == 'importante':
+                campos = {'es_importante': valor}
+            else: # 'aviso'
+                campos = {'minutos_aviso': valor}
+            cambios.append(self.actualizar_local(id_evento, campos))
+        return self.combinar(*cambios)
+
+    @staticmethod
+    def combinar(*cambios):
+        """Une varios (deshacer, dias) en uno solo; se deshacen en orden inverso."""
+        dias = set()
+        for _, d in cambios:
+            dias = None if d is None or dias is None else dias | d
+        def deshacer_todo():
+            for deshacer, _ in reversed(cambios):
+                deshacer()
+            return dias
+        return deshacer_todo, dias
+
+    # =================== Ejecución ===================
+    def ejecutar(self, descripcion, cambio_local, operaciones, reconciliar=None):
+        """
+        cambio_local() -> (deshacer, dias): se ejecuta ya, en el hilo de la interfaz.
+        operaciones: [(operacion, argumentos), ...], se aplican en el hilo de trabajo.
+        reconciliar(resultados) -> dias: de vuelta en la interfaz, si el servidor confirma.
+        """
+        # La versión de cada evento afectado se toma ahora, antes del cambio: es la base
+        # contra la que se detectan conflictos si hay que reproducirlo más tarde.
+        con_version = []
+        for operacion, args in operaciones:
+            objetivo = args.get(OBJETIVO_OPERACION.get(operacion))
+            evento = self._buscar(objetivo) if objetivo is not None else None
+            con_version.append((operacion, args, evento.get('version') if evento else None))
+
+        desde = len(self._filas_tocadas)
+        deshacer, dias = cambio_local()
+        id_trabajo = next(self._ids_trabajo)
+        self._trabajos[id_trabajo] = (descripcion, deshacer, reconciliar, dias, self._filas_tocadas[desde:])
+        self.cambio_local.emit(dias)
+        self.hilo.encolar(id_trabajo, con_version)
+        return id_trabajo
+
+    def _al_terminar(self, id_trabajo, estado, resultado):
+        descripcion, deshacer, reconciliar, dias, filas = self._trabajos.pop(id_trabajo)
+        if estado == 'ok':
+            resultados, versiones = resultado
+            if reconciliar:
+                self._filas_tocadas.extend(filas) # Pueden pasar de su id temporal al real
+                dias_servidor = reconciliar(resultados)
+                if dias_servidor != set():
+                    self.cambio_local.emit(dias_servidor)
+            # Versiones nuevas de lo que acabamos de escribir: base para futuros conflictos
+            for evento in self.obtener_eventos():
+                if evento['id_evento'] in versiones:
+                    evento['version'] = versiones[evento['id_evento']]
+            self.mutacion_confirmada.emit(descripcion)
+        elif estado == 'offline':
+            # El cambio local se queda: se enviará al volver la conexión
+            self.sin_conexion.emit(resultado)
+        else:
+            self.cambio_local.emit(deshacer())
+            self.mutacion_fallida.emit(descripcion, resultado)
+
+    # =================== Hilo de trabajo ===================
+    def aplicar_operacion(self, operacion, args, ids_nuevos):
+        """Traduce una operación del pipeline a llamadas al DAO. Devuelve su resultado."""
+        real = lambda clave: self.id_real(args[clave], ids_nuevos)
+        if operacion == 'guardar':
+            datos = dict(args['datos'])
+            datos['color_id'] = self.dao_colores.obtener_id_por_hex(datos.pop('color_hex'))
+            if not datos['color_id']:
+                raise Exception("El color seleccionado no se encontró en la base de datos.")
+            if datos.get('serie_id') is not None:
+                datos['serie_id'] = self.id_real(datos['serie_id'], ids_nuevos)
+            if args['modo'] == 'crear':
+                ids_nuevos[args['id_temporal']] = self.dao.guardar(datos, 'crear')
+                return ids_nuevos[args['id_temporal']]
+            return self.dao.guardar(datos, 'editar', real('id_evento'))
+        if operacion == 'eliminar':
+            return self.dao.eliminar(real('id_evento'))
+        if operacion == 'mover':
+            return self.dao.actualizar_fecha_evento_con_ripple(real('id_evento'), args['nueva_fecha'])
+        if operacion == 'mover_serie':
+            return self.dao.mover_serie(real('serie_id'), args['nuevo_inicio'])
+        if operacion == 'excluir_ocurrencia':
+            return self.dao.excluir_ocurrencia(real('serie_id'), args['fecha_original'])
+        if operacion == 'desprender_ocurrencia':
+            ids_nuevos[args['id_temporal']] = self.dao.desprender_ocurrencia(real('serie_id'), args['fecha_original'], args['nueva_fecha'])
+            return ids_nuevos[args['id_temporal']]
+        if operacion == 'bloque':
+            valor = args.get('valor')
+            if args['accion'] == 'color':
+                valor = self.dao_colores.obtener_id_por_hex(valor)
+                if not valor:
+                    raise Exception("El color seleccionado no se encontró en la base de datos.")
+            return self.dao.actualizar_en_bloque(
+                [self.id_real(i, ids_nuevos) for i in args['ids']], args['accion'], valor,
+                [(self.id_real(serie_id, ids_nuevos), fecha) for serie_id, fecha in args.get('excluir', ())]
+            )
+        if operacion == 'liberar_adjunto':
+            return self.almacen_adjuntos.liberar(args['ruta'])
+        raise ValueError(f"Operación desconocida: {operacion}")
+
+    def _procesar(self, operaciones):
+        """Aplica las operaciones de un trabajo; sin conexión, las anota en el diario."""
+        if len(self.diario):
+            # Ya hay cambios esperando: si la conexión ha vuelto se envían ya (sin esperar
+            # a que el hilo esté ocioso); si no, lo nuevo va detrás para respetar el orden
+            self.reproducir_diario()
+        if len(self.diario):
+            self.diario.anotar(operaciones)
+            return 'offline', len(self.diario)
+        resultados = []
+        ids_nuevos = {}
+        for i, (operacion, args, _) in enumerate(operaciones):
+            try:
+                resultados.append(self.aplicar_operacion(operacion, args, ids_nuevos))
+            except Exception as e:
+                if not es_error_de_conexion(e):
+                    raise
+                self.registrar_ids_reales(ids_nuevos)
+                for temporal, real in ids_nuevos.items():
+                    self.diario.registrar_id(temporal, real)
+                self.diario.anotar(operaciones[i:])
+                logging.warning(f"Sin conexión: {len(self.diario)} operaciones guardadas en el diario local.")
+                return 'offline', len(self.diario)
+            self.registrar_ids_reales(ids_nuevos)
+
+        objetivos = set(ids_nuevos.values())
+        for operacion, args, _ in operaciones:
+            objetivos.update(self.id_real(i) for i in _objetivos(operacion, args))
+        try:
+            versiones = self.dao.obtener_versiones_eventos([i for i in objetivos if i > 0])
+        except Exception:
+            versiones = {} # Lo escrito ya está confirmado; solo nos quedamos sin la versión nueva
+        return 'ok', (resultados, versiones)
+
+    def reproducir_diario(self):
+        """
+        Reenvía el diario al servidor en lotes de TAM_LOTE operaciones, cada lote en una
+        transacción. Antes de aplicar la primera operación sobre un evento se compara su
+        versión en el servidor con la que tenía al editarlo: si otro dispositivo lo ha
+        cambiado o borrado entretanto, gana el servidor y la operación se descarta.
+        """
+        informe = {'aplicadas': 0, 'conflictos': [], 'descartadas': []}
+        while len(self.diario):
+            lote = self.diario.pendientes(TAM_LOTE)
+            verificados = self.diario.verificados()
+            ids_nuevos = {}
+            nuevos_verificados = set()
+            aplicadas = 0
+            try:
+                with self.dao.lote():
+                    # Solo se comprueban eventos que ya existían en el servidor (id real); los
+                    # creados sin conexión no pueden haberse tocado desde otro dispositivo
+                    objetivos = {args.get(OBJETIVO_OPERACION.get(op)) for _, op, args, _ in lote}
+                    objetivos = {i for i in objetivos if isinstance(i, int) and i > 0}
+                    versiones = self.dao.obtener_versiones_eventos(list(objetivos))
+                    for id_op, operacion, args, version_base in lote:
+                        objetivo = args.get(OBJETIVO_OPERACION.get(operacion))
+                        if objetivo in objetivos and objetivo not in verificados | nuevos_verificados:
+                            if objetivo not in versiones:
+                                informe['conflictos'].append(f"{operacion} #{objetivo}: borrado en otro dispositivo")
+                                continue
+                            if version_base is not None and versiones[objetivo] > version_base:
+                                informe['conflictos'].append(f"{operacion} #{objetivo}: modificado en otro dispositivo")
+                                continue
+                            nuevos_verificados.add(objetivo)
+                        try:
+                            with self.dao.punto_guardado():
+                                self.aplicar_operacion(operacion, args, ids_nuevos)
+                            aplicadas += 1
+                        except Exception as e:
+                            if es_error_de_conexion(e):
+                                raise
+                            informe['descartadas'].append(f"{operacion}: {e}")
+            except Exception as e:
+                if not es_error_de_conexion(e):
+                    logging.error(f"Error reproduciendo el diario: {e}", exc_info=True)
+                break # Seguimos sin conexión: se reintentará más tarde
+
+            # El lote ya está en el servidor: ahora se refleja en el diario local
+            self.registrar_ids_reales(ids_nuevos)
+            for temporal, real in ids_nuevos.items():
+                self.diario.registrar_id(temporal, real)
+            self.diario.marcar_verificados(nuevos_verificados)
+            self.diario.confirmar(lote[-1][0])
+            informe['aplicadas'] += aplicadas
+
+        if informe['aplicadas'] or informe['conflictos'] or informe['descartadas']:
+            informe['pendientes'] = len(self.diario)
+            logging.info(f"Diario sin conexión reproducido: {informe}")
+            self.diario_reproducido.emit(informe)
@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.request
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from database.dao import EventosDAO
+from logic.servidor_notificaciones import ESPERA_MAXIMA
+
+INTERVALO_SONDEO = 30  # segundos entre lecturas del sello si no hay servidor de notificaciones
+ESPERA_REINTENTO = 10  # segundos antes de reintentar tras un fallo del servidor
+
+
+def _firma(calendarios):
+    """Lo que obliga a recargar todo si cambia: qué calendarios se ven, con qué permiso y color."""
+    return {(c['propietario_id'], c['permiso'], c.get('color')) for c in calendarios}
+
+
+class HiloCambios(QThread):
+    """
+    Vigila el sello de versión del usuario y, cuando cambia, descarga SOLO las filas
+    modificadas y los ids borrados desde la última versión vista.
+
+    Con NOTIF_URL definida espera por long-poll en el servidor de notificaciones
+    (el cambio llega en uno o dos segundos); si no, o si el servidor no responde,
+    lee el sello directamente de la BD cada INTERVALO_SONDEO segundos, que es una
+    consulta por clave primaria.
+
+    Cada calendario visible (el propio y los compartidos) lleva su propia versión; el
+    sello del usuario es su suma. Si se comparte o se deja de compartir un calendario,
+    o cambia su permiso, se emite calendarios_cambiados en lugar de los cambios sueltos.
+    """
+    cambios = pyqtSignal(list, list, int)  # filas, ids_borrados, versión
+    calendarios_cambiados = pyqtSignal()
+
+    def __init__(self, usuario_id, calendarios, dao=None, url=None):
+        super().__init__()
+        self.usuario_id = usuario_id
+        self.dao = dao or EventosDAO()
+        self.url = (url or os.getenv("NOTIF_URL") or "").rstrip("/")
+        self.token = os.getenv("NOTIF_TOKEN")
+        self._calendarios = list(calendarios or [])
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+
+    @property
+    def version(self):
+        with self._lock:
+            return sum(c['version'] for c in self._calendarios)
+
+    def reiniciar_version(self, calendarios):
+        """Tras una recarga completa: los cambios anteriores a esas versiones ya están en pantalla."""
+        if calendarios is None:
+            return
+        with self._lock:
+            self._calendarios = list(calendarios)
+
+    def detener(self):
+        self._parar.set()
+        self.wait(1000)
+
+    def run(self):
+        while not self._parar.is_set():
+            remota = self._esperar_version()
+            with self._lock:
+                anteriores = self._calendarios
+            desde = sum(c['version'] for c in anteriores)
+            if remota is None or remota <= desde or self._parar.is_set():
+                continue
+            try:
+                filas, borrados, calendarios = self.dao.obtener_cambios_visibles(
+                    self.usuario_id, {c['propietario_id']: c['version'] for c in anteriores}
+                )
+            except Exception as e:
+                logging.warning(f"No se pudieron descargar los cambios: {e}")
+                self._parar.wait(ESPERA_REINTENTO)
+                continue
+            with self._lock:
+                if self._calendarios is not anteriores:
+                    continue # Hubo una recarga completa mientras tanto
+                self._calendarios = calendarios
+            if _firma(calendarios) != _firma(anteriores):
+                self.calendarios_cambiados.emit()
+            elif filas or borrados:
+                self.cambios.emit(filas, borrados, sum(c['version'] for c in calendarios))
+
+    def _esperar_version(self):
+        if self.url:
+            try:
+                return self._long_poll()
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                logging.warning(f"Servidor de notificaciones no disponible ({e}); se sondea la BD.")
+        if self._parar.wait(INTERVALO_SONDEO):
+            return None
+        return self.dao.obtener_version(self.usuario_id)
+
+    def _long_poll(self):
+        peticion = urllib.request.Request(
+            f"{self.url}/version?usuario={self.usuario_id}&desde={self.version}&espera={ESPERA_MAXIMA:g}"
+        )
+        if self.token:
+            peticion.add_header("X-Token", self.token)
+        with urllib.request.urlopen(peticion, timeout=ESPERA_MAXIMA + 10) as respuesta:
+            return json.loads(respuesta.read().decode("utf-8"))["version"]
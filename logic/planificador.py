@@ -0,0 +1,107 @@
+import logging
+import time
+from collections import Counter
+
+from PyQt5.QtCore import QObject, QTimer
+
+ESPERA_MS = 30            # Ventana de agrupación: un par de fotogramas
+INTERVALO_CLIMA_S = 600   # El clima no cambia por editar eventos: como mucho cada 10 minutos
+
+
+class PlanificadorRefresco(QObject):
+    """
+    Agrupa las peticiones de refresco de la ventana principal.
+
+    Quien necesita refrescar solo marca qué está sucio (datos de la BD, índices en
+    memoria, vista o días concretos, clima) y el planificador ejecuta, al vencer
+    la ventana de agrupación, como mucho una carga y un repintado por ráfaga.
+    Lleva la cuenta de las peticiones recibidas frente a las ejecutadas.
+    """
+
+    def __init__(self, recargar, reindexar, repintar, clima, espera_ms=ESPERA_MS, parent=None):
+        super().__init__(parent)
+        self._recargar = recargar     # Lee de la BD y reconstruye los índices
+        self._reindexar = reindexar   # Reconstruye los índices desde la lista en memoria
+        self._repintar = repintar     # repintar(dias): set de fechas o None = vista completa
+        self._clima = clima
+        self.solicitudes = Counter()
+        self.ejecuciones = Counter()
+        self._ultimo_clima = 0.0
+        self._limpiar()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(espera_ms)
+        self.timer.timeout.connect(self.ejecutar)
+
+    def cancelar(self):
+        """Descarta lo pendiente (al cerrar la sesión)."""
+        self.timer.stop()
+        self._limpiar()
+
+    def _limpiar(self):
+        self._datos = False
+        self._indices = False
+        self._vista = False
+        self._dias = set()   # None = vista completa
+        self._clima_pendiente = False
+        self._forzar_clima = False
+
+    def _programar(self, tipo):
+        self.solicitudes[tipo] += 1
+        if not self.timer.isActive():
+            self.timer.start()
+
+    # =================== Marcar como sucio ===================
+    def marcar_datos(self):
+        self._datos = True
+        self._programar('datos')
+
+    def marcar_indices(self, dias=None):
+        self._indices = True
+        self.marcar_vista(dias)
+        self.solicitudes['indices'] += 1
+
+    def marcar_vista(self, dias=None):
+        self._vista = True
+        if dias is None or self._dias is None:
+            self._dias = None
+        else:
+            self._dias |= dias
+        self._programar('vista')
+
+    def marcar_clima(self, forzar=False):
+        self._clima_pendiente = True
+        self._forzar_clima = self._forzar_clima or forzar
+        self._programar('clima')
+
+    # =================== Ejecución ===================
+    def ejecutar(self):
+        """Aplica todo lo pendiente de una vez (también se puede llamar para no esperar)."""
+        self.timer.stop()
+        datos, indices, vista, dias = self._datos, self._indices, self._vista, self._dias
+        clima, forzar_clima = self._clima_pendiente, self._forzar_clima
+        self._limpiar()
+
+        if datos:
+            self._recargar()
+            self.ejecuciones['datos'] += 1
+        elif indices:
+            self._reindexar()
+            self.ejecuciones['indices'] += 1
+        if datos or vista:
+            # Tras recargar de la BD cualquier día puede haber cambiado
+            self._repintar(None if datos else dias)
+            self.ejecuciones['vista'] += 1
+        if clima and (forzar_clima or time.monotonic() - self._ultimo_clima >= INTERVALO_CLIMA_S):
+            self._ultimo_clima = time.monotonic()
+            self._clima()
+            self.ejecuciones['clima'] += 1
+
+        ahorrados = self.ahorrados()
+        if ahorrados:
+            logging.debug(f"Refrescos agrupados, evitados hasta ahora: {dict(ahorrados)}")
+
+    def ahorrados(self):
+        """Peticiones que no llegaron a ejecutarse porque se agruparon con otras."""
+        return self.solicitudes - self.ejecuciones
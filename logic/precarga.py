@@ -0,0 +1,78 @@
+import logging
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, QTimer
+
+MAX_PRECARGADOS = 12      # ventanas de año y páginas guardadas como máximo
+ESPERA_INACTIVIDAD_MS = 250  # tras pintar una vista, cuánto se espera antes de precargar
+
+
+class CachePrecarga:
+    """
+    LRU de lo que cuesta preparar una vista: la ventana de un año (series expandidas
+    e índice columnar) y las páginas de cada periodo. Las claves llevan la versión de
+    los datos, así que tras cualquier cambio las entradas antiguas no se vuelven a usar.
+    """
+
+    def __init__(self, maximo=MAX_PRECARGADOS):
+        self.maximo = maximo
+        self._entradas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        valor = self._entradas.get(clave)
+        if valor is None:
+            self.fallos += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.aciertos += 1
+        return valor
+
+    def guardar(self, clave, valor):
+        self._entradas[clave] = valor
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.maximo:
+            self._entradas.popitem(last=False)
+
+    def __contains__(self, clave):
+        return clave in self._entradas
+
+    def limpiar(self):
+        self._entradas.clear()
+
+
+class Precargador(QObject):
+    """
+    Ejecuta tareas de precarga cuando la interfaz está ociosa: espera ESPERA_INACTIVIDAD_MS
+    tras la última petición y después ejecuta UNA tarea por vuelta del bucle de eventos,
+    de modo que un clic del usuario nunca espera más que una tarea.
+    """
+
+    def __init__(self, espera_ms=ESPERA_INACTIVIDAD_MS, parent=None):
+        super().__init__(parent)
+        self._tareas = []
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._siguiente)
+        self.espera_ms = espera_ms
+
+    def programar(self, tareas):
+        """Sustituye lo pendiente (solo interesan los vecinos de la vista actual)."""
+        self._tareas = list(tareas)
+        self.timer.start(self.espera_ms)
+
+    def cancelar(self):
+        self._tareas = []
+        self.timer.stop()
+
+    def _siguiente(self):
+        if not self._tareas:
+            return
+        tarea = self._tareas.pop(0)
+        try:
+            tarea()
+        except Exception as e:
+            logging.warning(f"Precarga fallida: {e}", exc_info=True)
+        if self._tareas:
+            self.timer.start(0)
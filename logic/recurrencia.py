@@ -0,0 +1,215 @@
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from utils.excepciones import parsear_excepciones
+
+# Frecuencias soportadas (subconjunto de RRULE de iCalendar)
+FRECUENCIAS = {
+    "DAILY": "Cada día",
+    "WEEKLY": "Cada semana",
+    "MONTHLY": "Cada mes",
+    "YEARLY": "Cada año",
+}
+
+# Partes de RRULE que no cambian qué fechas se generan con las frecuencias soportadas.
+# Cualquier otra (BYDAY, BYMONTHDAY, BYSETPOS...) describe otro calendario: la regla se rechaza
+PARTES_IGNORABLES = {"WKST"}
+
+MAX_CACHE_EXPANSIONES = 256
+
+
+def parsear_regla(texto):
+    """
+    Convierte una regla tipo RRULE ("FREQ=WEEKLY;INTERVAL=2;COUNT=10" o con UNTIL=20261231)
+    en un diccionario. Devuelve None si la regla está vacía, no es válida o usa partes
+    que no se saben expandir (BYDAY, BYMONTHDAY...): nunca se genera otro calendario
+    distinto del guardado.
+    """
+    if not texto:
+        return None
+    regla = {"freq": None, "interval": 1, "count": None, "until": None}
+    try:
+        for parte in texto.upper().replace("RRULE:", "").split(";"):
+            if not parte:
+                continue
+            clave, valor = parte.split("=", 1)
+            if clave == "FREQ":
+                regla["freq"] = valor
+            elif clave == "INTERVAL":
+                regla["interval"] = max(1, int(valor))
+            elif clave == "COUNT":
+                regla["count"] = int(valor)
+            elif clave == "UNTIL":
+                fecha = valor.rstrip("Z")
+                formato = "%Y%m%dT%H%M%S" if "T" in fecha else "%Y%m%d"
+                regla["until"] = datetime.strptime(fecha, formato)
+                if "T" not in fecha:
+                    regla["until"] = regla["until"].replace(hour=23, minute=59, second=59)
+            elif clave not in PARTES_IGNORABLES:
+                logging.warning(f"Regla de recurrencia no soportada '{texto}': {clave}")
+                return None
+    except ValueError as e:
+        logging.warning(f"Regla de recurrencia inválida '{texto}': {e}")
+        return None
+    if regla["freq"] not in FRECUENCIAS:
+        return None
+    return regla
+
+
+def construir_regla(freq, interval=1, count=None, until=None):
+    """Operación inversa a parsear_regla: genera el texto RRULE que se guarda en la BD."""
+    if not freq:
+        return None
+    partes = [f"FREQ={freq}"]
+    if interval and interval > 1:
+        partes.append(f"INTERVAL={interval}")
+    if count:
+        partes.append(f"COUNT={count}")
+    if until:
+        partes.append(f"UNTIL={until.strftime('%Y%m%d')}")
+    return ";".join(partes)
+
+
+def _sumar_meses(fecha, meses):
+    """Suma meses a una fecha. Devuelve None si el día no existe en el mes destino (p.ej. 31 de abril)."""
+    total = fecha.year * 12 + fecha.month - 1 + meses
+    try:
+        return fecha.replace(year=total // 12, month=total % 12 + 1)
+    except ValueError:
+        return None
+
+
+def generar_fechas(inicio, regla, desde, hasta):
+    """
+    Generador perezoso de las fechas de una serie dentro de [desde, hasta).
+
+    Para DAILY/WEEKLY salta directamente a la primera ocurrencia del rango en vez
+    de recorrer la serie desde su inicio. Con COUNT o en MONTHLY/YEARLY (donde los
+    meses sin ese día se saltan, como en RFC 5545) sí hay que contar desde el inicio,
+    pero son como mucho 12 pasos por año.
+    """
+    freq, intervalo = regla["freq"], regla["interval"]
+    limite = hasta if regla["until"] is None else min(hasta, regla["until"] + timedelta(seconds=1))
+
+    if freq in ("DAILY", "WEEKLY"):
+        paso = timedelta(days=intervalo * (7 if freq == "WEEKLY" else 1))
+        k = 0
+        if desde > inicio:
+            k = -(-(desde - inicio) // paso)  # División entera hacia arriba
+        if regla["count"] is not None and k >= regla["count"]:
+            return
+        fecha = inicio + paso * k
+        while fecha < limite:
+            yield fecha
+            k += 1
+            if regla["count"] is not None and k >= regla["count"]:
+                return
+            fecha += paso
+        return
+
+    meses_paso = intervalo * (12 if freq == "YEARLY" else 1)
+    k = 0
+    emitidas = 0
+    while True:
+        fecha = _sumar_meses(inicio, k * meses_paso)
+        k += 1
+        if fecha is None:
+            continue
+        if fecha >= limite:
+            return
+        if regla["count"] is not None and emitidas >= regla["count"]:
+            return
+        emitidas += 1
+        if fecha >= desde:
+            yield fecha
+
+
+def proxima_ocurrencia(serie, desde, horizonte=timedelta(days=3660)):
+    """Fecha de la primera ocurrencia de la serie (sin sus excepciones) desde 'desde', o None si ya no quedan."""
+    regla = parsear_regla(serie['regla_recurrencia'])
+    if regla is None:
+        return None
+    excepciones = parsear_excepciones(serie.get('excepciones_recurrencia'))
+    for fecha in generar_fechas(serie['fecha_inicio'], regla, desde, desde + horizonte):
+        if fecha.replace(second=0, microsecond=0) not in excepciones:
+            return fecha
+    return None
+
+
+def clave_evento(evento):
+    """
+    Identificador estable de un evento en la UI (Drag & Drop, búsquedas...).
+    Las ocurrencias comparten id_evento con su serie, así que se distinguen por su fecha original.
+    """
+    if evento.get('es_ocurrencia'):
+        return f"{evento['id_evento']}@{evento['fecha_original'].strftime('%Y%m%d%H%M')}"
+    return str(evento['id_evento'])
+
+
+class ExpansorRecurrencias:
+    """
+    Expande las series recurrentes solo para el rango que pide una vista.
+
+    Las filas normales se devuelven tal cual. Cada serie se convierte en copias
+    marcadas con 'es_ocurrencia' y 'fecha_original'; las filas que sobrescriben
+    una ocurrencia concreta (serie_id + fecha_original) ocupan su lugar. Las
+    expansiones se guardan en una caché LRU cuya clave incluye todos los campos
+    de la serie, de modo que editarla invalida su entrada automáticamente. Cada
+    llamada devuelve copias nuevas de las ocurrencias: quien las modifique (la UI
+    les añade datos de presentación) no altera lo guardado en la caché.
+    """
+
+    def __init__(self, max_entradas=MAX_CACHE_EXPANSIONES):
+        self.max_entradas = max_entradas
+        self._cache = OrderedDict()
+
+    def limpiar(self):
+        self._cache.clear()
+
+    def expandir(self, eventos, desde, hasta):
+        resultado = []
+        series = []
+        sobrescritas = {}
+        for ev in eventos:
+            if ev.get('regla_recurrencia'):
+                series.append(ev)
+            else:
+                if ev.get('serie_id') and ev.get('fecha_original'):
+                    sobrescritas.setdefault(ev['serie_id'], set()).add(ev['fecha_original'].replace(second=0, microsecond=0))
+                resultado.append(ev)
+
+        for serie in series:
+            ocultas = sobrescritas.get(serie['id_evento'], set())
+            for ocurrencia in self._ocurrencias_serie(serie, desde, hasta):
+                if ocurrencia['fecha_original'] not in ocultas:
+                    resultado.append(ocurrencia)
+        return resultado
+
+    def _ocurrencias_serie(self, serie, desde, hasta):
+        regla = parsear_regla(serie['regla_recurrencia'])
+        if regla is None:
+            # Regla ilegible: mostramos la fila original para no perder el evento
+            return [serie] if desde <= serie['fecha_inicio'] < hasta else []
+
+        clave = (tuple(sorted(serie.items())), desde, hasta)
+        if clave in self._cache:
+            self._cache.move_to_end(clave)
+            return [dict(o) for o in self._cache[clave]]
+
+        excepciones = parsear_excepciones(serie.get('excepciones_recurrencia'))
+        ocurrencias = []
+        for fecha in generar_fechas(serie['fecha_inicio'], regla, desde, hasta):
+            if fecha.replace(second=0, microsecond=0) in excepciones:
+                continue
+            ocurrencia = dict(serie)
+            ocurrencia['fecha_inicio'] = fecha
+            ocurrencia['fecha_original'] = fecha.replace(second=0, microsecond=0)
+            ocurrencia['inicio_serie'] = serie['fecha_inicio']
+            ocurrencia['es_ocurrencia'] = True
+            ocurrencias.append(ocurrencia)
+
+        self._cache[clave] = ocurrencias
+        if len(self._cache) > self.max_entradas:
+            self._cache.popitem(last=False)
+        return [dict(o) for o in ocurrencias]
@@ -1,15 +1,172 @@
 import urllib.request
 import urllib.error
+import urllib.parse
 import json
 import logging
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+Ubicacion = namedtuple("Ubicacion", ["nombre", "latitud", "longitud"])
+
+# Ubicaciones predefinidas para el selector (el usuario puede guardar cualquier otra en la BD)
+UBICACIONES = [
+    Ubicacion("Sevilla", 37.38, -5.98),
+    Ubicacion("Madrid", 40.42, -3.70),
+    Ubicacion("Barcelona", 41.39, 2.17),
+    Ubicacion("Valencia", 39.47, -0.38),
+    Ubicacion("Málaga", 36.72, -4.42),
+    Ubicacion("Bilbao", 43.26, -2.93),
+    Ubicacion("A Coruña", 43.36, -8.41),
+    Ubicacion("Zaragoza", 41.65, -0.89),
+]
+UBICACION_POR_DEFECTO = UBICACIONES[0]
+
+# Se puede apuntar a un proxy propio (p.ej. el servidor de notificaciones) o a un doble local para pruebas
+URL_API_CLIMA = os.getenv("CLIMA_API_URL", "https://api.open-meteo.com/v1/forecast")
+# Con una carpeta compartida (CLIMA_CACHE_DIR) varios clientes reutilizan la misma descarga
+CARPETA_CACHE_CLIMA = os.getenv("CLIMA_CACHE_DIR", "cache_clima")
+TTL_CLIMA = 30 * 60  # segundos que se considera vigente un pronóstico
+
+
+def clave_ubicacion(latitud, longitud):
+    """Redondeo a ~1 km: usuarios de la misma ciudad comparten entrada de caché y petición."""
+    return f"{round(latitud, 2):.2f},{round(longitud, 2):.2f}"
+
+
+class CacheClima:
+    """Caché en disco de pronósticos, un JSON por ubicación, con caducidad por antigüedad del fichero."""
+
+    def __init__(self, carpeta=CARPETA_CACHE_CLIMA, ttl=TTL_CLIMA):
+        self.carpeta = carpeta
+        self.ttl = ttl
+
+    def _ruta(self, clave):
+        return os.path.join(self.carpeta, clave.replace(",", "_") + ".json")
+
+    def leer(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            if time.time() - os.path.getmtime(ruta) > self.ttl:
+                return None
+            with open(ruta, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def guardar(self, clave, datos):
+        os.makedirs(self.carpeta, exist_ok=True)
+        temporal = os.path.join(self.carpeta, f".tmp_{uuid.uuid4().hex}")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        os.replace(temporal, self._ruta(clave)) # Atómico: otro cliente nunca lee un JSON a medias
+
 
 class ClimaService:
+    cache = CacheClima()
+
     @staticmethod
-    def obtener_pronostico_sevilla():
-        try:
-            url = "https://api.open-meteo.com/v1/forecast?latitude=37.38&longitude=-5.98&current_weather=true&daily=weathercode,temperature_2m_max,temperature_2m_min&timezone=auto"
-            with urllib.request.urlopen(url, timeout=5) as response:
-                return json.loads(response.read().decode())
-        except Exception as e:
-            logging.error(f"Error servicio clima: {e}")
-            raise e
\ No newline at end of file
+    def descargar(coordenadas, url_base=None):
+        """
+        Una sola petición a Open-Meteo para todas las coordenadas [(lat, lon), ...]
+        (la API acepta listas separadas por comas). Devuelve los datos en el mismo orden.
+        """
+        parametros = urllib.parse.urlencode({
+            "latitude": ",".join(f"{lat:.2f}" for lat, _ in coordenadas),
+            "longitude": ",".join(f"{lon:.2f}" for _, lon in coordenadas),
+            "current_weather": "true",
+            "daily": "weathercode,temperature_2m_max,temperature_2m_min",
+            "timezone": "auto",
+        }, safe=",")
+        url = f"{url_base or URL_API_CLIMA}?{parametros}"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            datos = json.loads(response.read().decode())
+        # Con una sola ubicación la API devuelve un objeto en vez de una lista
+        return datos if isinstance(datos, list) else [datos]
+
+    @classmethod
+    def obtener_pronosticos(cls, coordenadas, url_base=None):
+        """
+        Pronósticos por clave de ubicación. Lo vigente sale de la caché compartida
+        y todo lo que falte se pide a la vez en una única llamada a la API.
+        """
+        resultado = {}
+        pendientes = {}
+        for lat, lon in coordenadas:
+            clave = clave_ubicacion(lat, lon)
+            datos = cls.cache.leer(clave)
+            if datos is not None:
+                resultado[clave] = datos
+            else:
+                pendientes[clave] = (round(lat, 2), round(lon, 2))
+        if pendientes:
+            try:
+                descargados = cls.descargar(list(pendientes.values()), url_base)
+            except Exception as e:
+                logging.error(f"Error servicio clima: {e}")
+                raise e
+            for clave, datos in zip(pendientes, descargados):
+                resultado[clave] = datos
+                try:
+                    cls.cache.guardar(clave, datos)
+                except OSError as e:
+                    logging.warning(f"No se pudo guardar el clima en caché: {e}")
+        return resultado
+
+    @classmethod
+    def obtener_pronostico(cls, latitud, longitud):
+        return cls.obtener_pronosticos([(latitud, longitud)])[clave_ubicacion(latitud, longitud)]
+
+    @classmethod
+    def obtener_pronostico_sevilla(cls):
+        return cls.obtener_pronostico(37.38, -5.98)
+
+
+class _Ronda:
+    def __init__(self):
+        self.coordenadas = set()
+        self.resultados = {}
+        self.lista = threading.Event()
+
+
+class AgrupadorClima:
+    """
+    Para un proxy de clima compartido: las peticiones que llegan dentro de la misma
+    ventana (de distintos clientes y ciudades) se resuelven con una sola llamada a
+    ClimaService.obtener_pronosticos, es decir, una petición a la API como mucho.
+    """
+
+    def __init__(self, ventana=0.2, url_base=None):
+        self.ventana = ventana
+        self.url_base = url_base
+        self._lock = threading.Lock()
+        self._abierta = None # Ronda que aún admite peticiones
+        self.llamadas = 0
+
+    def obtener(self, latitud, longitud):
+        with self._lock:
+            ronda = self._abierta
+            lider = ronda is None
+            if lider:
+                ronda = self._abierta = _Ronda()
+            ronda.coordenadas.add((latitud, longitud))
+
+        if lider:
+            time.sleep(self.ventana) # Damos tiempo a que se sumen más peticiones
+            with self._lock:
+                self._abierta = None
+            try:
+                ronda.resultados = ClimaService.obtener_pronosticos(ronda.coordenadas, self.url_base)
+                self.llamadas += 1
+            except Exception as e:
+                logging.warning(f"Proxy de clima: fallo obteniendo {len(ronda.coordenadas)} ubicaciones: {e}")
+            ronda.lista.set()
+        else:
+            ronda.lista.wait()
+
+        clave = clave_ubicacion(latitud, longitud)
+        if clave not in ronda.resultados:
+            raise ConnectionError("No se pudo obtener el clima")
+        return ronda.resultados[clave]
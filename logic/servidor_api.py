@@ -0,0 +1,442 @@
+"""
+Servidor HTTP/JSON de la API de MiniCalendar (asyncio, solo biblioteca estándar).
+
+Pone los DAO (UsuariosDAO, EventosDAO, ColoresDAO, CalendariosDAO) detrás de HTTP para que los
+clientes no necesiten credenciales de MySQL. Las llamadas al DAO son bloqueantes y
+se ejecutan en un pool de hilos que comparte un pool de conexiones a la BD, así que
+N clientes no abren N conexiones TLS.
+
+- Las lecturas (GET) se cachean por usuario y llevan ETag: con If-None-Match
+  igual se responde 304 sin cuerpo. La caché se invalida al escribir por la API y,
+  para cambios hechos por otras vías, comparando el sello de versión del usuario
+  (como mucho una consulta por usuario cada TTL_VERSION segundos).
+- Las escrituras y el resto de métodos van por POST /rpc/<dao>.<método>, con una
+  lista blanca que fija el usuario de la sesión y comprueba que los eventos
+  tocados son suyos o de un calendario compartido con él (con permiso de
+  escritura si el método escribe).
+- Límite de peticiones por cliente (cubeta de fichas).
+- Respuestas grandes comprimidas con gzip si el cliente lo acepta.
+
+Uso (local, p.ej. para pruebas):
+    python -m logic.servidor_api --puerto 8080
+
+Los clientes lo usan con la variable de entorno API_URL (http://host:8080).
+"""
+import argparse
+import asyncio
+import gzip
+import inspect
+import logging
+import secrets
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+from database.conexion_db import activar_pool, verificar_y_crear_tablas_base
+from database.dao import DAOS_MYSQL
+from utils.config import COLORES_MAP
+from utils.serializacion import a_json, de_json
+
+PUERTO_POR_DEFECTO = 8080
+TAM_POOL = 8               # conexiones a MySQL compartidas (y hilos de trabajo)
+TTL_SESION = 12 * 3600     # segundos de validez de un token
+TTL_VERSION = 2.0          # segundos que se da por buena la versión conocida de un usuario
+PETICIONES_POR_SEGUNDO = 20
+RAFAGA = 60
+TAM_MAX_CUERPO = 20 * 1024 * 1024
+TAM_MIN_COMPRIMIR = 1024   # bytes: por debajo gzip no compensa
+
+# "dao.metodo" -> (parámetro que se fuerza al usuario de la sesión, parámetros con ids de eventos, ¿escribe?)
+# Un parámetro "datos.usuario_id" es la clave usuario_id del diccionario 'datos': ahí se
+# admite también un calendario compartido con permiso de escritura (eventos en calendario ajeno).
+METODOS = {
+    "usuarios.obtener_region_festivos": ("id_usuario", (), False),
+    "usuarios.guardar_region_festivos": ("id_usuario", (), True),
+    "usuarios.obtener_ubicacion_clima": ("id_usuario", (), False),
+    "usuarios.guardar_ubicacion_clima": ("id_usuario", (), True),
+    "colores.obtener_id_por_hex": (None, (), False),
+    "colores.obtener_catalogo": (None, (), False),
+    "eventos.obtener_por_usuario": ("usuario_id", (), False),
+    "eventos.obtener_rango": ("usuario_id", (), False),
+    "eventos.obtener_pagina_agenda": ("usuario_id", (), False),
+    "eventos.obtener_proximos": ("usuario_id", (), False),
+    "eventos.contar_por_usuario": ("usuario_id", (), False),
+    "eventos.buscar": ("usuario_id", (), False),
+    "eventos.obtener_version": ("usuario_id", (), False),
+    "eventos.obtener_cambios": ("usuario_id", (), False),
+    "eventos.obtener_cambios_visibles": ("usuario_id", (), False),
+    "eventos.obtener_versiones_eventos": (None, ("ids_eventos",), False),
+    "eventos.obtener_detalles": (None, ("ids_eventos",), False),
+    "eventos.obtener_descripciones": ("usuario_id", (), False),
+    "eventos.contar_referencias_adjunto": ("usuario_id", (), False),
+    "eventos.obtener_rutas_adjuntos": ("usuario_id", (), False),
+    "eventos.guardar": ("datos.usuario_id", ("id_evento", "datos.serie_id"), True),
+    "eventos.eliminar": (None, ("id_evento",), True),
+    "eventos.excluir_ocurrencia": (None, ("serie_id",), True),
+    "eventos.desprender_ocurrencia": (None, ("serie_id",), True),
+    "eventos.mover_serie": (None, ("serie_id",), True),
+    "eventos.actualizar_en_bloque": (None, ("ids", "excluir"), True),
+    "eventos.actualizar_fecha_evento_con_ripple": (None, ("id_evento",), True),
+    "calendarios.obtener_visibles": ("usuario_id", (), False),
+    "calendarios.obtener_compartidos_por": ("propietario_id", (), False),
+    "calendarios.compartir": ("propietario_id", (), True),
+    "calendarios.dejar_de_compartir": ("propietario_id", (), True),
+    "calendarios.propietarios_visibles": ("usuario_id", (), False),
+    "calendarios.propietarios_editables": ("usuario_id", (), False),
+}
+
+
+class ErrorAPI(Exception):
+    def __init__(self, codigo, mensaje):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+def _ids_en(valor):
+    """Ids de eventos dentro de un argumento: un id, una lista de ids o de pares (serie_id, fecha)."""
+    if valor is None:
+        return []
+    if isinstance(valor, int):
+        return [valor]
+    return [v[0] if isinstance(v, (list, tuple)) else v for v in valor]
+
+
+def _leer_parametro(argumentos, ruta):
+    nombre, _, clave = ruta.partition(".")
+    valor = argumentos.get(nombre)
+    return valor.get(clave) if clave and isinstance(valor, dict) else valor
+
+
+class Sesiones:
+    def __init__(self, ttl=TTL_SESION):
+        self.ttl = ttl
+        self._tokens = {} # token -> (usuario_id, caduca)
+        self._lock = threading.Lock()
+
+    def crear(self, usuario_id):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._tokens[token] = (usuario_id, time.time() + self.ttl)
+        return token
+
+    def usuario(self, token):
+        with self._lock:
+            sesion = self._tokens.get(token)
+            if not sesion:
+                return None
+            if sesion[1] < time.time():
+                del self._tokens[token]
+                return None
+            return sesion[0]
+
+    def cerrar(self, token):
+        with self._lock:
+            self._tokens.pop(token, None)
+
+
+class CacheRespuestas:
+    """Respuestas GET ya serializadas, por usuario y etiquetadas con su versión."""
+
+    def __init__(self):
+        self._por_usuario = {}  # usuario_id -> {ruta: (version, etag, cuerpo)}
+        self._versiones = {}    # usuario_id -> (version, leida_en)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def version_conocida(self, usuario_id):
+        with self._lock:
+            version, leida = self._versiones.get(usuario_id, (None, 0))
+        return version if time.monotonic() - leida < TTL_VERSION else None
+
+    def anotar_version(self, usuario_id, version):
+        with self._lock:
+            anterior = self._versiones.get(usuario_id, (None, 0))[0]
+            self._versiones[usuario_id] = (version, time.monotonic())
+            if anterior is not None and anterior != version:
+                self._por_usuario.pop(usuario_id, None)
+
+    def invalidar(self, usuario_id):
+        with self._lock:
+            self._por_usuario.pop(usuario_id, None)
+            self._versiones.pop(usuario_id, None)
+
+    def leer(self, usuario_id, ruta, version):
+        with self._lock:
+            entrada = self._por_usuario.get(usuario_id, {}).get(ruta)
+        if entrada and entrada[0] == version:
+            self.aciertos += 1
+            return entrada
+        self.fallos += 1
+        return None
+
+    def guardar(self, usuario_id, ruta, version, cuerpo):
+        etag = f'"{usuario_id}-{version}-{zlib.crc32(ruta.encode()):08x}"'
+        with self._lock:
+            self._por_usuario.setdefault(usuario_id, {})[ruta] = (version, etag, cuerpo)
+        return etag
+
+
+class LimitePeticiones:
+    """Cubeta de fichas por cliente: PETICIONES_POR_SEGUNDO sostenidas, RAFAGA de golpe."""
+
+    def __init__(self, tasa=PETICIONES_POR_SEGUNDO, rafaga=RAFAGA):
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self._cubetas = {}
+
+    def permitir(self, cliente):
+        ahora = time.monotonic()
+        fichas, ultima = self._cubetas.get(cliente, (self.rafaga, ahora))
+        fichas = min(self.rafaga, fichas + (ahora - ultima) * self.tasa)
+        if fichas < 1:
+            self._cubetas[cliente] = (fichas, ahora)
+            return False
+        self._cubetas[cliente] = (fichas - 1, ahora)
+        return True
+
+
+class ServidorAPI:
+    def __init__(self, daos=None, hilos=TAM_POOL, limite=None):
+        self.daos = {nombre: clase() for nombre, clase in (daos or DAOS_MYSQL).items()}
+        self.ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="api")
+        self.sesiones = Sesiones()
+        self.cache = CacheRespuestas()
+        self.limite = limite or LimitePeticiones()
+        self.peticiones = 0
+
+    # =================== HTTP ===================
+    async def atender(self, lector, escritor):
+        """Una conexión HTTP/1.1 con keep-alive: atiende peticiones hasta que el cliente cierre."""
+        cliente = escritor.get_extra_info("peername")
+        cliente = cliente[0] if cliente else "?"
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                try:
+                    metodo, objetivo, version_http = linea.decode("latin-1").split()
+                except ValueError:
+                    break
+                cabeceras = {}
+                while True:
+                    cabecera = await lector.readline()
+                    if cabecera in (b"\r\n", b"\n", b""):
+                        break
+                    nombre, _, valor = cabecera.decode("latin-1").partition(":")
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+                longitud = int(cabeceras.get("content-length", 0) or 0)
+                if longitud > TAM_MAX_CUERPO:
+                    await self._enviar(escritor, 413, {"error": "petición demasiado grande"}, cerrar=True)
+                    break
+                cuerpo = await lector.readexactly(longitud) if longitud else b""
+
+                self.peticiones += 1
+                if not self.limite.permitir(cliente):
+                    codigo, respuesta, extra = 429, {"error": "demasiadas peticiones"}, {"Retry-After": "1"}
+                else:
+                    codigo, respuesta, extra = await self.despachar(metodo, objetivo, cabeceras, cuerpo)
+                cerrar = cabeceras.get("connection", "").lower() == "close" or version_http == "HTTP/1.0"
+                gzip_ok = "gzip" in cabeceras.get("accept-encoding", "")
+                await self._enviar(escritor, codigo, respuesta, extra, cerrar, gzip_ok)
+                if cerrar:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _enviar(self, escritor, codigo, respuesta, extra=None, cerrar=False, gzip_ok=False):
+        if isinstance(respuesta, bytes) or respuesta is None:
+            datos = respuesta or b""
+        else:
+            datos = a_json(respuesta).encode("utf-8")
+        if gzip_ok and len(datos) >= TAM_MIN_COMPRIMIR:
+            datos = gzip.compress(datos, compresslevel=5)
+            extra = dict(extra or {}, **{"Content-Encoding": "gzip"})
+        textos = {200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+                  404: "Not Found", 413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+                  503: "Service Unavailable"}
+        lineas = [f"HTTP/1.1 {codigo} {textos.get(codigo, '')}", "Content-Type: application/json; charset=utf-8",
+                  f"Content-Length: {len(datos)}", "Connection: " + ("close" if cerrar else "keep-alive")]
+        lineas += [f"{k}: {v}" for k, v in (extra or {}).items()]
+        escritor.write(("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1") + datos)
+        await escritor.drain()
+
+    async def despachar(self, metodo, objetivo, cabeceras, cuerpo):
+        url = urlparse(objetivo)
+        consulta = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            datos = de_json(cuerpo.decode("utf-8")) if cuerpo else {}
+            if url.path == "/salud":
+                return 200, {"ok": True, "peticiones": self.peticiones,
+                             "cache": {"aciertos": self.cache.aciertos, "fallos": self.cache.fallos}}, None
+            if metodo == "POST" and url.path.startswith("/login"):
+                return await self.login(url.path, datos)
+            if metodo == "POST" and url.path == "/registro":
+                exito, mensaje = await self.en_hilo(self.daos["usuarios"].registrar,
+                                                    datos.get("nombre"), datos.get("email"), datos.get("password"))
+                return 200, {"exito": exito, "mensaje": mensaje}, None
+
+            autorizacion = cabeceras.get("authorization", "")
+            token = (autorizacion[len("Bearer "):] if autorizacion.startswith("Bearer ") else autorizacion).strip()
+            usuario_id = self.sesiones.usuario(token)
+            if usuario_id is None:
+                raise ErrorAPI(401, "sesión no válida o caducada")
+            if metodo == "POST" and url.path == "/logout":
+                self.sesiones.cerrar(token)
+                return 200, {"ok": True}, None
+            if metodo == "GET":
+                return await self.leer(usuario_id, url.path, consulta, objetivo, cabeceras)
+            if metodo == "POST" and url.path.startswith("/rpc/"):
+                resultado = await self.rpc(usuario_id, url.path[len("/rpc/"):], datos.get("args", []), datos.get("kwargs", {}))
+                return 200, {"resultado": resultado}, None
+            if metodo == "POST" and url.path == "/importar":
+                series = datos.get("series", {})
+                insertados = await self.importar(usuario_id, datos.get("eventos", []), series)
+                return 200, {"insertados": insertados, "series": series}, None
+            raise ErrorAPI(404, "ruta desconocida")
+        except ErrorAPI as e:
+            return e.codigo, {"error": str(e)}, None
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"petición no válida: {e}"}, None
+        except Exception as e:
+            logging.error(f"API: error atendiendo {metodo} {url.path}: {e}", exc_info=True)
+            # El detalle (SQL, rutas, datos de otros usuarios) se queda en el log del servidor
+            return 500, {"error": "error interno del servidor"}, None
+
+    async def en_hilo(self, funcion, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.ejecutor, lambda: funcion(*args, **kwargs))
+
+    # =================== Rutas ===================
+    async def login(self, ruta, datos):
+        usuarios = self.daos["usuarios"]
+        if ruta == "/login/invitado":
+            usuario = await self.en_hilo(usuarios.login_invitado)
+        else:
+            usuario = await self.en_hilo(usuarios.autenticar, datos.get("email", ""), datos.get("password", ""))
+        if not usuario:
+            raise ErrorAPI(401, "usuario o contraseña incorrectos")
+        return 200, {"token": self.sesiones.crear(usuario["id_usuario"]), "usuario": usuario}, None
+
+    async def leer(self, usuario_id, ruta, consulta, objetivo, cabeceras):
+        """GET cacheados por usuario: se validan contra el sello de versión y se sirven con ETag."""
+        eventos = self.daos["eventos"]
+        if ruta == "/eventos":
+            if consulta.get("resumen") == "1":
+                leer = lambda: eventos.obtener_resumen_por_usuario(usuario_id)
+            elif "desde" in consulta:
+                desde, hasta = datetime.fromisoformat(consulta["desde"]), datetime.fromisoformat(consulta["hasta"])
+                leer = lambda: eventos.obtener_rango(usuario_id, desde, hasta)
+            else:
+                leer = lambda: eventos.obtener_por_usuario(usuario_id)
+        elif ruta == "/cambios":
+            desde = int(consulta.get("desde", 0))
+            leer = lambda: eventos.obtener_cambios(usuario_id, desde)
+        elif ruta == "/colores":
+            leer = self.daos["colores"].obtener_catalogo
+        elif ruta == "/version":
+            version = await self.en_hilo(eventos.obtener_version, usuario_id)
+            self.cache.anotar_version(usuario_id, version)
+            return 200, {"version": version}, None
+        else:
+            raise ErrorAPI(404, "ruta desconocida")
+
+        version = self.cache.version_conocida(usuario_id)
+        if version is None:
+            version = await self.en_hilo(eventos.obtener_version, usuario_id)
+            self.cache.anotar_version(usuario_id, version)
+        entrada = self.cache.leer(usuario_id, objetivo, version)
+        if entrada:
+            _, etag, cuerpo = entrada
+        else:
+            cuerpo = a_json({"resultado": await self.en_hilo(leer)}).encode("utf-8")
+            etag = self.cache.guardar(usuario_id, objetivo, version, cuerpo)
+        if cabeceras.get("if-none-match") == etag:
+            return 304, None, {"ETag": etag}
+        return 200, cuerpo, {"ETag": etag}
+
+    async def rpc(self, usuario_id, nombre, args, kwargs):
+        if nombre not in METODOS:
+            raise ErrorAPI(404, f"método no disponible: {nombre}")
+        parametro_usuario, parametros_eventos, escribe = METODOS[nombre]
+        dao, metodo = nombre.split(".")
+        funcion = getattr(self.daos[dao], metodo)
+        argumentos = inspect.signature(funcion).bind(*args, **kwargs)
+        argumentos.apply_defaults()
+        valores = argumentos.arguments
+
+        # Calendarios a los que llega el usuario: el suyo y los compartidos con él
+        calendarios = self.daos["calendarios"]
+        permitidos = await self.en_hilo(calendarios.propietarios_editables if escribe else calendarios.propietarios_visibles,
+                                        usuario_id)
+
+        # El usuario es siempre el de la sesión, diga lo que diga la petición
+        if parametro_usuario:
+            nombre_param, _, clave = parametro_usuario.partition(".")
+            if clave:
+                datos = valores[nombre_param] or {}
+                if datos.get(clave) not in permitidos:
+                    datos = dict(datos, **{clave: usuario_id})
+                valores[nombre_param] = datos
+            else:
+                valores[nombre_param] = usuario_id
+        ids = [i for p in parametros_eventos for i in _ids_en(_leer_parametro(valores, p))]
+        if ids:
+            ajenos = await self.en_hilo(self.daos["eventos"].propietarios, ids) - permitidos
+            if ajenos:
+                raise ErrorAPI(403, "hay eventos de calendarios a los que este usuario no tiene acceso")
+
+        resultado = await self.en_hilo(funcion, *argumentos.args, **argumentos.kwargs)
+        if escribe:
+            self.cache.invalidar(usuario_id)
+        return resultado
+
+    async def importar(self, usuario_id, filas, series):
+        # El mapa uid -> id de las series lo devuelve el servidor en cada trozo y el cliente
+        # lo reenvía en el siguiente: solo se admiten ids de eventos del propio usuario
+        if not isinstance(series, dict) or not all(isinstance(i, int) for i in series.values()):
+            raise ErrorAPI(400, "petición no válida: ids de series")
+        if series:
+            eventos, ids = self.daos["eventos"], set(series.values())
+            existentes = await self.en_hilo(eventos.obtener_versiones_eventos, list(ids))
+            if len(existentes) != len(ids) or await self.en_hilo(eventos.propietarios, list(ids)) - {usuario_id}:
+                raise ErrorAPI(403, "hay series de calendarios a los que este usuario no tiene acceso")
+        def insertar():
+            total = 0
+            for total in self.daos["eventos"].importar(usuario_id, iter(filas), len(filas) or 1, series):
+                pass
+            return total
+        insertados = await self.en_hilo(insertar)
+        self.cache.invalidar(usuario_id)
+        return insertados
+
+
+async def servir(host="127.0.0.1", puerto=PUERTO_POR_DEFECTO, servidor=None):
+    servidor = servidor or ServidorAPI()
+    tcp = await asyncio.start_server(servidor.atender, host, puerto)
+    logging.info(f"API de MiniCalendar escuchando en http://{host}:{puerto}")
+    async with tcp:
+        await tcp.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON de la API de MiniCalendar")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO)
+    parser.add_argument("--pool", type=int, default=TAM_POOL, help="conexiones a MySQL compartidas")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    activar_pool(args.pool)
+    verificar_y_crear_tablas_base()
+    DAOS_MYSQL["eventos"]().verificar_columnas()
+    DAOS_MYSQL["colores"]().sincronizar(COLORES_MAP)
+    try:
+        asyncio.run(servir(args.host, args.puerto, ServidorAPI(hilos=args.pool)))
+    except KeyboardInterrupt:
+        pass
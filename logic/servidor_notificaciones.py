@@ -0,0 +1,164 @@
+"""
+Servidor de notificaciones de cambios (long-poll).
+
+Los clientes preguntan "¿ha cambiado la versión del usuario X desde N?" y la
+petición queda en espera hasta que cambie o venza el plazo. El servidor consulta
+la BD con UNA sola consulta por intervalo para todos los usuarios con clientes
+esperando, y ninguna si no hay nadie: el coste de un cliente inactivo es una
+conexión HTTP abierta, no consultas a la BD.
+
+Uso (local, p.ej. para pruebas):
+    python -m logic.servidor_notificaciones --puerto 8765
+
+Los clientes lo encuentran con la variable de entorno NOTIF_URL (http://host:8765).
+Si se define NOTIF_TOKEN, las peticiones deben enviarlo en la cabecera X-Token.
+
+También hace de proxy de clima compartido en /clima, con los mismos parámetros
+que Open-Meteo (CLIMA_API_URL=http://host:8765/clima en los clientes): todos los
+clientes comparten su caché y las peticiones simultáneas van en una sola llamada.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from database.dao import EventosDAO
+from logic.services import AgrupadorClima, ClimaService, clave_ubicacion
+
+PUERTO_POR_DEFECTO = 8765
+INTERVALO_CONSULTA = 2.0   # segundos entre consultas a la BD (solo si hay clientes esperando)
+ESPERA_MAXIMA = 25.0       # segundos que puede quedar abierta una petición
+
+
+class EstadoVersiones:
+    """Versiones conocidas por usuario y clientes esperando cada una."""
+
+    def __init__(self, dao=None, intervalo=INTERVALO_CONSULTA):
+        self.dao = dao or EventosDAO()
+        self.intervalo = intervalo
+        self.cond = threading.Condition()
+        self.versiones = {}         # usuario_id -> versión
+        self.esperando = Counter()  # usuario_id -> nº de peticiones abiertas
+        self.consultas = 0
+        self._parar = threading.Event()
+
+    def esperar(self, usuario_id, desde, espera):
+        """Bloquea hasta que la versión del usuario supere 'desde' o venza el plazo. Devuelve la versión conocida."""
+        fin = time.monotonic() + espera
+        with self.cond:
+            self.esperando[usuario_id] += 1
+            try:
+                while self.versiones.get(usuario_id, -1) <= desde:
+                    restante = fin - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self.cond.wait(restante)
+                return self.versiones.get(usuario_id)
+            finally:
+                self.esperando[usuario_id] -= 1
+                if self.esperando[usuario_id] <= 0:
+                    del self.esperando[usuario_id]
+
+    def vigilar(self):
+        """Bucle del hilo de consulta a la BD."""
+        while not self._parar.wait(self.intervalo):
+            with self.cond:
+                usuarios = list(self.esperando)
+            if not usuarios:
+                continue
+            versiones = self.dao.obtener_versiones(usuarios)
+            self.consultas += 1
+            with self.cond:
+                self.versiones.update(versiones)
+                self.cond.notify_all()
+
+    def detener(self):
+        self._parar.set()
+
+
+class ManejadorNotificaciones(BaseHTTPRequestHandler):
+    estado = None
+    token = None
+    clima = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/clima":
+            return self._clima(parse_qs(url.query)) # Datos públicos: no requiere token
+        if self.token and self.headers.get("X-Token") != self.token:
+            return self._responder(403, {"error": "token no válido"})
+        if url.path == "/salud":
+            return self._responder(200, {"ok": True, "esperando": sum(self.estado.esperando.values()),
+                                         "consultas": self.estado.consultas})
+        if url.path != "/version":
+            return self._responder(404, {"error": "ruta desconocida"})
+
+        parametros = parse_qs(url.query)
+        try:
+            usuario_id = int(parametros["usuario"][0])
+            desde = int(parametros.get("desde", ["-1"])[0])
+            espera = min(float(parametros.get("espera", [ESPERA_MAXIMA])[0]), ESPERA_MAXIMA)
+        except (KeyError, ValueError):
+            return self._responder(400, {"error": "parámetros: usuario, desde, espera"})
+        self._responder(200, {"version": self.estado.esperar(usuario_id, desde, espera)})
+
+    def _clima(self, parametros):
+        try:
+            latitudes = [float(v) for v in parametros["latitude"][0].split(",")]
+            longitudes = [float(v) for v in parametros["longitude"][0].split(",")]
+        except (KeyError, ValueError):
+            return self._responder(400, {"error": "parámetros: latitude, longitude"})
+        coordenadas = list(zip(latitudes, longitudes))
+        try:
+            if len(coordenadas) == 1:
+                return self._responder(200, self.clima.obtener(*coordenadas[0]))
+            # Varias ubicaciones en una petición: ya van juntas en una sola llamada
+            datos = ClimaService.obtener_pronosticos(coordenadas)
+            return self._responder(200, [datos[clave_ubicacion(lat, lon)] for lat, lon in coordenadas])
+        except Exception as e:
+            return self._responder(502, {"error": f"clima no disponible: {e}"})
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, formato, *args):
+        logging.debug("Notificaciones: " + formato % args)
+
+
+def crear_servidor(host="127.0.0.1", puerto=PUERTO_POR_DEFECTO, estado=None, token=None):
+    """Crea el servidor y arranca el hilo de consulta. Llamar a serve_forever() para atender."""
+    estado = estado or EstadoVersiones()
+    manejador = type("Manejador", (ManejadorNotificaciones,), {"estado": estado, "token": token, "clima": AgrupadorClima()})
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    servidor.daemon_threads = True
+    servidor.estado = estado
+    threading.Thread(target=estado.vigilar, daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor de notificaciones de cambios de MiniCalendar")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    servidor = crear_servidor(args.host, args.puerto, token=os.getenv("NOTIF_TOKEN"))
+    logging.info(f"Servidor de notificaciones escuchando en http://{args.host}:{args.puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.estado.detener()
+        servidor.server_close()
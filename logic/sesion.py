@@ -0,0 +1,39 @@
+"""
+Ciclo de vida de una sesión (de un login al logout siguiente).
+
+Es de la sesión y se suelta al cerrarla (VentanaPrincipal.liberar_sesion): la ventana
+con sus widgets, timers, DAOs y cachés de vistas, los hilos HiloCambios, HiloClima,
+HiloGoogle e HiloICS, el pipeline de mutaciones con su diario, y los detalles (notas y
+adjuntos) que CargadorDetalles tenga del usuario.
+
+Es del proceso y se queda caliente para la siguiente sesión: el pool de conexiones,
+el catálogo de colores (ColoresDAO.catalogo_compartido), las tablas de festivos, la
+caché del clima y los hilos compartidos CargadorDetalles y GeneradorMiniaturas.
+"""
+import logging
+
+from PyQt5.QtCore import QCoreApplication
+
+
+def desconectar(*senales):
+    """Desconecta todo lo conectado a cada señal (las que no tenían nada se ignoran)."""
+    for senal in senales:
+        try:
+            senal.disconnect()
+        except TypeError:
+            pass
+
+
+def soltar_hilo(hilo, *senales):
+    """
+    Suelta un QThread de la sesión que se cierra: sus señales ya no llegan a nadie y, si
+    aún está trabajando (una descarga, una consulta), pasa a ser hijo de la aplicación y
+    se borra solo al terminar. Destruir un QThread en marcha abortaría el proceso.
+    """
+    if hilo is None:
+        return
+    desconectar(*senales)
+    if hilo.isRunning():
+        logging.info(f"{type(hilo).__name__} sigue trabajando al cerrar la sesión: se borrará al terminar")
+        hilo.setParent(QCoreApplication.instance())
+        hilo.finished.connect(hilo.deleteLater)
@@ -8,9 +8,14 @@ from PyQt5.QtGui import QPixmap, QPainter, QColor, QFont
 from PyQt5.QtCore import Qt
 from ui.login import VentanaLogin
 from ui.ventana_principal import VentanaPrincipal
-from database.dao import ColoresDAO, UsuariosDAO
+from database.dao import ColoresDAO, UsuariosDAO, MODO_CLIENTE
 from utils.config import COLORES_MAP
-from database.conexion_db import conectar_db, verificar_y_crear_tablas_base
+from logic.adjuntos import AlmacenAdjuntos
+from database.conexion_db import conectar_db, verificar_y_crear_tablas_base, activar_pool
+from utils import perfilado
+
+# Conexiones a MySQL que se reutilizan entre llamadas (hilos de la UI, mutaciones, cambios...)
+TAM_POOL_ESCRITORIO = 4
 
 # Configuración Global de Logging
 logging.basicConfig(
@@ -58,7 +63,10 @@ def crear_splash_pixmap():
     return pixmap
 
 def verificar_conexion_db():
-    """Intenta conectar a la BD y devuelve True/False."""
+    """Intenta conectar a la BD (o al servidor de la API en modo cliente) y devuelve True/False."""
+    if MODO_CLIENTE:
+        from database.remoto import ClienteAPI
+        return ClienteAPI.instancia().disponible()
     conn = conectar_db()
     if conn and conn.is_connected():
         conn.close()
@@ -79,9 +87,13 @@ def inicializacion_db_segundo_plano():
     Se envuelve en un try/except para capturar cualquier error en el hilo.
     """
     try:
+        if MODO_CLIENTE:
+            return # Las tablas y los colores los prepara el servidor de la API, y sin sesión no hay con qué limpiar adjuntos
         logging.info("Iniciando verificación de tablas y sincronización de colores...")
         verificar_y_crear_tablas_base()
         sincronizar_colores_db()
+        # Limpieza de adjuntos que quedaron sin ningún evento (p.ej. un borrado que falló)
+        AlmacenAdjuntos().recolectar_huerfanos()
         logging.info("Inicialización de BD completada con éxito.")
     except Exception as e:
         logging.error(f"Error durante la inicialización de la BD en segundo plano: {e}", exc_info=True)
@@ -90,6 +102,9 @@ def inicializacion_db_segundo_plano():
 class AppController:
     """
     Clase que gestiona el flujo de ventanas para evitar variables globales.
+
+    Cada login abre una sesión nueva y el logout la destruye entera (ver logic/sesion.py):
+    lo que no depende del usuario (pool, catálogo de colores, festivos, clima) no se toca.
     """
     def __init__(self):
         self.ventana_principal = None
@@ -99,6 +114,7 @@ class AppController:
         self.mostrar_login()
 
     def mostrar_login(self):
+        self.cerrar_principal()
         self.login_window = VentanaLogin()
         self.login_window.login_exitoso.connect(self.mostrar_principal)
         self.login_window.show()
@@ -107,9 +123,12 @@ class AppController:
         # Aseguramos que la ventana de login se cierre correctamente antes de abrir la principal
         if self.login_window:
             self.login_window.close()
+            self.login_window.deleteLater()
+            self.login_window = None
 
         # Guardamos la referencia de la ventana principal para que no se destruya
-        self.ventana_principal = VentanaPrincipal(usuario_info)
+        with perfilado.perfilar("apertura_principal"):
+            self.ventana_principal = VentanaPrincipal(usuario_info)
 
         self.ventana_principal.logout_signal.connect(self.mostrar_login)
         self.ventana_principal.showMaximized()
@@ -118,50 +137,74 @@ class AppController:
         if usuario_info.get('nombre') == 'Invitado':
             self.ventana_principal.setWindowTitle("MiniCalendar - Modo Invitado")
 
+    def cerrar_principal(self):
+        """Fin de sesión: la ventana suelta sus hilos y timers y se destruye con todos sus widgets."""
+        if self.ventana_principal is None:
+            return
+        ventana, self.ventana_principal = self.ventana_principal, None
+        ventana.liberar_sesion()
+        ventana.deleteLater()
+
 if __name__ == '__main__':
     try:
         app = QApplication(sys.argv)
+        if "--profile" in sys.argv:
+            perfilado.activar()
+        # Siempre activo: si la interfaz se queda parada, deja en el log qué la bloquea
+        perfilado.VigilanteBloqueos.iniciar()
+        with perfilado.perfilar("arranque"): # Solo graba con --profile
+            # --- SPLASH SCREEN ---
+            splash_pix = crear_splash_pixmap()
+            splash = QSplashScreen(splash_pix, Qt.WindowStaysOnTopHint)
+            splash.show()
+            splash.showMessage("Conectando con la nube...", Qt.AlignBottom | Qt.AlignCenter, Qt.white)
+            app.processEvents() # Forzar renderizado inmediato
         
-        # --- SPLASH SCREEN ---
-        splash_pix = crear_splash_pixmap()
-        splash = QSplashScreen(splash_pix, Qt.WindowStaysOnTopHint)
-        splash.show()
-        splash.showMessage("Conectando con la nube...", Qt.AlignBottom | Qt.AlignCenter, Qt.white)
-        app.processEvents() # Forzar renderizado inmediato
-        
-        # 1. VERIFICACIÓN DE CONEXIÓN
-        if not verificar_conexion_db():
-            splash.hide() # Ocultamos el splash para mostrar el error
-            QMessageBox.critical(None, "Error Crítico de Base de Datos",
-                                 "No se pudo conectar a la base de datos MySQL.\n\n"
-                                 "Revisa tus credenciales en .env y el estado del servidor.\n"
-                                 "Consulta 'minicalendar.log' para más detalles.")
-            sys.exit(1) # Salir de forma segura si no hay conexión
+            # 1. VERIFICACIÓN DE CONEXIÓN
+            if not verificar_conexion_db():
+                splash.hide() # Ocultamos el splash para mostrar el error
+                if MODO_CLIENTE:
+                    detalle = ("No se pudo conectar con el servidor de la API.\n\n"
+                               "Revisa API_URL en .env y que el servidor esté arrancado.\n")
+                else:
+                    detalle = ("No se pudo conectar a la base de datos MySQL.\n\n"
+                               "Revisa tus credenciales en .env y el estado del servidor.\n")
+                QMessageBox.critical(None, "Error Crítico de Base de Datos",
+                                     detalle + "Consulta 'minicalendar.log' para más detalles.")
+                sys.exit(1) # Salir de forma segura si no hay conexión
+
+            if not MODO_CLIENTE:
+                # Sin pool cada consulta abriría (y negociaría TLS) una conexión nueva y no se
+                # podrían reutilizar las sentencias preparadas
+                try:
+                    activar_pool(TAM_POOL_ESCRITORIO)
+                except Exception as e:
+                    logging.warning(f"No se pudo crear el pool de conexiones, se usarán conexiones sueltas: {e}")
         
-        splash.showMessage("Sincronizando datos...", Qt.AlignBottom | Qt.AlignCenter, Qt.white)
-        app.processEvents()
+            splash.showMessage("Sincronizando datos...", Qt.AlignBottom | Qt.AlignCenter, Qt.white)
+            app.processEvents()
 
-        # 2. CREACIÓN DE TABLAS Y SINCRONIZACIÓN (con timeout de 5 segundos)
-        # Se ejecuta en un hilo para no bloquear la apertura de la UI.
-        db_init_thread = threading.Thread(target=inicializacion_db_segundo_plano, daemon=True)
-        db_init_thread.start()
+            # 2. CREACIÓN DE TABLAS Y SINCRONIZACIÓN (con timeout de 5 segundos)
+            # Se ejecuta en un hilo para no bloquear la apertura de la UI.
+            db_init_thread = threading.Thread(target=inicializacion_db_segundo_plano, daemon=True)
+            db_init_thread.start()
         
-        splash.showMessage("Iniciando interfaz...", Qt.AlignBottom | Qt.AlignCenter, Qt.white)
-        app.processEvents()
+            splash.showMessage("Iniciando interfaz...", Qt.AlignBottom | Qt.AlignCenter, Qt.white)
+            app.processEvents()
         
-        # Esperamos un máximo de 5 segundos a que termine
-        db_init_thread.join(timeout=5.0)
+            # Esperamos un máximo de 5 segundos a que termine
+            db_init_thread.join(timeout=5.0)
         
-        if db_init_thread.is_alive():
-            logging.warning("La inicialización de la base de datos ha superado los 5 segundos. La aplicación continuará de todos modos.")
-            # El hilo seguirá en segundo plano. Si termina, bien. Si no, no bloquea.
+            if db_init_thread.is_alive():
+                logging.warning("La inicialización de la base de datos ha superado los 5 segundos. La aplicación continuará de todos modos.")
+                # El hilo seguirá en segundo plano. Si termina, bien. Si no, no bloquea.
 
-        # 3. Iniciamos el controlador de la aplicación inmediatamente
-        controlador = AppController()
-        controlador.iniciar()
+            # 3. Iniciamos el controlador de la aplicación inmediatamente
+            controlador = AppController()
+            controlador.iniciar()
         
-        # El splash se cerrará suavemente cuando aparezca la ventana de login
-        splash.finish(controlador.login_window)
+            # El splash se cerrará suavemente cuando aparezca la ventana de login
+            splash.finish(controlador.login_window)
 
         sys.exit(app.exec_())
     except Exception as e:
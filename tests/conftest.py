@@ -0,0 +1,29 @@
+"""
+Configuración común de las pruebas. Se lanzan desde la raíz del proyecto:
+
+    python -m pytest -q
+
+Ninguna toca MySQL ni Internet: los DAO son los de tests/falsos.py y Qt va en modo
+'offscreen', así que también corren sin pantalla.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Antes de importar nada del proyecto: los módulos leen estas variables al cargarse
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ["API_URL"] = ""      # DAO de MySQL aunque haya un .env en modo cliente
+os.environ["NOTIF_URL"] = ""    # HiloCambios sondea su DAO (falso) en lugar de un servidor
+os.environ["CLIMA_CACHE_DIR"] = tempfile.mkdtemp(prefix="minicalendar_clima_")
+os.environ["DIARIO_DIR"] = tempfile.mkdtemp(prefix="minicalendar_diarios_")
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
@@ -0,0 +1,253 @@
+"""
+DAO falsos en memoria con los mismos métodos (y firmas) que los de database.dao, para
+probar la interfaz, el pipeline y la API sin MySQL.
+
+Todos los DAO de unas mismas DatosFalsos ven las mismas tablas: daos_falsos(datos)
+devuelve clases enlazadas a ellas, con la forma de DAOS_MYSQL, porque tanto ServidorAPI
+como el resto de la aplicación instancian los DAO sin argumentos.
+"""
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from utils.config import COLORES_MAP
+
+COLOR_POR_DEFECTO = "#3498DB"
+
+
+class DatosFalsos:
+    """Las "tablas": usuarios, eventos y el sello de versión de cada usuario."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.usuarios = {}
+        self.eventos = {}
+        self.versiones = Counter()
+        self.llamadas = Counter() # "dao.metodo" -> veces
+        self._ids = itertools.count(1)
+        self.colores = {hex_code.upper(): id_color for id_color, hex_code in enumerate(sorted(set(COLORES_MAP.values())), 1)}
+
+    def nuevo_usuario(self, nombre, email, password="secreta"):
+        with self.lock:
+            id_usuario = len(self.usuarios) + 1
+            self.usuarios[id_usuario] = {'id_usuario': id_usuario, 'nombre': nombre, 'email': email, 'password': password}
+            return self.usuarios[id_usuario]
+
+    def nuevo_evento(self, usuario_id, titulo, fecha_inicio, **campos):
+        with self.lock:
+            self.versiones[usuario_id] += 1
+            fila = {
+                'id_evento': next(self._ids), 'usuario_id': usuario_id, 'titulo': titulo, 'descripcion': "",
+                'fecha_inicio': fecha_inicio, 'color_db_string': COLOR_POR_DEFECTO, 'archivo_adjunto': None,
+                'es_importante': False, 'minutos_aviso': 0, 'duracion_minutos': 0, 'regla_recurrencia': None,
+                'excepciones_recurrencia': None, 'serie_id': None, 'fecha_original': None,
+                'version': self.versiones[usuario_id],
+            }
+            fila.update(campos)
+            self.eventos[fila['id_evento']] = fila
+            return fila
+
+    def resumen(self, fila):
+        """La fila como la devuelve SQL_RESUMEN_DE_USUARIO (sin notas ni ruta del adjunto)."""
+        dueno = self.usuarios.get(fila['usuario_id'], {})
+        resumen = {k: v for k, v in fila.items() if k not in ('usuario_id', 'descripcion', 'archivo_adjunto')}
+        resumen.update(tiene_notas=bool(fila['descripcion']), tiene_adjunto=fila['archivo_adjunto'] is not None,
+                       propietario_id=fila['usuario_id'], propietario_nombre=dueno.get('nombre'),
+                       permiso='propietario', color_calendario=None)
+        return resumen
+
+    def de_usuario(self, usuario_id):
+        with self.lock:
+            return sorted((e for e in self.eventos.values() if e['usuario_id'] == usuario_id),
+                          key=lambda e: (e['fecha_inicio'], e['titulo'], e['id_evento']))
+
+
+class _DAOFalso:
+    datos = None # DatosFalsos: lo fija daos_falsos() en cada subclase
+    nombre = None
+
+    def __getattribute__(self, nombre):
+        atributo = object.__getattribute__(self, nombre)
+        if callable(atributo) and not nombre.startswith("_"):
+            object.__getattribute__(self, "datos").llamadas[f"{type(self).nombre}.{nombre}"] += 1
+        return atributo
+
+    @contextmanager
+    def lote(self):
+        yield
+
+    @contextmanager
+    def punto_guardado(self, nombre="operacion"):
+        yield
+
+
+class UsuariosDAOFalso(_DAOFalso):
+    nombre = "usuarios"
+
+    def autenticar(self, email, password):
+        with self.datos.lock:
+            for usuario in self.datos.usuarios.values():
+                if usuario['email'] == email and usuario['password'] == password:
+                    return {'id_usuario': usuario['id_usuario'], 'nombre': usuario['nombre']}
+        return None
+
+    def login_invitado(self):
+        return self.autenticar("invitado@demo.com", "demo")
+
+    def registrar(self, nombre, email, password):
+        self.datos.nuevo_usuario(nombre, email, password)
+        return True, "Usuario registrado correctamente."
+
+    def obtener_region_festivos(self, id_usuario):
+        return None
+
+    def guardar_region_festivos(self, id_usuario, region):
+        pass
+
+    def obtener_ubicacion_clima(self, id_usuario):
+        return None
+
+    def guardar_ubicacion_clima(self, id_usuario, nombre, latitud, longitud):
+        pass
+
+
+class ColoresDAOFalso(_DAOFalso):
+    nombre = "colores"
+
+    def obtener_catalogo(self):
+        return dict(self.datos.colores)
+
+    def catalogo_compartido(self):
+        return self.obtener_catalogo()
+
+    def obtener_id_por_hex(self, hex_code):
+        return self.datos.colores.get(hex_code.upper())
+
+    def sincronizar(self, mapa_colores):
+        pass
+
+
+class CalendariosDAOFalso(_DAOFalso):
+    nombre = "calendarios"
+
+    def obtener_visibles(self, usuario_id):
+        usuario = self.datos.usuarios.get(usuario_id, {})
+        return [{'propietario_id': usuario_id, 'nombre': usuario.get('nombre'), 'permiso': 'propietario',
+                 'color': None, 'version': self.datos.versiones[usuario_id]}]
+
+    def propietarios_visibles(self, usuario_id):
+        return {usuario_id}
+
+    def propietarios_editables(self, usuario_id):
+        return {usuario_id}
+
+
+class EventosDAOFalso(_DAOFalso):
+    nombre = "eventos"
+
+    def verificar_columnas(self):
+        pass
+
+    def obtener_resumen_por_usuario(self, usuario_id):
+        return [self.datos.resumen(e) for e in self.datos.de_usuario(usuario_id)]
+
+    def obtener_por_usuario(self, usuario_id):
+        return [{k: v for k, v in e.items() if k != 'usuario_id'} for e in self.datos.de_usuario(usuario_id)]
+
+    def obtener_rango(self, usuario_id, desde, hasta):
+        return [e for e in self.obtener_por_usuario(usuario_id)
+                if e['fecha_inicio'] < hasta and (e['fecha_inicio'] >= desde or e['regla_recurrencia'])]
+
+    def obtener_detalles(self, ids_eventos):
+        with self.datos.lock:
+            return {i: {'descripcion': self.datos.eventos[i]['descripcion'], 'archivo_adjunto': self.datos.eventos[i]['archivo_adjunto']}
+                    for i in ids_eventos if i in self.datos.eventos}
+
+    def obtener_descripciones(self, usuario_id):
+        return {e['id_evento']: e['descripcion'] for e in self.datos.de_usuario(usuario_id) if e['descripcion']}
+
+    def obtener_pagina_agenda(self, usuario_id, cursor, adelante=True, limite=100, filtro=None):
+        fecha, id_evento = cursor
+        filas = [self.datos.resumen(e) for e in self.datos.de_usuario(usuario_id) if not e['regla_recurrencia']]
+        if adelante:
+            filas = [e for e in filas if (e['fecha_inicio'], e['id_evento']) > (fecha, id_evento)]
+            return filas[:limite]
+        return [e for e in filas if (e['fecha_inicio'], e['id_evento']) < (fecha, id_evento)][-limite:]
+
+    def obtener_proximos(self, usuario_id, desde, limite=50, filtro=None, cursor=None):
+        return self.obtener_pagina_agenda(usuario_id, cursor or (desde, 0), True, limite, filtro)
+
+    def buscar(self, usuario_id, texto, limite=50):
+        texto = texto.lower()
+        return [self.datos.resumen(e) for e in self.datos.de_usuario(usuario_id) if texto in e['titulo'].lower()][:limite]
+
+    def propietarios(self, ids_eventos):
+        with self.datos.lock:
+            return {self.datos.eventos[i]['usuario_id'] for i in ids_eventos if i in self.datos.eventos}
+
+    def guardar(self, datos, modo='crear', id_evento=None):
+        campos = {k: v for k, v in datos.items() if k not in ('color_id', 'usuario_id')}
+        with self.datos.lock:
+            if modo == 'crear':
+                return self.datos.nuevo_evento(datos['usuario_id'], **campos)['id_evento']
+            fila = self.datos.eventos[id_evento]
+            self.datos.versiones[fila['usuario_id']] += 1
+            fila.update(campos, version=self.datos.versiones[fila['usuario_id']])
+            return id_evento
+
+    def importar(self, usuario_id, eventos, tam_lote=500, series=None):
+        series = {} if series is None else series
+        total = 0
+        for evento in eventos:
+            serie_id = series.get(evento.get('uid')) if evento.get('fecha_original') else None
+            campos = {k: evento.get(k) for k in ('descripcion', 'es_importante', 'minutos_aviso', 'regla_recurrencia',
+                                                  'excepciones_recurrencia')}
+            fila = self.datos.nuevo_evento(usuario_id, evento['titulo'], evento['fecha_inicio'], serie_id=serie_id,
+                                           fecha_original=evento['fecha_original'] if serie_id else None, **campos)
+            if evento.get('regla_recurrencia') and evento.get('uid'):
+                series[evento['uid']] = fila['id_evento']
+            total += 1
+        yield total
+
+    def eliminar(self, id_evento):
+        with self.datos.lock:
+            fila = self.datos.eventos.pop(id_evento, None)
+            if fila:
+                self.datos.versiones[fila['usuario_id']] += 1
+
+    def obtener_version(self, usuario_id):
+        return self.datos.versiones[usuario_id]
+
+    def obtener_versiones_eventos(self, ids_eventos):
+        with self.datos.lock:
+            return {i: self.datos.eventos[i]['version'] for i in ids_eventos if i in self.datos.eventos}
+
+    def obtener_cambios_visibles(self, usuario_id, desde):
+        desde = {int(k): v for k, v in desde.items()}
+        filas = [self.datos.resumen(e) for e in self.datos.de_usuario(usuario_id) if e['version'] > desde.get(usuario_id, -1)]
+        return filas, [], CalendariosDAOFalso.obtener_visibles(self, usuario_id)
+
+    def contar_referencias_adjunto(self, ruta, usuario_id=None):
+        with self.datos.lock:
+            return sum(1 for e in self.datos.eventos.values()
+                       if e['archivo_adjunto'] == ruta and usuario_id in (None, e['usuario_id']))
+
+    def obtener_rutas_adjuntos(self, usuario_id=None):
+        with self.datos.lock:
+            return sorted({e['archivo_adjunto'] for e in self.datos.eventos.values()
+                           if e['archivo_adjunto'] and usuario_id in (None, e['usuario_id'])})
+
+
+def daos_falsos(datos):
+    """{"usuarios": clase, ...} como DAOS_MYSQL, con todas las clases sobre las mismas 'datos'."""
+    return {clase.nombre: type(clase.__name__, (clase,), {'datos': datos})
+            for clase in (UsuariosDAOFalso, ColoresDAOFalso, EventosDAOFalso, CalendariosDAOFalso)}
+
+
+def eventos_de_ejemplo(datos, usuario_id, n=50, desde=datetime(2026, 1, 1, 9)):
+    """Unos cuantos eventos repartidos por las cuatro semanas siguientes a 'desde'."""
+    return [datos.nuevo_evento(usuario_id, f"Evento {k}", desde + timedelta(days=k % 28, hours=k % 8),
+                               duracion_minutos=30 * (k % 3), es_importante=k % 7 == 0)
+            for k in range(n)]
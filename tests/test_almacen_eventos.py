@@ -0,0 +1,130 @@
+"""
+AlmacenColumnar (logic/almacen_eventos.py): mismos resultados que recorrer la lista
+de eventos, con NumPy y sin él, también con 100k eventos. El benchmark de tiempos
+frente al recorrido completo solo corre con BENCH_ALMACEN=1 en el entorno.
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from logic import almacen_eventos
+from logic.almacen_eventos import AlmacenColumnar
+
+BASE = datetime(2024, 1, 1)
+COLORES = ["#FF0000", "#00FF00", "#FFA500"]
+
+
+def eventos_aleatorios(n, anios=3, semilla=26):
+    azar = random.Random(semilla)
+    return [{
+        'id_evento': k,
+        'titulo': f"Evento {k}",
+        'fecha_inicio': BASE + timedelta(minutes=azar.randrange(0, 60 * 24 * 365 * anios)),
+        'color_db_string': azar.choice(COLORES),
+        'es_importante': azar.random() < 0.05,
+        'minutos_aviso': azar.choice([0, 0, 15, 60, 24 * 60]),
+    } for k in range(n)]
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "listas"])
+def con_numpy(request, monkeypatch):
+    if request.param and not almacen_eventos.NUMPY_OK:
+        pytest.skip("NumPy no está instalado")
+    monkeypatch.setattr(almacen_eventos, "NUMPY_OK", request.param)
+    return request.param
+
+
+def test_consultas_iguales_que_recorrer_la_lista(con_numpy):
+    eventos = eventos_aleatorios(5000)
+    almacen = AlmacenColumnar(eventos)
+
+    desde, hasta = datetime(2025, 3, 10, 8), datetime(2025, 4, 2, 17, 30)
+    esperados = sorted((e for e in eventos if desde <= e['fecha_inicio'] < hasta),
+                       key=lambda e: (e['fecha_inicio'], e['titulo'], e['id_evento']))
+    assert almacen.eventos_en_rango(desde, hasta) == esperados
+
+    assert almacen.conteo_por_mes(2025) == [
+        sum(1 for e in eventos if e['fecha_inicio'].year == 2025 and e['fecha_inicio'].month == m) for m in range(1, 13)]
+    assert almacen.conteo_por_dia(2024, 2) == [
+        sum(1 for e in eventos if e['fecha_inicio'].date() == datetime(2024, 2, d).date()) for d in range(1, 30)]
+
+    en_rango = [e for e in eventos if desde <= e['fecha_inicio'] < hasta]
+    assert almacen.conteo_por_color(desde, hasta) == {
+        c: n for c in COLORES if (n := sum(1 for e in en_rango if e['color_db_string'] == c))}
+
+    assert [e['id_evento'] for e in almacen.importantes_lista(desde)] == [
+        e['id_evento'] for e in sorted(eventos, key=lambda e: (e['fecha_inicio'], e['titulo'], e['id_evento']))
+        if e['es_importante'] and e['fecha_inicio'] >= desde]
+
+    ahora = datetime(2025, 6, 1, 12)
+    pendientes = {e['id_evento'] for e in eventos
+                  if e['minutos_aviso'] and e['fecha_inicio'] - timedelta(minutes=e['minutos_aviso']) <= ahora <= e['fecha_inicio']}
+    assert {e['id_evento'] for e in almacen.pendientes_aviso(ahora)} == pendientes
+    assert pendientes # La muestra tiene avisos a 24 h: la comprobación no es trivial
+
+
+def test_almacen_vacio(con_numpy):
+    almacen = AlmacenColumnar([])
+    assert len(almacen) == 0
+    assert almacen.eventos_dia(BASE) == []
+    assert almacen.conteo_por_mes(2024) == [0] * 12
+    assert almacen.conteo_por_dia(2024, 2) == [0] * 29
+    assert almacen.conteo_por_color(BASE, BASE + timedelta(days=1)) == {}
+    assert almacen.importantes_lista() == []
+    assert almacen.pendientes_aviso(BASE) == []
+
+
+def test_sin_avisos_no_hay_pendientes(con_numpy):
+    eventos = [dict(e, minutos_aviso=0) for e in eventos_aleatorios(100)]
+    assert AlmacenColumnar(eventos).pendientes_aviso(BASE + timedelta(days=100)) == []
+
+
+def test_conteos_con_100k_eventos(con_numpy):
+    """Con el volumen de un calendario grande, las consultas de las vistas coinciden con recorrer la lista."""
+    eventos = eventos_aleatorios(100_000, anios=8)
+    almacen = AlmacenColumnar(eventos)
+    dia, ahora = datetime(2026, 6, 15), datetime(2026, 6, 15, 9)
+
+    assert almacen.conteo_por_mes(2026) == [
+        sum(1 for e in eventos if e['fecha_inicio'].year == 2026 and e['fecha_inicio'].month == m) for m in range(1, 13)]
+    assert almacen.conteo_por_dia(2026, 6) == [
+        sum(1 for e in eventos if e['fecha_inicio'].date() == datetime(2026, 6, d).date()) for d in range(1, 31)]
+    assert {e['id_evento'] for e in almacen.eventos_dia(dia)} == {
+        e['id_evento'] for e in eventos if e['fecha_inicio'].date() == dia.date()}
+    assert {e['id_evento'] for e in almacen.pendientes_aviso(ahora)} == {
+        e['id_evento'] for e in eventos
+        if e['minutos_aviso'] and e['fecha_inicio'] - timedelta(minutes=e['minutos_aviso']) <= ahora <= e['fecha_inicio']}
+    assert sum(almacen.conteo_por_color(BASE, BASE + timedelta(days=366 * 8)).values()) == len(eventos)
+
+
+def _por_consulta(funcion, repeticiones=20):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - t0) / repeticiones
+
+
+@pytest.mark.skipif(not os.getenv("BENCH_ALMACEN"), reason="benchmark de tiempos: solo con BENCH_ALMACEN=1")
+def test_benchmark_conteos_con_100k_eventos():
+    """Las consultas de las vistas (mapa de calor, día, avisos) no escalan con el total de eventos."""
+    if not almacen_eventos.NUMPY_OK:
+        pytest.skip("NumPy no está instalado")
+    eventos = eventos_aleatorios(100_000, anios=8)
+    almacen = AlmacenColumnar(eventos)
+    dia, ahora = datetime(2026, 6, 15), datetime(2026, 6, 15, 9)
+
+    columnar = _por_consulta(lambda: (almacen.conteo_por_mes(2026), almacen.conteo_por_dia(2026, 6),
+                                      almacen.eventos_dia(dia), almacen.pendientes_aviso(ahora)))
+    # Lo que hacían las vistas antes: recorrer todos los eventos en cada consulta
+    recorrido = _por_consulta(lambda: (
+        [sum(1 for e in eventos if e['fecha_inicio'].year == 2026 and e['fecha_inicio'].month == m) for m in range(1, 13)],
+        [e for e in eventos if e['fecha_inicio'].date() == dia.date()],
+    ), repeticiones=2)
+
+    assert columnar * 20 < recorrido, f"columnar={columnar * 1e3:.2f} ms recorrido={recorrido * 1e3:.2f} ms"
+
+    # La consulta de un día (búsqueda binaria y un corte) sigue por debajo del milisegundo
+    assert _por_consulta(lambda: almacen.eventos_dia(dia), repeticiones=200) < 1e-3
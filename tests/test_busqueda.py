@@ -0,0 +1,70 @@
+"""
+Índice de búsqueda local (logic/busqueda.py) sobre filas del resumen, que traen el
+título pero no las notas: la descripción se busca igual con las cargadas aparte.
+"""
+from datetime import datetime
+
+from logic.busqueda import IndiceBusqueda
+
+
+def resumen(id_evento, titulo, tiene_notas=False, **campos):
+    return dict(id_evento=id_evento, titulo=titulo, fecha_inicio=datetime(2026, 1, id_evento, 9),
+                tiene_notas=tiene_notas, **campos)
+
+
+def ids(resultados):
+    return [e['id_evento'] for e in resultados]
+
+
+def test_las_notas_se_buscan_aunque_el_resumen_no_las_traiga():
+    indice = IndiceBusqueda()
+    indice.descripciones = {"1": "Llevar el informe trimestral"}
+    indice.sincronizar([resumen(1, "Reunión", tiene_notas=True), resumen(2, "Dentista")])
+
+    assert ids(indice.buscar("trimes")) == [1]
+    assert ids(indice.buscar("reunion informe")) == [1]
+
+
+def test_las_notas_siguen_a_las_filas_que_las_traen():
+    indice = IndiceBusqueda()
+    indice.descripciones = {"1": "Llevar el informe"}
+    fila = resumen(1, "Reunión", tiene_notas=True)
+    indice.sincronizar([fila])
+
+    # El editor guarda la fila con su descripción nueva
+    indice.agregar(dict(fila, descripcion="Preparar la demo"))
+    assert ids(indice.buscar("demo")) == [1] and indice.buscar("informe") == []
+    # Un cambio posterior que solo trae el resumen conserva la última descripción conocida
+    indice.agregar(dict(fila, titulo="Reunión semanal"))
+    assert ids(indice.buscar("semanal demo")) == [1]
+    # Sin notas ya no hay nada que buscar en ellas
+    indice.agregar(dict(fila, tiene_notas=False))
+    assert indice.buscar("demo") == []
+
+
+def test_los_borrados_olvidan_sus_notas():
+    indice = IndiceBusqueda()
+    indice.descripciones = {"1": "Notas"}
+    indice.sincronizar([resumen(1, "Uno", tiene_notas=True)])
+    indice.sincronizar([])
+    assert indice.buscar("notas") == [] and indice.descripciones == {}
+
+
+def test_actualizar_solo_con_las_filas_cambiadas():
+    filas = [resumen(k, f"Evento {k}") for k in range(1, 6)]
+    indice = IndiceBusqueda()
+    indice.sincronizar(filas)
+
+    nueva = dict(resumen(6, "Temporal"), id_evento=-1, descripcion="Cita nueva")
+    filas[0]['titulo'] = "Revisión anual"
+    indice.actualizar([(filas[0], True), (filas[1], False), (nueva, True)])
+    assert ids(indice.buscar("revision")) == [1]
+    assert indice.buscar("evento 2") == []
+    assert ids(indice.buscar("cita")) == [-1]
+
+    # Al confirmar, la fila pasa de su id temporal al real: se re-indexa con la clave nueva
+    nueva['id_evento'] = 60
+    indice.actualizar([(nueva, True)])
+    assert ids(indice.buscar("cita")) == [60] and set(indice.eventos) == {"1", "3", "4", "5", "60"}
+    indice.actualizar([(nueva, False)])
+    assert indice.buscar("cita") == []
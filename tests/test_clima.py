@@ -0,0 +1,121 @@
+"""
+Clima por ubicación (logic/services.py) contra un doble local de Open-Meteo: una
+sola petición para varias coordenadas, caché compartida por ubicación y el
+agrupador que sirve a muchos clientes con una llamada.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from logic.services import UBICACIONES, AgrupadorClima, CacheClima, ClimaService, clave_ubicacion
+
+
+def pronostico(latitud, longitud):
+    return {
+        "latitude": latitud, "longitude": longitud,
+        "current_weather": {"temperature": round(latitud, 1), "weathercode": 0},
+        "daily": {"time": ["2026-01-01"], "weathercode": [0],
+                  "temperature_2m_max": [latitud], "temperature_2m_min": [longitud]},
+    }
+
+
+class DobleOpenMeteo(BaseHTTPRequestHandler):
+    """Responde como Open-Meteo: un objeto con una coordenada, una lista con varias."""
+    peticiones = None # [{"latitude": [...], "longitude": [...]}, ...], lo fija el fixture
+
+    def do_GET(self):
+        consulta = parse_qs(urlparse(self.path).query)
+        latitudes = [float(v) for v in consulta["latitude"][0].split(",")]
+        longitudes = [float(v) for v in consulta["longitude"][0].split(",")]
+        self.peticiones.append({"latitude": latitudes, "longitude": longitudes})
+        datos = [pronostico(lat, lon) for lat, lon in zip(latitudes, longitudes)]
+        cuerpo = json.dumps(datos if len(datos) > 1 else datos[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def open_meteo(monkeypatch, tmp_path):
+    """URL del doble y la lista de peticiones que recibe; la caché va a una carpeta vacía."""
+    peticiones = []
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), type("Doble", (DobleOpenMeteo,), {"peticiones": peticiones}))
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    monkeypatch.setattr(ClimaService, "cache", CacheClima(str(tmp_path)))
+    yield f"http://127.0.0.1:{servidor.server_address[1]}/v1/forecast", peticiones
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_varias_ubicaciones_en_una_peticion(open_meteo):
+    url, peticiones = open_meteo
+    coordenadas = [(u.latitud, u.longitud) for u in UBICACIONES[:3]]
+
+    resultado = ClimaService.obtener_pronosticos(coordenadas, url)
+
+    assert len(peticiones) == 1
+    assert peticiones[0]["latitude"] == [lat for lat, _ in coordenadas]
+    for lat, lon in coordenadas:
+        assert resultado[clave_ubicacion(lat, lon)]["latitude"] == lat
+
+
+def test_una_sola_ubicacion(open_meteo):
+    url, peticiones = open_meteo
+    sevilla = UBICACIONES[0]
+    resultado = ClimaService.obtener_pronosticos([(sevilla.latitud, sevilla.longitud)], url)
+    assert resultado[clave_ubicacion(sevilla.latitud, sevilla.longitud)]["current_weather"]["weathercode"] == 0
+    assert len(peticiones) == 1
+
+
+def test_la_cache_solo_pide_lo_que_falta(open_meteo):
+    url, peticiones = open_meteo
+    madrid, barcelona, valencia = UBICACIONES[1:4]
+    ClimaService.obtener_pronosticos([(madrid.latitud, madrid.longitud), (barcelona.latitud, barcelona.longitud)], url)
+
+    # Lo ya descargado sale de la caché; solo Valencia va a la API
+    resultado = ClimaService.obtener_pronosticos([(madrid.latitud, madrid.longitud), (valencia.latitud, valencia.longitud)], url)
+    assert len(peticiones) == 2
+    assert peticiones[1]["latitude"] == [valencia.latitud]
+    assert set(resultado) == {clave_ubicacion(madrid.latitud, madrid.longitud), clave_ubicacion(valencia.latitud, valencia.longitud)}
+
+    # Coordenadas a menos de ~1 km comparten entrada de caché
+    ClimaService.obtener_pronosticos([(madrid.latitud + 0.001, madrid.longitud - 0.001)], url)
+    assert len(peticiones) == 2
+
+
+def test_la_cache_caduca(open_meteo, tmp_path, monkeypatch):
+    url, peticiones = open_meteo
+    monkeypatch.setattr(ClimaService, "cache", CacheClima(str(tmp_path), ttl=-1))
+    sevilla = UBICACIONES[0]
+    ClimaService.obtener_pronosticos([(sevilla.latitud, sevilla.longitud)], url)
+    ClimaService.obtener_pronosticos([(sevilla.latitud, sevilla.longitud)], url)
+    assert len(peticiones) == 2
+
+
+def test_el_agrupador_sirve_a_muchos_clientes_con_una_llamada(open_meteo):
+    url, peticiones = open_meteo
+    agrupador = AgrupadorClima(ventana=0.3, url_base=url)
+    clientes = [UBICACIONES[k % len(UBICACIONES)] for k in range(24)]
+
+    with ThreadPoolExecutor(max_workers=len(clientes)) as hilos:
+        resultados = list(hilos.map(lambda u: agrupador.obtener(u.latitud, u.longitud), clientes))
+
+    assert agrupador.llamadas == 1
+    assert len(peticiones) == 1
+    assert sorted(peticiones[0]["latitude"]) == sorted(u.latitud for u in UBICACIONES)
+    assert [r["latitude"] for r in resultados] == [u.latitud for u in clientes]
+
+
+def test_fallo_de_la_api(open_meteo):
+    with pytest.raises(Exception):
+        ClimaService.obtener_pronosticos([(1.0, 2.0)], "http://127.0.0.1:9/no-hay-nada")
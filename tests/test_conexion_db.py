@@ -0,0 +1,145 @@
+"""
+Conector y sentencias preparadas (database/conexion_db.py). Lo que no necesita servidor
+se prueba con conexiones falsas; el benchmark contra MySQL real (extensión C frente a
+Python puro, texto frente a preparada) solo corre con credenciales en el entorno y
+BENCH_USUARIO_ID apuntando a un usuario con muchos eventos.
+"""
+import os
+
+import pytest
+
+from database import conexion_db
+from database.conexion_db import (HAVE_CEXT, USAR_PURE, _ConexionDelPool, consultar_preparada,
+                                  ejecutar_preparada, parametros_conexion)
+from database.dao import _ConexionDeLote
+
+SQL_A = "SELECT id_evento, titulo FROM eventos WHERE usuario_id = %s"
+SQL_B = "UPDATE eventos SET titulo = %s WHERE id_evento = %s"
+
+
+class CursorFalso:
+    def __init__(self, preparado, dictionary):
+        self.preparado = preparado
+        self.dictionary = dictionary
+        self.ejecuciones = []
+        self.cerrado = False
+        self.column_names = ("id_evento", "titulo")
+        self.lastrowid = 7
+
+    def execute(self, sql, parametros=()):
+        self.ejecuciones.append((sql, parametros))
+
+    def fetchall(self):
+        if self.dictionary:
+            return [{"id_evento": 1, "titulo": "Uno"}]
+        return [(1, "Uno")]
+
+    def close(self):
+        self.cerrado = True
+
+
+class ConexionFalsa:
+    def __init__(self, connection_id=1):
+        self.connection_id = connection_id
+        self.cursores = []
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.cierres = 0
+
+    def cursor(self, prepared=False, dictionary=False):
+        cursor = CursorFalso(prepared, dictionary)
+        self.cursores.append(cursor)
+        return cursor
+
+    def preparados(self):
+        return [c for c in self.cursores if c.preparado]
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.cierres += 1
+
+
+class ConexionAgrupada:
+    """Como PooledMySQLConnection: la conexión real va en _cnx."""
+    def __init__(self, cnx):
+        self._cnx = cnx
+
+
+@pytest.fixture
+def con_pool(monkeypatch):
+    monkeypatch.setattr(conexion_db, "_pool", object())
+
+
+def test_sin_pool_se_consulta_como_texto():
+    conn = ConexionFalsa()
+    assert consultar_preparada(conn, SQL_A, (1,), dictionary=True) == [{"id_evento": 1, "titulo": "Uno"}]
+    assert ejecutar_preparada(conn, SQL_B, ("x", 1)) == 7
+    assert conn.preparados() == []
+    assert all(c.cerrado for c in conn.cursores) # Conexión de un solo uso: nada se queda abierto
+
+
+def test_con_pool_cada_sentencia_se_prepara_una_vez_por_conexion(con_pool):
+    conn = ConexionFalsa()
+    for k in range(500):
+        consultar_preparada(conn, SQL_A, (k,))
+        ejecutar_preparada(conn, SQL_B, ("x", k))
+
+    preparados = conn.preparados()
+    assert len(preparados) == 2 # El SQL se envía y se analiza una vez; después solo viajan parámetros
+    assert sorted(len(c.ejecuciones) for c in preparados) == [500, 500]
+
+
+def test_filas_como_diccionario_desde_el_cursor_preparado(con_pool):
+    assert consultar_preparada(ConexionFalsa(), SQL_A, (1,), dictionary=True) == [{"id_evento": 1, "titulo": "Uno"}]
+
+
+def test_una_reconexion_vuelve_a_preparar(con_pool):
+    conn = ConexionFalsa(connection_id=10)
+    consultar_preparada(conn, SQL_A, (1,))
+    conn.connection_id = 11 # El pool reconectó: el servidor ya no tiene la sentencia
+    consultar_preparada(conn, SQL_A, (1,))
+    assert len(conn.preparados()) == 2
+
+
+def test_los_envoltorios_comparten_las_preparadas_de_la_conexion_fisica(con_pool):
+    fisica = ConexionFalsa()
+    for envoltorio in (fisica, ConexionAgrupada(fisica), _ConexionDelPool(ConexionAgrupada(fisica)),
+                       _ConexionDeLote(_ConexionDelPool(ConexionAgrupada(fisica)))):
+        consultar_preparada(envoltorio, SQL_A, (1,))
+    assert len(fisica.preparados()) == 1
+
+
+def test_la_conexion_vuelve_al_pool_sin_transaccion_abierta():
+    fisica = ConexionFalsa()
+    fisica.in_transaction = True
+    with _ConexionDelPool(fisica) as conn:
+        pass
+    conn.close() # Cerrar dos veces no la devuelve dos veces
+    assert fisica.rollbacks == 1 and fisica.cierres == 1
+
+
+def test_se_usa_la_extension_c_si_esta_disponible(monkeypatch):
+    for variable, valor in (("DB_USER", "u"), ("DB_PASS", "p"), ("DB_HOST", "h")):
+        monkeypatch.setenv(variable, valor)
+    assert parametros_conexion()["use_pure"] is USAR_PURE
+    if os.getenv("DB_USE_PURE") != "1":
+        assert USAR_PURE is (not HAVE_CEXT)
+
+
+@pytest.mark.skipif(not (os.getenv("DB_HOST") and os.getenv("BENCH_USUARIO_ID")),
+                    reason="necesita MySQL (DB_HOST, DB_USER, DB_PASS) y BENCH_USUARIO_ID")
+def test_benchmark_extension_c_y_preparadas():
+    resultados = conexion_db.medir_consultas(int(os.environ["BENCH_USUARIO_ID"]), repeticiones=5)
+    modos = {modo for modo, _, _ in resultados}
+    for consulta in ("completa", "resumen"):
+        for modo in modos:
+            texto, preparada = resultados[(modo, consulta, False)], resultados[(modo, consulta, True)]
+            assert preparada['filas'] == texto['filas']
+            assert preparada['segundos'] <= texto['segundos'] * 1.2, (modo, consulta, resultados)
+        if "C" in modos:
+            assert resultados[("C", consulta, False)]['segundos'] < resultados[("puro", consulta, False)]['segundos']
+    # El resumen de las vistas no trae descripción ni adjunto: menos datos que la carga completa
+    assert resultados[("puro", "resumen", False)]['bytes'] <= resultados[("puro", "completa", False)]['bytes']
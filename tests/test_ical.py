@@ -0,0 +1,77 @@
+"""
+Importación .ics (logic/ical.py): las ocurrencias modificadas que llegan antes que
+su serie se enlazan a ella al final, sin acumularlas en memoria.
+"""
+import tracemalloc
+from datetime import datetime
+
+from logic import ical
+from tests.falsos import DatosFalsos, daos_falsos
+
+
+def vevent(uid, inicio, titulo, regla=None, recurrencia=None):
+    lineas = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTART:{inicio}", f"SUMMARY:{titulo}"]
+    if regla:
+        lineas.append(f"RRULE:{regla}")
+    if recurrencia:
+        lineas.append(f"RECURRENCE-ID:{recurrencia}")
+    return lineas + ["END:VEVENT"]
+
+
+def escribir_ics(ruta, vevents):
+    with open(ruta, "w", encoding="utf-8", newline="") as f:
+        f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n")
+        for lineas in vevents:
+            f.write("".join(l + "\r\n" for l in lineas))
+        f.write("END:VCALENDAR\r\n")
+
+
+def importar(tmp_path, monkeypatch, vevents):
+    datos = DatosFalsos()
+    usuario = datos.nuevo_usuario("Ana", "ana@ejemplo.com")
+    daos = daos_falsos(datos)
+    monkeypatch.setattr(ical, "ColoresDAO", daos["colores"])
+    ruta = tmp_path / "calendario.ics"
+    escribir_ics(ruta, vevents)
+    ical.importar_ics(str(ruta), usuario['id_usuario'], dao=daos["eventos"]())
+    return list(datos.eventos.values())
+
+
+def test_ocurrencia_antes_que_su_serie(tmp_path, monkeypatch):
+    filas = importar(tmp_path, monkeypatch, [
+        vevent("yoga", "20260112T100000", "Yoga (cambiado)", recurrencia="20260112T090000"),
+        vevent("suelta", "20260201T120000", "Comida"),
+        vevent("yoga", "20260105T090000", "Yoga", regla="FREQ=WEEKLY"),
+    ])
+    serie = next(f for f in filas if f['regla_recurrencia'])
+    cambiada = next(f for f in filas if f['titulo'] == "Yoga (cambiado)")
+    assert cambiada['serie_id'] == serie['id_evento']
+    assert cambiada['fecha_original'] == datetime(2026, 1, 12, 9)
+    assert len(filas) == 3
+
+
+def test_las_ocurrencias_adelantadas_no_se_acumulan_en_memoria(tmp_path, monkeypatch):
+    n = 3000
+    dias = [f"2026{1 + k // 28 % 12:02d}{1 + k % 28:02d}" for k in range(n)]
+    vevents = [vevent("serie", f"{dia}T100000", f"Cambio {k}", recurrencia=f"{dia}T090000") for k, dia in enumerate(dias)]
+    vevents.append(vevent("serie", "20260101T090000", "Diario", regla="FREQ=DAILY"))
+    escribir_ics(tmp_path / "grande.ics", vevents)
+    monkeypatch.setattr(ical, "ColoresDAO", daos_falsos(DatosFalsos())["colores"])
+
+    memoria = []
+
+    class DAO:
+        def importar(self, usuario_id, filas, tam_lote=500, series=None):
+            for fila in filas:
+                # La serie es la primera fila: todas las ocurrencias están ya apartadas
+                memoria.append(tracemalloc.get_traced_memory()[0])
+                yield len(memoria)
+
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        ical.importar_ics(str(tmp_path / "grande.ics"), 1, dao=DAO())
+    finally:
+        tracemalloc.stop()
+    assert len(memoria) == n + 1
+    assert memoria[0] - base < 512 * 1024, f"{(memoria[0] - base) / 1024:.0f} KiB retenidos con la serie"
@@ -0,0 +1,72 @@
+"""
+Escrituras sin conexión (logic/mutaciones.py, logic/diario.py): lo que queda en el
+diario se envía en cuanto vuelve la conexión, también si el usuario sigue escribiendo
+sin pausa, y el diario no depende de la carpeta desde la que se lanza la aplicación.
+"""
+import pytest
+
+from database.dao import SinConexionError
+from logic import diario
+from logic.diario import DiarioOffline
+from logic.mutaciones import PipelineMutaciones
+from tests.falsos import DatosFalsos, daos_falsos
+
+
+@pytest.fixture
+def pipeline(qapp, tmp_path):
+    datos = DatosFalsos()
+    usuario = datos.nuevo_usuario("Ana", "ana@ejemplo.com")
+    eventos = [datos.nuevo_evento(usuario['id_usuario'], f"Evento {k}", None) for k in range(3)]
+    datos.sin_conexion = False
+
+    class EventosDAO(daos_falsos(datos)["eventos"]):
+        def eliminar(self, id_evento):
+            if datos.sin_conexion:
+                raise SinConexionError("sin red")
+            return super().eliminar(id_evento)
+
+    mut = PipelineMutaciones(lambda: [], usuario['id_usuario'], dao=EventosDAO(),
+                             diario=DiarioOffline(str(tmp_path / "diario.sqlite3")))
+    yield mut, datos, [e['id_evento'] for e in eventos]
+    mut.detener()
+    mut.diario.cerrar()
+
+
+def test_al_volver_la_conexion_se_envia_el_diario_antes_de_lo_nuevo(pipeline):
+    mut, datos, (a, b, _) = pipeline
+    datos.sin_conexion = True
+    assert mut._procesar([('eliminar', {'id_evento': a}, None)]) == ('offline', 1)
+
+    datos.sin_conexion = False
+    estado, _ = mut._procesar([('eliminar', {'id_evento': b}, None)])
+    assert estado == 'ok' and len(mut.diario) == 0
+    assert a not in datos.eventos and b not in datos.eventos
+
+
+def test_sin_conexion_lo_nuevo_va_detras_en_el_diario(pipeline):
+    mut, datos, (a, b, _) = pipeline
+    datos.sin_conexion = True
+    mut._procesar([('eliminar', {'id_evento': a}, None)])
+    assert mut._procesar([('eliminar', {'id_evento': b}, None)]) == ('offline', 2)
+    assert [args['id_evento'] for _, _, args, _ in mut.diario.pendientes(10)] == [a, b]
+
+
+def test_el_diario_no_depende_de_la_carpeta_de_arranque(tmp_path, monkeypatch):
+    datos_usuario, arranque = tmp_path / "datos", tmp_path / "arranque"
+    arranque.mkdir()
+    monkeypatch.setattr(diario, "CARPETA_DIARIOS", str(datos_usuario))
+    monkeypatch.chdir(arranque)
+    antiguo = DiarioOffline("diario_offline_7.sqlite3") # Como lo dejaban las versiones anteriores
+    antiguo.anotar([('liberar_adjunto', {'ruta': "adjuntos/informe.pdf"}, None)])
+    antiguo.cerrar()
+
+    ruta = diario.ruta_diario(7)
+    assert ruta == str(datos_usuario / "diario_offline_7.sqlite3")
+    assert not (arranque / "diario_offline_7.sqlite3").exists()
+    trasladado = DiarioOffline(ruta)
+    assert len(trasladado) == 1
+    trasladado.cerrar()
+
+    monkeypatch.chdir(tmp_path) # Otra carpeta de arranque: el mismo diario
+    assert diario.ruta_diario(7) == ruta
+    assert diario.textos_pendientes((str(datos_usuario),)) == {"adjuntos/informe.pdf"}
@@ -0,0 +1,30 @@
+"""
+Expansión de series (logic/recurrencia.py): la caché de ocurrencias no se comparte
+con quien las recibe.
+"""
+from datetime import datetime
+
+from logic.recurrencia import ExpansorRecurrencias
+from utils.excepciones import desplazar_excepciones
+
+
+def serie():
+    return dict(id_evento=1, titulo="Guardia", fecha_inicio=datetime(2026, 1, 5, 8),
+                regla_recurrencia="FREQ=WEEKLY", excepciones_recurrencia="2026-01-12 08:00")
+
+
+def test_las_ocurrencias_devueltas_no_alteran_la_cache():
+    expansor = ExpansorRecurrencias()
+    desde, hasta = datetime(2026, 1, 1), datetime(2026, 2, 1)
+    primeras = expansor.expandir([serie()], desde, hasta)
+    assert [o['fecha_inicio'].day for o in primeras] == [5, 19, 26]
+
+    primeras[0]['titulo'] = "Cambiado"
+    primeras.clear()
+    segundas = expansor.expandir([serie()], desde, hasta)
+    assert [o['titulo'] for o in segundas] == ["Guardia"] * 3
+
+
+def test_desplazar_excepciones_con_la_serie():
+    texto = desplazar_excepciones("2026-01-12 08:00,2026-01-19 08:00", datetime(2026, 1, 2) - datetime(2026, 1, 1))
+    assert texto == "2026-01-13 08:00,2026-01-20 08:00"
@@ -0,0 +1,156 @@
+"""
+API HTTP (logic/servidor_api.py) de punta a punta en localhost: el servidor real con
+DAO falsos y, del otro lado, los DAO remotos de database/remoto.py que usa la
+aplicación en modo cliente.
+"""
+import asyncio
+import http.client
+import threading
+from datetime import datetime
+
+import pytest
+
+from database import remoto
+from logic.servidor_api import ServidorAPI
+from tests.falsos import DatosFalsos, daos_falsos, eventos_de_ejemplo
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Arranca el servidor en un puerto libre de 127.0.0.1 y apunta el cliente a él."""
+    datos = DatosFalsos()
+    ana = datos.nuevo_usuario("Ana", "ana@ejemplo.com")
+    otro = datos.nuevo_usuario("Otro", "otro@ejemplo.com")
+    eventos_de_ejemplo(datos, ana['id_usuario'], 20)
+    ajeno = datos.nuevo_evento(otro['id_usuario'], "De otro usuario", datetime(2026, 1, 5, 10))
+    servidor = ServidorAPI(daos=daos_falsos(datos), hilos=2)
+
+    bucle = asyncio.new_event_loop()
+    tcp = bucle.run_until_complete(asyncio.start_server(servidor.atender, "127.0.0.1", 0))
+    puerto = tcp.sockets[0].getsockname()[1]
+    hilo = threading.Thread(target=bucle.run_forever, daemon=True)
+    hilo.start()
+    monkeypatch.setattr(remoto.ClienteAPI, "_instancia", remoto.ClienteAPI(f"http://127.0.0.1:{puerto}"))
+
+    yield datos, servidor, ana, ajeno
+
+    remoto.ClienteAPI.instancia()._cerrar()
+    async def parar():
+        # Las conexiones keep-alive siguen esperando la siguiente petición: se cancelan
+        tcp.close()
+        atendiendo = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for tarea in atendiendo:
+            tarea.cancel()
+        await asyncio.gather(*atendiendo, return_exceptions=True)
+        await tcp.wait_closed()
+    asyncio.run_coroutine_threadsafe(parar(), bucle).result(5)
+    bucle.call_soon_threadsafe(bucle.stop)
+    hilo.join(5)
+    bucle.close()
+    servidor.ejecutor.shutdown(wait=True)
+
+
+def test_login_y_lectura_con_fechas(api):
+    datos, _, ana, _ = api
+    assert remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "incorrecta") is None
+    usuario = remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "secreta")
+    assert usuario == {'id_usuario': ana['id_usuario'], 'nombre': "Ana"}
+
+    eventos = remoto.EventosDAO().obtener_resumen_por_usuario(usuario['id_usuario'])
+    assert [e['id_evento'] for e in eventos] == [e['id_evento'] for e in datos.de_usuario(ana['id_usuario'])]
+    assert all(isinstance(e['fecha_inicio'], datetime) for e in eventos) # Las fechas sobreviven al JSON
+
+
+def test_sin_sesion_se_rechaza(api):
+    with pytest.raises(Exception, match="sesión"):
+        remoto.EventosDAO().obtener_resumen_por_usuario(1)
+
+
+def test_lecturas_repetidas_responden_304_sin_tocar_el_dao(api):
+    datos, servidor, ana, _ = api
+    remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "secreta")
+    dao = remoto.EventosDAO()
+
+    primera = dao.obtener_resumen_por_usuario(ana['id_usuario'])
+    lecturas = datos.llamadas["eventos.obtener_resumen_por_usuario"]
+    segunda = dao.obtener_resumen_por_usuario(ana['id_usuario'])
+
+    assert segunda == primera
+    assert datos.llamadas["eventos.obtener_resumen_por_usuario"] == lecturas # Servida de la caché
+    assert servidor.cache.aciertos >= 1
+
+    # Con el ETag guardado por el cliente, el servidor contesta 304 y sin cuerpo
+    cliente = remoto.ClienteAPI.instancia()
+    etag, _ = cliente._etags["/eventos?resumen=1"]
+    conn = http.client.HTTPConnection(cliente.url.hostname, cliente.url.port, timeout=5)
+    conn.request("GET", "/eventos?resumen=1", headers={"Authorization": f"Bearer {cliente.token}", "If-None-Match": etag})
+    respuesta = conn.getresponse()
+    assert respuesta.status == 304 and respuesta.read() == b""
+    conn.close()
+
+
+def test_escribir_invalida_la_cache_del_usuario(api):
+    datos, _, ana, _ = api
+    usuario = remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "secreta")
+    dao = remoto.EventosDAO()
+    antes = dao.obtener_resumen_por_usuario(usuario['id_usuario'])
+
+    nuevo_id = dao.guardar({
+        'usuario_id': 9999, # El servidor impone el usuario de la sesión
+        'titulo': "Creado por la API", 'descripcion': "", 'fecha_inicio': datetime(2026, 2, 1, 12),
+        'color_id': 1, 'archivo_adjunto': None, 'es_importante': False, 'minutos_aviso': 0,
+    }, 'crear')
+
+    despues = dao.obtener_resumen_por_usuario(usuario['id_usuario'])
+    assert len(despues) == len(antes) + 1
+    nuevo = next(e for e in despues if e['id_evento'] == nuevo_id)
+    assert nuevo['titulo'] == "Creado por la API" and nuevo['propietario_id'] == ana['id_usuario']
+
+
+def test_no_se_tocan_eventos_de_otros_calendarios(api):
+    datos, _, _, ajeno = api
+    remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "secreta")
+    with pytest.raises(Exception, match="no tiene acceso"):
+        remoto.EventosDAO().eliminar(ajeno['id_evento'])
+    assert ajeno['id_evento'] in datos.eventos
+
+
+def test_metodo_fuera_de_la_lista_blanca(api):
+    remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "secreta")
+    with pytest.raises(Exception, match="no disponible"):
+        remoto.EventosDAO().verificar_tablas_o_lo_que_sea()
+
+
+def test_adjuntos_solo_de_los_calendarios_visibles(api):
+    datos, _, ana, ajeno = api
+    ajeno['archivo_adjunto'] = "/adjuntos/ajeno.pdf"
+    remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "secreta")
+    dao = remoto.EventosDAO()
+    assert dao.obtener_rutas_adjuntos() == []
+    assert dao.contar_referencias_adjunto("/adjuntos/ajeno.pdf") == 0
+
+
+def _importada(titulo, fecha, uid, regla=None, fecha_original=None):
+    return {'titulo': titulo, 'descripcion': "", 'fecha_inicio': fecha, 'color_id': 1, 'es_importante': False,
+            'minutos_aviso': 0, 'regla_recurrencia': regla, 'excepciones_recurrencia': None,
+            'fecha_original': fecha_original, 'uid': uid}
+
+
+def test_importar_enlaza_series_entre_trozos(api):
+    datos, _, ana, _ = api
+    remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "secreta")
+    serie = _importada("Serie", datetime(2026, 3, 2, 9), "u1", regla="FREQ=WEEKLY")
+    cambio = _importada("Cambiada", datetime(2026, 3, 9, 11), "u1", fecha_original=datetime(2026, 3, 9, 9))
+    assert list(remoto.EventosDAO().importar(ana['id_usuario'], [serie, cambio], tam_lote=1))[-1] == 2
+    serie_id = next(e['id_evento'] for e in datos.de_usuario(ana['id_usuario']) if e['titulo'] == "Serie")
+    assert next(e for e in datos.de_usuario(ana['id_usuario']) if e['titulo'] == "Cambiada")['serie_id'] == serie_id
+
+
+def test_importar_no_enlaza_con_series_ajenas(api):
+    datos, _, _, ajeno = api
+    remoto.UsuariosDAO().autenticar("ana@ejemplo.com", "secreta")
+    cambio = _importada("Intrusa", datetime(2026, 1, 5, 11), "u1", fecha_original=datetime(2026, 1, 5, 10))
+    for series in ({"u1": ajeno['id_evento']}, {"u1": 999999}):
+        with pytest.raises(Exception, match="no tiene acceso"):
+            list(remoto.EventosDAO().importar(1, [cambio], series=dict(series)))
+    assert not any(e['titulo'] == "Intrusa" for e in datos.eventos.values())
@@ -0,0 +1,105 @@
+"""
+Ciclo de vida de la sesión (logic/sesion.py): cien login/logout seguidos con
+AppController no deben dejar por el camino hilos, ventanas ni QObjects vivos.
+"""
+import gc
+import threading
+
+import pytest
+from PyQt5 import sip
+from PyQt5.QtCore import QCoreApplication, QEvent, QObject, QThread
+from PyQt5.QtWidgets import QApplication
+
+from tests.falsos import DatosFalsos, daos_falsos, eventos_de_ejemplo
+
+CICLOS = 100
+CALENTAMIENTO = 3 # Los primeros logins crean lo que es del proceso (hilos compartidos, cachés)
+HOLGURA_QOBJECTS = 10
+
+
+@pytest.fixture
+def controlador(qapp, monkeypatch, tmp_path):
+    # El log de la aplicación se escribe en la carpeta actual
+    monkeypatch.chdir(tmp_path)
+
+    import main
+    import logic.adjuntos
+    import logic.mutaciones
+    import logic.notificaciones
+    import ui.login
+    import ui.ventana_gestionar_evento
+    import ui.ventana_principal
+    from logic.detalles import CargadorDetalles
+    from logic.services import ClimaService
+
+    datos = DatosFalsos()
+    usuario = datos.nuevo_usuario("Ana", "ana@ejemplo.com")
+    eventos_de_ejemplo(datos, usuario['id_usuario'], 200)
+    daos = daos_falsos(datos)
+    for modulo, nombre, dao in [
+        (ui.ventana_principal, "EventosDAO", "eventos"), (ui.ventana_principal, "UsuariosDAO", "usuarios"),
+        (ui.ventana_principal, "CalendariosDAO", "calendarios"), (ui.login, "UsuariosDAO", "usuarios"),
+        (ui.ventana_gestionar_evento, "EventosDAO", "eventos"), (logic.mutaciones, "EventosDAO", "eventos"),
+        (logic.mutaciones, "ColoresDAO", "colores"), (logic.notificaciones, "EventosDAO", "eventos"),
+        (logic.adjuntos, "EventosDAO", "eventos"),
+    ]:
+        monkeypatch.setattr(modulo, nombre, daos[dao])
+    monkeypatch.setattr(CargadorDetalles.instancia(), "dao", daos["eventos"]())
+    monkeypatch.setattr(ClimaService, "obtener_pronostico", staticmethod(lambda latitud, longitud: {}))
+
+    controlador = main.AppController()
+    controlador.iniciar()
+    controlador.usuario = usuario
+    yield controlador
+    controlador.cerrar_principal()
+    if controlador.login_window is not None:
+        controlador.login_window.close()
+        controlador.login_window.deleteLater()
+    vaciar_eventos()
+
+
+def vaciar_eventos():
+    """Procesa lo pendiente, incluidos los deleteLater (fuera de exec_() no se atienden solos)."""
+    app = QApplication.instance()
+    for _ in range(3):
+        app.processEvents()
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    gc.collect()
+
+
+def ciclo(controlador):
+    """Un login con la ventana de login y un logout desde la ventana principal."""
+    login = controlador.login_window
+    login.input_usuario.setText(controlador.usuario['email'])
+    login.input_password.setText(controlador.usuario['password'])
+    login.verificar_login()
+    vaciar_eventos()
+    assert controlador.ventana_principal is not None
+    controlador.ventana_principal.cerrar_sesion()
+    vaciar_eventos()
+    assert controlador.ventana_principal is None and controlador.login_window is not None
+
+
+def recuento():
+    vivos = [o for o in gc.get_objects() if isinstance(o, QObject) and not sip.isdeleted(o)]
+    return {
+        'qobjects': len(vivos),
+        'qthreads': sum(1 for o in vivos if isinstance(o, QThread) and o.isRunning()),
+        'hilos': threading.active_count(),
+        'widgets': len(QApplication.allWidgets()),
+    }
+
+
+def test_cien_sesiones_no_acumulan_hilos_ni_qobjects(controlador):
+    for _ in range(CALENTAMIENTO):
+        ciclo(controlador)
+    antes = recuento()
+
+    for _ in range(CICLOS):
+        ciclo(controlador)
+    despues = recuento()
+
+    assert despues['qthreads'] <= antes['qthreads'], (antes, despues)
+    assert despues['hilos'] <= antes['hilos'], (antes, despues)
+    assert despues['widgets'] <= antes['widgets'], (antes, despues)
+    assert despues['qobjects'] <= antes['qobjects'] + HOLGURA_QOBJECTS, (antes, despues)
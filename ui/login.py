@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import pyqtSignal, Qt
 # Importamos las clases necesarias de otros archivos
 from database.dao import UsuariosDAO
+from utils import perfilado
 import mysql.connector 
 
 class VentanaRegistro(QDialog):
@@ -219,7 +220,8 @@ class VentanaLogin(QWidget):
         dao = UsuariosDAO()
 
         try:
-            usuario = dao.autenticar(email, password)
+            with perfilado.perfilar("login"):
+                usuario = dao.autenticar(email, password)
             
             if usuario:
                 # En lugar de abrir la ventana aquí, emitimos una señal
@@ -239,7 +241,8 @@ class VentanaLogin(QWidget):
     def entrar_invitado(self):
         dao = UsuariosDAO()
         try:
-            usuario = dao.login_invitado()
+            with perfilado.perfilar("login_invitado"):
+                usuario = dao.login_invitado()
             if usuario:
                 # Creamos un mensaje personalizado para quitar el icono azul predeterminado
                 msg = QMessageBox(self)
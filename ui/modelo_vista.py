@@ -0,0 +1,105 @@
+"""
+Datos de presentación de cada evento, calculados una vez cuando se cargan o cambian
+los eventos y compartidos por todas las vistas (Día, Semana, Mes, Año) y la lista de
+importantes: al pintar solo se consultan.
+
+Los eventos que se ven igual (mismo título, color, adjunto, calendario y si chocan
+con otro) comparten la misma VistaEvento, así que una serie con cientos de ocurrencias cuesta una sola.
+"""
+from collections import OrderedDict, namedtuple
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QBrush, QColor
+
+from logic.calendarios import es_compartido, es_solo_lectura, marca_calendario, texto_calendario
+from logic.detalles import tiene_adjunto
+from utils.config import CONFIGURACION
+
+MAX_VISTAS = 20000  # apariencias distintas guardadas como máximo
+
+VistaEvento = namedtuple("VistaEvento", [
+    "titulo",               # con ⚠ (se solapa con otro), 📎, 🎂 y la marca del calendario compartido
+    "color_hex",
+    "brush",                # fondo de la celda en Día / Semana
+    "tooltip",              # parte fija del tooltip (de quién es el calendario); las notas llegan después
+    "flags",                # flags del QTableWidgetItem (los de solo lectura no se arrastran)
+    "estilo",               # hoja de estilo del botón en la vista Mes
+    "estilo_seleccionado",
+])
+
+ESTILO_BOTON = """
+    QPushButton {{ background-color: {fondo}; color: black; text-align: left; font-size: 9pt; border-radius: 2px; padding: 2px; {borde} }}
+    QPushButton:hover {{ border: 1px solid #333; }}
+"""
+
+
+def color_evento(evento):
+    return '#' + evento['color_db_string'].split('#')[-1]
+
+
+def texto_tooltip(evento, vista):
+    """Tooltip completo: título y notas (si ya se han cargado) más la parte fija de la vista."""
+    texto = ""
+    if CONFIGURACION["MOSTRAR_NOTAS"] and evento.get('descripcion'):
+        texto = f"{evento['titulo']}\n---\n{evento['descripcion']}"
+    if vista.tooltip:
+        texto = f"{texto}\n\n{vista.tooltip}" if texto else vista.tooltip
+    return texto
+
+
+class ModelosVista:
+    def __init__(self, maximo=MAX_VISTAS):
+        self.maximo = maximo
+        self._por_apariencia = OrderedDict()
+
+    @staticmethod
+    def _apariencia(evento, conflicto):
+        return (conflicto, evento['titulo'], evento.get('color_db_string'), tiene_adjunto(evento), evento.get('permiso'),
+                evento.get('propietario_nombre'), evento.get('color_calendario'), CONFIGURACION["MOSTRAR_CUMPLEANOS"])
+
+    def vista(self, evento, conflicto=False):
+        clave = self._apariencia(evento, conflicto)
+        vista = self._por_apariencia.get(clave)
+        if vista is None:
+            vista = self._por_apariencia[clave] = self._crear(evento, conflicto)
+            if len(self._por_apariencia) > self.maximo:
+                self._por_apariencia.popitem(last=False)
+        else:
+            self._por_apariencia.move_to_end(clave)
+        return vista
+
+    def calcular(self, eventos, conflictos=frozenset()):
+        """
+        {id(evento): VistaEvento} de una ventana de eventos (vive lo mismo que la ventana).
+        'conflictos' son los id(evento) que se solapan con otro (ArbolIntervalos.conflictos).
+        """
+        return {id(e): self.vista(e, id(e) in conflictos) for e in eventos}
+
+    @staticmethod
+    def _crear(evento, conflicto=False):
+        titulo = evento['titulo']
+        if tiene_adjunto(evento):
+            titulo = "📎 " + titulo
+        if CONFIGURACION["MOSTRAR_CUMPLEANOS"] and "cumple" in titulo.lower():
+            titulo = "🎂 " + titulo
+        titulo = marca_calendario(evento) + titulo
+        tooltip = texto_calendario(evento)
+        if conflicto:
+            titulo = "⚠ " + titulo
+            tooltip = "⚠ Se solapa con otro evento" + (f"\n{tooltip}" if tooltip else "")
+
+        color_hex = color_evento(evento)
+        # Calendario compartido: su color en el borde izquierdo
+        borde = f" border-left: 5px solid {evento.get('color_calendario') or '#3498db'};" if es_compartido(evento) else ""
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if not es_solo_lectura(evento):
+            flags |= Qt.ItemIsDragEnabled
+        return VistaEvento(
+            titulo=titulo,
+            color_hex=color_hex,
+            brush=QBrush(QColor(color_hex)),
+            tooltip=tooltip,
+            flags=flags,
+            estilo=ESTILO_BOTON.format(fondo=color_hex, borde=borde),
+            estilo_seleccionado=ESTILO_BOTON.format(fondo=color_hex, borde="border: 2px solid #2c3e50;" + borde),
+        )
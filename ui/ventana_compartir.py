@@ -0,0 +1,105 @@
+import logging
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QComboBox, QPushButton,
+    QListWidget, QListWidgetItem, QMessageBox
+)
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QBrush, QColor
+from database.dao import CalendariosDAO
+
+PERMISOS = {"lectura": "👁 Solo lectura", "escritura": "✏ Lectura y escritura"}
+
+
+class VentanaCompartir(QDialog):
+    """Con quién comparte el usuario su calendario y qué calendarios le han compartido."""
+
+    def __init__(self, usuario, parent=None):
+        super().__init__(parent)
+        self.usuario = usuario
+        self.dao = CalendariosDAO()
+        self.setWindowTitle("Calendarios compartidos 👥")
+        self.resize(460, 520)
+
+        layout = QVBoxLayout()
+
+        # --- Compartir mi calendario ---
+        layout.addWidget(QLabel("<b>Compartir mi calendario con:</b>"))
+        fila = QHBoxLayout()
+        self.input_email = QLineEdit()
+        self.input_email.setPlaceholderText("Email del usuario")
+        self.combo_permiso = QComboBox()
+        for clave, texto in PERMISOS.items():
+            self.combo_permiso.addItem(texto, clave)
+        boton_compartir = QPushButton("Compartir")
+        boton_compartir.setCursor(Qt.PointingHandCursor)
+        boton_compartir.clicked.connect(self.compartir)
+        fila.addWidget(self.input_email)
+        fila.addWidget(self.combo_permiso)
+        fila.addWidget(boton_compartir)
+        layout.addLayout(fila)
+
+        self.lista_compartidos = QListWidget()
+        layout.addWidget(self.lista_compartidos)
+        boton_quitar = QPushButton("🚫 Dejar de compartir con el seleccionado")
+        boton_quitar.setCursor(Qt.PointingHandCursor)
+        boton_quitar.clicked.connect(self.dejar_de_compartir)
+        layout.addWidget(boton_quitar)
+
+        # --- Calendarios que me han compartido ---
+        layout.addWidget(QLabel("<b>Calendarios compartidos conmigo:</b>"))
+        self.lista_visibles = QListWidget()
+        layout.addWidget(self.lista_visibles)
+
+        self.setLayout(layout)
+        self.cargar()
+
+    def cargar(self):
+        self.lista_compartidos.clear()
+        self.lista_visibles.clear()
+        try:
+            compartidos = self.dao.obtener_compartidos_por(self.usuario['id_usuario'])
+            visibles = self.dao.obtener_visibles(self.usuario['id_usuario']) or []
+        except Exception as e:
+            logging.error(f"No se pudieron cargar los calendarios compartidos: {e}")
+            QMessageBox.warning(self, "Sin Conexión", "No se pudieron cargar los calendarios compartidos.")
+            return
+        for c in compartidos:
+            item = QListWidgetItem(f"{c['nombre']} <{c['email']}> — {PERMISOS[c['permiso']]}")
+            item.setData(Qt.UserRole, c['usuario_id'])
+            self.lista_compartidos.addItem(item)
+        for c in visibles:
+            if c['permiso'] == 'propietario':
+                continue
+            item = QListWidgetItem(f"■ {c['nombre']} — {PERMISOS[c['permiso']]}")
+            item.setForeground(QBrush(QColor(c['color'])))
+            self.lista_visibles.addItem(item)
+        if not self.lista_visibles.count():
+            self.lista_visibles.addItem("(ninguno)")
+
+    def compartir(self):
+        email = self.input_email.text().strip()
+        if not email:
+            return
+        try:
+            exito, mensaje = self.dao.compartir(self.usuario['id_usuario'], email, self.combo_permiso.currentData())
+        except Exception as e:
+            logging.error(f"No se pudo compartir el calendario: {e}")
+            QMessageBox.warning(self, "Sin Conexión", "No se pudo compartir el calendario.")
+            return
+        if not exito:
+            QMessageBox.warning(self, "Compartir", mensaje)
+            return
+        self.input_email.clear()
+        self.cargar()
+
+    def dejar_de_compartir(self):
+        item = self.lista_compartidos.currentItem()
+        if not item:
+            return
+        try:
+            self.dao.dejar_de_compartir(self.usuario['id_usuario'], item.data(Qt.UserRole))
+        except Exception as e:
+            logging.error(f"No se pudo dejar de compartir el calendario: {e}")
+            QMessageBox.warning(self, "Sin Conexión", "No se pudo dejar de compartir el calendario.")
+            return
+        self.cargar()
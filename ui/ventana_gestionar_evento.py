@@ -1,26 +1,62 @@
 import logging
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QLineEdit, QTextEdit, QPushButton,
-    QVBoxLayout, QHBoxLayout, QMessageBox, QComboBox, QFileDialog, QCheckBox, QDateTimeEdit
+    QVBoxLayout, QHBoxLayout, QMessageBox, QComboBox, QFileDialog, QCheckBox, QDateTimeEdit, QProgressDialog
 )
-from PyQt5.QtCore import pyqtSignal, Qt, QUrl
-from PyQt5.QtGui import QDesktopServices
-import mysql.connector
-from database.dao import EventosDAO, ColoresDAO
-from utils.ui_utils import centrar_ventana
+from PyQt5.QtCore import pyqtSignal, Qt, QUrl, QThread
+from PyQt5.QtGui import QDesktopServices, QPixmap
+from database.dao import EventosDAO
+from utils.ui_utils import centrar_ventana, preguntar_alcance_serie
 from utils.config import COLORES_MAP, HEX_A_NOMBRE
+from logic.recurrencia import FRECUENCIAS, parsear_regla, construir_regla
+from logic.calendarios import CAMPOS_CALENDARIO
+from logic.adjuntos import AlmacenAdjuntos, CopiaCancelada
+from logic.miniaturas import GeneradorMiniaturas, admite_miniatura, TAM_MINIATURA
+from logic.intervalos import DURACION_POR_DEFECTO
+from logic.sesion import desconectar
 import os
-import shutil
-import uuid
+
+REGLA_CONSERVADA = "CONSERVAR"  # dato del combo de repetición para una regla que no se puede editar aquí
+
+# --- HILO PARA COPIAR EL ADJUNTO AL ALMACÉN ---
+class HiloCopiaAdjunto(QThread):
+    progreso = pyqtSignal(int)   # 0-100
+    terminado = pyqtSignal(str)  # ruta en el almacén ("" si se canceló)
+    error = pyqtSignal(str)
+
+    def __init__(self, almacen, ruta_origen):
+        super().__init__()
+        self.almacen = almacen
+        self.ruta_origen = ruta_origen
+        self._cancelado = False
+
+    def cancelar(self):
+        self._cancelado = True
+
+    def run(self):
+        try:
+            ruta = self.almacen.importar(
+                self.ruta_origen,
+                progreso=lambda f: self.progreso.emit(int(f * 100)),
+                cancelado=lambda: self._cancelado
+            )
+            self.terminado.emit(ruta)
+        except CopiaCancelada:
+            self.terminado.emit("")
+        except Exception as e:
+            logging.error(f"Error copiando adjunto: {e}", exc_info=True)
+            self.error.emit(str(e))
 
 class VentanaGestionEvento(QWidget):
     evento_gestionado = pyqtSignal()
 
-    def __init__(self, usuario, fecha_o_evento):
+    def __init__(self, usuario, fecha_o_evento, mutaciones):
         super().__init__()
         self.usuario = usuario
+        self.mutaciones = mutaciones # Pipeline de la ventana principal: los cambios se ven al instante
         self.dao_eventos = EventosDAO()
-        self.dao_colores = ColoresDAO()
+        self.almacen_adjuntos = AlmacenAdjuntos(dao=self.dao_eventos)
+        self.hilo_copia = None
 
         if isinstance(fecha_o_evento, dict): # Modo EDICIÓN
             self.modo = 'editar'
@@ -51,6 +87,18 @@ class VentanaGestionEvento(QWidget):
         self.input_fecha_hora.setDisplayFormat("dd/MM/yyyy HH:mm")
         self.input_fecha_hora.setCalendarPopup(True)
 
+        self.label_duracion = QLabel("Duración:")
+        self.combo_duracion = QComboBox()
+        self.combo_duracion.addItem("Sin duración", 0)
+        self.combo_duracion.addItem("15 min", 15)
+        self.combo_duracion.addItem("30 min", 30)
+        self.combo_duracion.addItem("45 min", 45)
+        self.combo_duracion.addItem("1 hora", 60)
+        self.combo_duracion.addItem("1 h 30 min", 90)
+        self.combo_duracion.addItem("2 horas", 120)
+        self.combo_duracion.addItem("3 horas", 180)
+        self.combo_duracion.addItem("Todo el día", 1440)
+
         self.label_titulo = QLabel("Título:")
         self.input_titulo = QLineEdit()
 
@@ -74,6 +122,13 @@ class VentanaGestionEvento(QWidget):
         self.combo_aviso.addItem("1 hora", 60)
         self.combo_aviso.addItem("1 día", 1440)
 
+        # --- Repetición (series recurrentes) ---
+        self.label_repetir = QLabel("Repetir:")
+        self.combo_repetir = QComboBox()
+        self.combo_repetir.addItem("No se repite", None)
+        for freq, texto in FRECUENCIAS.items():
+            self.combo_repetir.addItem(texto, freq)
+
         # --- Interfaz para adjuntos ---
         self.label_adjunto_titulo = QLabel("Archivo Adjunto:")
         self.label_adjunto_nombre = QLabel("Ninguno")
@@ -93,6 +148,15 @@ class VentanaGestionEvento(QWidget):
         self.boton_quitar_adjunto.clicked.connect(self.marcar_para_quitar_adjunto)
         self.boton_quitar_adjunto.setVisible(False)
 
+        # Vista previa (la miniatura se genera en segundo plano)
+        self.label_preview = QLabel()
+        self.label_preview.setAlignment(Qt.AlignCenter)
+        self.label_preview.setFixedHeight(TAM_MINIATURA)
+        self.label_preview.setVisible(False)
+        self.ruta_preview = None
+        self.generador_miniaturas = GeneradorMiniaturas.instancia()
+        self.generador_miniaturas.miniatura_lista.connect(self.miniatura_lista)
+
         # --- Botones de Acción ---
         self.boton_guardar = QPushButton("Guardar")
         self.boton_guardar.setCursor(Qt.PointingHandCursor)
@@ -115,7 +179,11 @@ class VentanaGestionEvento(QWidget):
         layout.setContentsMargins(20, 20, 20, 20) # Márgenes para que respire
         layout.setSpacing(10)
         layout.addWidget(self.label_fecha_hora)
-        layout.addWidget(self.input_fecha_hora)
+        h_fecha = QHBoxLayout()
+        h_fecha.addWidget(self.input_fecha_hora, 1)
+        h_fecha.addWidget(self.label_duracion)
+        h_fecha.addWidget(self.combo_duracion)
+        layout.addLayout(h_fecha)
         layout.addWidget(self.label_titulo)
         layout.addWidget(self.input_titulo)
         layout.addWidget(self.label_descripcion)
@@ -127,6 +195,8 @@ class VentanaGestionEvento(QWidget):
         h_imp.addWidget(self.check_importante)
         h_imp.addWidget(self.label_aviso)
         h_imp.addWidget(self.combo_aviso)
+        h_imp.addWidget(self.label_repetir)
+        h_imp.addWidget(self.combo_repetir)
         layout.addLayout(h_imp)
         
         # Layout para adjuntos
@@ -137,6 +207,7 @@ class VentanaGestionEvento(QWidget):
         adjunto_layout.addWidget(self.boton_cambiar_adjunto)
         adjunto_layout.addWidget(self.boton_quitar_adjunto)
         layout.addLayout(adjunto_layout)
+        layout.addWidget(self.label_preview)
 
         h_layout = QHBoxLayout()
         h_layout.addWidget(self.boton_guardar)
@@ -157,6 +228,7 @@ class VentanaGestionEvento(QWidget):
             self.input_titulo.setText(self.evento['titulo'])
             self.input_descripcion.setText(self.evento.get('descripcion', ''))
             self.input_fecha_hora.setDateTime(self.evento['fecha_inicio'])
+            self.seleccionar_duracion(int(self.evento.get('duracion_minutos') or 0))
             
             # Cargar estado de importante y aviso
             self.check_importante.setChecked(bool(self.evento.get('es_importante', False)))
@@ -165,6 +237,19 @@ class VentanaGestionEvento(QWidget):
             if idx_aviso != -1:
                 self.combo_aviso.setCurrentIndex(idx_aviso)
 
+            # Cargar regla de repetición (en una ocurrencia es la de su serie)
+            regla = parsear_regla(self.evento.get('regla_recurrencia'))
+            if regla is None and self.evento.get('regla_recurrencia'):
+                # Regla importada que no se sabe expandir (BYDAY...): se conserva tal cual
+                self.combo_repetir.addItem("Regla personalizada (se conserva)", REGLA_CONSERVADA)
+                regla = {'freq': REGLA_CONSERVADA}
+            idx_repetir = self.combo_repetir.findData(regla['freq'] if regla else None)
+            if idx_repetir != -1:
+                self.combo_repetir.setCurrentIndex(idx_repetir)
+            # Una ocurrencia sobrescrita ya no puede convertirse en otra serie
+            if self.evento.get('serie_id'):
+                self.combo_repetir.setEnabled(False)
+
             # Cargar datos del adjunto
             if self.ruta_archivo_adjunto_actual:
                 nombre_archivo = os.path.basename(self.ruta_archivo_adjunto_actual)
@@ -172,9 +257,11 @@ class VentanaGestionEvento(QWidget):
                 self.label_adjunto_nombre.setStyleSheet("font-style: normal;")
                 self.boton_ver_adjunto.setVisible(True)
                 self.boton_quitar_adjunto.setVisible(True)
+                self.mostrar_preview(self.ruta_archivo_adjunto_actual)
             else:
                 self.boton_ver_adjunto.setVisible(False)
                 self.boton_quitar_adjunto.setVisible(False)
+                self.mostrar_preview(None)
             
             # Seleccionar el color actual en el ComboBox
             color_db_string = self.evento.get('color_db_string', '')
@@ -192,10 +279,20 @@ class VentanaGestionEvento(QWidget):
                     self.combo_color.setCurrentIndex(index)
         else: # Modo CREAR
             self.input_fecha_hora.setDateTime(self.fecha_sugerida)
+            self.seleccionar_duracion(DURACION_POR_DEFECTO)
             self.boton_ver_adjunto.setVisible(False)
             self.boton_quitar_adjunto.setVisible(False)
 
 
+    def seleccionar_duracion(self, minutos):
+        idx = self.combo_duracion.findData(minutos)
+        if idx == -1: # Duración que no está en la lista (importada de .ics o Google)
+            horas, resto = divmod(minutos, 60)
+            texto = f"{horas} h {resto} min" if horas and resto else (f"{horas} h" if horas else f"{resto} min")
+            self.combo_duracion.addItem(texto, minutos)
+            idx = self.combo_duracion.count() - 1
+        self.combo_duracion.setCurrentIndex(idx)
+
     def ver_adjunto(self):
         if self.ruta_archivo_adjunto_actual and os.path.exists(self.ruta_archivo_adjunto_actual):
             try:
@@ -208,6 +305,27 @@ class VentanaGestionEvento(QWidget):
         else:
             QMessageBox.warning(self, "Archivo no encontrado", "El archivo adjunto parece haber sido eliminado o movido de su ubicación original.")
 
+    def mostrar_preview(self, ruta):
+        """Muestra la miniatura si ya está en caché; si no, la pide al hilo generador."""
+        self.ruta_preview = ruta
+        self.label_preview.clear()
+        if not ruta or not admite_miniatura(ruta):
+            self.label_preview.setVisible(False)
+            return
+        png = self.generador_miniaturas.buscar(ruta)
+        if png:
+            self.miniatura_lista(ruta, png)
+        else:
+            self.label_preview.setText("Generando vista previa...")
+            self.label_preview.setVisible(True)
+            self.generador_miniaturas.solicitar(ruta)
+
+    def miniatura_lista(self, ruta, png):
+        if ruta != self.ruta_preview:
+            return # Llega tarde: el usuario ya eligió otro archivo
+        self.label_preview.setPixmap(QPixmap(png))
+        self.label_preview.setVisible(True)
+
     def seleccionar_nuevo_adjunto(self):
         ruta, _ = QFileDialog.getOpenFileName(self, "Seleccionar nuevo archivo", "", "Todos los archivos (*.*)")
         if ruta:
@@ -217,6 +335,7 @@ class VentanaGestionEvento(QWidget):
             self.label_adjunto_nombre.setText(f"Nuevo: {nombre_archivo}")
             self.label_adjunto_nombre.setStyleSheet("font-style: normal; color: #27ae60;")
             self.boton_ver_adjunto.setVisible(False)
+            self.mostrar_preview(ruta)
 
     def marcar_para_quitar_adjunto(self):
         # Si se estaba por cambiar, cancela el cambio
@@ -231,6 +350,7 @@ class VentanaGestionEvento(QWidget):
             self.label_adjunto_nombre.setStyleSheet("font-style: normal; color: #e74c3c;")
             self.boton_ver_adjunto.setVisible(False)
             self.boton_quitar_adjunto.setVisible(False)
+            self.mostrar_preview(None)
 
     def guardar(self):
         """Unifica la lógica para crear y modificar un evento."""
@@ -244,84 +364,176 @@ class VentanaGestionEvento(QWidget):
         fecha_nueva = self.input_fecha_hora.dateTime().toPyDateTime()
         es_importante = self.check_importante.isChecked()
         minutos_aviso = self.combo_aviso.currentData()
+        duracion_minutos = self.combo_duracion.currentData()
         
         if not titulo:
             QMessageBox.warning(self, "Error", "El título es obligatorio")
             return
-            
-        ruta_db = self.ruta_archivo_adjunto_actual
-        archivo_a_borrar_si_exito = None
-        archivo_creado_a_borrar_si_error = None
 
-        # Lógica para gestionar el archivo
-        if self.accion_adjunto == "cambiar" and self.nueva_ruta_archivo:
-            try:
-                ruta_carpeta_adjuntos = "adjuntos"
-                if not os.path.exists(ruta_carpeta_adjuntos):
-                    os.makedirs(ruta_carpeta_adjuntos)
-                nombre_original, extension = os.path.splitext(os.path.basename(self.nueva_ruta_archivo))
-                nombre_unico = f"{nombre_original}_{uuid.uuid4().hex[:8]}{extension}"
-                ruta_destino = os.path.join(ruta_carpeta_adjuntos, nombre_unico)
-                shutil.copy(self.nueva_ruta_archivo, ruta_destino)
-                ruta_db = ruta_destino
-                archivo_creado_a_borrar_si_error = ruta_destino
-                
-                # Marcar el antiguo para borrar SOLO si la DB actualiza bien
-                if self.ruta_archivo_adjunto_actual:
-                    archivo_a_borrar_si_exito = self.ruta_archivo_adjunto_actual
-            except Exception as e:
-                logging.error(f"Error gestionando archivo adjunto (modificar): {e}", exc_info=True)
-                QMessageBox.critical(self, "Error de Archivo", f"No se pudo guardar el nuevo archivo adjunto.\nVerifica el espacio en disco o permisos.\nDetalle: {e}")
+        # En una ocurrencia de una serie hay que elegir a qué afecta el cambio
+        alcance = None
+        if self.modo == 'editar' and self.evento.get('es_ocurrencia'):
+            alcance = preguntar_alcance_serie(self, "modificar")
+            if alcance is None:
                 return
-        elif self.accion_adjunto == "quitar":
-            if self.ruta_archivo_adjunto_actual:
-                archivo_a_borrar_si_exito = self.ruta_archivo_adjunto_actual
-            ruta_db = None
-
-        try:
-            # 1. Obtener ID del color
-            color_id = self.dao_colores.obtener_id_por_hex(color_hex)
-            if not color_id:
-                QMessageBox.critical(self, "Error BD", "El color seleccionado no se encontró en la base de datos.")
-                return
-            
-            # 2. Preparar datos
-            datos_evento = {
-                'usuario_id': self.usuario['id_usuario'],
-                'titulo': titulo,
-                'descripcion': descripcion,
-                'fecha_inicio': fecha_nueva,
-                'color_id': color_id,
-                'archivo_adjunto': ruta_db,
-                'es_importante': es_importante,
-                'minutos_aviso': minutos_aviso
-            }
-
-            # 3. Guardar usando DAO
-            id_ev = self.evento['id_evento'] if self.modo == 'editar' else None
-            self.dao_eventos.guardar(datos_evento, self.modo, id_ev)
+        regla_recurrencia = self.obtener_regla_recurrencia()
             
-            mensaje_exito = "Evento creado correctamente 🎉" if self.modo == 'crear' else "Evento modificado correctamente ✅"
+        # Datos del formulario a la espera de que termine (si la hay) la copia del adjunto
+        self.datos_pendientes = {
+            'titulo': titulo,
+            'descripcion': descripcion,
+            'color_hex': color_hex,
+            'fecha_inicio': fecha_nueva,
+            'es_importante': es_importante,
+            'minutos_aviso': minutos_aviso,
+            'duracion_minutos': duracion_minutos,
+            'regla_recurrencia': regla_recurrencia,
+            'alcance': alcance
+        }
 
-            # --- ÉXITO: Borrar archivo antiguo físico ---
-            if archivo_a_borrar_si_exito and os.path.exists(archivo_a_borrar_si_exito):
-                try: os.remove(archivo_a_borrar_si_exito)
-                except Exception as e: logging.warning(f"No se pudo borrar archivo antiguo: {e}")
-            
-            QMessageBox.information(self, "Éxito", mensaje_exito)
-            self.evento_gestionado.emit()
-            self.close()
-            
-        except mysql.connector.Error as e:
-            # --- ERROR: Limpiar archivo nuevo si se creó ---
-            if archivo_creado_a_borrar_si_error and os.path.exists(archivo_creado_a_borrar_si_error):
-                try: os.remove(archivo_creado_a_borrar_si_error)
-                except: pass
-            logging.error(f"Error SQL al modificar evento: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error al Guardar", f"No se pudieron guardar los cambios en la base de datos.\nDetalle: {e}")
+        # Lógica para gestionar el archivo
+        if self.accion_adjunto == "cambiar" and self.nueva_ruta_archivo:
+            # La copia va en un hilo aparte: un vídeo grande no congela el editor
+            self.iniciar_copia_adjunto()
+            return
+        ruta_db = None if self.accion_adjunto == "quitar" else self.ruta_archivo_adjunto_actual
+        self.guardar_en_bd(ruta_db)
+
+    # =================== Copia del adjunto en segundo plano ===================
+    def iniciar_copia_adjunto(self):
+        self.boton_guardar.setEnabled(False)
+        self.dialogo_progreso = QProgressDialog("Copiando archivo adjunto...", "Cancelar", 0, 100, self)
+        self.dialogo_progreso.setWindowTitle("Archivo Adjunto")
+        self.dialogo_progreso.setWindowModality(Qt.WindowModal)
+        self.dialogo_progreso.setMinimumDuration(300) # Si es instantánea (duplicado, reflink) ni se ve
+
+        self.hilo_copia = HiloCopiaAdjunto(self.almacen_adjuntos, self.nueva_ruta_archivo)
+        self.hilo_copia.progreso.connect(self.dialogo_progreso.setValue)
+        self.hilo_copia.terminado.connect(self.fin_copia_adjunto)
+        self.hilo_copia.error.connect(self.error_copia_adjunto)
+        self.dialogo_progreso.canceled.connect(self.hilo_copia.cancelar)
+        self.hilo_copia.start()
+
+    def copiando(self):
+        """True mientras la copia del adjunto sigue en marcha."""
+        return self.hilo_copia is not None and self.hilo_copia.isRunning()
+
+    def closeEvent(self, event):
+        # El hilo de copia no tiene padre: se cancela y se espera aquí para que no sobreviva
+        # al editor (la copia mira la cancelación en cada bloque, así que termina enseguida)
+        if self.hilo_copia is not None:
+            desconectar(self.hilo_copia.progreso, self.hilo_copia.terminado, self.hilo_copia.error)
+            self.hilo_copia.cancelar()
+            self.hilo_copia.wait()
+            self.hilo_copia.deleteLater()
+            self.hilo_copia = None
+        super().closeEvent(event)
+
+    def fin_copia_adjunto(self, ruta_destino):
+        self.dialogo_progreso.reset()
+        self.boton_guardar.setEnabled(True)
+        if not ruta_destino: # Cancelada por el usuario
+            return
+        self.guardar_en_bd(ruta_destino)
+
+    def error_copia_adjunto(self, mensaje):
+        self.dialogo_progreso.reset()
+        self.boton_guardar.setEnabled(True)
+        QMessageBox.critical(self, "Error de Archivo", f"No se pudo guardar el nuevo archivo adjunto.\nVerifica el espacio en disco o permisos.\nDetalle: {mensaje}")
+
+    def guardar_en_bd(self, ruta_db):
+        """
+        Segunda fase de guardar(): aplica el cambio en el calendario al instante y lo
+        escribe en la BD en segundo plano (si falla, la ventana principal lo deshace;
+        sin conexión, queda en el diario local). Si el guardado falla, un adjunto nuevo
+        que nadie usa lo recoge la limpieza de huérfanos del arranque.
+        """
+        datos = self.datos_pendientes
+        alcance = datos['alcance']
+        mut = self.mutaciones
+        ruta_anterior = self.ruta_archivo_adjunto_actual
+
+        campos = {
+            'titulo': datos['titulo'],
+            'descripcion': datos['descripcion'],
+            'fecha_inicio': datos['fecha_inicio'],
+            'color_db_string': datos['color_hex'],
+            'archivo_adjunto': ruta_db,
+            'es_importante': datos['es_importante'],
+            'minutos_aviso': datos['minutos_aviso'],
+            'duracion_minutos': datos['duracion_minutos'],
+            'regla_recurrencia': datos['regla_recurrencia']
+        }
+        if alcance == 'ocurrencia':
+            # Nueva fila que sustituye solo a esta ocurrencia al expandir la serie
+            campos.update({'regla_recurrencia': None, 'excepciones_recurrencia': None,
+                           'serie_id': self.evento['id_evento'], 'fecha_original': self.evento['fecha_original']})
+        elif alcance == 'serie':
+            # Se desplaza el inicio de la serie lo mismo que se ha movido esta ocurrencia, pero con
+            # mover_serie: así sus excepciones y ocurrencias sobrescritas se desplazan con ella
+            nuevo_inicio_serie = self.evento['inicio_serie'] + (datos['fecha_inicio'] - self.evento['fecha_original'])
+            campos['fecha_inicio'] = self.evento['inicio_serie']
+
+        crear = self.modo == 'crear' or alcance == 'ocurrencia'
+        # La ocurrencia de una serie de un calendario compartido sigue siendo del dueño de la serie
+        calendario = {k: self.evento[k] for k in CAMPOS_CALENDARIO if k in self.evento} if alcance == 'ocurrencia' else {}
+        datos_evento = {k: v for k, v in campos.items() if k not in ('color_db_string', 'excepciones_recurrencia')}
+        datos_evento.update({'usuario_id': calendario.get('propietario_id', self.usuario['id_usuario']), 'color_hex': datos['color_hex']})
+        if crear:
+            fila = dict(campos, id_evento=mut.nuevo_id_temporal(), **calendario)
+            fila.setdefault('excepciones_recurrencia', None)
+            fila.setdefault('serie_id', None)
+            fila.setdefault('fecha_original', None)
+            operaciones = [('guardar', {'datos': datos_evento, 'modo': 'crear', 'id_temporal': fila['id_evento']})]
+        else:
+            id_evento = self.evento['id_evento']
+            operaciones = [('guardar', {'datos': datos_evento, 'modo': 'editar', 'id_evento': id_evento})]
+            if alcance == 'serie' and nuevo_inicio_serie != campos['fecha_inicio']:
+                operaciones.append(('mover_serie', {'serie_id': id_evento, 'nuevo_inicio': nuevo_inicio_serie}))
+        # Tras guardar, el adjunto anterior se borra si ya no lo usa ningún evento
+        if ruta_anterior and ruta_anterior != ruta_db:
+            operaciones.append(('liberar_adjunto', {'ruta': ruta_anterior}))
+
+        if crear:
+            def reconciliar(resultados):
+                fila['id_evento'] = resultados[0]
+                return set() # Solo cambia el id: no hace falta repintar
+            descripcion = "Crear evento" if self.modo == 'crear' else "Modificar ocurrencia"
+            mut.ejecutar(descripcion, lambda: mut.insertar_local(fila), operaciones, reconciliar)
+        else:
+            cambio_local = lambda: mut.actualizar_local(id_evento, campos)
+            if alcance == 'serie':
+                cambio_local = lambda: mut.combinar(mut.actualizar_local(id_evento, campos),
+                                                    mut.mover_serie_local(id_evento, nuevo_inicio_serie))
+            mut.ejecutar("Modificar evento", cambio_local, operaciones)
+
+        self.evento_gestionado.emit()
+        self.close()
+
+    def obtener_regla_recurrencia(self):
+        """Devuelve el texto RRULE a guardar, conservando INTERVAL/COUNT/UNTIL si la frecuencia no cambia."""
+        freq = self.combo_repetir.currentData()
+        if self.modo == 'editar' and self.evento.get('serie_id'):
+            return None
+        if self.modo == 'editar':
+            regla_actual = self.evento.get('regla_recurrencia')
+            if freq == REGLA_CONSERVADA:
+                return regla_actual
+            parseada = parsear_regla(regla_actual)
+            if parseada and parseada['freq'] == freq:
+                return regla_actual
+        return construir_regla(freq)
 
     # ... (Funciones confirmar_eliminar y eliminar_evento sin cambios)
     def confirmar_eliminar(self):
+        if self.evento.get('es_ocurrencia'):
+            alcance = preguntar_alcance_serie(self, "eliminar")
+            if alcance == 'ocurrencia':
+                self.eliminar_ocurrencia()
+            elif alcance == 'serie':
+                self.eliminar_evento()
+            return
+
         respuesta = QMessageBox.question(self, 'Confirmar Eliminación',
             "¿Estás seguro de que quieres eliminar este evento? Esta acción es irreversible.",
             QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -329,22 +541,38 @@ class VentanaGestionEvento(QWidget):
         if respuesta == QMessageBox.Yes:
             self.eliminar_evento()
 
-    def eliminar_evento(self):
-        # Primero, eliminar el archivo físico si existe
-        if self.ruta_archivo_adjunto_actual and os.path.exists(self.ruta_archivo_adjunto_actual):
-            try:
-                os.remove(self.ruta_archivo_adjunto_actual)
-            except Exception as e:
-                # No detenemos la eliminación del evento, solo advertimos
-                logging.warning(f"No se pudo borrar archivo físico {self.ruta_archivo_adjunto_actual}: {e}")
+    def eliminar_ocurrencia(self):
+        """Borra solo esta ocurrencia añadiéndola a las excepciones de la serie (el adjunto sigue siendo de la serie)."""
+        mut = self.mutaciones
+        serie_id, fecha_original = self.evento['id_evento'], self.evento['fecha_original']
+        mut.ejecutar("Eliminar ocurrencia",
+                     lambda: mut.excluir_local(serie_id, fecha_original),
+                     [('excluir_ocurrencia', {'serie_id': serie_id, 'fecha_original': fecha_original})])
+        self.evento_gestionado.emit()
+        self.close()
 
-        try:
-            self.dao_eventos.eliminar(self.evento['id_evento'])
-            
-            QMessageBox.information(self, "Éxito", "Evento eliminado correctamente 🗑️")
-            self.evento_gestionado.emit()
-            self.close()
-            
-        except mysql.connector.Error as e:
-            logging.error(f"Error SQL al eliminar evento: {e}", exc_info=True)
-            QMessageBox.critical(self, "Error al Eliminar", f"No se pudo eliminar el evento de la base de datos.\nDetalle: {e}")
\ No newline at end of file
+    def eliminar_evento(self):
+        mut = self.mutaciones
+        id_evento = self.evento['id_evento']
+        # Si era una ocurrencia sobrescrita, que no reaparezca la original de la serie
+        serie_id, fecha_original = self.evento.get('serie_id'), self.evento.get('fecha_original')
+        es_sobrescrita = bool(serie_id and fecha_original)
+
+        def cambio_local():
+            cambios = [mut.eliminar_local(id_evento)]
+            if es_sobrescrita:
+                cambios.append(mut.excluir_local(serie_id, fecha_original))
+            return mut.combinar(*cambios)
+
+        # Primero la BD: si falla, el adjunto sigue intacto y el evento no queda roto
+        operaciones = [('eliminar', {'id_evento': id_evento})]
+        if es_sobrescrita:
+            operaciones.append(('excluir_ocurrencia', {'serie_id': serie_id, 'fecha_original': fecha_original}))
+        # Después el archivo físico, si ya no lo usa ningún evento. Si no se puede borrar
+        # ahora, la limpieza de huérfanos del arranque lo recogerá.
+        if self.ruta_archivo_adjunto_actual:
+            operaciones.append(('liberar_adjunto', {'ruta': self.ruta_archivo_adjunto_actual}))
+
+        mut.ejecutar("Eliminar evento", cambio_local, operaciones)
+        self.evento_gestionado.emit()
+        self.close()
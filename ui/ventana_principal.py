@@ -1,22 +1,44 @@
 import logging
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QPushButton,
-    QLabel, QComboBox, QHeaderView, QMessageBox, QScrollArea, QToolTip,
-    QDialog, QCheckBox, QDialogButtonBox, QApplication, QAbstractItemView, QListWidget, QListWidgetItem
+    QLabel, QComboBox, QHeaderView, QMessageBox, QScrollArea, QToolTip, QLineEdit,
+    QDialog, QCheckBox, QDialogButtonBox, QApplication, QAbstractItemView, QListWidget, QListWidgetItem,
+    QFileDialog, QProgressDialog, QInputDialog, QDateEdit
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QMimeData, QTimer
-from PyQt5.QtGui import QColor, QBrush, QDrag
-from datetime import datetime, timedelta
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QMimeData, QTimer, QUrl, QDate, QEvent, QPoint
+from PyQt5.QtGui import QColor, QBrush, QDrag, QPixmap, QIcon, QCursor
+from datetime import date, datetime, timedelta
 import calendar
+import html
+import os
 import mysql.connector
 import urllib.error
 from functools import partial
 
-from utils.ui_utils import centrar_ventana
+from utils.ui_utils import centrar_ventana, preguntar_alcance_serie
+from utils import perfilado
 from ui.ventana_gestionar_evento import VentanaGestionEvento
-from database.dao import EventosDAO
-from logic.services import ClimaService
-from utils.config import CONFIGURACION, FESTIVOS_DATA, COLORES_FESTIVOS
+from ui.ventana_compartir import VentanaCompartir
+from ui.modelo_vista import ModelosVista, texto_tooltip
+from ui.vista_agenda import ModeloAgenda, VistaAgenda
+from database.dao import EventosDAO, UsuariosDAO, CalendariosDAO
+from logic.services import ClimaService, Ubicacion, UBICACIONES, UBICACION_POR_DEFECTO
+from logic.almacen_eventos import AlmacenColumnar
+from logic.intervalos import ArbolIntervalos, DURACION_POR_DEFECTO, duracion_evento, fin_evento
+from logic.precarga import CachePrecarga, Precargador
+from logic.agenda import FuenteAgenda
+from logic.recurrencia import ExpansorRecurrencias, clave_evento, proxima_ocurrencia
+from logic.busqueda import IndiceBusqueda
+from logic.miniaturas import GeneradorMiniaturas, admite_miniatura
+from logic.detalles import CargadorDetalles, tiene_adjunto
+from logic.calendarios import es_solo_lectura, texto_calendario
+from logic.mutaciones import PipelineMutaciones
+from logic.planificador import PlanificadorRefresco
+from logic.sesion import soltar_hilo
+from logic.notificaciones import HiloCambios
+from logic.festivos import REGIONES, REGION_POR_DEFECTO, info_dia
+from logic.ical import importar_ics, exportar_ics, OperacionCancelada
+from utils.config import CONFIGURACION, COLORES_FESTIVOS, COLORES_MAP
 
 MESES_ESPANOL = {
     1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
@@ -25,26 +47,14 @@ MESES_ESPANOL = {
 
 DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
 
-# Santoral básico (Mes, Día): "Nombre"
-SANTORAL = {
-    (1, 1): "Sta. María", (1, 6): "Reyes Magos", (1, 17): "S. Antón",
-    (2, 2): "Candelaria", (2, 14): "S. Valentín",
-    (3, 19): "S. José", (3, 25): "Anunciación",
-    (4, 23): "S. Jorge",
-    (5, 1): "S. José Obrero", (5, 15): "S. Isidro",
-    (6, 13): "S. Antonio", (6, 24): "S. Juan", (6, 29): "S. Pedro",
-    (7, 16): "Virgen Carmen", (7, 25): "Santiago", (7, 26): "Sta. Ana",
-    (8, 15): "Asunción", (8, 24): "S. Bartolomé",
-    (9, 29): "S. Miguel", (10, 4): "S. Francisco", (10, 12): "Virgen Pilar",
-    (11, 1): "Todos Santos", (12, 6): "S. Nicolás", (12, 8): "Inmaculada", (12, 25): "Navidad"
-}
-
-VISTAS = ["Día", "Semana", "Mes", "Año"]
+VISTAS = ["Día", "Semana", "Mes", "Año", "Agenda"]
 MAX_EVENTOS_CELDA = 3
+MAX_IMPORTANTES = 50        # próximos importantes que muestra la lista
+REFRESCO_AVISOS = timedelta(minutes=10) # cada cuánto se vuelven a pedir los próximos avisos a la BD
 
 # --- WIDGET DE CELDA PARA VISTA MES (CON DROP) ---
 class CeldaDiaWidget(QWidget):
-    evento_soltado_en_celda = pyqtSignal(int, object, datetime) # id_movido, id_destino, fecha_celda
+    evento_soltado_en_celda = pyqtSignal(str, object, datetime) # clave_movido, clave_destino, fecha_celda
 
     def __init__(self, fecha, parent=None):
         super().__init__(parent)
@@ -77,7 +87,9 @@ class CeldaDiaWidget(QWidget):
 
     def dropEvent(self, event):
         try:
-            id_evento_movido = int(event.mimeData().text())
+            id_evento_movido = event.mimeData().text()
+            if not id_evento_movido:
+                raise ValueError("Drop sin evento")
             
             scroll_area = self.findChild(QScrollArea)
             # Si no hay scroll_area (porque no hay eventos), el destino es nulo.
@@ -101,7 +113,7 @@ class CeldaDiaWidget(QWidget):
                             # Si la posición Y del drop es menor que el centro del botón,
                             # significa que queremos insertar ANTES de este botón.
                             if pos_in_content.y() < widget.y() + widget.height() / 2:
-                                id_evento_destino = widget.evento['id_evento']
+                                id_evento_destino = clave_evento(widget.evento)
                                 break
             self.evento_soltado_en_celda.emit(id_evento_movido, id_evento_destino, self.fecha)
             event.acceptProposedAction()
@@ -110,11 +122,60 @@ class CeldaDiaWidget(QWidget):
 
 # --- CLASES PARA DRAG & DROP ---
 class BotonEvento(QPushButton):
-    def __init__(self, evento, titulo, parent=None):
-        super().__init__(titulo, parent)
+    def __init__(self, evento, vista, parent=None):
+        super().__init__(vista.titulo, parent)
         self.evento = evento
+        self.vista = vista
         self.setCursor(Qt.PointingHandCursor)
         self._drag_start_pos = None
+        self._esperando_miniatura = False
+        self._esperando_detalle = False
+
+    def enterEvent(self, e):
+        # Las vistas solo cargan el resumen: notas y adjunto se piden al pasar el ratón
+        cargador = CargadorDetalles.instancia()
+        if cargador.completar(self.evento):
+            self.preparar_tooltip()
+        elif not self._esperando_detalle:
+            self._esperando_detalle = True
+            cargador.detalles_listos.connect(self.detalles_listos)
+            cargador.solicitar(self.evento)
+        super().enterEvent(e)
+
+    def detalles_listos(self, ids):
+        if self.evento['id_evento'] not in ids or not CargadorDetalles.instancia().completar(self.evento):
+            return
+        self.preparar_tooltip()
+        if self.underMouse() and self.toolTip():
+            QToolTip.showText(QCursor.pos(), self.toolTip(), self)
+
+    def preparar_tooltip(self):
+        self.setToolTip(texto_tooltip(self.evento, self.vista))
+        # Vista previa del adjunto: aquí solo se mira la caché en disco. Si no está,
+        # se pide al hilo generador y el tooltip se actualiza cuando llegue.
+        ruta = self.evento.get('archivo_adjunto')
+        if ruta and admite_miniatura(ruta):
+            generador = GeneradorMiniaturas.instancia()
+            png = generador.buscar(ruta)
+            if png:
+                self.poner_tooltip_miniatura(png)
+            elif not self._esperando_miniatura:
+                self._esperando_miniatura = True
+                generador.miniatura_lista.connect(self.miniatura_lista)
+                generador.solicitar(ruta)
+
+    def miniatura_lista(self, ruta, png):
+        if ruta != self.evento.get('archivo_adjunto'):
+            return
+        self.poner_tooltip_miniatura(png)
+        if self.underMouse():
+            QToolTip.showText(QCursor.pos(), self.toolTip(), self)
+
+    def poner_tooltip_miniatura(self, png):
+        # El mismo texto que el resto de tooltips, en HTML para poder añadir la imagen
+        texto = html.escape(texto_tooltip(self.evento, self.vista) or self.evento['titulo']).replace("\n", "<br>")
+        url = QUrl.fromLocalFile(os.path.abspath(png)).toString()
+        self.setToolTip(f"{texto}<br><img src='{url}'>")
 
     def mousePressEvent(self, e):
         if e.button() == Qt.LeftButton:
@@ -122,11 +183,11 @@ class BotonEvento(QPushButton):
         super().mousePressEvent(e)
 
     def mouseMoveEvent(self, e):
-        if e.buttons() == Qt.LeftButton and self._drag_start_pos:
+        if e.buttons() == Qt.LeftButton and self._drag_start_pos and not es_solo_lectura(self.evento):
             if (e.pos() - self._drag_start_pos).manhattanLength() > QApplication.startDragDistance():
                 drag = QDrag(self)
                 mime = QMimeData()
-                mime.setText(str(self.evento['id_evento']))
+                mime.setText(clave_evento(self.evento))
                 drag.setMimeData(mime)
                 drag.exec_(Qt.MoveAction)
                 self._drag_start_pos = None
@@ -134,7 +195,8 @@ class BotonEvento(QPushButton):
         super().mouseMoveEvent(e)
 
 class CalendarioTable(QTableWidget):
-    evento_dropped = pyqtSignal(int, int, int) # id_evento, row, col
+    evento_dropped = pyqtSignal(str, int, int) # clave_evento, row, col
+    tooltip_pedido = pyqtSignal(object) # QTableWidgetItem de un evento sin tooltip todavía
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -144,6 +206,14 @@ class CalendarioTable(QTableWidget):
         self.setDefaultDropAction(Qt.MoveAction)
         self.setMouseTracking(True)
 
+    def viewportEvent(self, event):
+        # El detalle (notas) del evento se pide al pasar el ratón, no al pintar la vista
+        if event.type() == QEvent.ToolTip:
+            item = self.itemAt(event.pos())
+            if item and item.data(Qt.UserRole) and not item.toolTip():
+                self.tooltip_pedido.emit(item)
+        return super().viewportEvent(event)
+
     def startDrag(self, supportedActions):
         item = self.currentItem()
         if item:
@@ -174,7 +244,9 @@ class CalendarioTable(QTableWidget):
 
     def dropEvent(self, event):
         try:
-            id_evento = int(event.mimeData().text())
+            id_evento = event.mimeData().text()
+            if not id_evento:
+                raise ValueError("Drop sin evento")
             index = self.indexAt(event.pos())
             if index.isValid():
                 self.evento_dropped.emit(id_evento, index.row(), index.column())
@@ -182,14 +254,18 @@ class CalendarioTable(QTableWidget):
         except ValueError:
             event.ignore()
 
-# --- HILO PARA OBTENER EL CLIMA (SEVILLA) ---
+# --- HILO PARA OBTENER EL CLIMA (UBICACIÓN DEL USUARIO) ---
 class HiloClima(QThread):
     datos_clima = pyqtSignal(str, str, dict) # temp_actual, icono_actual, pronostico_diario
 
+    def __init__(self, ubicacion):
+        super().__init__()
+        self.ubicacion = ubicacion
+
     def run(self):
         try:
-            # Delegamos la llamada a la API al servicio
-            data = ClimaService.obtener_pronostico_sevilla()
+            # Delegamos la llamada a la API al servicio (con caché compartida por ubicación)
+            data = ClimaService.obtener_pronostico(self.ubicacion.latitud, self.ubicacion.longitud)
                 
             # 1. Clima Actual
             temp_actual = "N/A"
@@ -231,6 +307,70 @@ class HiloClima(QThread):
         elif code in [95, 96, 99]: return "⛈️"
         return "❓"
 
+# --- HILO PARA CONSTRUIR EL ÍNDICE DE BÚSQUEDA ---
+class HiloIndice(QThread):
+    """
+    Tokeniza todos los eventos al abrir la sesión sin bloquear la interfaz. Las notas no
+    vienen en el resumen de las vistas: se leen aquí, una vez, solo para el índice.
+    """
+    listo = pyqtSignal(object) # IndiceBusqueda
+
+    def __init__(self, eventos, dao, usuario_id):
+        super().__init__()
+        self.eventos = eventos
+        self.dao = dao
+        self.usuario_id = usuario_id
+
+    def run(self):
+        indice = IndiceBusqueda()
+        try:
+            descripciones = self.dao.obtener_descripciones(self.usuario_id) or {}
+            indice.descripciones = {str(id_evento): texto for id_evento, texto in descripciones.items()}
+        except Exception as e:
+            logging.warning(f"Sin notas en el índice de búsqueda (solo títulos): {e}")
+        try:
+            indice.sincronizar(self.eventos)
+        except Exception as e:
+            logging.error(f"Error construyendo el índice de búsqueda: {e}", exc_info=True)
+        self.listo.emit(indice)
+
+# --- HILO PARA BUSCAR EN EL SERVIDOR ---
+class HiloBusqueda(QThread):
+    resultado = pyqtSignal(object) # Lista de eventos (None sin conexión)
+    error = pyqtSignal(str)
+
+    def __init__(self, dao, usuario_id, texto):
+        super().__init__()
+        self.dao = dao
+        self.usuario_id = usuario_id
+        self.texto = texto
+
+    def run(self):
+        try:
+            self.resultado.emit(self.dao.buscar(self.usuario_id, self.texto))
+        except Exception as e:
+            logging.error(f"Error en la búsqueda en el servidor: {e}", exc_info=True)
+            self.error.emit(str(e))
+
+# --- HILO PARA CONSULTAR LOS PRÓXIMOS AVISOS ---
+class HiloAvisos(QThread):
+    """Lee de la BD los próximos eventos con aviso: el timer de alertas solo compara con lo ya leído."""
+    listos = pyqtSignal(int, object) # version_datos de la consulta, eventos
+
+    def __init__(self, fuente, version, desde):
+        super().__init__()
+        self.fuente = fuente
+        self.version = version
+        self.desde = desde
+
+    def run(self):
+        try:
+            eventos, _ = self.fuente.siguientes((self.desde, 0))
+        except Exception as e:
+            logging.error(f"No se pudieron consultar los próximos avisos: {e}")
+            eventos = [] # Mientras, solo lo de memoria
+        self.listos.emit(self.version, eventos)
+
 # --- HILO PARA IMPORTAR GOOGLE CALENDAR ---
 class HiloGoogle(QThread):
     resultado = pyqtSignal(bool, str)
@@ -248,12 +388,62 @@ class HiloGoogle(QThread):
             logging.error(f"Excepción en HiloGoogle: {e}", exc_info=True)
             self.resultado.emit(False, f"Error inesperado durante la sincronización: {str(e)}")
 
+# --- HILO PARA IMPORTAR / EXPORTAR .ICS ---
+class HiloICS(QThread):
+    progreso = pyqtSignal(int)         # 0-100
+    resultado = pyqtSignal(bool, str)
+
+    def __init__(self, operacion, ruta, usuario_id):
+        super().__init__()
+        self.operacion = operacion # 'importar' o 'exportar'
+        self.ruta = ruta
+        self.usuario_id = usuario_id
+        self._cancelado = False
+        self._ultimo_progreso = -1
+
+    def cancelar(self):
+        self._cancelado = True
+
+    def _emitir_progreso(self, fraccion):
+        # El lector informa en cada evento: solo se emite cuando cambia el porcentaje
+        porcentaje = int(fraccion * 100)
+        if porcentaje != self._ultimo_progreso:
+            self._ultimo_progreso = porcentaje
+            self.progreso.emit(porcentaje)
+
+    def run(self):
+        funcion = importar_ics if self.operacion == 'importar' else exportar_ics
+        try:
+            resultado = funcion(
+                self.ruta, self.usuario_id,
+                progreso=self._emitir_progreso,
+                cancelado=lambda: self._cancelado
+            )
+            if self.operacion == 'importar':
+                importados, descartados = resultado
+                mensaje = f"Importación completada: {importados} eventos nuevos."
+                if descartados:
+                    mensaje += f"\n{descartados} eventos sin fecha válida se han ignorado."
+            else:
+                mensaje = f"Exportación completada: {resultado} eventos guardados en\n{self.ruta}"
+            self.resultado.emit(True, mensaje)
+        except OperacionCancelada as e:
+            if self.operacion == 'importar':
+                self.resultado.emit(True, f"Importación cancelada: se conservan los {e.args[0]} eventos ya importados.")
+            else:
+                self.resultado.emit(True, "Exportación cancelada.")
+        except Exception as e:
+            logging.error(f"Excepción en HiloICS ({self.operacion}): {e}", exc_info=True)
+            self.resultado.emit(False, f"No se pudo {self.operacion} el calendario.\nDetalle: {e}")
+
 class VentanaPrincipal(QWidget):
     logout_signal = pyqtSignal()
 
     def __init__(self, usuario_info):
         super().__init__()
         self.usuario = usuario_info
+        self.sesion_liberada = False
+        self.ventana_editor = None
         self.dao = EventosDAO() # Instancia del DAO
         self.setWindowTitle(f"MiniCalendar - Bienvenido, {self.usuario['nombre']}")
         
@@ -269,10 +459,63 @@ class VentanaPrincipal(QWidget):
         # Inicialización
         self.fecha_actual = datetime.now()
         self.vista_actual = "Mes"
-        self.eventos = self.cargar_eventos()
+        self.dao_usuarios = UsuariosDAO()
+        self.region_festivos = self.dao_usuarios.obtener_region_festivos(self.usuario['id_usuario']) or REGION_POR_DEFECTO
+        ubicacion = self.dao_usuarios.obtener_ubicacion_clima(self.usuario['id_usuario'])
+        self.ubicacion_clima = Ubicacion(*ubicacion) if ubicacion else UBICACION_POR_DEFECTO
+        self.expansor = ExpansorRecurrencias() # Expande series solo para el año visible
+        # Ventanas de año (series expandidas + índice columnar) y páginas de cada periodo,
+        # versionadas: la vista actual y sus vecinas se preparan antes de que se pidan
+        self.precarga = CachePrecarga()
+        self.precargador = Precargador(parent=self)
+        self.version_datos = 0
+        # Título, colores, tooltip y flags de cada evento: se calculan con la ventana, no al pintar
+        self.modelos_vista = ModelosVista()
+        self.hoy = date.today()
+        # Índice invertido para la búsqueda mientras se escribe: sobre las filas cargadas (cada
+        # serie una vez, no sus ocurrencias), así que no cambia al pasar de un año a otro
+        self.indice_busqueda = IndiceBusqueda()
+        self.indice_listo = False
+        self.hilo_indice = None
+        self.construyendo_indice = False
+        self.cambios_indice = [] # (fila, presente) aún sin aplicar al índice (se guardan mientras se construye)
+        self.hilo_busqueda = None # Búsqueda en el servidor en curso
+        self.anio_ventana = None
+        self.dao_calendarios = CalendariosDAO()
+        # Calendarios visibles (el propio y los compartidos) con su versión: se leen ANTES que los eventos
+        calendarios_iniciales = self.dao_calendarios.obtener_visibles(self.usuario['id_usuario'])
+        self.eventos_base = self.cargar_eventos() # Filas tal cual vienen de la BD
+        self.aplicar_ventana_recurrencias()
+        # Los cambios se aplican en memoria al instante y se guardan en segundo plano
+        self.mutaciones = PipelineMutaciones(lambda: self.eventos_base, self.usuario['id_usuario'], dao=self.dao)
+        self.construir_indice()
+        # Notas y adjunto no vienen en la carga de las vistas: se piden al pasar el ratón o al editar
+        self.cargador_detalles = CargadorDetalles.instancia()
+        self.cargador_detalles.detalles_listos.connect(self.detalles_cargados)
+        self.mutaciones.cambio_local.connect(self.aplicar_cambio_local)
+        self.mutaciones.mutacion_confirmada.connect(self.mutacion_confirmada)
+        self.mutaciones.mutacion_fallida.connect(self.mutacion_fallida)
+        self.mutaciones.sin_conexion.connect(self.mostrar_sin_conexion)
+        self.mutaciones.diario_reproducido.connect(self.mostrar_informe_diario)
+        # Cambios hechos desde otros dispositivos: llegan solos, sin pulsar Sincronizar
+        self.cambios_remotos_pendientes = []
+        self.notas_por_indexar = {} # id_evento -> fila cambiada en otro dispositivo, a la espera de sus notas
+        self.hilo_cambios = HiloCambios(self.usuario['id_usuario'], calendarios_iniciales)
+        self.hilo_cambios.cambios.connect(self.recibir_cambios_remotos)
+        self.hilo_cambios.calendarios_cambiados.connect(self.refrescar_eventos) # Nuevo permiso o calendario: recarga completa
+        self.hilo_cambios.start()
         self.pronostico_clima = {} # Diccionario para guardar el clima futuro
         self.celdas_map = {} # Mapeo de (fila, col) -> fecha para Drag&Drop
         self.eventos_notificados = set() # Para no repetir alertas
+        self.seleccion = set() # Claves de los eventos seleccionados con Ctrl+clic (acciones en bloque)
+        # Todas las recargas y repintados pasan por aquí para agrupar las ráfagas
+        self.planificador = PlanificadorRefresco(
+            recargar=self.recargar_eventos,
+            reindexar=self.reindexar,
+            repintar=self.repintar_dias,
+            clima=self.solicitar_clima,
+            parent=self
+        )
 
         # Navegación
         self.label_fecha = QLabel("")
@@ -289,10 +532,21 @@ class VentanaPrincipal(QWidget):
         nav_layout.addWidget(self.label_fecha)
         nav_layout.addWidget(self.boton_next)
         
-        # Etiqueta del Clima (Sevilla)
+        # Etiqueta del Clima (ubicación elegida por el usuario)
         self.label_clima = QLabel("Cargando clima...")
         self.label_clima.setStyleSheet("color: #555; font-size: 12px; margin-left: 15px; padding: 3px; border: 1px solid #ddd; border-radius: 5px; background-color: #f9f9f9;")
         nav_layout.addWidget(self.label_clima)
+        self.combo_ubicacion = QComboBox()
+        self.combo_ubicacion.setCursor(Qt.PointingHandCursor)
+        self.combo_ubicacion.setToolTip("Ubicación del pronóstico del tiempo")
+        ubicaciones = list(UBICACIONES)
+        if self.ubicacion_clima not in ubicaciones:
+            ubicaciones.insert(0, self.ubicacion_clima) # Ubicación personalizada guardada en la BD
+        for ubicacion in ubicaciones:
+            self.combo_ubicacion.addItem(f"📍 {ubicacion.nombre}", ubicacion)
+        self.combo_ubicacion.setCurrentIndex(ubicaciones.index(self.ubicacion_clima))
+        self.combo_ubicacion.currentIndexChanged.connect(self.cambiar_ubicacion_clima)
+        nav_layout.addWidget(self.combo_ubicacion)
 
         # Selector de vista
         self.combo_vista = QComboBox()
@@ -303,6 +557,27 @@ class VentanaPrincipal(QWidget):
         vista_layout = QHBoxLayout()
         vista_layout.addWidget(QLabel("Vista:"))
         vista_layout.addWidget(self.combo_vista)
+
+        # Selector de calendario de festivos (se guarda por usuario)
+        self.combo_festivos = QComboBox()
+        self.combo_festivos.setCursor(Qt.PointingHandCursor)
+        self.combo_festivos.setToolTip("Calendario laboral: incluye los festivos nacionales y autonómicos que correspondan")
+        sangria = {"nacional": "", "autonomico": "  ", "local": "    "}
+        for clave, datos in REGIONES.items():
+            self.combo_festivos.addItem(sangria[datos["tipo"]] + datos["nombre"], clave)
+        self.combo_festivos.setCurrentIndex(max(0, self.combo_festivos.findData(self.region_festivos)))
+        self.combo_festivos.currentIndexChanged.connect(self.cambiar_region_festivos)
+        vista_layout.addWidget(QLabel("🎉 Festivos:"))
+        vista_layout.addWidget(self.combo_festivos)
+
+        # Buscador (local mientras se escribe, en el servidor al pulsar Enter)
+        self.input_busqueda = QLineEdit()
+        self.input_busqueda.setPlaceholderText("🔍 Buscar eventos... (Enter: buscar en todo el historial)")
+        self.input_busqueda.setClearButtonEnabled(True)
+        self.input_busqueda.setMinimumWidth(280)
+        self.input_busqueda.textChanged.connect(self.buscar_local)
+        self.input_busqueda.returnPressed.connect(self.buscar_servidor)
+        vista_layout.addWidget(self.input_busqueda)
         vista_layout.addStretch()
 
         # Botón Sincronizar (Nuevo)
@@ -320,6 +595,8 @@ class VentanaPrincipal(QWidget):
         self.label_status = QLabel("")
         self.label_status.setStyleSheet("color: #7f8c8d; font-size: 11px; margin-right: 10px;")
         vista_layout.addWidget(self.label_status)
+        if self.mutaciones.pendientes_offline():
+            self.mostrar_sin_conexion(self.mutaciones.pendientes_offline())
         
         # Botón Eventos Importantes
         self.boton_importantes = QPushButton("⭐ Importantes")
@@ -341,6 +618,30 @@ class VentanaPrincipal(QWidget):
         """)
         vista_layout.addWidget(self.boton_google)
 
+        # Botones de importación / exportación .ics
+        self.boton_importar_ics = QPushButton("📥 Importar .ics")
+        self.boton_importar_ics.clicked.connect(lambda: self.iniciar_ics('importar'))
+        self.boton_exportar_ics = QPushButton("📤 Exportar .ics")
+        self.boton_exportar_ics.clicked.connect(lambda: self.iniciar_ics('exportar'))
+        for boton in (self.boton_importar_ics, self.boton_exportar_ics):
+            boton.setCursor(Qt.PointingHandCursor)
+            boton.setStyleSheet("""
+                QPushButton { padding: 5px; background-color: #16a085; color: white; font-weight: bold; border-radius: 3px; }
+                QPushButton:hover { background-color: #1abc9c; }
+            """)
+            vista_layout.addWidget(boton)
+
+        # Botón Calendarios compartidos
+        self.boton_compartir = QPushButton("👥 Compartir")
+        self.boton_compartir.setToolTip("Compartir tu calendario y ver los que te han compartido")
+        self.boton_compartir.clicked.connect(self.abrir_compartir)
+        self.boton_compartir.setCursor(Qt.PointingHandCursor)
+        self.boton_compartir.setStyleSheet("""
+            QPushButton { padding: 5px; background-color: #8e44ad; color: white; font-weight: bold; border-radius: 3px; }
+            QPushButton:hover { background-color: #9b59b6; }
+        """)
+        vista_layout.addWidget(self.boton_compartir)
+
         # Botón Cerrar Sesión
         self.boton_logout = QPushButton("🔒 Salir")
         self.boton_logout.clicked.connect(self.cerrar_sesion)
@@ -355,6 +656,7 @@ class VentanaPrincipal(QWidget):
         self.tabla = CalendarioTable()
         self.tabla.cellClicked.connect(self.celda_click)
         self.tabla.evento_dropped.connect(self.procesar_drop)
+        self.tabla.tooltip_pedido.connect(self.pedir_tooltip_item)
         
         # --- CORRECCIÓN DE LAYOUT ---
         # Configuramos los headers para que estiren (Stretch) todas las secciones por igual.
@@ -378,15 +680,71 @@ class VentanaPrincipal(QWidget):
             }
         """)
 
+        # Agenda: lista perezosa sobre todo el historial (oculta en el resto de vistas)
+        self.series_agenda = (None, [])
+        self.modelo_agenda = ModeloAgenda(FuenteAgenda(self.dao, self.usuario['id_usuario'], self.series_en_memoria),
+                                          self.modelos_vista, self)
+        self.lista_agenda = VistaAgenda()
+        self.lista_agenda.setModel(self.modelo_agenda)
+        self.lista_agenda.clicked.connect(lambda indice: self.click_evento(indice.data(Qt.UserRole)))
+        self.lista_agenda.setVisible(False)
+        self.fecha_agenda = None # fecha_actual con la que se abrió la agenda (para saber si se ha navegado)
+        # Próximos importantes y avisos: consulta indexada a la BD, no depende de lo cargado en memoria
+        self.fuente_importantes = FuenteAgenda(self.dao, self.usuario['id_usuario'], self.series_en_memoria,
+                                               tam_pagina=MAX_IMPORTANTES, filtro='importantes')
+        # Los avisos se consultan en un hilo: sus series son una foto tomada en el hilo de la interfaz
+        self.series_avisos = []
+        self.fuente_avisos = FuenteAgenda(self.dao, self.usuario['id_usuario'], lambda: self.series_avisos, filtro='avisos')
+        self.avisos_proximos = None # (version_datos, caduca, eventos)
+        self.hilo_avisos = None
+
+        # Resultados de búsqueda (ocultos mientras no haya consulta)
+        self.lista_busqueda = QListWidget()
+        self.lista_busqueda.setMaximumHeight(160)
+        self.lista_busqueda.setCursor(Qt.PointingHandCursor)
+        self.lista_busqueda.itemClicked.connect(self.ir_a_resultado_busqueda)
+        self.lista_busqueda.setVisible(False)
+
+        # Barra de acciones en bloque (visible solo con eventos seleccionados)
+        self.barra_seleccion = QWidget()
+        self.barra_seleccion.setObjectName("barra_seleccion")
+        self.barra_seleccion.setAttribute(Qt.WA_StyledBackground, True)
+        self.barra_seleccion.setStyleSheet("#barra_seleccion { background-color: #eaf2f8; border: 1px solid #3498db; border-radius: 4px; }")
+        barra_layout = QHBoxLayout()
+        barra_layout.setContentsMargins(6, 3, 6, 3)
+        self.label_seleccion = QLabel("")
+        self.label_seleccion.setStyleSheet("font-weight: bold; color: #2c3e50;")
+        barra_layout.addWidget(self.label_seleccion)
+        barra_layout.addStretch()
+        acciones = [
+            ("↔ Desplazar días", 'desplazar'), ("📅 Mover a fecha", 'mover_a'), ("🎨 Color", 'color'),
+            ("⭐ Importante", 'importante'), ("⏰ Aviso", 'aviso'), ("🗑 Eliminar", 'eliminar'),
+        ]
+        for texto, accion in acciones:
+            boton = QPushButton(texto)
+            boton.setCursor(Qt.PointingHandCursor)
+            boton.clicked.connect(partial(self.accion_en_bloque, accion))
+            barra_layout.addWidget(boton)
+        boton_limpiar = QPushButton("✖")
+        boton_limpiar.setToolTip("Quitar la selección")
+        boton_limpiar.setCursor(Qt.PointingHandCursor)
+        boton_limpiar.clicked.connect(self.limpiar_seleccion)
+        barra_layout.addWidget(boton_limpiar)
+        self.barra_seleccion.setLayout(barra_layout)
+        self.barra_seleccion.setVisible(False)
+
         # Layout principal
         layout = QVBoxLayout()
         layout.addLayout(nav_layout)
         layout.addLayout(vista_layout)
+        layout.addWidget(self.lista_busqueda)
+        layout.addWidget(self.barra_seleccion)
         layout.addWidget(self.tabla, stretch=1)
+        layout.addWidget(self.lista_agenda, stretch=1)
         self.setLayout(layout)
 
         self.mostrar_vista()
-        self.solicitar_clima()
+        self.planificador.marcar_clima(forzar=True)
 
         # Timer para verificar recordatorios cada 30 segundos
         self.timer_alertas = QTimer(self)
@@ -394,9 +752,46 @@ class VentanaPrincipal(QWidget):
         self.timer_alertas.start(30000) 
 
     def cerrar_sesion(self):
+        self.liberar_sesion()
         self.logout_signal.emit()
         self.close()
 
+    def closeEvent(self, event):
+        self.liberar_sesion()
+        super().closeEvent(event)
+
+    def liberar_sesion(self):
+        """
+        Suelta lo que es de esta sesión: timers, hilos, escrituras pendientes y las
+        conexiones a los hilos compartidos (que siguen vivos para la siguiente; ver
+        logic/sesion.py). Se puede llamar más de una vez.
+        """
+        if self.sesion_liberada:
+            return
+        self.sesion_liberada = True
+        self.timer_alertas.stop()
+        self.planificador.cancelar()
+        self.precargador.cancelar()
+        self.cerrar_editor()
+        soltar_hilo(self.hilo_indice, self.hilo_indice.listo)
+        if self.hilo_busqueda is not None:
+            soltar_hilo(self.hilo_busqueda, self.hilo_busqueda.resultado, self.hilo_busqueda.error)
+        if self.hilo_avisos is not None:
+            soltar_hilo(self.hilo_avisos, self.hilo_avisos.listos)
+        self.hilo_cambios.detener()
+        soltar_hilo(self.hilo_cambios, self.hilo_cambios.cambios, self.hilo_cambios.calendarios_cambiados)
+        hilo_clima = getattr(self, 'hilo_clima', None)
+        soltar_hilo(hilo_clima, *([hilo_clima.datos_clima] if hilo_clima else []))
+        hilo_google = getattr(self, 'hilo_google', None)
+        soltar_hilo(hilo_google, *([hilo_google.resultado] if hilo_google else []))
+        hilo_ics = getattr(self, 'hilo_ics', None)
+        if hilo_ics is not None:
+            hilo_ics.cancelar() # Lo importado hasta aquí se queda
+            soltar_hilo(hilo_ics, hilo_ics.progreso, hilo_ics.resultado)
+        self.mutaciones.cerrar()
+        self.cargador_detalles.detalles_listos.disconnect(self.detalles_cargados)
+        self.cargador_detalles.olvidar()
+
     # =================== Sincronización Manual ===================
     def sincronizar_manual(self):
         """Fuerza la recarga de eventos desde la BD con feedback visual."""
@@ -407,7 +802,9 @@ class VentanaPrincipal(QWidget):
         QApplication.processEvents()
 
         try:
-            self.refrescar_eventos()
+            self.planificador.marcar_datos()
+            self.planificador.marcar_clima(forzar=True)
+            self.planificador.ejecutar() # El usuario está esperando: sin ventana de agrupación
             hora_actual = datetime.now().strftime("%H:%M:%S")
             self.label_status.setText(f"Última sinc: {hora_actual}")
         except Exception as e:
@@ -434,13 +831,46 @@ class VentanaPrincipal(QWidget):
         else:
             QMessageBox.warning(self, "Error Google", mensaje)
 
+    # =================== Importar / Exportar .ics ===================
+    def iniciar_ics(self, operacion):
+        if operacion == 'importar':
+            ruta, _ = QFileDialog.getOpenFileName(self, "Importar calendario", "", "iCalendar (*.ics);;Todos los archivos (*.*)")
+        else:
+            ruta, _ = QFileDialog.getSaveFileName(self, "Exportar calendario", "MiniCalendar.ics", "iCalendar (*.ics)")
+        if not ruta:
+            return
+        self.boton_importar_ics.setEnabled(False)
+        self.boton_exportar_ics.setEnabled(False)
+        texto = "Importando eventos..." if operacion == 'importar' else "Exportando eventos..."
+        self.dialogo_ics = QProgressDialog(texto, "Cancelar", 0, 100, self)
+        self.dialogo_ics.setWindowTitle("Calendario .ics")
+        self.dialogo_ics.setWindowModality(Qt.WindowModal)
+        self.dialogo_ics.setMinimumDuration(300)
+
+        self.hilo_ics = HiloICS(operacion, ruta, self.usuario['id_usuario'])
+        self.hilo_ics.progreso.connect(self.dialogo_ics.setValue)
+        self.hilo_ics.resultado.connect(self.fin_ics)
+        self.dialogo_ics.canceled.connect(self.hilo_ics.cancelar)
+        self.hilo_ics.start()
+
+    def fin_ics(self, exito, mensaje):
+        self.dialogo_ics.reset()
+        self.boton_importar_ics.setEnabled(True)
+        self.boton_exportar_ics.setEnabled(True)
+        if exito:
+            QMessageBox.information(self, "Calendario .ics", mensaje)
+            if self.hilo_ics.operacion == 'importar':
+                self.refrescar_eventos()
+        else:
+            QMessageBox.warning(self, "Error .ics", mensaje)
+
     def solicitar_clima(self):
         """Inicia el hilo de carga del clima, evitando ejecuciones duplicadas."""
         # Si ya hay un hilo de clima corriendo, no hacemos nada para no saturar.
         if hasattr(self, 'hilo_clima') and self.hilo_clima.isRunning():
             return
 
-        self.hilo_clima = HiloClima()
+        self.hilo_clima = HiloClima(self.ubicacion_clima)
         self.hilo_clima.datos_clima.connect(self.actualizar_clima)
         self.hilo_clima.start()
 
@@ -451,16 +881,29 @@ class VentanaPrincipal(QWidget):
 
     def verificar_recordatorios(self):
         ahora = datetime.now()
-        for ev in self.eventos:
-            # Si tiene aviso configurado y no ha sido notificado en esta sesión
-            if ev.get('minutos_aviso', 0) > 0 and ev['id_evento'] not in self.eventos_notificados:
-                fecha_evento = ev['fecha_inicio']
-                fecha_aviso = fecha_evento - timedelta(minutes=ev['minutos_aviso'])
-                
-                # Si ya pasó la hora del aviso pero aún no ha pasado el evento (o acaba de pasar)
-                if fecha_aviso <= ahora <= fecha_evento:
-                    self.mostrar_alerta(ev)
-                    self.eventos_notificados.add(ev['id_evento'])
+        # Los próximos eventos con aviso se piden a la BD (en HiloAvisos) cuando cambian los datos
+        # o cada REFRESCO_AVISOS; aquí solo se mira qué aviso de los ya leídos ha saltado
+        if self.avisos_proximos is None or self.avisos_proximos[0] != self.version_datos or ahora >= self.avisos_proximos[1]:
+            self.consultar_avisos(ahora)
+        proximos = self.avisos_proximos[2] if self.avisos_proximos else []
+        pendientes = [e for e in proximos if e['fecha_inicio'] - timedelta(minutes=int(e['minutos_aviso'])) <= ahora <= e['fecha_inicio']]
+        # Más los de la ventana en memoria: cambios locales que quizá aún no han llegado a la BD
+        for ev in pendientes + self.almacen.pendientes_aviso(ahora):
+            # Si no ha sido notificado en esta sesión
+            if clave_evento(ev) not in self.eventos_notificados:
+                self.mostrar_alerta(ev)
+                self.eventos_notificados.add(clave_evento(ev))
+
+    def consultar_avisos(self, ahora):
+        if self.hilo_avisos is not None and self.hilo_avisos.isRunning():
+            return # La consulta en curso ya traerá la ventana nueva
+        self.series_avisos = self.series_en_memoria()
+        self.hilo_avisos = HiloAvisos(self.fuente_avisos, self.version_datos, ahora)
+        self.hilo_avisos.listos.connect(self.avisos_leidos)
+        self.hilo_avisos.start()
+
+    def avisos_leidos(self, version, eventos):
+        self.avisos_proximos = (version, datetime.now() + REFRESCO_AVISOS, eventos)
 
     def mostrar_alerta(self, evento):
         QMessageBox.information(self, "🔔 Recordatorio de Evento", 
@@ -473,12 +916,18 @@ class VentanaPrincipal(QWidget):
         layout = QVBoxLayout()
         
         lista = QListWidget()
-        importantes = [e for e in self.eventos if e.get('es_importante')]
-        importantes.sort(key=lambda x: x['fecha_inicio'])
+        try:
+            importantes, _ = self.fuente_importantes.siguientes((datetime.now(), 0)) # Ya vienen ordenados por fecha
+        except Exception as e:
+            logging.error(f"No se pudieron consultar los próximos importantes: {e}")
+            importantes = self.almacen.importantes_lista(datetime.now())[:MAX_IMPORTANTES]
         
+        resaltado = QBrush(QColor("#d35400")) # Color oscuro para resaltar
         for ev in importantes:
-            item = QListWidgetItem(f"{ev['fecha_inicio'].strftime('%d/%m %H:%M')} - {ev['titulo']}")
-            item.setForeground(QBrush(QColor("#d35400"))) # Color oscuro para resaltar
+            vista = self.vista_de(ev) # Mismo título y color que en las vistas
+            item = QListWidgetItem(f"{ev['fecha_inicio'].strftime('%d/%m %H:%M')} - {vista.titulo}")
+            item.setIcon(self.icono_color(vista.color_hex))
+            item.setForeground(resaltado)
             lista.addItem(item)
             
         layout.addWidget(QLabel("Próximos eventos importantes:"))
@@ -486,44 +935,167 @@ class VentanaPrincipal(QWidget):
         dialogo.setLayout(layout)
         dialogo.exec_()
 
+    # =================== Búsqueda ===================
+    def buscar_local(self, texto):
+        """Búsqueda mientras se escribe sobre el índice invertido en memoria."""
+        if not texto.strip():
+            self.lista_busqueda.clear()
+            self.lista_busqueda.setVisible(False)
+            return
+        if not self.indice_listo:
+            self.lista_busqueda.clear()
+            self.lista_busqueda.addItem("Preparando la búsqueda...")
+            self.lista_busqueda.setVisible(True)
+            return
+        self.mostrar_resultados_busqueda(self.indice_busqueda.buscar(texto))
+
+    def construir_indice(self):
+        """
+        (Re)construye el índice de búsqueda con todas las filas cargadas en un hilo. Hasta
+        que termina sigue respondiendo el anterior (vacío al abrir la sesión).
+        """
+        if self.hilo_indice is not None:
+            soltar_hilo(self.hilo_indice, self.hilo_indice.listo)
+        self.mutaciones.tomar_filas_tocadas() # Lo anterior ya va en la lista que se indexa
+        self.cambios_indice = []
+        self.construyendo_indice = True
+        self.hilo_indice = HiloIndice(list(self.eventos_base), self.dao, self.usuario['id_usuario'])
+        self.hilo_indice.listo.connect(self.indice_construido)
+        self.hilo_indice.start()
+
+    def indice_construido(self, indice):
+        """El índice está listo: se le aplica lo que haya cambiado mientras se construía."""
+        indice.actualizar(self.cambios_indice)
+        self.cambios_indice = []
+        self.indice_busqueda = indice
+        self.indice_listo = True
+        self.construyendo_indice = False
+        if self.input_busqueda.text().strip():
+            self.buscar_local(self.input_busqueda.text())
+
+    def indexar(self, cambios):
+        """Lleva al índice de búsqueda solo las filas cambiadas: [(fila, presente)]."""
+        self.cambios_indice += cambios
+        if not self.construyendo_indice:
+            self.indice_busqueda.actualizar(self.cambios_indice)
+            self.cambios_indice = []
+
+    def buscar_servidor(self):
+        """Búsqueda FULLTEXT en el servidor (Enter): sobre lo que hay ahora en la BD, no sobre lo cargado."""
+        texto = self.input_busqueda.text().strip()
+        if not texto:
+            return
+        if self.hilo_busqueda is not None:
+            # Solo interesa la última búsqueda: la anterior termina sin avisar a nadie
+            soltar_hilo(self.hilo_busqueda, self.hilo_busqueda.resultado, self.hilo_busqueda.error)
+        self.lista_busqueda.clear()
+        self.lista_busqueda.addItem("Buscando en el servidor...")
+        self.lista_busqueda.setVisible(True)
+        self.hilo_busqueda = HiloBusqueda(self.dao, self.usuario['id_usuario'], texto)
+        self.hilo_busqueda.resultado.connect(self.resultados_servidor)
+        self.hilo_busqueda.error.connect(self.error_busqueda_servidor)
+        self.hilo_busqueda.start()
+
+    def error_busqueda_servidor(self, mensaje):
+        self.lista_busqueda.setVisible(False)
+        QMessageBox.warning(self, "Error de Búsqueda", f"No se pudo buscar en el servidor.\nDetalle: {mensaje}")
+
+    def resultados_servidor(self, resultados):
+        if resultados is None:
+            self.lista_busqueda.setVisible(False)
+            return
+        for e in resultados:
+            if isinstance(e['fecha_inicio'], str):
+                e['fecha_inicio'] = datetime.strptime(e['fecha_inicio'], "%Y-%m-%d %H:%M:%S")
+        self.mostrar_resultados_busqueda(resultados)
+
+    def mostrar_resultados_busqueda(self, resultados):
+        self.lista_busqueda.clear()
+        if not resultados:
+            self.lista_busqueda.addItem("Sin resultados")
+        for ev in map(self.ocurrencia_resultado, resultados):
+            item = QListWidgetItem(f"{ev['fecha_inicio'].strftime('%d/%m/%Y %H:%M')} - {ev['titulo']}")
+            item.setData(Qt.UserRole, ev)
+            if ev.get('color_db_string'):
+                item.setIcon(self.icono_color('#' + ev['color_db_string'].split('#')[-1]))
+            self.lista_busqueda.addItem(item)
+        self.lista_busqueda.setVisible(True)
+
+    def ocurrencia_resultado(self, evento):
+        """Una serie aparece una sola vez en los resultados: lleva a su próxima ocurrencia (o a su inicio si ya terminó)."""
+        if not evento.get('regla_recurrencia'):
+            return evento
+        fecha = proxima_ocurrencia(evento, datetime.now())
+        return dict(evento, fecha_inicio=fecha) if fecha else evento
+
+    def icono_color(self, color_hex):
+        pixmap = QPixmap(12, 12)
+        pixmap.fill(QColor(color_hex))
+        return QIcon(pixmap)
+
+    def ir_a_resultado_busqueda(self, item):
+        """Salta a la vista Día del evento y lo deja seleccionado."""
+        evento = item.data(Qt.UserRole)
+        if not evento:
+            return
+        self.fecha_actual = evento['fecha_inicio']
+        if self.vista_actual == "Día":
+            self.planificador.marcar_vista()
+        else:
+            self.combo_vista.setCurrentText("Día") # Dispara cambiar_vista -> marcar_vista
+        self.planificador.ejecutar() # Hay que pintar ya para poder seleccionar la fila
+        for fila, ev in enumerate(self.almacen.eventos_dia(self.fecha_actual)):
+            if ev['id_evento'] == evento['id_evento']:
+                self.tabla.setCurrentCell(fila, 0)
+                break
+
     # =================== Gestión de vistas ===================
     def cambiar_vista(self, nueva_vista):
         self.vista_actual = nueva_vista
-        self.mostrar_vista()
-        self.solicitar_clima()
+        self.planificador.marcar_vista()
+        self.planificador.marcar_clima()
 
     def cambiar_periodo(self, delta):
-        if self.vista_actual == "Día":
-            self.fecha_actual += timedelta(days=delta)
-        elif self.vista_actual == "Semana":
-            self.fecha_actual += timedelta(weeks=delta)
-        elif self.vista_actual == "Mes":
-            mes = self.fecha_actual.month + delta
-            anio = self.fecha_actual.year
-            if mes > 12:
-                mes = 1
-                anio += 1
-            elif mes < 1:
-                mes = 12
-                anio -= 1
-            self.fecha_actual = self.fecha_actual.replace(year=anio, month=mes)
-        elif self.vista_actual == "Año":
-            self.fecha_actual = self.fecha_actual.replace(year=self.fecha_actual.year + delta)
-        self.mostrar_vista()
-        self.solicitar_clima()
+        self.fecha_actual = self.fecha_periodo(delta)
+        # Pulsar varias veces seguidas la flecha solo pinta el periodo final
+        self.planificador.marcar_vista()
+        self.planificador.marcar_clima()
         
+    def fecha_periodo(self, delta, vista=None):
+        """Fecha del periodo anterior (delta=-1) o siguiente (delta=1) al visible."""
+        vista = vista or self.vista_actual
+        fecha = self.fecha_actual
+        if vista == "Día":
+            return fecha + timedelta(days=delta)
+        if vista == "Semana":
+            return fecha + timedelta(weeks=delta)
+        if vista in ("Mes", "Agenda"):
+            anio, mes = divmod(fecha.year * 12 + fecha.month - 1 + delta, 12)
+            mes += 1
+            # El 31 no existe en todos los meses
+            return fecha.replace(year=anio, month=mes, day=min(fecha.day, calendar.monthrange(anio, mes)[1]))
+        return fecha.replace(year=fecha.year + delta, day=min(fecha.day, 28) if fecha.month == 2 else fecha.day)
+
     def actualizar_clima(self, temp, icono, pronostico):
         """Slot que recibe los datos del hilo y actualiza la interfaz"""
+        if self.sender().ubicacion != self.ubicacion_clima:
+            # Se cambió de ubicación mientras se descargaba: pedimos la nueva
+            self.planificador.marcar_clima(forzar=True)
+            return
         if temp == "Error":
             self.label_clima.setText("Sin conexión 🚫")
         else:
-            self.label_clima.setText(f"Sevilla: {icono} {temp}°C")
+            self.label_clima.setText(f"{self.ubicacion_clima.nombre}: {icono} {temp}°C")
             
         self.pronostico_clima = pronostico
         # Refrescamos la vista para que aparezcan los iconos en los días
-        self.mostrar_vista()
+        self.planificador.marcar_vista()
 
     def mostrar_vista(self):
+        # Si hemos navegado a otro año, expandimos las series recurrentes para él
+        if self.fecha_actual.year != self.anio_ventana:
+            self.aplicar_ventana_recurrencias()
+
         # Reinforzamos el modo Stretch cada vez que se actualiza la vista
         self.tabla.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.tabla.verticalHeader().setSectionResizeMode(QHeaderView.Stretch)
@@ -532,14 +1104,28 @@ class VentanaPrincipal(QWidget):
         self.tabla.horizontalHeader().setVisible(True)
         self.tabla.verticalHeader().setVisible(False)
 
-        if self.vista_actual == "Día":
-            self.mostrar_vista_dia()
-        elif self.vista_actual == "Semana":
-            self.mostrar_vista_semana()
-        elif self.vista_actual == "Mes":
-            self.mostrar_vista_mes()
-        elif self.vista_actual == "Año":
-            self.mostrar_vista_anio()
+        self.hoy = date.today() # Una vez por pintado, no por celda
+        es_agenda = self.vista_actual == "Agenda"
+        self.tabla.setVisible(not es_agenda)
+        self.lista_agenda.setVisible(es_agenda)
+        with perfilado.perfilar(f"vista_{self.vista_actual}"):
+            if self.vista_actual == "Día":
+                self.mostrar_vista_dia()
+            elif self.vista_actual == "Semana":
+                self.mostrar_vista_semana()
+            elif self.vista_actual == "Mes":
+                self.mostrar_vista_mes()
+            elif self.vista_actual == "Año":
+                self.mostrar_vista_anio()
+            elif es_agenda:
+                self.mostrar_vista_agenda()
+
+        # En los ratos libres se preparan el periodo siguiente y el anterior
+        vista = self.vista_actual
+        if es_agenda:
+            self.precargador.cancelar() # La agenda lee sus páginas al desplazarse
+        else:
+            self.precargador.programar([partial(self.pagina, vista, self.fecha_periodo(d)) for d in (1, -1)])
 
     # ================= VISTAS =================
     def mostrar_vista_dia(self):
@@ -558,25 +1144,23 @@ class VentanaPrincipal(QWidget):
         if fecha_str in self.pronostico_clima:
             icono_clima, temp_max, temp_min = self.pronostico_clima[fecha_str]
             info_extra = f"  |  {icono_clima} Max: {temp_max}°C Min: {temp_min}°C"
+
+        eventos_dia, info, vistas = self.pagina("Día", self.fecha_actual)[self.fecha_actual.date()]
+        festivo = info.festivo
+        if festivo and CONFIGURACION["MOSTRAR_FESTIVOS"]:
+            info_extra += f"  |  🎉 {festivo[0]}"
             
         self.tabla.setHorizontalHeaderLabels([f"{nombre_dia} {info_extra}"])
-        
-        eventos_dia = [e for e in self.eventos if e['fecha_inicio'].date() == self.fecha_actual.date()]
         for i in range(20):
             item = QTableWidgetItem("")
             if i < len(eventos_dia):
-                evento = eventos_dia[i]
-                
-                titulo_mostrar = evento['titulo']
-                if evento.get('archivo_adjunto'):
-                    titulo_mostrar = "📎 " + titulo_mostrar
-                item.setText(titulo_mostrar)
-
-                color_hex = '#' + evento['color_db_string'].split('#')[-1]
-                item.setBackground(QBrush(QColor(color_hex)))
-                # Datos para Drag & Drop
-                item.setData(Qt.UserRole, evento['id_evento'])
-                item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled)
+                evento, vista = eventos_dia[i], vistas[i]
+                item.setText(vista.titulo)
+                item.setBackground(vista.brush)
+                # Datos para Drag & Drop (los de solo lectura no se arrastran)
+                item.setData(Qt.UserRole, clave_evento(evento))
+                item.setFlags(vista.flags)
+                self.marcar_item_seleccionado(item, evento)
             self.tabla.setItem(i, 0, item)
             self.celdas_map[(i, 0)] = self.fecha_actual
 
@@ -589,6 +1173,7 @@ class VentanaPrincipal(QWidget):
         self.tabla.setRowCount(20)
         self.tabla.setColumnCount(7)
         
+        pagina = self.pagina("Semana", self.fecha_actual)
         headers = []
         dias_cortos = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
         for col in range(7):
@@ -600,6 +1185,10 @@ class VentanaPrincipal(QWidget):
             if fecha_str in self.pronostico_clima:
                 icono_clima, temp_max, temp_min = self.pronostico_clima[fecha_str]
                 info = f"\n{icono_clima} {temp_max}°/{temp_min}°"
+
+            festivo = pagina[dia.date()][1].festivo
+            if festivo and CONFIGURACION["MOSTRAR_FESTIVOS"]:
+                info += f"\n🎉 {festivo[0]}"
                 
             headers.append(f"{dias_cortos[col]}{info}")
             
@@ -615,7 +1204,7 @@ class VentanaPrincipal(QWidget):
 
         for col in range(7):
             dia = inicio_semana + timedelta(days=col)
-            eventos_dia = [e for e in self.eventos if e['fecha_inicio'].date() == dia.date()]
+            eventos_dia, _, vistas = pagina[dia.date()]
             
             # Determinar color de fondo de la columna
             bg_color = QColor("white")
@@ -623,28 +1212,23 @@ class VentanaPrincipal(QWidget):
                 bg_color = QColor(color_sabado)
             elif col == 6: # Domingo
                 bg_color = QColor(color_domingo)
+            fondo = QBrush(bg_color)
 
             for fila in range(20):
                 item = QTableWidgetItem("")
-                item.setBackground(QBrush(bg_color)) # Aplicar fondo base (blanco o rosa finde)
+                item.setBackground(fondo) # Aplicar fondo base (blanco o rosa finde)
                 
                 if fila < len(eventos_dia):
-                    evento = eventos_dia[fila]
-                    
-                    titulo_mostrar = evento['titulo']
-                    if evento.get('archivo_adjunto'):
-                        titulo_mostrar = "📎 " + titulo_mostrar
-                    item.setText(titulo_mostrar)
-
-                    color_hex = '#' + evento['color_db_string'].split('#')[-1]
-                    item.setBackground(QBrush(QColor(color_hex)))
-                    # Datos para Drag & Drop
-                    item.setData(Qt.UserRole, evento['id_evento'])
-                    item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled)
+                    evento, vista = eventos_dia[fila], vistas[fila]
+                    item.setText(vista.titulo)
+                    item.setBackground(vista.brush)
+                    # Datos para Drag & Drop (los de solo lectura no se arrastran)
+                    item.setData(Qt.UserRole, clave_evento(evento))
+                    item.setFlags(vista.flags)
+                    self.marcar_item_seleccionado(item, evento)
                     
                     # Tooltip para eventos en vista semana
-                    if CONFIGURACION["MOSTRAR_NOTAS"] and evento.get('descripcion'):
-                        item.setToolTip(f"{evento['titulo']}\n---\n{evento['descripcion']}")
+                    item.setToolTip(texto_tooltip(evento, vista))
                         
                 self.tabla.setItem(fila, col, item)
                 self.celdas_map[(fila, col)] = dia
@@ -668,145 +1252,9 @@ class VentanaPrincipal(QWidget):
         fila, col = 0, 0
         for dia in dias:
             if dia != 0:
-                eventos_dia = [e for e in self.eventos if e['fecha_inicio'].day == dia and e['fecha_inicio'].month == mes and e['fecha_inicio'].year == anio]
-                
-                # --- LÓGICA DE ESTILO (HEATMAP & FINDE & HOY) ---
-                es_hoy = (dia == datetime.now().day and mes == datetime.now().month and anio == datetime.now().year)
                 fecha_obj = datetime(anio, mes, dia)
-                self.celdas_map[(fila, col)] = fecha_obj # <-- AÑADIDO: Mapear celda a fecha para Drag&Drop
-                dia_semana = fecha_obj.weekday() # 0=Lun, 5=Sab, 6=Dom
-                num_eventos = len(eventos_dia)
-
-                # Color de fondo base (Fin de semana vs Laborable)
-                bg_color = "white"
-                
-                # Definición de paletas (Suave vs Intenso)
-                if CONFIGURACION["ESTILO_INTENSO"]:
-                    color_sabado = "#FF69B4" # HotPink
-                    color_domingo = "#C71585" # MediumVioletRed
-                    color_hoy = "#5DADE2" # Azul intenso
-                else:
-                    color_sabado = "#FFB6C1" # Rosa pastel
-                    color_domingo = "#F06292" # Rosa oscuro suave
-                    color_hoy = "#AED6F1" # Azul celeste suave
-
-                if dia_semana == 5: # Sábado
-                    bg_color = color_sabado
-                elif dia_semana == 6: # Domingo
-                    bg_color = color_domingo
-
-                # Borde para "HOY"
-                borde_estilo = "1px solid #bfbfbf" # Gris estándar para simular rejilla
-                if es_hoy:
-                    borde_estilo = "2px solid #3498db" # Marco azul
-                    bg_color = color_hoy
-
-                # Widget contenedor de la celda
-                celda_widget = CeldaDiaWidget(fecha_obj)
-                celda_widget.setObjectName("celda_dia")
-                celda_widget.evento_soltado_en_celda.connect(self.procesar_drop_mes)
-                celda_widget.setStyleSheet(f"#celda_dia {{ background-color: {bg_color}; border: {borde_estilo}; }}")
-                celda_layout = QVBoxLayout()
-                celda_layout.setContentsMargins(2, 2, 2, 2)
-                celda_layout.setSpacing(1)
-
-                # --- CABECERA DE LA CELDA (NÚMERO + SANTO) ---
-                # Detectar Festivo
-                datos_festivo = FESTIVOS_DATA.get((mes, dia))
-                color_numero = "#555" # Gris oscuro por defecto
-                tooltip_texto = ""
-
-                if datos_festivo and CONFIGURACION["MOSTRAR_FESTIVOS"]:
-                    tipo = datos_festivo["tipo"]
-                    color_numero = COLORES_FESTIVOS.get(tipo, "#555")
-                    tooltip_texto = f"{datos_festivo['nombre']} ({tipo.capitalize()})"
-
-                # Texto del número (con clima si existe)
-                texto_dia = str(dia)
-                fecha_str = f"{anio}-{mes:02d}-{dia:02d}"
-                if fecha_str in self.pronostico_clima:
-                    icono_clima, temp_max, temp_min = self.pronostico_clima[fecha_str]
-                    texto_dia += f"  {icono_clima} {temp_max}°/{temp_min}°"
-
-                # Texto del número
-                dia_label = QLabel(texto_dia)
-                dia_label.setStyleSheet(f"font-weight: bold; color: {color_numero}; font-size: 12px; border: none; background: transparent;")
-                dia_label.setAlignment(Qt.AlignLeft)
-                if tooltip_texto:
-                    dia_label.setToolTip(tooltip_texto)
-                
-                celda_layout.addWidget(dia_label)
-
-                # Santo (Texto pequeño debajo)
-                info_santo = self.obtener_info_dia(fecha_obj)
-                if info_santo:
-                    santo_label = QLabel(info_santo)
-                    santo_label.setStyleSheet("color: #7f8c8d; font-size: 9px; font-style: italic; border: none; background: transparent;")
-                    santo_label.setAlignment(Qt.AlignLeft)
-                    celda_layout.addWidget(santo_label)
-
-                # Área de scroll para los eventos (por si hay muchos)
-                scroll = QScrollArea()
-                scroll.setWidgetResizable(True)
-                scroll.setFrameShape(0) # Sin bordes
-                scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff) # Evita que aparezca el scroll horizontal si el texto es largo
-                scroll.setStyleSheet("background: transparent;")
-                
-                contenido_scroll = QWidget()
-                contenido_layout = QVBoxLayout()
-                contenido_layout.setContentsMargins(0,0,0,0)
-                contenido_layout.setSpacing(1)
-
-                for ev in eventos_dia:
-                    titulo_mostrar = ev['titulo']
-                    # Icono de adjunto
-                    if ev.get('archivo_adjunto'):
-                        titulo_mostrar = "📎 " + titulo_mostrar
-                    # Icono de cumpleaños
-                    if CONFIGURACION["MOSTRAR_CUMPLEANOS"] and ("cumple" in titulo_mostrar.lower()):
-                        titulo_mostrar = "🎂 " + titulo_mostrar
-
-                    # Usamos BotonEvento para permitir arrastrar
-                    btn = BotonEvento(ev, titulo_mostrar)
-                    
-                    # Mostrar notas (descripción) en tooltip si está activado
-                    if CONFIGURACION["MOSTRAR_NOTAS"] and ev.get('descripcion'):
-                        btn.setToolTip(f"{ev['titulo']}\n---\n{ev['descripcion']}")
-
-                    # Estilo del evento
-                    color_bg = '#' + ev['color_db_string'].split('#')[-1]
-                    btn.setStyleSheet(f"""
-                        QPushButton {{ background-color: {color_bg}; color: black; text-align: left; font-size: 9pt; border-radius: 2px; padding: 2px; }}
-                        QPushButton:hover {{ border: 1px solid #333; }}
-                    """)
-                    btn.setFixedHeight(18)
-                    btn.clicked.connect(partial(self.abrir_gestion_evento, ev))
-                    contenido_layout.addWidget(btn)
-
-                contenido_layout.addStretch()
-                contenido_scroll.setLayout(contenido_layout)
-                scroll.setWidget(contenido_scroll)
-                celda_layout.addWidget(scroll)
-
-                # Botón pequeño de "+"
-                nuevo_btn = QPushButton("+")
-                nuevo_btn.setFixedSize(20, 20)
-                nuevo_btn.setCursor(Qt.PointingHandCursor)
-                nuevo_btn.setStyleSheet("""
-                    QPushButton { background-color: #2ecc71; color: white; font-weight: bold; border-radius: 10px; border: none; }
-                    QPushButton:hover { background-color: #27ae60; }
-                """)
-                nuevo_btn.clicked.connect(partial(self.abrir_crear_evento, datetime(anio, mes, dia)))
-                
-                # Alineamos el botón + a la derecha
-                h_layout_btn = QHBoxLayout()
-                h_layout_btn.addStretch()
-                h_layout_btn.addWidget(nuevo_btn)
-                h_layout_btn.setContentsMargins(0,0,2,2)
-                celda_layout.addLayout(h_layout_btn)
-
-                celda_widget.setLayout(celda_layout)
-                self.tabla.setCellWidget(fila, col, celda_widget)
+                self.celdas_map[(fila, col)] = fecha_obj # Mapear celda a fecha para Drag&Drop
+                self.tabla.setCellWidget(fila, col, self.crear_celda_mes(fecha_obj))
 
             col += 1
             if col > 6:
@@ -816,6 +1264,157 @@ class VentanaPrincipal(QWidget):
         # NOTA: Se ha eliminado el bucle manual de "Ajuste uniforme"
         # QHeaderView.Stretch se encarga de todo.
 
+    def crear_celda_mes(self, fecha_obj):
+        """Construye el widget de un día de la vista Mes (se usa también para repintar solo ese día)."""
+        anio, mes, dia = fecha_obj.year, fecha_obj.month, fecha_obj.day
+        eventos_dia, info, vistas = self.pagina("Mes", fecha_obj)[fecha_obj.date()]
+        
+        # --- LÓGICA DE ESTILO (HEATMAP & FINDE & HOY) ---
+        es_hoy = fecha_obj.date() == self.hoy
+        dia_semana = fecha_obj.weekday() # 0=Lun, 5=Sab, 6=Dom
+        num_eventos = len(eventos_dia)
+
+        # Color de fondo base (Fin de semana vs Laborable)
+        bg_color = "white"
+        
+        # Definición de paletas (Suave vs Intenso)
+        if CONFIGURACION["ESTILO_INTENSO"]:
+            color_sabado = "#FF69B4" # HotPink
+            color_domingo = "#C71585" # MediumVioletRed
+            color_hoy = "#5DADE2" # Azul intenso
+        else:
+            color_sabado = "#FFB6C1" # Rosa pastel
+            color_domingo = "#F06292" # Rosa oscuro suave
+            color_hoy = "#AED6F1" # Azul celeste suave
+
+        if dia_semana == 5: # Sábado
+            bg_color = color_sabado
+        elif dia_semana == 6: # Domingo
+            bg_color = color_domingo
+
+        # Borde para "HOY"
+        borde_estilo = "1px solid #bfbfbf" # Gris estándar para simular rejilla
+        if es_hoy:
+            borde_estilo = "2px solid #3498db" # Marco azul
+            bg_color = color_hoy
+
+        # Widget contenedor de la celda
+        celda_widget = CeldaDiaWidget(fecha_obj)
+        celda_widget.setObjectName("celda_dia")
+        celda_widget.evento_soltado_en_celda.connect(self.procesar_drop_mes)
+        celda_widget.setStyleSheet(f"#celda_dia {{ background-color: {bg_color}; border: {borde_estilo}; }}")
+        celda_layout = QVBoxLayout()
+        celda_layout.setContentsMargins(2, 2, 2, 2)
+        celda_layout.setSpacing(1)
+
+        # --- CABECERA DE LA CELDA (NÚMERO + SANTO) ---
+        # Festivo y santo vienen en la página del mes (tabla precalculada del año)
+        color_numero = "#555" # Gris oscuro por defecto
+        tooltip_texto = ""
+
+        if info.festivo and CONFIGURACION["MOSTRAR_FESTIVOS"]:
+            nombre_festivo, tipo = info.festivo
+            color_numero = COLORES_FESTIVOS.get(tipo, "#555")
+            tooltip_texto = f"{nombre_festivo} ({tipo.capitalize()})"
+
+        # Texto del número (con clima si existe)
+        texto_dia = str(dia)
+        fecha_str = f"{anio}-{mes:02d}-{dia:02d}"
+        if fecha_str in self.pronostico_clima:
+            icono_clima, temp_max, temp_min = self.pronostico_clima[fecha_str]
+            texto_dia += f"  {icono_clima} {temp_max}°/{temp_min}°"
+
+        # Texto del número
+        dia_label = QLabel(texto_dia)
+        dia_label.setStyleSheet(f"font-weight: bold; color: {color_numero}; font-size: 12px; border: none; background: transparent;")
+        dia_label.setAlignment(Qt.AlignLeft)
+        if tooltip_texto:
+            dia_label.setToolTip(tooltip_texto)
+        
+        celda_layout.addWidget(dia_label)
+
+        # Santo (Texto pequeño debajo)
+        if info.santo and CONFIGURACION["MOSTRAR_SANTOS"]:
+            santo_label = QLabel(info.santo)
+            santo_label.setStyleSheet("color: #7f8c8d; font-size: 9px; font-style: italic; border: none; background: transparent;")
+            santo_label.setAlignment(Qt.AlignLeft)
+            celda_layout.addWidget(santo_label)
+
+        # Área de scroll para los eventos (por si hay muchos)
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setFrameShape(0) # Sin bordes
+        scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff) # Evita que aparezca el scroll horizontal si el texto es largo
+        scroll.setStyleSheet("background: transparent;")
+        
+        contenido_scroll = QWidget()
+        contenido_layout = QVBoxLayout()
+        contenido_layout.setContentsMargins(0,0,0,0)
+        contenido_layout.setSpacing(1)
+
+        for ev, vista in zip(eventos_dia, vistas):
+            # Usamos BotonEvento para permitir arrastrar; título, tooltip y estilo ya vienen calculados
+            btn = BotonEvento(ev, vista)
+            btn.preparar_tooltip()
+
+            # Los seleccionados llevan marco y casilla
+            if self.seleccion and clave_evento(ev) in self.seleccion:
+                btn.setText("☑ " + vista.titulo)
+                btn.setStyleSheet(vista.estilo_seleccionado)
+            else:
+                btn.setStyleSheet(vista.estilo)
+            btn.setFixedHeight(18)
+            btn.clicked.connect(partial(self.click_evento, ev))
+            contenido_layout.addWidget(btn)
+
+        contenido_layout.addStretch()
+        contenido_scroll.setLayout(contenido_layout)
+        scroll.setWidget(contenido_scroll)
+        celda_layout.addWidget(scroll)
+
+        # Botón pequeño de "+"
+        nuevo_btn = QPushButton("+")
+        nuevo_btn.setFixedSize(20, 20)
+        nuevo_btn.setCursor(Qt.PointingHandCursor)
+        nuevo_btn.setStyleSheet("""
+            QPushButton { background-color: #2ecc71; color: white; font-weight: bold; border-radius: 10px; border: none; }
+            QPushButton:hover { background-color: #27ae60; }
+        """)
+        nuevo_btn.clicked.connect(partial(self.abrir_crear_evento, datetime(anio, mes, dia)))
+        
+        # Alineamos el botón + a la derecha
+        h_layout_btn = QHBoxLayout()
+        h_layout_btn.addStretch()
+        h_layout_btn.addWidget(nuevo_btn)
+        h_layout_btn.setContentsMargins(0,0,2,2)
+        celda_layout.addLayout(h_layout_btn)
+
+        celda_widget.setLayout(celda_layout)
+        return celda_widget
+
+    def mostrar_vista_agenda(self):
+        # Al repintar sin haber navegado se vuelve a leer desde el evento que está arriba
+        arriba = self.lista_agenda.indexAt(QPoint(1, 1))
+        if self.fecha_agenda == self.fecha_actual and arriba.isValid():
+            fecha = arriba.data(Qt.UserRole)['fecha_inicio']
+        else:
+            fecha = self.fecha_actual.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        self.fecha_agenda = self.fecha_actual
+        self.label_fecha.setText(f"Agenda · {MESES_ESPANOL[self.fecha_actual.month]} {self.fecha_actual.year}")
+        try:
+            self.modelo_agenda.reiniciar(fecha)
+        except Exception as e:
+            logging.error(f"No se pudo cargar la agenda: {e}")
+            QMessageBox.warning(self, "Sin Conexión", "No se pudo cargar la agenda.")
+            return
+        self.lista_agenda.ir_a_fila(self.modelo_agenda.fila_desde(fecha))
+
+    def series_en_memoria(self):
+        """Series y ocurrencias sobrescritas de la carga actual: la agenda las expande por tramos."""
+        if self.series_agenda[0] != self.version_datos:
+            self.series_agenda = (self.version_datos, [e for e in self.eventos_base if e.get('regla_recurrencia') or e.get('serie_id')])
+        return self.series_agenda[1]
+
     def mostrar_vista_anio(self):
         anio = self.fecha_actual.year
         self.label_fecha.setText(str(anio))
@@ -838,6 +1437,9 @@ class VentanaPrincipal(QWidget):
             12: "🌧️" # Diciembre (Lluvia/Invierno)
         }
 
+        # Conteo de eventos por mes en una sola pasada (bincount sobre el almacén)
+        conteos_mes = self.pagina("Año", self.fecha_actual)
+
         for m in range(1, 13):
             fila = (m - 1) // 4
             col = (m - 1) % 4
@@ -845,7 +1447,7 @@ class VentanaPrincipal(QWidget):
             icono = ICONOS_ESTACION.get(m, "")
             
             # Contamos los eventos de este mes
-            count = sum(1 for e in self.eventos if e['fecha_inicio'].month == m and e['fecha_inicio'].year == anio)
+            count = conteos_mes[m - 1]
             
             # Creamos el botón tarjeta
             btn_mes = QPushButton()
@@ -918,8 +1520,11 @@ class VentanaPrincipal(QWidget):
     # =================== Lógica Drag & Drop ===================
     def procesar_drop(self, id_evento, row, col):
         """Calcula la nueva fecha/hora basada en dónde se soltó el evento"""
-        evento = next((e for e in self.eventos if e['id_evento'] == id_evento), None)
+        evento = self.buscar_evento(id_evento)
         if not evento: return
+        if es_solo_lectura(evento):
+            self.planificador.marcar_vista() # Deshace el arrastre en pantalla
+            return
 
         # Esta función ahora solo gestiona las vistas Día y Semana
         if self.vista_actual in ["Semana", "Día"]:
@@ -932,17 +1537,18 @@ class VentanaPrincipal(QWidget):
                 target_date = self.fecha_actual
 
             # Obtenemos eventos del día objetivo EXCLUYENDO el movido
-            evs_dia = [e for e in self.eventos if e['fecha_inicio'].date() == target_date.date() and e['id_evento'] != id_evento]
-            # Ordenación robusta para evitar saltos: Hora -> Título -> ID
-            evs_dia.sort(key=lambda x: (x['fecha_inicio'], x['titulo'], x['id_evento']))
+            # (el almacén ya los devuelve con la ordenación robusta: Hora -> Título -> ID)
+            evs_dia = [e for e in self.almacen.eventos_dia(target_date) if clave_evento(e) != id_evento]
             
             nueva_fecha_inicio = None
 
             # 'row' indica la posición visual deseada
             if row >= len(evs_dia):
-                # Mover al final
+                # Mover al final: justo cuando acaba el último, o 30 min después si no tiene duración
                 if evs_dia:
-                    nueva_fecha_inicio = evs_dia[-1]['fecha_inicio'] + timedelta(minutes=30)
+                    fin_dia = datetime.combine(target_date.date(), datetime.min.time()) + timedelta(days=1)
+                    nueva_fecha_inicio = (self.hueco_tras(max(evs_dia, key=fin_evento), evento, fin_dia)
+                                          or evs_dia[-1]['fecha_inicio'] + timedelta(minutes=30))
                 else:
                     nueva_fecha_inicio = target_date.replace(hour=9, minute=0, second=0)
             elif row == 0:
@@ -954,34 +1560,37 @@ class VentanaPrincipal(QWidget):
                 else:
                     nueva_fecha_inicio = target_date.replace(hour=9, minute=0, second=0)
             else:
-                # Insertar entre dos eventos
+                # Insertar entre dos eventos: al acabar el anterior si cabe entero; si no, a mitad
                 prev_t = evs_dia[row-1]['fecha_inicio']
                 next_t = evs_dia[row]['fecha_inicio']
                 diff_seconds = (next_t - prev_t).total_seconds() / 2
-                nueva_fecha_inicio = prev_t + timedelta(seconds=max(60, diff_seconds)) # Mínimo 1 min de diferencia
+                nueva_fecha_inicio = (self.hueco_tras(evs_dia[row-1], evento, next_t)
+                                      or prev_t + timedelta(seconds=max(60, diff_seconds))) # Mínimo 1 min de diferencia
             
             # Asegurar que la fecha base es la correcta (por si el cálculo de horas cambió el día)
             nueva_fecha_inicio = nueva_fecha_inicio.replace(year=target_date.year, month=target_date.month, day=target_date.day)
 
             if nueva_fecha_inicio:
                 # Actualizamos y aplicamos efecto dominó si es necesario
-                self.actualizar_evento_con_ripple(id_evento, nueva_fecha_inicio, evs_dia, row)
+                self.actualizar_evento_con_ripple(evento, nueva_fecha_inicio)
 
     def procesar_drop_mes(self, id_evento_movido, id_evento_destino, fecha_destino_obj):
         """Gestiona el drop en la vista Mes para reordenar o mover eventos."""
-        evento_movido = next((e for e in self.eventos if e['id_evento'] == id_evento_movido), None)
+        evento_movido = self.buscar_evento(id_evento_movido)
         if not evento_movido: return
+        if es_solo_lectura(evento_movido):
+            self.planificador.marcar_vista()
+            return
 
         # Eventos del día destino (excluyendo el movido) para calcular posiciones
-        eventos_destino = [e for e in self.eventos if e['fecha_inicio'].date() == fecha_destino_obj.date() and e['id_evento'] != id_evento_movido]
-        # Ordenación robusta para evitar saltos: Hora -> Título -> ID
-        eventos_destino.sort(key=lambda x: (x['fecha_inicio'], x['titulo'], x['id_evento']))
+        # (el almacén ya los devuelve con la ordenación robusta: Hora -> Título -> ID)
+        eventos_destino = [e for e in self.almacen.eventos_dia(fecha_destino_obj) if clave_evento(e) != id_evento_movido]
 
         # Determinar índice de inserción
         insert_index = len(eventos_destino) # Por defecto al final
         if id_evento_destino is not None:
             for i, ev in enumerate(eventos_destino):
-                if ev['id_evento'] == id_evento_destino:
+                if clave_evento(ev) == id_evento_destino:
                     insert_index = i
                     break
         
@@ -1002,7 +1611,9 @@ class VentanaPrincipal(QWidget):
         
         elif insert_index == len(eventos_destino):
             # Insertar al final
-            nueva_fecha = eventos_destino[-1]['fecha_inicio'] + timedelta(minutes=30)
+            fin_dia = datetime.combine(fecha_destino_obj.date(), datetime.min.time()) + timedelta(days=1)
+            nueva_fecha = (self.hueco_tras(max(eventos_destino, key=fin_evento), evento_movido, fin_dia)
+                           or eventos_destino[-1]['fecha_inicio'] + timedelta(minutes=30))
             if nueva_fecha.date() > fecha_destino_obj.date():
                 nueva_fecha = datetime.combine(fecha_destino_obj.date(), datetime.max.time()) - timedelta(seconds=1)
         
@@ -1012,27 +1623,205 @@ class VentanaPrincipal(QWidget):
             next_ev = eventos_destino[insert_index]
             diff = (next_ev['fecha_inicio'] - prev_ev['fecha_inicio']).total_seconds()
             add_seconds = max(60, diff / 2) # Mínimo 1 minuto
-            nueva_fecha = prev_ev['fecha_inicio'] + timedelta(seconds=add_seconds)
+            nueva_fecha = (self.hueco_tras(prev_ev, evento_movido, next_ev['fecha_inicio'])
+                           or prev_ev['fecha_inicio'] + timedelta(seconds=add_seconds))
 
         if nueva_fecha:
-            self.actualizar_evento_con_ripple(id_evento_movido, nueva_fecha, eventos_destino, insert_index)
+            self.actualizar_evento_con_ripple(evento_movido, nueva_fecha)
+
+    def hueco_tras(self, previo, evento, limite):
+        """
+        Fin de 'previo' si desde ahí cabe 'evento' entero antes de 'limite' sin pisar a
+        nadie (None si no cabe o si 'previo' no tiene duración: se sigue el criterio de siempre).
+        """
+        if not duracion_evento(previo):
+            return None
+        inicio = fin_evento(previo)
+        fin = inicio + timedelta(minutes=max(duracion_evento(evento), 1))
+        if fin > limite:
+            return None
+        if any(clave_evento(e) != clave_evento(evento) for e in self.intervalos.solapados(inicio, fin)):
+            return None
+        return inicio
+
+    # =================== Detalle perezoso (notas y adjunto) ===================
+    def pedir_tooltip_item(self, item):
+        """Día / Semana: el tooltip con las notas se rellena cuando llega el detalle del evento."""
+        evento = self.buscar_evento(item.data(Qt.UserRole))
+        if not evento:
+            return
+        if self.cargador_detalles.completar(evento):
+            self.poner_tooltip_item(item, evento)
+        else:
+            self.cargador_detalles.solicitar(evento)
+
+    def poner_tooltip_item(self, item, evento):
+        item.setToolTip(texto_tooltip(evento, self.vista_de(evento)))
+
+    def vista_de(self, evento):
+        """VistaEvento de un evento de la ventana actual (calculada al vuelo si es de otra)."""
+        return self.vistas.get(id(evento)) or self.modelos_vista.vista(evento)
+
+    def detalles_cargados(self, ids):
+        for id_evento in ids:
+            fila = self.notas_por_indexar.pop(id_evento, None)
+            if fila is not None and self.cargador_detalles.completar(fila):
+                self.indexar([(fila, True)])
+        if self.vista_actual not in ("Día", "Semana"):
+            return # En el mes cada BotonEvento atiende su propio detalle
+        ids = set(ids)
+        for fila in range(self.tabla.rowCount()):
+            for col in range(self.tabla.columnCount()):
+                item = self.tabla.item(fila, col)
+                clave = item.data(Qt.UserRole) if item else None
+                if not clave or int(str(clave).split("@")[0]) not in ids:
+                    continue
+                evento = self.buscar_evento(clave)
+                if evento and self.cargador_detalles.completar(evento):
+                    self.poner_tooltip_item(item, evento)
+        # Si el ratón sigue encima se muestra ya, sin esperar a que se mueva
+        pos = self.tabla.viewport().mapFromGlobal(QCursor.pos())
+        item = self.tabla.itemAt(pos)
+        if item and item.toolTip() and self.tabla.viewport().rect().contains(pos):
+            QToolTip.showText(QCursor.pos(), item.toolTip(), self.tabla)
+
+    def buscar_evento(self, clave):
+        """Localiza un evento visible por su clave de Drag & Drop (id o id@fecha para ocurrencias)."""
+        return next((e for e in self.eventos if clave_evento(e) == clave), None)
+
+    def actualizar_evento_con_ripple(self, evento, nueva_fecha):
+        """
+        Mueve un evento y empuja los siguientes si hay colisión de horas.
+
+        El cambio se ve al instante (cascada calculada en local) y se persiste en segundo
+        plano; la cascada definitiva la calcula el servidor sobre el estado actual de la BD
+        y, si difiere de la local, se corrige al confirmar.
+        """
+        id_evento = evento['id_evento']
+        mut = self.mutaciones
+
+        def reconciliar_ripple(cambios):
+            return mut.mover_local(cambios)[1]
+
+        if not evento.get('es_ocurrencia'):
+            mut.ejecutar("Mover evento",
+                         lambda: mut.ripple_local(id_evento, nueva_fecha),
+                         [('mover', {'id_evento': id_evento, 'nueva_fecha': nueva_fecha})],
+                         lambda resultados: reconciliar_ripple(resultados[0]))
+            return
 
-    def actualizar_evento_con_ripple(self, id_evento, nueva_fecha, lista_eventos_posteriores, indice_inicio):
-        """Actualiza un evento y empuja los siguientes si hay colisión de horas."""
-        # Delegamos la lógica de negocio compleja (actualización en cascada) al DAO.
-        # Esto mantiene la ventana principal más limpia y la lógica de datos centralizada.
-        try:
-            self.dao.actualizar_fecha_evento_con_ripple(
-                id_evento,
-                nueva_fecha,
-                lista_eventos_posteriores,
-                indice_inicio
-            )
-            self.refrescar_eventos()
-        except Exception as e:
-            logging.error(f"Error al mover evento con efecto dominó: {e}", exc_info=True)
-            QMessageBox.warning(self, "Error al Mover", f"No se pudo guardar el cambio de fecha.\nError: {e}")
-            self.refrescar_eventos() # Recargamos para deshacer el cambio visual
+        alcance = preguntar_alcance_serie(self, "mover")
+        if alcance is None:
+            self.planificador.marcar_vista() # Cancelado: repintamos para deshacer el arrastre
+            return
+        fecha_original = evento['fecha_original']
+        if alcance == 'serie':
+            # Desplazamos el inicio de la serie lo mismo que se ha movido esta ocurrencia
+            nuevo_inicio = evento['inicio_serie'] + (nueva_fecha - fecha_original)
+            mut.ejecutar("Mover serie",
+                         lambda: mut.mover_serie_local(id_evento, nuevo_inicio),
+                         [('mover_serie', {'serie_id': id_evento, 'nuevo_inicio': nuevo_inicio})])
+            return
+
+        # Solo esta: se convierte en una fila propia y a partir de ahí se mueve como cualquier otra
+        id_temporal = mut.nuevo_id_temporal()
+        fila = {k: v for k, v in evento.items() if k not in ('es_ocurrencia', 'inicio_serie')}
+        fila.update({'id_evento': id_temporal, 'fecha_inicio': nueva_fecha, 'regla_recurrencia': None,
+                     'excepciones_recurrencia': None, 'serie_id': id_evento, 'fecha_original': fecha_original})
+
+        def reconciliar(resultados):
+            nuevo_id, cambios = resultados
+            fila['id_evento'] = nuevo_id
+            return reconciliar_ripple(cambios)
+
+        mut.ejecutar("Mover ocurrencia",
+                     lambda: mut.combinar(mut.insertar_local(fila), mut.ripple_local(id_temporal, nueva_fecha)),
+                     [('desprender_ocurrencia', {'serie_id': id_evento, 'fecha_original': fecha_original,
+                                                 'nueva_fecha': nueva_fecha, 'id_temporal': id_temporal}),
+                      ('mover', {'id_evento': id_temporal, 'nueva_fecha': nueva_fecha})],
+                     reconciliar)
+
+    # =================== Mutaciones optimistas ===================
+    def aplicar_cambio_local(self, dias):
+        """Reconstruye los índices en memoria y repinta solo los días afectados (None = todo)."""
+        self.planificador.marcar_indices(dias)
+
+    def repintar_dias(self, dias):
+        if dias is not None and self.vista_actual == "Mes":
+            self.hoy = date.today()
+            for (fila, col), fecha in self.celdas_map.items():
+                if fecha.date() in dias:
+                    self.tabla.setCellWidget(fila, col, self.crear_celda_mes(fecha))
+            return
+        self.mostrar_vista()
+
+    def mutacion_confirmada(self, descripcion):
+        self.label_status.setText(f"Guardado ✓ {datetime.now().strftime('%H:%M:%S')}")
+        self.aplicar_cambios_remotos_pendientes()
+
+    def mutacion_fallida(self, descripcion, mensaje):
+        QMessageBox.warning(self, "Error al Guardar", f"No se pudo completar: {descripcion}.\nSe ha deshecho el cambio.\nError: {mensaje}")
+        self.refrescar_eventos() # Recargamos desde la BD por si el servidor quedó en otro estado
+
+    def mostrar_sin_conexion(self, pendientes):
+        self.label_status.setText(f"📴 Sin conexión · {pendientes} cambios pendientes de enviar")
+
+    def mostrar_informe_diario(self, informe):
+        """Al reconectar: resumen de lo que se ha enviado del diario sin conexión."""
+        texto = f"☁️ Enviados {informe['aplicadas']} cambios hechos sin conexión"
+        if informe['pendientes']:
+            texto += f" ({informe['pendientes']} pendientes)"
+        self.label_status.setText(texto)
+        problemas = informe['conflictos'] + informe['descartadas']
+        if problemas:
+            QMessageBox.warning(self, "Cambios sin conexión",
+                f"{len(problemas)} cambios no se aplicaron (gana la versión del servidor):\n\n" + "\n".join(problemas[:15]))
+        self.refrescar_eventos() # Trae los ids reales y lo que haya decidido el servidor
+
+    # =================== Cambios de otros dispositivos ===================
+    def recibir_cambios_remotos(self, filas, borrados, version):
+        self.cambios_remotos_pendientes.append((filas, borrados))
+        self.aplicar_cambios_remotos_pendientes()
+
+    def aplicar_cambios_remotos_pendientes(self):
+        """Fusiona en la lista local las filas cambiadas y quita las borradas."""
+        # Con escrituras propias en vuelo se espera: un id temporal aún sin reconciliar
+        # duplicaría el evento que acaba de insertar este mismo cliente.
+        if self.mutaciones.ocupado() or not self.cambios_remotos_pendientes:
+            return
+        pendientes, self.cambios_remotos_pendientes = self.cambios_remotos_pendientes, []
+
+        por_id = {e['id_evento']: e for e in self.eventos_base}
+        cambios = []
+        for filas, borrados in pendientes:
+            for fila in self.normalizar_fechas(filas):
+                if fila['id_evento'] in por_id:
+                    existente = por_id[fila['id_evento']]
+                    # Las filas del resumen no traen el detalle: el que tuviera ya no vale
+                    for campo in ('descripcion', 'archivo_adjunto'):
+                        if campo not in fila:
+                            existente.pop(campo, None)
+                    existente.update(fila) # Se conserva el objeto: los botones lo referencian
+                    fila = existente
+                else:
+                    self.eventos_base.append(fila)
+                    por_id[fila['id_evento']] = fila
+                cambios.append((fila, True))
+                if fila.get('tiene_notas'):
+                    # Sus notas pueden haber cambiado: se piden para el índice de búsqueda
+                    self.notas_por_indexar[fila['id_evento']] = fila
+                    self.cargador_detalles.solicitar(fila)
+            quitar = set(borrados)
+            if quitar:
+                self.eventos_base[:] = [e for e in self.eventos_base if e['id_evento'] not in quitar]
+                for id_evento in quitar:
+                    fila = por_id.pop(id_evento, None)
+                    if fila is not None:
+                        cambios.append((fila, False))
+
+        self.indexar(cambios)
+        self.planificador.marcar_indices()
+        self.label_status.setText(f"Actualizado desde otro dispositivo {datetime.now().strftime('%H:%M:%S')}")
 
     # =================== Click ===================
     def celda_click(self, row, col):
@@ -1045,9 +1834,9 @@ class VentanaPrincipal(QWidget):
                 fecha = inicio_semana + timedelta(days=col)
                 fila_celda=row
             
-            eventos_dia=[e for e in self.eventos if e['fecha_inicio'].date()==fecha.date()]
+            eventos_dia=self.almacen.eventos_dia(fecha)
             if fila_celda<len(eventos_dia):
-                self.abrir_gestion_evento(eventos_dia[fila_celda])
+                self.click_evento(eventos_dia[fila_celda])
             else:
                 self.abrir_crear_evento(fecha)
         elif self.vista_actual=="Mes":
@@ -1055,15 +1844,164 @@ class VentanaPrincipal(QWidget):
         elif self.vista_actual=="Año":
             pass
 
+    # =================== Selección múltiple y acciones en bloque ===================
+    def click_evento(self, evento):
+        """Clic: abre el editor. Ctrl+clic: añade o quita el evento de la selección."""
+        if QApplication.keyboardModifiers() & Qt.ControlModifier:
+            self.alternar_seleccion(evento)
+        else:
+            self.abrir_gestion_evento(evento)
+
+    def alternar_seleccion(self, evento):
+        self.seleccion ^= {clave_evento(evento)}
+        self.actualizar_barra_seleccion()
+        self.planificador.marcar_vista({evento['fecha_inicio'].date()} if self.vista_actual == "Mes" else None)
+
+    def limpiar_seleccion(self):
+        self.seleccion.clear()
+        self.actualizar_barra_seleccion()
+        self.planificador.marcar_vista()
+
+    def actualizar_barra_seleccion(self):
+        n = len(self.seleccion)
+        self.label_seleccion.setText(f"☑ {n} evento{'s' if n != 1 else ''} seleccionado{'s' if n != 1 else ''} (Ctrl+clic para añadir o quitar)")
+        self.barra_seleccion.setVisible(n > 0)
+
+    def marcar_item_seleccionado(self, item, evento):
+        """Día / Semana: los seleccionados se muestran con casilla y en negrita."""
+        if clave_evento(evento) in self.seleccion:
+            item.setText("☑ " + item.text())
+            fuente = item.font()
+            fuente.setBold(True)
+            item.setFont(fuente)
+
+    def pedir_valor_bloque(self, accion, eventos):
+        """Pide el dato de la acción. Devuelve (aceptado, valor)."""
+        if accion == 'desplazar':
+            dias, ok = QInputDialog.getInt(self, "Desplazar eventos", "Días a desplazar (negativo = hacia atrás):", 1, -3650, 3650)
+            return ok, dias
+        if accion == 'mover_a':
+            dialogo = QDialog(self)
+            dialogo.setWindowTitle("Mover eventos")
+            selector = QDateEdit(QDate(self.fecha_actual.year, self.fecha_actual.month, self.fecha_actual.day))
+            selector.setCalendarPopup(True)
+            selector.setDisplayFormat("dd/MM/yyyy")
+            botones = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+            botones.accepted.connect(dialogo.accept)
+            botones.rejected.connect(dialogo.reject)
+            layout = QVBoxLayout()
+            layout.addWidget(QLabel("Nueva fecha (cada evento conserva su hora):"))
+            layout.addWidget(selector)
+            layout.addWidget(botones)
+            dialogo.setLayout(layout)
+            if dialogo.exec_() != QDialog.Accepted:
+                return False, None
+            fecha = selector.date()
+            return True, datetime(fecha.year(), fecha.month(), fecha.day())
+        if accion == 'color':
+            nombre, ok = QInputDialog.getItem(self, "Cambiar color", "Color:", list(COLORES_MAP.keys()), 0, False)
+            return ok, COLORES_MAP.get(nombre)
+        if accion == 'importante':
+            # Si alguno no era importante se marcan todos; si ya lo eran todos, se desmarcan
+            return True, not all(e.get('es_importante') for e in eventos)
+        if accion == 'aviso':
+            minutos, ok = QInputDialog.getInt(self, "Aviso", "Minutos de antelación del aviso (0 = sin aviso):", 15, 0, 10080)
+            return ok, minutos
+        respuesta = QMessageBox.question(self, "Eliminar eventos", f"¿Eliminar {len(eventos)} eventos seleccionados?",
+                                         QMessageBox.Yes | QMessageBox.No)
+        return respuesta == QMessageBox.Yes, None
+
+    def accion_en_bloque(self, accion):
+        """Aplica una acción a todos los seleccionados con una sola operación en la BD."""
+        eventos = [e for e in map(self.buscar_evento, self.seleccion) if e]
+        solo_lectura = [e for e in eventos if es_solo_lectura(e)]
+        if solo_lectura:
+            QMessageBox.information(self, "Acción en bloque",
+                f"{len(solo_lectura)} de los eventos seleccionados son de calendarios compartidos en solo lectura "
+                "y se dejan como están.")
+            eventos = [e for e in eventos if not es_solo_lectura(e)]
+        if not eventos:
+            self.limpiar_seleccion()
+            return
+
+        ids, excluir = [], []
+        if any(e.get('es_ocurrencia') for e in eventos):
+            alcance = preguntar_alcance_serie(self, "cambiar")
+            if alcance is None:
+                return
+            if alcance == 'ocurrencia' and accion != 'eliminar':
+                QMessageBox.information(self, "Acción en bloque",
+                    "En bloque, las ocurrencias sueltas de una serie solo se pueden eliminar.\n"
+                    "Para cambiar una sola ocurrencia, ábrela en el editor.")
+                return
+        else:
+            alcance = 'serie'
+        for e in eventos:
+            if e.get('es_ocurrencia') and alcance == 'ocurrencia':
+                excluir.append((e['id_evento'], e['fecha_original']))
+            elif e['id_evento'] not in ids:
+                ids.append(e['id_evento']) # Ocurrencia con alcance 'serie': se actúa sobre la serie
+                if accion == 'eliminar' and e.get('serie_id') and e.get('fecha_original'):
+                    # Ocurrencia sobrescrita: que no reaparezca la original de la serie
+                    excluir.append((e['serie_id'], e['fecha_original']))
+
+        ok, valor = self.pedir_valor_bloque(accion, eventos)
+        if not ok:
+            return
+
+        operaciones = [('bloque', {'ids': ids, 'accion': accion, 'valor': valor, 'excluir': excluir})]
+        if accion == 'eliminar':
+            try:
+                self.cargador_detalles.cargar([e for e in eventos if tiene_adjunto(e) and e['id_evento'] in ids])
+            except Exception as e:
+                # Sin las rutas no se liberan ahora; la limpieza de huérfanos los recogerá al arrancar
+                logging.warning(f"No se pudieron leer los adjuntos de los eventos a borrar: {e}")
+            rutas = {e['archivo_adjunto'] for e in eventos if e.get('archivo_adjunto') and e['id_evento'] in ids}
+            operaciones += [('liberar_adjunto', {'ruta': ruta}) for ruta in rutas]
+        mut = self.mutaciones
+        mut.ejecutar(f"Acción en bloque ({accion}) sobre {len(eventos)} eventos",
+                     lambda: mut.bloque_local(ids, accion, valor, excluir),
+                     operaciones)
+        if accion == 'eliminar':
+            self.seleccion.clear()
+        elif accion in ('desplazar', 'mover_a'):
+            # La clave de una ocurrencia lleva su fecha: al mover la serie deja de existir
+            self.seleccion = {clave for clave in self.seleccion if "@" not in clave}
+        self.actualizar_barra_seleccion()
+
     # =================== Crear/Gestionar eventos ===================
+    def cerrar_editor(self):
+        """Cierra y borra el editor abierto (su closeEvent cancela y espera la copia del adjunto)."""
+        if self.ventana_editor is not None:
+            self.ventana_editor.close()
+            self.ventana_editor.deleteLater()
+            self.ventana_editor = None
+
+    def editor_libre(self):
+        """Deja sitio para un editor nuevo. False si el abierto aún está copiando un adjunto."""
+        if self.ventana_editor is not None and self.ventana_editor.copiando():
+            QMessageBox.information(self, "Editor ocupado",
+                "El editor abierto todavía está copiando un archivo adjunto.\n"
+                "Espera a que termine para abrir otro evento.")
+            self.ventana_editor.raise_()
+            self.ventana_editor.activateWindow()
+            return False
+        self.cerrar_editor()
+        return True
+
     def abrir_crear_evento(self, fecha):
         # Lógica inteligente para sugerir hora:
-        # Si ya hay eventos ese día, sugerimos 1 hora después del último.
-        eventos_dia = [e for e in self.eventos if e['fecha_inicio'].date() == fecha.date()]
-        
+        # el primer hueco libre de DURACION_POR_DEFECTO desde las 09:00 (o la hora pulsada);
+        # si el día ya no tiene ninguno, 1 hora después del último.
+        eventos_dia = self.almacen.eventos_dia(fecha)
+        inicio_dia = datetime.combine(fecha.date(), datetime.min.time())
+        desde = fecha if (fecha.hour or fecha.minute) else inicio_dia.replace(hour=9)
+        hueco = self.intervalos.siguiente_hueco(desde, DURACION_POR_DEFECTO, inicio_dia + timedelta(days=1))
+
         fecha_sugerida = fecha
-        if eventos_dia:
-            eventos_dia.sort(key=lambda x: x['fecha_inicio'])
+        if hueco is not None:
+            fecha_sugerida = hueco
+        elif eventos_dia:
             ultimo_evento = eventos_dia[-1]
             fecha_sugerida = ultimo_evento['fecha_inicio'] + timedelta(hours=1)
             # Si nos pasamos de día, lo dejamos al final del día
@@ -1073,39 +2011,153 @@ class VentanaPrincipal(QWidget):
             # Si es un día vacío y la fecha viene sin hora (00:00), sugerimos las 09:00
             fecha_sugerida = fecha.replace(hour=9, minute=0)
 
-        self.ventana_editor = VentanaGestionEvento(self.usuario, fecha_sugerida)
-        self.ventana_editor.evento_gestionado.connect(self.refrescar_eventos)
+        if not self.editor_libre():
+            return
+        self.ventana_editor = VentanaGestionEvento(self.usuario, fecha_sugerida, self.mutaciones)
         self.ventana_editor.show()
 
     def abrir_gestion_evento(self, evento):
-        self.ventana_editor = VentanaGestionEvento(self.usuario, evento)
-        self.ventana_editor.evento_gestionado.connect(self.refrescar_eventos)
+        if es_solo_lectura(evento):
+            self.mostrar_evento_solo_lectura(evento)
+            return
+        if not self.editor_libre():
+            return
+        try:
+            self.cargador_detalles.cargar([evento]) # El editor necesita notas y adjunto
+        except Exception as e:
+            logging.error(f"No se pudo cargar el detalle del evento {evento.get('id_evento')}: {e}")
+            QMessageBox.warning(self, "Sin Conexión", "No se pudieron cargar las notas y el adjunto del evento.\n"
+                                "Vuelve a intentarlo cuando se recupere la conexión.")
+            return
+        self.ventana_editor = VentanaGestionEvento(self.usuario, evento, self.mutaciones)
         self.ventana_editor.show()
 
+    def mostrar_evento_solo_lectura(self, evento):
+        """Eventos de un calendario compartido en modo lectura: se ven, pero no se abre el editor."""
+        try:
+            self.cargador_detalles.cargar([evento])
+        except Exception as e:
+            logging.warning(f"No se pudo cargar el detalle del evento {evento.get('id_evento')}: {e}")
+        texto = f"{evento['fecha_inicio'].strftime('%d/%m/%Y %H:%M')}\n\n{evento['titulo']}"
+        if evento.get('descripcion'):
+            texto += f"\n---\n{evento['descripcion']}"
+        QMessageBox.information(self, "👁 " + texto_calendario(evento), texto)
+
+    def abrir_compartir(self):
+        VentanaCompartir(self.usuario, self).exec_()
+
     def refrescar_eventos(self):
-        self.eventos = self.cargar_eventos()
-        self.mostrar_vista()
-        # Cada vez que se gestiona un evento, intentamos actualizar el clima
-        self.solicitar_clima()
+        """Pide una recarga desde la BD; varias peticiones seguidas se agrupan en una sola."""
+        self.planificador.marcar_datos()
+        self.planificador.marcar_clima()
+
+    def recargar_eventos(self):
+        calendarios = self.dao_calendarios.obtener_visibles(self.usuario['id_usuario'])
+        self.eventos_base = self.cargar_eventos()
+        self.construir_indice()
+        self.hilo_cambios.reiniciar_version(calendarios)
+        self.cambios_remotos_pendientes = [] # La recarga completa ya los incluye
+        self.reindexar()
         
-    def obtener_info_dia(self, fecha, completo=False):
-        """Devuelve el Santo si está activado en config."""
-        if not CONFIGURACION["MOSTRAR_SANTOS"]:
-            return ""
-            
-        # Santoral
-        return SANTORAL.get((fecha.month, fecha.day), "")
+    def obtener_info_dia(self, fecha):
+        """Festivo y santo del día según el calendario de festivos del usuario."""
+        return info_dia(fecha, self.region_festivos)
+
+    def cambiar_region_festivos(self, indice):
+        self.region_festivos = self.combo_festivos.itemData(indice)
+        try:
+            self.dao_usuarios.guardar_region_festivos(self.usuario['id_usuario'], self.region_festivos)
+        except Exception as e:
+            logging.error(f"No se pudo guardar la región de festivos: {e}")
+        self.planificador.marcar_vista()
+
+    def cambiar_ubicacion_clima(self, indice):
+        self.ubicacion_clima = self.combo_ubicacion.itemData(indice)
+        try:
+            self.dao_usuarios.guardar_ubicacion_clima(self.usuario['id_usuario'], *self.ubicacion_clima)
+        except Exception as e:
+            logging.error(f"No se pudo guardar la ubicación del clima: {e}")
+        self.label_clima.setText("Cargando clima...")
+        self.pronostico_clima = {}
+        self.planificador.marcar_clima(forzar=True)
 
 
     # =================== Cargar eventos ===================
+    def reindexar(self):
+        """Los eventos en memoria han cambiado: nada de lo precargado sirve ya."""
+        self.version_datos += 1
+        self.precarga.limpiar()
+        self.indexar(self.mutaciones.tomar_filas_tocadas())
+        self.aplicar_ventana_recurrencias()
+
+    def aplicar_ventana_recurrencias(self):
+        """Pone como self.eventos / self.almacen / self.vistas / self.intervalos la ventana del año visible (precargada si la hay)."""
+        self.anio_ventana = self.fecha_actual.year
+        self.eventos, self.almacen, self.vistas, self.intervalos = self.ventana_anio(self.anio_ventana)
+
+    def ventana_anio(self, anio):
+        """
+        Eventos de un año a partir de las filas cargadas: los eventos sueltos pasan
+        tal cual y las series se expanden solo para ese año (con un mes de margen
+        por cada lado para las semanas que cruzan el cambio de año), con su índice columnar,
+        la VistaEvento de cada uno ({id(evento): VistaEvento}) y su árbol de intervalos
+        (solapes y huecos libres; los que chocan se marcan en su VistaEvento).
+        """
+        clave = ('ventana', anio, self.version_datos)
+        ventana = self.precarga.obtener(clave)
+        if ventana is None:
+            eventos = self.expansor.expandir(self.eventos_base, datetime(anio - 1, 12, 1), datetime(anio + 1, 2, 1))
+            intervalos = ArbolIntervalos(eventos)
+            ventana = (eventos, AlmacenColumnar(eventos), self.modelos_vista.calcular(eventos, intervalos.conflictos()), intervalos)
+            self.precarga.guardar(clave, ventana)
+        return ventana
+
+    def dias_periodo(self, vista, fecha):
+        if vista == "Día":
+            return [fecha.date()]
+        if vista == "Semana":
+            inicio = fecha.date() - timedelta(days=fecha.weekday())
+            return [inicio + timedelta(days=i) for i in range(7)]
+        if vista == "Mes":
+            primero = fecha.date().replace(day=1)
+            return [primero + timedelta(days=i) for i in range(calendar.monthrange(fecha.year, fecha.month)[1])]
+        return []
+
+    def pagina(self, vista, fecha):
+        """
+        Contenido ya calculado del periodo de 'vista' que contiene 'fecha': por cada día,
+        (eventos, festivo/santo, VistaEvento de cada evento); en la vista Año, el conteo por mes. Se guarda con la
+        versión de los datos, así que pintar un periodo precargado no recalcula nada.
+        """
+        dias = self.dias_periodo(vista, fecha)
+        clave = ('pagina', vista, dias[0] if dias else fecha.year, self.version_datos, self.region_festivos)
+        pagina = self.precarga.obtener(clave)
+        if pagina is None:
+            _, almacen, vistas, _ = self.ventana_anio(fecha.year)
+            if vista == "Año":
+                pagina = almacen.conteo_por_mes(fecha.year)
+            else:
+                pagina = {}
+                for d in dias:
+                    eventos = almacen.eventos_dia(d)
+                    pagina[d] = (eventos, self.obtener_info_dia(d), [vistas[id(e)] for e in eventos])
+            self.precarga.guardar(clave, pagina)
+        return pagina
+
     def cargar_eventos(self):
-        eventos = self.dao.obtener_por_usuario(self.usuario['id_usuario'])
+        # Solo el resumen: descripción y adjunto los trae CargadorDetalles cuando hacen falta
+        eventos = self.dao.obtener_resumen_por_usuario(self.usuario['id_usuario'])
         if eventos is None:
             QMessageBox.critical(self, "Sin Conexión", "Se ha perdido la conexión con el servidor.\nNo se pueden cargar los eventos. Revisa tu internet.")
             return []
         
+        return self.normalizar_fechas(eventos)
+
+    def normalizar_fechas(self, eventos):
         # Conversión de fechas si vienen como string (depende del conector)
         for e in eventos:
             if isinstance(e['fecha_inicio'], str):
                 e['fecha_inicio'] = datetime.strptime(e['fecha_inicio'], "%Y-%m-%d %H:%M:%S")
+            if isinstance(e.get('fecha_original'), str):
+                e['fecha_original'] = datetime.strptime(e['fecha_original'], "%Y-%m-%d %H:%M:%S")
         return eventos
\ No newline at end of file
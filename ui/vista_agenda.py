@@ -0,0 +1,150 @@
+from bisect import bisect_left
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QColor, QFont, QIcon, QPixmap
+from PyQt5.QtWidgets import QAbstractItemView, QListView
+
+from logic.agenda import clave_agenda
+from ui.modelo_vista import texto_tooltip
+
+MAX_FILAS_AGENDA = 500  # eventos en memoria como máximo; al pasarse se sueltan los del otro extremo
+DIAS_CORTOS = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+
+
+class ModeloAgenda(QAbstractListModel):
+    """
+    Lista perezosa de la vista Agenda: una ventana de como mucho MAX_FILAS_AGENDA eventos
+    que se desliza por el historial pidiendo páginas a FuenteAgenda. Hacia abajo la pide
+    Qt (canFetchMore / fetchMore); hacia arriba, VistaAgenda al llegar al principio.
+    """
+
+    def __init__(self, fuente, modelos_vista, parent=None):
+        super().__init__(parent)
+        self.fuente = fuente
+        self.modelos_vista = modelos_vista
+        self.eventos = []
+        self.hay_anteriores = False
+        self.hay_siguientes = False
+        self._inicio = None
+        self._iconos = {}
+        self._negrita = QFont()
+        self._negrita.setBold(True)
+
+    def reiniciar(self, fecha):
+        """Vuelve a leer alrededor de 'fecha': una página antes y otra después."""
+        self.beginResetModel()
+        self._inicio = (fecha, 0)
+        anteriores, self.hay_anteriores = self.fuente.anteriores(self._inicio)
+        siguientes, self.hay_siguientes = self.fuente.siguientes(self._inicio)
+        self.eventos = anteriores + siguientes
+        self.endResetModel()
+
+    def fila_desde(self, fecha):
+        """Fila del primer evento cargado que empieza en 'fecha' o después."""
+        return bisect_left([clave_agenda(e) for e in self.eventos], (fecha, 0))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.eventos)
+
+    def data(self, index, rol=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        evento = self.eventos[index.row()]
+        if rol == Qt.UserRole:
+            return evento
+        vista = self.modelos_vista.vista(evento)
+        if rol == Qt.DisplayRole:
+            fecha = evento['fecha_inicio']
+            return f"{DIAS_CORTOS[fecha.weekday()]} {fecha.strftime('%d/%m/%Y  %H:%M')}    {vista.titulo}"
+        if rol == Qt.DecorationRole:
+            return self._icono(vista.color_hex)
+        if rol == Qt.ToolTipRole:
+            return texto_tooltip(evento, vista) or None
+        if rol == Qt.FontRole and evento.get('es_importante'):
+            return self._negrita
+        return None
+
+    def _icono(self, color_hex):
+        icono = self._iconos.get(color_hex)
+        if icono is None:
+            pixmap = QPixmap(12, 12)
+            pixmap.fill(QColor(color_hex))
+            icono = self._iconos[color_hex] = QIcon(pixmap)
+        return icono
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.hay_siguientes
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.hay_siguientes:
+            return
+        cursor = clave_agenda(self.eventos[-1]) if self.eventos else self._inicio
+        nuevos, self.hay_siguientes = self.fuente.siguientes(cursor)
+        if nuevos:
+            self.beginInsertRows(QModelIndex(), len(self.eventos), len(self.eventos) + len(nuevos) - 1)
+            self.eventos.extend(nuevos)
+            self.endInsertRows()
+        sobran = len(self.eventos) - MAX_FILAS_AGENDA
+        if sobran > 0:
+            self.beginRemoveRows(QModelIndex(), 0, sobran - 1)
+            del self.eventos[:sobran]
+            self.hay_anteriores = True
+            self.endRemoveRows()
+
+    def cargar_anteriores(self):
+        if not self.hay_anteriores:
+            return
+        cursor = clave_agenda(self.eventos[0]) if self.eventos else self._inicio
+        nuevos, self.hay_anteriores = self.fuente.anteriores(cursor)
+        if nuevos:
+            self.beginInsertRows(QModelIndex(), 0, len(nuevos) - 1)
+            self.eventos[:0] = nuevos
+            self.endInsertRows()
+        sobran = len(self.eventos) - MAX_FILAS_AGENDA
+        if sobran > 0:
+            self.beginRemoveRows(QModelIndex(), len(self.eventos) - sobran, len(self.eventos) - 1)
+            del self.eventos[-sobran:]
+            self.hay_siguientes = True
+            self.endRemoveRows()
+
+
+class VistaAgenda(QListView):
+    """
+    QListView de la Agenda. Desplaza por filas (el valor de la barra es la fila de arriba),
+    así que al añadir o soltar filas por arriba basta con corregir la barra en esa cantidad
+    para que lo que está viendo el usuario no se mueva.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setUniformItemSizes(True) # Sin medir cada fila: el coste no depende de cuántas haya
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerItem)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setCursor(Qt.PointingHandCursor)
+        self.verticalScrollBar().valueChanged.connect(self._desplazado)
+
+    def setModel(self, modelo):
+        super().setModel(modelo)
+        modelo.rowsInserted.connect(self._filas_insertadas)
+        modelo.rowsRemoved.connect(self._filas_quitadas)
+
+    def ir_a_fila(self, fila):
+        if self.model().rowCount():
+            self.scrollTo(self.model().index(min(fila, self.model().rowCount() - 1), 0), QAbstractItemView.PositionAtTop)
+
+    def _desplazado(self, valor):
+        if valor == self.verticalScrollBar().minimum() and self.model() is not None:
+            self.model().cargar_anteriores()
+
+    def _filas_insertadas(self, parent, primera, ultima):
+        # Solo importan las que entran por encima de lo que ya había
+        if primera == 0 and ultima + 1 < self.model().rowCount():
+            self.doItemsLayout() # La barra aún no conoce las filas nuevas
+            barra = self.verticalScrollBar()
+            barra.setValue(barra.value() + ultima + 1)
+
+    def _filas_quitadas(self, parent, primera, ultima):
+        if primera == 0:
+            self.doItemsLayout()
+            barra = self.verticalScrollBar()
+            barra.setValue(max(0, barra.value() - (ultima + 1)))
@@ -0,0 +1,35 @@
+"""
+Texto de 'excepciones_recurrencia': fechas separadas por comas con precisión de minuto.
+Lo comparten la capa de datos (al mover series) y la lógica de recurrencias e iCalendar.
+"""
+import logging
+from datetime import datetime
+
+FORMATO_EXCEPCION = "%Y-%m-%d %H:%M"
+
+
+def parsear_excepciones(texto):
+    """Las excepciones se guardan como fechas separadas por comas (precisión de minuto)."""
+    if not texto:
+        return set()
+    excepciones = set()
+    for parte in texto.split(","):
+        parte = parte.strip()
+        if parte:
+            try:
+                excepciones.add(datetime.strptime(parte, FORMATO_EXCEPCION))
+            except ValueError:
+                logging.warning(f"Excepción de recurrencia ignorada: '{parte}'")
+    return excepciones
+
+
+def formatear_excepcion(fecha):
+    return fecha.strftime(FORMATO_EXCEPCION)
+
+
+def desplazar_excepciones(texto, delta):
+    """Desplaza todas las excepciones 'delta', para que sigan apuntando a las mismas ocurrencias al mover la serie."""
+    excepciones = parsear_excepciones(texto)
+    if not excepciones or not delta:
+        return texto
+    return ",".join(formatear_excepcion(f + delta) for f in sorted(excepciones))
@@ -0,0 +1,126 @@
+"""
+Diagnóstico de bloqueos de la interfaz.
+
+- Modo perfil (python main.py --profile): arranque, login y cada pintado de vista se
+  perfilan con cProfile y se guardan en DIRECTORIO_PERFILES, un .prof (para pstats o
+  snakeviz) y un .txt con las funciones más costosas, con la hora en el nombre.
+- VigilanteBloqueos: siempre activo. Un QTimer del hilo de la interfaz late cada
+  INTERVALO_LATIDO ms y un hilo aparte comprueba el último latido; si el bucle de
+  eventos lleva más de UMBRAL_BLOQUEO_MS sin atenderlo, se vuelca al log la pila del
+  hilo principal (la llamada que lo tiene parado: una consulta síncrona, un QMessageBox...).
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime
+
+from PyQt5.QtCore import QTimer
+
+DIRECTORIO_PERFILES = "perfiles"
+LINEAS_RESUMEN = 40       # funciones del resumen en texto, por tiempo acumulado
+INTERVALO_LATIDO = 50     # ms entre latidos del bucle de eventos
+UMBRAL_BLOQUEO_MS = int(os.getenv("UMBRAL_BLOQUEO_MS", "250"))
+
+_activo = False
+_en_curso = threading.local()
+
+
+def activar(directorio=DIRECTORIO_PERFILES):
+    """Modo perfil: a partir de aquí perfilar() graba lo que envuelve."""
+    global _activo, DIRECTORIO_PERFILES
+    DIRECTORIO_PERFILES = directorio
+    os.makedirs(directorio, exist_ok=True)
+    _activo = True
+    logging.info(f"Modo perfil activo: las capturas se guardan en '{os.path.abspath(directorio)}'")
+
+
+@contextmanager
+def perfilar(nombre):
+    """
+    Perfila el bloque si el modo perfil está activo (si no, no cuesta nada). Los bloques
+    anidados cuentan dentro del exterior: cProfile no admite dos perfiles a la vez.
+    """
+    if not _activo or getattr(_en_curso, "nombre", None):
+        yield
+        return
+    perfil = cProfile.Profile()
+    _en_curso.nombre = nombre
+    inicio = time.perf_counter()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        _en_curso.nombre = None
+        _guardar(perfil, nombre, time.perf_counter() - inicio)
+
+
+def _guardar(perfil, nombre, duracion):
+    base = os.path.join(DIRECTORIO_PERFILES, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{nombre}")
+    try:
+        perfil.dump_stats(base + ".prof")
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats("cumulative").print_stats(LINEAS_RESUMEN)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"{nombre}: {duracion * 1000:.1f} ms\n\n{texto.getvalue()}")
+        logging.info(f"Perfil '{nombre}': {duracion * 1000:.1f} ms -> {base}.prof")
+    except OSError as e:
+        logging.warning(f"No se pudo guardar el perfil '{nombre}': {e}")
+
+
+class VigilanteBloqueos(threading.Thread):
+    """Detecta paradas del bucle de eventos de Qt y registra qué estaba ejecutando el hilo principal."""
+    _instancia = None
+
+    @classmethod
+    def iniciar(cls, umbral_ms=UMBRAL_BLOQUEO_MS):
+        """Se llama desde el hilo de la interfaz, con la QApplication ya creada."""
+        if cls._instancia is None:
+            cls._instancia = cls(umbral_ms)
+            cls._instancia.start()
+        return cls._instancia
+
+    def __init__(self, umbral_ms=UMBRAL_BLOQUEO_MS):
+        super().__init__(name="vigilante-gui", daemon=True)
+        self.umbral = umbral_ms / 1000
+        self.id_principal = threading.main_thread().ident
+        self.latencia_maxima = 0.0
+        self._ultimo_latido = time.monotonic()
+        self._parar = threading.Event()
+        # El QTimer vive en el hilo de la interfaz: solo late si el bucle de eventos corre
+        self._timer = QTimer()
+        self._timer.timeout.connect(self._latido)
+        self._timer.start(INTERVALO_LATIDO)
+
+    def _latido(self):
+        ahora = time.monotonic()
+        # Latencia del bucle: cuánto ha llegado tarde este latido respecto a lo programado
+        self.latencia_maxima = max(self.latencia_maxima, ahora - self._ultimo_latido - INTERVALO_LATIDO / 1000)
+        self._ultimo_latido = ahora
+
+    def detener(self):
+        self._parar.set()
+        self._timer.stop()
+
+    def run(self):
+        bloqueo_registrado = None
+        while not self._parar.wait(INTERVALO_LATIDO / 2000):
+            parado = time.monotonic() - self._ultimo_latido
+            if parado > self.umbral:
+                if bloqueo_registrado != self._ultimo_latido:
+                    # Una sola pila por bloqueo: la del momento en que supera el umbral
+                    bloqueo_registrado = self._ultimo_latido
+                    marco = sys._current_frames().get(self.id_principal)
+                    pila = "".join(traceback.format_stack(marco)) if marco else "(sin pila)"
+                    logging.warning(f"Interfaz bloqueada más de {parado * 1000:.0f} ms. Pila del hilo principal:\n{pila}")
+            elif bloqueo_registrado is not None:
+                logging.warning(f"Interfaz recuperada (bloqueo de unos {self.latencia_maxima * 1000:.0f} ms como máximo)")
+                bloqueo_registrado = None
+                self.latencia_maxima = 0.0
@@ -0,0 +1,31 @@
+"""
+JSON con fechas: los datetime viajan como {"__fecha__": "2025-01-31T10:00:00"}.
+Lo usan el diario sin conexión, la API HTTP y la importación .ics (que aparta en un
+fichero temporal las ocurrencias que llegan antes que su serie).
+"""
+import json
+from datetime import date, datetime
+
+
+def codificar(valor):
+    if isinstance(valor, datetime):
+        return {"__fecha__": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"__fecha__": datetime.combine(valor, datetime.min.time()).isoformat()}
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def decodificar(objeto):
+    if "__fecha__" in objeto:
+        return datetime.fromisoformat(objeto["__fecha__"])
+    return objeto
+
+
+def a_json(valor):
+    return json.dumps(valor, default=codificar, ensure_ascii=False)
+
+
+def de_json(texto):
+    return json.loads(texto, object_hook=decodificar)
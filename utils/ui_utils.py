@@ -1,8 +1,26 @@
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QMessageBox
 
 def centrar_ventana(window):
     """Centra una ventana en la pantalla principal de forma moderna."""
     qr = window.frameGeometry()
     screen = QApplication.primaryScreen().availableGeometry()
     qr.moveCenter(screen.center())
-    window.move(qr.topLeft())
\ No newline at end of file
+    window.move(qr.topLeft())
+
+def preguntar_alcance_serie(parent, accion):
+    """
+    Pregunta si un cambio sobre un evento recurrente afecta solo a esta ocurrencia
+    o a toda la serie. Devuelve 'ocurrencia', 'serie' o None si se cancela.
+    """
+    msg = QMessageBox(parent)
+    msg.setWindowTitle("Evento recurrente")
+    msg.setText(f"Este evento se repite. ¿Qué quieres {accion}?")
+    btn_ocurrencia = msg.addButton("Solo esta ocurrencia", QMessageBox.AcceptRole)
+    btn_serie = msg.addButton("Toda la serie", QMessageBox.AcceptRole)
+    msg.addButton("Cancelar", QMessageBox.RejectRole)
+    msg.exec_()
+    if msg.clickedButton() == btn_ocurrencia:
+        return 'ocurrencia'
+    if msg.clickedButton() == btn_serie:
+        return 'serie'
+    return None